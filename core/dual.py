@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+from numbers import Number
+from typing import Sequence, Tuple, List, Union
+import math
+
+class Dual:
+    """
+    A class to represent a dual number for forward-mode automatic differentiation
+
+    A Dual carries a value and its partial derivatives with respect to a set of seeded
+    parameters. Vector3, Quaternion and the physics classes accept Duals wherever they
+    accept floats, so a single run also yields the derivatives of its state.
+
+    ...
+
+    Attributes
+    ----------
+    value : float
+        Value of the number
+    grad : Tuple[float, ...]
+        Partial derivatives of the value with respect to each seeded parameter
+
+    Factories
+    ---------
+    Seed():
+        Creates one Dual per parameter, each differentiated with respect to itself
+
+    Methods
+    -------
+    sqrt(), exp(), log(), sin(), cos(), asin(), acos():
+        Elementary functions of the number
+    """
+
+    __slots__ = ("value", "grad")
+
+    def __init__(self, value : float, grad : Sequence[float] = ()) -> None:
+        """
+        Construct all necessary attributes for a Dual object
+
+        Parameters
+        ----------
+        value : float
+            Value of the number
+        grad : Sequence[float]
+            Partial derivatives of the value (empty for a constant)
+        """
+
+        self.value = float(value)
+        self.grad = tuple(grad)
+
+    @classmethod
+    def Seed(cls, values : Sequence[float]) -> List[Dual]:
+        """
+        Construct one Dual per parameter, each with a unit derivative with respect to itself
+
+        Parameters
+        ----------
+        values : Sequence[float]
+            Values of the parameters
+
+        Returns
+        -------
+        List[Dual]
+            Seeded parameters
+        """
+        n = len(values)
+        return [cls(value, [1.0 if i == j else 0.0 for j in range(n)]) for i, value in enumerate(values)]
+
+    def _chain(self, value : float, derivative : float) -> Dual:
+        return Dual(value, [derivative * g for g in self.grad])
+
+    def __str__(self) -> str:
+        return ''.join([str(self.value), "+", str(list(self.grad)), "e"])
+
+    def __repr__(self) -> str:
+        return ''.join(["Dual(", str(self.value), ",", str(self.grad), ")"])
+
+    def __format__(self, spec : str) -> str:
+        return format(self.value, spec)
+
+    def __hash__(self) -> int:
+        return hash(self.value)
+
+    def __bool__(self) -> bool:
+        return self.value != 0
+
+    def __eq__(self, other : object) -> bool:
+        if isinstance(other, Dual):
+            return self.value == other.value
+        if isinstance(other, Number):
+            return self.value == other
+        return NotImplemented
+
+    def __ne__(self, other : object) -> bool:
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __lt__(self, other : Union[float, Dual]) -> bool:
+        return self.value < (other.value if isinstance(other, Dual) else other)
+
+    def __le__(self, other : Union[float, Dual]) -> bool:
+        return self.value <= (other.value if isinstance(other, Dual) else other)
+
+    def __gt__(self, other : Union[float, Dual]) -> bool:
+        return self.value > (other.value if isinstance(other, Dual) else other)
+
+    def __ge__(self, other : Union[float, Dual]) -> bool:
+        return self.value >= (other.value if isinstance(other, Dual) else other)
+
+    def __pos__(self) -> Dual:
+        return self
+
+    def __neg__(self) -> Dual:
+        return Dual(-self.value, [-g for g in self.grad])
+
+    def __abs__(self) -> Dual:
+        return -self if self.value < 0 else self
+
+    def __add__(self, other : Union[float, Dual]) -> Dual:
+        if isinstance(other, Dual):
+            if not other.grad:
+                return Dual(self.value + other.value, self.grad)
+            if not self.grad:
+                return Dual(self.value + other.value, other.grad)
+            return Dual(self.value + other.value, [a + b for a, b in zip(self.grad, other.grad)])
+        if isinstance(other, Number):
+            return Dual(self.value + other, self.grad)
+        return NotImplemented
+
+    def __radd__(self, other : float) -> Dual:
+        return self.__add__(other)
+
+    def __sub__(self, other : Union[float, Dual]) -> Dual:
+        if isinstance(other, Dual):
+            if not other.grad:
+                return Dual(self.value - other.value, self.grad)
+            if not self.grad:
+                return Dual(self.value - other.value, [-b for b in other.grad])
+            return Dual(self.value - other.value, [a - b for a, b in zip(self.grad, other.grad)])
+        if isinstance(other, Number):
+            return Dual(self.value - other, self.grad)
+        return NotImplemented
+
+    def __rsub__(self, other : float) -> Dual:
+        if isinstance(other, Number):
+            return Dual(other - self.value, [-g for g in self.grad])
+        return NotImplemented
+
+    def __mul__(self, other : Union[float, Dual]) -> Dual:
+        if isinstance(other, Dual):
+            a, b = self.value, other.value
+            if not other.grad:
+                return Dual(a * b, [b * g for g in self.grad])
+            if not self.grad:
+                return Dual(a * b, [a * g for g in other.grad])
+            return Dual(a * b, [b * ga + a * gb for ga, gb in zip(self.grad, other.grad)])
+        if isinstance(other, Number):
+            return Dual(self.value * other, [other * g for g in self.grad])
+        return NotImplemented
+
+    def __rmul__(self, other : float) -> Dual:
+        return self.__mul__(other)
+
+    def __truediv__(self, other : Union[float, Dual]) -> Dual:
+        if isinstance(other, Dual):
+            a, b = self.value, other.value
+            value = a / b
+            if not other.grad:
+                return Dual(value, [g / b for g in self.grad])
+            if not self.grad:
+                return Dual(value, [-value * g / b for g in other.grad])
+            return Dual(value, [(ga - value * gb) / b for ga, gb in zip(self.grad, other.grad)])
+        if isinstance(other, Number):
+            return Dual(self.value / other, [g / other for g in self.grad])
+        return NotImplemented
+
+    def __rtruediv__(self, other : float) -> Dual:
+        if isinstance(other, Number):
+            value = other / self.value
+            return Dual(value, [-value * g / self.value for g in self.grad])
+        return NotImplemented
+
+    def __pow__(self, exponent : float) -> Dual:
+        if isinstance(exponent, Dual) or not isinstance(exponent, Number):
+            return NotImplemented
+        return self._chain(self.value ** exponent, exponent * self.value ** (exponent - 1))
+
+    def sqrt(self) -> Dual:
+        """Square root of the number"""
+        value = math.sqrt(self.value)
+        return self._chain(value, 0.5 / value if value > 0 else math.inf)
+
+    def exp(self) -> Dual:
+        """Exponential of the number"""
+        value = math.exp(self.value)
+        return self._chain(value, value)
+
+    def log(self) -> Dual:
+        """Natural logarithm of the number"""
+        return self._chain(math.log(self.value), 1 / self.value)
+
+    def sin(self) -> Dual:
+        """Sine of the number"""
+        return self._chain(math.sin(self.value), math.cos(self.value))
+
+    def cos(self) -> Dual:
+        """Cosine of the number"""
+        return self._chain(math.cos(self.value), -math.sin(self.value))
+
+    def asin(self) -> Dual:
+        """Arcsine of the number"""
+        d = 1 - self.value * self.value
+        return self._chain(math.asin(self.value), 1 / math.sqrt(d) if d > 0 else math.inf)
+
+    def acos(self) -> Dual:
+        """Arccosine of the number"""
+        d = 1 - self.value * self.value
+        return self._chain(math.acos(self.value), -1 / math.sqrt(d) if d > 0 else -math.inf)
+
+Number.register(Dual)
+
+# Elementary functions accepting either floats or Duals
+
+def sqrt(x : Union[float, Dual]) -> Union[float, Dual]:
+    return x.sqrt() if isinstance(x, Dual) else math.sqrt(x)
+
+def pow(x : Union[float, Dual], y : float) -> Union[float, Dual]:
+    return x ** y if isinstance(x, Dual) else math.pow(x, y)
+
+def exp(x : Union[float, Dual]) -> Union[float, Dual]:
+    return x.exp() if isinstance(x, Dual) else math.exp(x)
+
+def log(x : Union[float, Dual]) -> Union[float, Dual]:
+    return x.log() if isinstance(x, Dual) else math.log(x)
+
+def sin(x : Union[float, Dual]) -> Union[float, Dual]:
+    return x.sin() if isinstance(x, Dual) else math.sin(x)
+
+def cos(x : Union[float, Dual]) -> Union[float, Dual]:
+    return x.cos() if isinstance(x, Dual) else math.cos(x)
+
+def asin(x : Union[float, Dual]) -> Union[float, Dual]:
+    return x.asin() if isinstance(x, Dual) else math.asin(x)
+
+def acos(x : Union[float, Dual]) -> Union[float, Dual]:
+    return x.acos() if isinstance(x, Dual) else math.acos(x)
+
+def atan2(y : Union[float, Dual], x : Union[float, Dual]) -> Union[float, Dual]:
+    if not isinstance(x, Dual) and not isinstance(y, Dual):
+        return math.atan2(y, x)
+    y = y if isinstance(y, Dual) else Dual(y)
+    x = x if isinstance(x, Dual) else Dual(x)
+    n = max(len(x.grad), len(y.grad))
+    gx = x.grad or (0.0,) * n
+    gy = y.grad or (0.0,) * n
+    r2 = x.value * x.value + y.value * y.value
+    return Dual(math.atan2(y.value, x.value), [(x.value * dy - y.value * dx) / r2 for dx, dy in zip(gx, gy)])
+
+def copysign(x : Union[float, Dual], y : Union[float, Dual]) -> Union[float, Dual]:
+    xv = x.value if isinstance(x, Dual) else x
+    yv = y.value if isinstance(y, Dual) else y
+    return x if math.copysign(1, xv) == math.copysign(1, yv) else -x
+
+def valueOf(x : Union[float, Dual]) -> float:
+    """
+    Return the value of a float or Dual
+
+    Parameters
+    ----------
+    x : float OR Dual
+        Number to inspect
+
+    Returns
+    -------
+    float
+        Value of the number
+    """
+    return x.value if isinstance(x, Dual) else float(x)
+
+def gradientOf(x : Union[float, Dual], size : int) -> Tuple[float, ...]:
+    """
+    Return the partial derivatives of a float or Dual
+
+    Parameters
+    ----------
+    x : float OR Dual
+        Number to inspect
+    size : int
+        Number of seeded parameters
+
+    Returns
+    -------
+    Tuple[float, ...]
+        Partial derivatives (all zero for a float or constant Dual)
+    """
+    if isinstance(x, Dual) and x.grad:
+        return x.grad
+    return (0.0,) * size
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from typing import List, Sequence
+
+Matrix = List[List[float]]
+
+def solveLinear(a : Sequence[Sequence[float]], b : Sequence[float]) -> List[float]:
+    """
+    Solve a small dense linear system with Gaussian elimination and partial pivoting
+
+    Parameters
+    ----------
+    a : Matrix
+        Square coefficient matrix
+    b : List[float]
+        Right-hand side
+
+    Returns
+    -------
+    List[float]
+        Solution of a x = b
+    """
+    n = len(b)
+    m = [list(row) + [b[i]] for i, row in enumerate(a)]
+    for col in range(n):
+        pivot = max(range(col, n), key = lambda r : abs(m[r][col]))
+        if m[pivot][col] == 0:
+            raise ZeroDivisionError("Singular matrix")
+        m[col], m[pivot] = m[pivot], m[col]
+        pivotRow = m[col]
+        for r in range(col + 1, n):
+            row = m[r]
+            f = row[col] / pivotRow[col]
+            if f != 0:
+                for c in range(col, n + 1):
+                    row[c] -= f * pivotRow[c]
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        x[r] = (m[r][n] - sum(m[r][c] * x[c] for c in range(r + 1, n))) / m[r][r]
+    return x
+
+def leastSquares(a : Sequence[Sequence[float]], b : Sequence[float], ridge : float = 0.0) -> List[float]:
+    """
+    Solve an overdetermined linear system in the least-squares sense through the normal equations
+
+    Parameters
+    ----------
+    a : Matrix
+        Coefficient matrix with at least as many rows as columns
+    b : List[float]
+        Right-hand side
+    ridge : float
+        Tikhonov regularisation added to the diagonal of the normal equations
+
+    Returns
+    -------
+    List[float]
+        Solution minimising |a x - b|^2 + ridge |x|^2
+    """
+    n = len(a[0])
+    columns = list(zip(*a))
+    ata = [[sum(p * q for p, q in zip(columns[i], columns[j])) for j in range(n)] for i in range(n)]
+    atb = [sum(p * q for p, q in zip(columns[i], b)) for i in range(n)]
+    for i in range(n):
+        ata[i][i] += ridge
+    return solveLinear(ata, atb)
@@ -0,0 +1,258 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Union
+
+from numbers import Number
+
+from .vector import *
+from .quaternion import *
+
+@dataclass
+class Matrix3:
+    """
+    A class to represent a three-by-three matrix
+
+    Matrix3 objects are treated as immutable, so they can be shared and cached.
+
+    ...
+
+    Attributes
+    ----------
+    xx, xy, xz : float
+        First row of the matrix
+    yx, yy, yz : float
+        Second row of the matrix
+    zx, zy, zz : float
+        Third row of the matrix
+
+    Methods
+    -------
+    diagonal():
+        Returns the diagonal of this matrix
+    transpose():
+        Returns the transpose of this matrix
+    determinant():
+        Calculates the determinant of this matrix
+    inverse():
+        Calculates and returns the inverse of this matrix
+    """
+
+    xx : float = 1
+    xy : float = 0
+    xz : float = 0
+    yx : float = 0
+    yy : float = 1
+    yz : float = 0
+    zx : float = 0
+    zy : float = 0
+    zz : float = 1
+
+    @classmethod
+    def Identity(cls) -> Matrix3:
+        return cls(1, 0, 0, 0, 1, 0, 0, 0, 1)
+
+    @classmethod
+    def Diagonal(cls, diagonal : Vector3) -> Matrix3:
+        """
+        Construct a diagonal Matrix3 object
+
+        Parameters
+        ----------
+        diagonal : Vector3
+            Diagonal of the matrix
+
+        Returns
+        -------
+        Matrix3
+            Matrix with the given diagonal and zeros elsewhere
+        """
+        return cls(diagonal.x, 0, 0, 0, diagonal.y, 0, 0, 0, diagonal.z)
+
+    @classmethod
+    def Symmetric(cls, diagonal : Vector3, products : Vector3) -> Matrix3:
+        """
+        Construct a symmetric Matrix3 object, e.g. an inertia tensor
+
+        Parameters
+        ----------
+        diagonal : Vector3
+            Diagonal of the matrix (Ixx, Iyy, Izz)
+        products : Vector3
+            Off-diagonal entries in xy, xz, yz order (for an inertia tensor, the negated products of inertia)
+
+        Returns
+        -------
+        Matrix3
+            Symmetric matrix
+        """
+        return cls(diagonal.x, products.x, products.y,
+                   products.x, diagonal.y, products.z,
+                   products.y, products.z, diagonal.z)
+
+    @classmethod
+    def FromQuaternion(cls, q : Quaternion) -> Matrix3:
+        """
+        Construct the rotation matrix of a unit Quaternion object
+
+        Parameters
+        ----------
+        q : Quaternion
+            Rotation to convert
+
+        Returns
+        -------
+        Matrix3
+            Matrix m such that m * v equals v * q for every Vector3 v
+        """
+        w, x, y, z = q.w, q.x, q.y, q.z
+        return cls(1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y),
+                   2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x),
+                   2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y))
+
+    def __repr__(self) -> str:
+        """
+        Return a comprehensive string representation of a Matrix3 object
+
+        Returns
+        -------
+        str
+            Comprehensive string representation
+        """
+
+        return ''.join(["Matrix3((", str(self.xx), ",", str(self.xy), ",", str(self.xz), "),(",
+            str(self.yx), ",", str(self.yy), ",", str(self.yz), "),(",
+            str(self.zx), ",", str(self.zy), ",", str(self.zz), "))"])
+
+    def __add__(self, other : Matrix3) -> Matrix3:
+        """
+        Return a sum of two Matrix3 objects
+
+        Parameters
+        ----------
+        other : Matrix3
+            Matrix3 for right-hand operand in addition
+
+        Returns
+        -------
+        Matrix3
+            Elementwise sum of operands
+        """
+
+        if not isinstance(other, Matrix3):
+            return NotImplemented
+        return Matrix3(self.xx + other.xx, self.xy + other.xy, self.xz + other.xz,
+                       self.yx + other.yx, self.yy + other.yy, self.yz + other.yz,
+                       self.zx + other.zx, self.zy + other.zy, self.zz + other.zz)
+
+    def __sub__(self, other : Matrix3) -> Matrix3:
+        """
+        Return a difference of two Matrix3 objects
+
+        Parameters
+        ----------
+        other : Matrix3
+            Matrix3 for right-hand operand in subtraction
+
+        Returns
+        -------
+        Matrix3
+            Elementwise difference of operands
+        """
+
+        if not isinstance(other, Matrix3):
+            return NotImplemented
+        return Matrix3(self.xx - other.xx, self.xy - other.xy, self.xz - other.xz,
+                       self.yx - other.yx, self.yy - other.yy, self.yz - other.yz,
+                       self.zx - other.zx, self.zy - other.zy, self.zz - other.zz)
+
+    def __mul__(self, other : Union[float, Vector3, Matrix3]) -> Union[Vector3, Matrix3]:
+        """
+        Return a multiplication of a Matrix3 object
+
+        Parameters
+        ----------
+        other : float, Vector3, Matrix3
+            Value for right-hand operand in multiplication
+
+        Returns
+        -------
+        Vector3 OR Matrix3
+            Transformed vector, matrix product or scaled matrix
+        """
+
+        if isinstance(other, Vector3):
+            x, y, z = other.x, other.y, other.z
+            return Vector3(self.xx * x + self.xy * y + self.xz * z,
+                           self.yx * x + self.yy * y + self.yz * z,
+                           self.zx * x + self.zy * y + self.zz * z)
+        elif isinstance(other, Matrix3):
+            return Matrix3(self.xx * other.xx + self.xy * other.yx + self.xz * other.zx,
+                           self.xx * other.xy + self.xy * other.yy + self.xz * other.zy,
+                           self.xx * other.xz + self.xy * other.yz + self.xz * other.zz,
+                           self.yx * other.xx + self.yy * other.yx + self.yz * other.zx,
+                           self.yx * other.xy + self.yy * other.yy + self.yz * other.zy,
+                           self.yx * other.xz + self.yy * other.yz + self.yz * other.zz,
+                           self.zx * other.xx + self.zy * other.yx + self.zz * other.zx,
+                           self.zx * other.xy + self.zy * other.yy + self.zz * other.zy,
+                           self.zx * other.xz + self.zy * other.yz + self.zz * other.zz)
+        elif isinstance(other, Number):
+            return Matrix3(self.xx * other, self.xy * other, self.xz * other,
+                           self.yx * other, self.yy * other, self.yz * other,
+                           self.zx * other, self.zy * other, self.zz * other)
+        else:
+            return NotImplemented
+
+    def diagonal(self) -> Vector3:
+        """
+        Return the diagonal of a Matrix3 object
+
+        Returns
+        -------
+        Vector3
+            Diagonal entries
+        """
+
+        return Vector3(self.xx, self.yy, self.zz)
+
+    def transpose(self) -> Matrix3:
+        """
+        Return the transpose of a Matrix3 object
+
+        Returns
+        -------
+        Matrix3
+            Transposed matrix (the inverse of a rotation matrix)
+        """
+
+        return Matrix3(self.xx, self.yx, self.zx, self.xy, self.yy, self.zy, self.xz, self.yz, self.zz)
+
+    def determinant(self) -> float:
+        """
+        Calculate the determinant of a Matrix3 object
+
+        Returns
+        -------
+        float
+            Determinant of the matrix
+        """
+
+        return (self.xx * (self.yy * self.zz - self.yz * self.zy)
+                - self.xy * (self.yx * self.zz - self.yz * self.zx)
+                + self.xz * (self.yx * self.zy - self.yy * self.zx))
+
+    def inverse(self) -> Matrix3:
+        """
+        Calculate and return the inverse of a Matrix3 object
+
+        Returns
+        -------
+        Matrix3
+            Inverse matrix (ZeroDivisionError is raised for a singular matrix)
+        """
+
+        det = self.determinant()
+        if det == 0:
+            raise ZeroDivisionError("Singular matrix")
+        return Matrix3((self.yy * self.zz - self.yz * self.zy) / det, (self.xz * self.zy - self.xy * self.zz) / det, (self.xy * self.yz - self.xz * self.yy) / det,
+                       (self.yz * self.zx - self.yx * self.zz) / det, (self.xx * self.zz - self.xz * self.zx) / det, (self.xz * self.yx - self.xx * self.yz) / det,
+                       (self.yx * self.zy - self.yy * self.zx) / det, (self.xy * self.zx - self.xx * self.zy) / det, (self.xx * self.yy - self.xy * self.yx) / det)
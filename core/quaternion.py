@@ -12,6 +12,8 @@ from numbers import Number
 import math
 
 from .vector import *
+from . import dual
+from .dual import Dual
 
 @dataclass
 class Quaternion:
@@ -50,6 +52,8 @@ class Quaternion:
         Calculates and returns the quaternion's conjugate
     fractional():
         Returns a quaternion that rotates some fraction of the original
+    slerp():
+        Returns a quaternion spherically interpolated towards another
     """
 
     w : float = 0
@@ -73,10 +77,17 @@ class Quaternion:
             z imaginary component of the quaternion
         """
 
-        self.w = float(w)
-        self.x = float(x)
-        self.y = float(y)
-        self.z = float(z)
+        try:
+            self.w = float(w)
+            self.x = float(x)
+            self.y = float(y)
+            self.z = float(z)
+        except TypeError:
+            # Dual components keep their derivatives
+            self.w = w if isinstance(w, Dual) else float(w)
+            self.x = x if isinstance(x, Dual) else float(x)
+            self.y = y if isinstance(y, Dual) else float(y)
+            self.z = z if isinstance(z, Dual) else float(z)
 
     @classmethod
     def FromVector(cls, other : Vector3) -> Quaternion:
@@ -114,13 +125,13 @@ class Quaternion:
         Quaternion
             Converted euler rotation in Quaternion form
         """
-        cy = math.cos(yaw / 2)
-        cp = math.cos(pitch / 2)
-        cr = math.cos(roll / 2)
+        cy = dual.cos(yaw / 2)
+        cp = dual.cos(pitch / 2)
+        cr = dual.cos(roll / 2)
 
-        sy = math.sin(yaw / 2)
-        sp = math.sin(pitch / 2)
-        sr = math.sin(roll / 2)
+        sy = dual.sin(yaw / 2)
+        sp = dual.sin(pitch / 2)
+        sr = dual.sin(roll / 2)
 
         return cls((cr * cp * cy) + (sr * sp * sy), (sr * cp * cy) - (cr * sp * sy), (cr * sp * cy) + (sr * cp * sy), (cr * cp * sy) - (sr * sp * cy))
 
@@ -136,17 +147,17 @@ class Quaternion:
         sinr_cosp = 2 * (self.w * self.x + self.y * self.z)
         cosr_cosp = 1 - 2 * (self.x * self.x + self.y * self.y)
 
-        roll = math.atan2(sinr_cosp, cosr_cosp)
+        roll = dual.atan2(sinr_cosp, cosr_cosp)
 
         sinp = 2 * (self.w * self.y - self.z * self.x)
         if abs(sinp) >= 1:
-            pitch = math.copysign(math.pi / 2, sinp)
+            pitch = dual.copysign(math.pi / 2, sinp)
         else:
-            pitch = math.asin(sinp)
+            pitch = dual.asin(sinp)
 
         siny_cosp = 2 * (self.w * self.z + self.x * self.y)
         cosy_cosp = 1 - 2 * (self.y * self.y + self.z * self.z)
-        yaw = math.atan2(siny_cosp, cosy_cosp)
+        yaw = dual.atan2(siny_cosp, cosy_cosp)
 
         return yaw, pitch, roll
 
@@ -216,12 +227,12 @@ class Quaternion:
         if angle == 0 or (isinstance(x, Vector3) and x == Vector3.Zero()) or (x == 0 and y == 0 and z == 0):
             return Quaternion.Zero()
 
-        sa = math.sin(angle / 2)
+        sa = dual.sin(angle / 2)
 
         if isinstance(x, Vector3):
-            return cls(math.cos(angle / 2), x.x * sa, x.y * sa, x.z * sa)
+            return cls(dual.cos(angle / 2), x.x * sa, x.y * sa, x.z * sa)
         elif x is not None and y is not None and z is not None:
-            return cls(math.cos(angle / 2), x * sa, y * sa, z * sa)
+            return cls(dual.cos(angle / 2), x * sa, y * sa, z * sa)
         return NotImplemented
 
     def ToAxisAngle(self) -> Tuple[float, Vector3]:
@@ -233,12 +244,12 @@ class Quaternion:
         Tuple[float, Vector3]
             Axis-angle representation in angle, axis order
         """
-        angle = math.acos(self.w) * 2
+        angle = dual.acos(self.w) * 2
 
         if angle == 0:
             return 0, Vector3.Zero()
 
-        sa = math.sin(angle / 2)
+        sa = dual.sin(angle / 2)
 
         return angle, Vector3(self.x / sa, self.y / sa, self.z / sa).normalized()
 
@@ -379,7 +390,7 @@ class Quaternion:
 
             return ret
         elif isinstance(other, Number):
-            return Quaternion(self.w * float(other), self.x * float(other), self.y * float(other), self.z * float(other))
+            return Quaternion(self.w * other, self.x * other, self.y * other, self.z * other)
         else:
             return NotImplemented
 
@@ -421,7 +432,7 @@ class Quaternion:
 
         if not isinstance(other, Number):
             return NotImplemented
-        return Quaternion(self.w / float(other), self.x / float(other), self.y / float(other), self.z / float(other))
+        return Quaternion(self.w / other, self.x / other, self.y / other, self.z / other)
 
     def norm(self) -> float:
         """
@@ -433,7 +444,10 @@ class Quaternion:
             Calculated vector length
         """
 
-        return math.sqrt(math.pow(self.w, 2) + math.pow(self.x, 2) + math.pow(self.y, 2) + math.pow(self.z, 2))
+        try:
+            return math.sqrt(math.pow(self.w, 2) + math.pow(self.x, 2) + math.pow(self.y, 2) + math.pow(self.z, 2))
+        except TypeError:
+            return dual.sqrt(dual.pow(self.w, 2) + dual.pow(self.x, 2) + dual.pow(self.y, 2) + dual.pow(self.z, 2))
 
     def normalized(self) -> Quaternion:
         """
@@ -477,3 +491,37 @@ class Quaternion:
             Fractional rotation Quaternion, normalized
         """
         return Quaternion((1 - fraction) + (self.w * fraction), self.x * fraction, self.y * fraction, self.z * fraction).normalized()
+
+    def slerp(self, other : Quaternion, fraction : float) -> Quaternion:
+        """
+        Returns a quaternion spherically interpolated between this quaternion and another
+
+        Parameters
+        ----------
+        other : Quaternion
+            Quaternion reached at a fraction of 1
+        fraction : float
+            Fractional amount (0-1) to interpolate towards other
+
+        Returns
+        -------
+        Quaternion
+            Interpolated Quaternion, normalized
+        """
+        cosAngle = (self.w * other.w) + (self.x * other.x) + (self.y * other.y) + (self.z * other.z)
+
+        # Take the shorter path between the two rotations
+        if cosAngle < 0:
+            other = other * -1
+            cosAngle = -cosAngle
+
+        # Nearly parallel quaternions fall back to normalized linear interpolation
+        if cosAngle > 0.9995:
+            return (self + (other - self) * fraction).normalized()
+
+        angle = dual.acos(cosAngle)
+        sinAngle = dual.sin(angle)
+        a = dual.sin((1 - fraction) * angle) / sinAngle
+        b = dual.sin(fraction * angle) / sinAngle
+
+        return Quaternion((self.w * a) + (other.w * b), (self.x * a) + (other.x * b), (self.y * a) + (other.y * b), (self.z * a) + (other.z * b))
@@ -6,8 +6,11 @@ Created on Thu Sep 9 22:59:57 2021
 """
 from .vector import *
 from .quaternion import *
+from .matrix import *
+from .dual import *
 import unittest
 import operator
+import math
 
 class TestVector2(unittest.TestCase):
     def test_init(self):
@@ -165,4 +168,62 @@ class TestVector3(unittest.TestCase):
         self.assertEqual(Vector3(1, 0, 0).cross(Vector3(0, 0, 1)), Vector3(0, -1, 0))
         self.assertEqual(Vector3(1, 2, 3).cross(Vector3(4, 5, 6)), Vector3(-3, 6, -3))
 
+class TestQuaternion(unittest.TestCase):
+    def test_slerp(self):
+        a = Quaternion.FromAxisAngle(0, Vector3.UnitZ())
+        b = Quaternion.FromAxisAngle(math.pi / 2, Vector3.UnitZ())
+        mid = a.slerp(b, 0.5)
+        expected = Quaternion.FromAxisAngle(math.pi / 4, Vector3.UnitZ())
+        self.assertAlmostEqual(mid.w, expected.w)
+        self.assertAlmostEqual(mid.z, expected.z)
+        self.assertAlmostEqual(a.slerp(b, 0).w, a.w)
+        self.assertAlmostEqual(a.slerp(b, 1).z, b.z)
+        self.assertAlmostEqual(a.slerp(b * -1, 0.5).w, expected.w)
+        self.assertAlmostEqual(b.slerp(b, 0.3).norm(), 1)
+
+class TestMatrix3(unittest.TestCase):
+    def test_rotation_and_inverse(self):
+        q = Quaternion.FromAxisAngle(0.7, Vector3(1, 2, 3).normalized())
+        r = Matrix3.FromQuaternion(q)
+        v = Vector3(0.3, -1.2, 2.5)
+        self.assertAlmostEqual((r * v - v * q).norm(), 0)
+        self.assertAlmostEqual((r.transpose() * (r * v) - v).norm(), 0)
+        self.assertAlmostEqual((Matrix3.FromQuaternion(q.conj()) - r.transpose()).diagonal().norm(), 0)
+        self.assertAlmostEqual(r.determinant(), 1)
+
+        m = Matrix3.Symmetric(Vector3(4, 5, 6), Vector3(-0.5, 0.25, -1))
+        product = m * m.inverse()
+        for got, expected in zip((product.xx, product.xy, product.xz, product.yx, product.yy, product.yz, product.zx, product.zy, product.zz),
+                                 (1, 0, 0, 0, 1, 0, 0, 0, 1)):
+            self.assertAlmostEqual(got, expected)
+        self.assertEqual(Matrix3.Diagonal(Vector3(1, 2, 4)).inverse(), Matrix3.Diagonal(Vector3(1, 0.5, 0.25)))
+        self.assertEqual(Matrix3.Identity() * 2 + Matrix3.Identity(), Matrix3.Diagonal(Vector3(3, 3, 3)))
+        self.assertRaises(ZeroDivisionError, Matrix3.Diagonal(Vector3(1, 0, 1)).inverse)
+
+class TestDual(unittest.TestCase):
+    def test_arithmetic(self):
+        x, y = Dual.Seed([3, 4])
+        f = (x * y + x / y - 2 * x + 1) / x
+        self.assertAlmostEqual(f.value, 4 + 0.25 - 2 + 1 / 3)
+        self.assertAlmostEqual(f.grad[0], -1 / 9)
+        self.assertAlmostEqual(f.grad[1], 1 - 1 / 16)
+        self.assertTrue(x < y and y > 3.5 and x == 3)
+
+    def test_vector_norm(self):
+        x, y = Dual.Seed([3, 4])
+        n = Vector3(x, y, 0).norm()
+        self.assertAlmostEqual(n.value, 5)
+        self.assertAlmostEqual(n.grad[0], 0.6)
+        self.assertAlmostEqual(n.grad[1], 0.8)
+        self.assertIsInstance(Vector3(1, 2, 3).norm(), float)
+
+    def test_quaternion_rotation(self):
+        (angle,) = Dual.Seed([0.3])
+        q = Quaternion.FromAxisAngle(angle, Vector3.UnitZ())
+        v = Vector3.UnitX() * q
+        self.assertAlmostEqual(v.x.value, math.cos(0.3))
+        self.assertAlmostEqual(v.y.grad[0], math.cos(0.3))
+        yaw, pitch, roll = q.ToEuler()
+        self.assertAlmostEqual(yaw.grad[0], 1)
+
 unittest.main(argv=[''],verbosity=2, exit=False)
\ No newline at end of file
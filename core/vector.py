@@ -10,6 +10,9 @@ from dataclasses import dataclass
 from numbers import Number
 import math
 
+from . import dual
+from .dual import Dual
+
 @dataclass
 class Vector2:
     """
@@ -51,8 +54,13 @@ class Vector2:
             y component of the vector
         """
 
-        self.x = float(x)
-        self.y = float(y)
+        try:
+            self.x = float(x)
+            self.y = float(y)
+        except TypeError:
+            # Dual components keep their derivatives
+            self.x = x if isinstance(x, Dual) else float(x)
+            self.y = y if isinstance(y, Dual) else float(y)
 
     @classmethod
     def Zero(cls) -> Vector2:
@@ -207,7 +215,7 @@ class Vector2:
 
         if not isinstance(other, Number):
             return NotImplemented
-        return Vector2(self.x * float(other), self.y * float(other))
+        return Vector2(self.x * other, self.y * other)
 
     def __truediv__(self, other : float) -> Vector2:
         """
@@ -226,7 +234,7 @@ class Vector2:
 
         if not isinstance(other, Number):
             return NotImplemented
-        return Vector2(self.x / float(other), self.y / float(other))
+        return Vector2(self.x / other, self.y / other)
 
     def norm(self) -> float:
         """
@@ -238,7 +246,10 @@ class Vector2:
             Calculated vector length
         """
 
-        return math.sqrt(math.pow(self.x, 2) + math.pow(self.y, 2))
+        try:
+            return math.sqrt(math.pow(self.x, 2) + math.pow(self.y, 2))
+        except TypeError:
+            return dual.sqrt(dual.pow(self.x, 2) + dual.pow(self.y, 2))
 
     def normalized(self) -> Vector2:
         """
@@ -310,7 +321,10 @@ class Vector2:
 
         if not isinstance(other, Vector2):
             return NotImplemented
-        return math.acos(self.dot(other) / (self.norm() * other.norm()))
+        try:
+            return math.acos(self.dot(other) / (self.norm() * other.norm()))
+        except TypeError:
+            return dual.acos(self.dot(other) / (self.norm() * other.norm()))
 
 @dataclass
 class Vector3:
@@ -358,9 +372,15 @@ class Vector3:
             z component of the vector
         """
 
-        self.x = float(x)
-        self.y = float(y)
-        self.z = float(z)
+        try:
+            self.x = float(x)
+            self.y = float(y)
+            self.z = float(z)
+        except TypeError:
+            # Dual components keep their derivatives
+            self.x = x if isinstance(x, Dual) else float(x)
+            self.y = y if isinstance(y, Dual) else float(y)
+            self.z = z if isinstance(z, Dual) else float(z)
 
     @classmethod
     def Zero(cls) -> Vector3:
@@ -521,7 +541,7 @@ class Vector3:
 
         if not isinstance(other, Number):
             return NotImplemented
-        return Vector3(self.x * float(other), self.y * float(other), self.z * float(other))
+        return Vector3(self.x * other, self.y * other, self.z * other)
 
     def __truediv__(self, other : float) -> Vector3:
         """
@@ -540,7 +560,7 @@ class Vector3:
 
         if not isinstance(other, Number):
             return NotImplemented
-        return Vector3(self.x / float(other), self.y / float(other), self.z / float(other))
+        return Vector3(self.x / other, self.y / other, self.z / other)
 
     def norm(self) -> float:
         """
@@ -552,7 +572,10 @@ class Vector3:
             Calculated vector length
         """
 
-        return math.sqrt(math.pow(self.x, 2) + math.pow(self.y, 2) + math.pow(self.z, 2))
+        try:
+            return math.sqrt(math.pow(self.x, 2) + math.pow(self.y, 2) + math.pow(self.z, 2))
+        except TypeError:
+            return dual.sqrt(dual.pow(self.x, 2) + dual.pow(self.y, 2) + dual.pow(self.z, 2))
 
     def normalized(self) -> Vector3:
         """
@@ -624,4 +647,4 @@ class Vector3:
 
         if not isinstance(other, Vector3):
             return NotImplemented
-        return math.acos(self.dot(other) / (self.norm() * other.norm()))
\ No newline at end of file
+        return dual.acos(self.dot(other) / (self.norm() * other.norm()))
\ No newline at end of file
@@ -0,0 +1,5 @@
+import sys
+
+from platysim.cli import main
+
+sys.exit(main())
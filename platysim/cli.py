@@ -0,0 +1,343 @@
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Sections of a scenario file; a file without any of them holds only the scenario fields
+FILE_SECTIONS = ("scenario", "sweep", "montecarlo")
+
+# Seconds of imports a short job may spend before it starts simulating (run path, CSV output),
+# summed over python -X importtime; measured at about 0.13 s, with headroom for slower machines
+STARTUP_BUDGET = 0.5
+
+def loadScenarioFile(path : str) -> Dict[str, Dict[str, Any]]:
+    """
+    Read a declarative JSON or TOML scenario file
+
+    The file holds the Scenario fields as in Scenario.toDict(), either at the top level or in
+    a "scenario" table next to optional "sweep" and "montecarlo" tables of command defaults.
+    TOML needs Python 3.11, or the tomli package on older versions.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file (".toml" files are read as TOML, anything else as JSON)
+
+    Returns
+    -------
+    Dict[str, Dict[str, Any]]
+        Contents of every section in FILE_SECTIONS (empty when missing)
+    """
+    with open(path, 'rb') as scenario_file:
+        raw = scenario_file.read()
+
+    if path.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ValueError("TOML scenario files need Python 3.11 or the tomli package") from None
+        data = tomllib.loads(raw.decode("utf-8"))
+    else:
+        data = json.loads(raw)
+
+    if not isinstance(data, dict):
+        raise ValueError(f"A scenario file holds a table of fields: {path}")
+    if not any(section in data for section in FILE_SECTIONS):
+        data = {"scenario": data}
+    unknown = set(data) - set(FILE_SECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown scenario file sections: {', '.join(sorted(unknown))}")
+    return {section: dict(data.get(section, {})) for section in FILE_SECTIONS}
+
+def buildScenario(fields : Dict[str, Any], overrides : Sequence[str] = ()):
+    """
+    Construct a Scenario from the fields of a scenario file and command-line overrides
+
+    Parameters
+    ----------
+    fields : Dict[str, Any]
+        Scenario fields as in Scenario.toDict()
+    overrides : Sequence[str]
+        "name=value" strings; the name is a Scenario field or one of SCENARIO_PARAMETERS, and
+        the value is read as JSON, or taken as a string when it is not valid JSON
+
+    Returns
+    -------
+    Scenario
+        Constructed scenario
+    """
+    from sim.scenario import SCENARIO_PARAMETERS, Scenario
+
+    fields = dict(fields)
+    parameters : Dict[str, float] = {}
+    for override in overrides:
+        name, separator, text = override.partition("=")
+        if not separator:
+            raise ValueError(f"Overrides take the form name=value: {override}")
+        try:
+            value = json.loads(text)
+        except ValueError:
+            value = text
+        if name in Scenario.__dataclass_fields__:
+            fields[name] = value
+        elif name in SCENARIO_PARAMETERS:
+            parameters[name] = float(value)
+        else:
+            raise ValueError(f"Unknown scenario field or parameter: {name}")
+
+    scenario = Scenario.FromDict(fields)
+    return scenario.withParameters(parameters) if parameters else scenario
+
+def parseDistribution(spec : Dict[str, Sequence[float]]):
+    """
+    Construct a dispersion distribution from its scenario file form
+
+    Parameters
+    ----------
+    spec : Dict[str, Sequence[float]]
+        {"normal": [mean, std]} or {"uniform": [low, high]}
+
+    Returns
+    -------
+    Normal OR Uniform
+        Distribution of the perturbation
+    """
+    from sim.sampling import Normal, Uniform
+
+    distributions = {"normal": Normal, "uniform": Uniform}
+    if not isinstance(spec, dict) or len(spec) != 1 or next(iter(spec)) not in distributions:
+        raise ValueError(f"Dispersions take the form {{\"normal\": [mean, std]}} or {{\"uniform\": [low, high]}}: {spec}")
+    kind, values = next(iter(spec.items()))
+    return distributions[kind](*values)
+
+def sweepValues(section : Dict[str, Any], values : Optional[Sequence[float]] = None,
+                span : Optional[Tuple[float, float, int]] = None) -> List[float]:
+    """
+    Return the values of a sweep, from the command line or else the scenario file
+
+    Parameters
+    ----------
+    section : Dict[str, Any]
+        "sweep" table of the scenario file, with "values" or "range" ([start, stop, count])
+    values : Sequence[float]
+        Explicit values
+    span : Tuple[float, float, int]
+        Start, stop and count of evenly spaced values, ends included
+
+    Returns
+    -------
+    List[float]
+        Values to run
+    """
+    if values:
+        return [float(value) for value in values]
+    if span is None and "values" in section:
+        return [float(value) for value in section["values"]]
+    if span is None and "range" in section:
+        span = tuple(section["range"])
+    if span is None:
+        raise ValueError("A sweep needs --values, --range or a sweep table with values or range")
+
+    start, stop, count = float(span[0]), float(span[1]), int(span[2])
+    if count < 2:
+        return [start][:count]
+    return [start + (stop - start) * i / (count - 1) for i in range(count)]
+
+def _chunks(items : Sequence[Any], workers : int) -> List[Sequence[Any]]:
+    # A few chunks per worker keeps them busy when run times differ
+    size = max(1, -(-len(items) // (workers * 4)))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def _sweepChunk(scenarios : Sequence[Any]) -> List[Dict[str, Any]]:
+    from sim.scenario import resultToDict
+    return [resultToDict(scenario.run()) for scenario in scenarios]
+
+def _statisticsChunk(scenarios : Sequence[Any]):
+    from sim.aggregate import EnsembleStatistics
+    statistics = EnsembleStatistics()
+    for scenario in scenarios:
+        statistics.addResult(scenario.run(observer = statistics.observe))
+    return statistics
+
+def _map(function, scenarios : Sequence[Any], workers : int) -> List[Any]:
+    # Run chunks of scenarios in worker processes, or in this one
+    if workers <= 1:
+        return [function(scenarios)]
+    from multiprocessing import Pool
+    with Pool(workers) as pool:
+        return pool.map(function, _chunks(scenarios, workers))
+
+def runCommand(args : argparse.Namespace) -> int:
+    from sim.recorder import DEFAULT_CHANNELS, Recorder
+    from sim.scenario import resultToDict
+
+    scenario = buildScenario(loadScenarioFile(args.scenario)["scenario"], args.set)
+    channels = tuple(args.channels) if args.channels else DEFAULT_CHANNELS
+
+    if args.output is None:
+        result = scenario.run()
+    elif args.output.endswith(".csv"):
+        recorder = Recorder(channels)
+        result = scenario.run(recorder.recordBody)
+        recorder.writeCSV(args.output)
+    else:
+        from sim.telemetry import TelemetryWriter
+        with TelemetryWriter(args.output, channels) as writer:
+            recorder = Recorder(channels, writer = writer)
+            result = scenario.run(recorder.recordBody)
+            recorder.flush()
+
+    print(json.dumps(resultToDict(result)))
+    return 0
+
+def sweepCommand(args : argparse.Namespace) -> int:
+    import csv
+
+    sections = loadScenarioFile(args.scenario)
+    scenario = buildScenario(sections["scenario"], args.set)
+    parameter = args.parameter or sections["sweep"].get("parameter")
+    if parameter is None:
+        raise ValueError("A sweep needs --parameter or a sweep table with a parameter")
+    values = sweepValues(sections["sweep"], args.values, args.range)
+    scenarios = [scenario.withParameters({parameter: value}) for value in values]
+
+    results = [result for chunk in _map(_sweepChunk, scenarios, args.workers) for result in chunk]
+
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        writer = csv.writer(output)
+        writer.writerow([parameter, "x", "y", "z", "landed", "apogee", "flightTime", "steps"])
+        for value, result in zip(values, results):
+            writer.writerow([value, *result["impact"], result["landed"], result["apogee"], result["flightTime"], result["steps"]])
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+def montecarloCommand(args : argparse.Namespace) -> int:
+    from sim.sampling import DispersionSampler
+
+    sections = loadScenarioFile(args.scenario)
+    section = sections["montecarlo"]
+    scenario = buildScenario(sections["scenario"], args.set)
+    dispersions = {name: parseDistribution(spec) for name, spec in section.get("dispersions", {}).items()}
+    sampler = DispersionSampler(scenario, dispersions, args.method or section.get("method", "sobol"),
+                                args.seed if args.seed is not None else section.get("seed"))
+    scenarios = list(sampler.scenarios(args.runs or int(section.get("runs", 100))))
+
+    partials = _map(_statisticsChunk, scenarios, args.workers)
+    statistics = partials[0]
+    for partial in partials[1:]:
+        statistics.merge(partial)
+
+    summary = statistics.summary(args.probability or float(section.get("probability", 0.95)))
+    text = json.dumps(summary, indent = 2)
+    if args.output:
+        with open(args.output, 'w') as summary_file:
+            summary_file.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+def plotCommand(args : argparse.Namespace) -> int:
+    from platysim.plotting import loadChannels, plotTrajectory
+
+    plotTrajectory(loadChannels(args.file, tuple(args.window) if args.window else None))
+    return 0
+
+def workerCommand(args : argparse.Namespace) -> int:
+    from sim.cluster import fileWorkerMain, workerMain
+
+    if args.queue:
+        fileWorkerMain(args.queue, args.id, args.heartbeat)
+    elif args.host and args.port:
+        workerMain(args.host, args.port, args.id, args.heartbeat)
+    else:
+        raise ValueError("A worker needs --queue, or --host and --port")
+    return 0
+
+def buildParser() -> argparse.ArgumentParser:
+    """
+    Return the command-line parser of python -m platysim
+
+    Returns
+    -------
+    argparse.ArgumentParser
+        Parser with the run, sweep, montecarlo, plot and worker subcommands
+    """
+    parser = argparse.ArgumentParser(prog = "platysim", description = "Run PlatySim scenarios")
+    commands = parser.add_subparsers(dest = "command", metavar = "command")
+    commands.required = True
+
+    def scenarioCommand(name : str, help : str) -> argparse.ArgumentParser:
+        command = commands.add_parser(name, help = help, description = help)
+        command.add_argument("scenario", help = "JSON or TOML scenario file")
+        command.add_argument("--set", action = "append", default = [], metavar = "NAME=VALUE",
+                             help = "override a scenario field or parameter (value read as JSON)")
+        return command
+
+    run = scenarioCommand("run", "run a scenario and print its outcome")
+    run.add_argument("-o", "--output", help = "record the trajectory to a CSV file, or a telemetry file for any other extension")
+    run.add_argument("--channels", nargs = "+", help = "recorded channels, time first")
+    run.set_defaults(handler = runCommand)
+
+    sweep = scenarioCommand("sweep", "run a scenario across the values of one parameter")
+    sweep.add_argument("-p", "--parameter", help = "swept parameter (see SCENARIO_PARAMETERS)")
+    sweep.add_argument("--values", nargs = "+", type = float, help = "values of the parameter")
+    sweep.add_argument("--range", nargs = 3, type = float, metavar = ("START", "STOP", "COUNT"), help = "evenly spaced values, ends included")
+    sweep.add_argument("-w", "--workers", type = int, default = 1, help = "number of worker processes")
+    sweep.add_argument("-o", "--output", help = "CSV file of the outcomes (defaults to stdout)")
+    sweep.set_defaults(handler = sweepCommand)
+
+    montecarlo = scenarioCommand("montecarlo", "run a dispersed Monte Carlo campaign and print its statistics")
+    montecarlo.add_argument("-n", "--runs", type = int, help = "number of runs")
+    montecarlo.add_argument("--seed", type = int, help = "seed of the sampling method")
+    montecarlo.add_argument("--method", choices = ("sobol", "lhs"), help = "sampling method")
+    montecarlo.add_argument("--probability", type = float, help = "probability mass of the impact ellipse")
+    montecarlo.add_argument("-w", "--workers", type = int, default = 1, help = "number of worker processes")
+    montecarlo.add_argument("-o", "--output", help = "JSON file of the statistics (defaults to stdout)")
+    montecarlo.set_defaults(handler = montecarloCommand)
+
+    plot = commands.add_parser("plot", help = "plot a recorded CSV or telemetry file", description = "plot a recorded CSV or telemetry file")
+    plot.add_argument("file", help = "CSV or telemetry file")
+    plot.add_argument("window", nargs = "*", type = float, metavar = "START END", help = "time window to plot")
+    plot.set_defaults(handler = plotCommand)
+
+    worker = commands.add_parser("worker", help = "run a sim campaign worker", description = "run a sim campaign worker")
+    worker.add_argument("--host", help = "coordinator host (TCP mode)")
+    worker.add_argument("--port", type = int, help = "coordinator port (TCP mode)")
+    worker.add_argument("--queue", help = "shared queue directory (file mode)")
+    worker.add_argument("--id", help = "worker id")
+    worker.add_argument("--heartbeat", type = float, default = 5, help = "seconds between heartbeats")
+    worker.set_defaults(handler = workerCommand)
+    return parser
+
+def main(argv : Optional[Sequence[str]] = None) -> int:
+    """
+    Run the command-line interface
+
+    Only the modules a command needs are imported, so batch jobs never load plotting or
+    networking code.
+
+    Parameters
+    ----------
+    argv : Sequence[str]
+        Arguments (defaults to sys.argv[1:])
+
+    Returns
+    -------
+    int
+        Exit status
+    """
+    parser = buildParser()
+    args = parser.parse_args(argv)
+    if args.command == "plot" and len(args.window) not in (0, 2):
+        parser.error("plot takes a start and an end time")
+    try:
+        return args.handler(args)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+        return 2
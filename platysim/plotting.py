@@ -0,0 +1,77 @@
+import csv
+from typing import Dict, List, Optional, Tuple
+
+# Channels shown by plotTrajectory()
+PLOT_CHANNELS = ("time", "x", "y", "z", "vx", "vy", "vz", "ax", "ay", "az")
+
+def loadChannels(path : str, window : Optional[Tuple[float, float]] = None) -> Dict[str, List[float]]:
+    """
+    Read the plotted channels of a CSV or telemetry file
+
+    Parameters
+    ----------
+    path : str
+        Path of a CSV file written by Recorder.writeCSV() or of a telemetry file
+    window : Tuple[float, float]
+        Optional start and end time; a telemetry file only decodes the chunks within it
+
+    Returns
+    -------
+    Dict[str, List[float]]
+        Values of every channel
+    """
+    if path.endswith(".csv"):
+        data : Dict[str, List[float]] = {channel: [] for channel in PLOT_CHANNELS}
+        with open(path, newline='') as csv_file:
+            for row in csv.DictReader(csv_file):
+                if window is None or window[0] <= float(row["time"]) <= window[1]:
+                    for channel in PLOT_CHANNELS:
+                        data[channel].append(float(row[channel]))
+        return data
+
+    from sim.telemetry import TelemetryReader
+    with TelemetryReader(path) as reader:
+        columns = reader.window(*window, channels = list(PLOT_CHANNELS)) if window else reader.read(list(PLOT_CHANNELS))
+    return {channel: list(column) for channel, column in columns.items()}
+
+def plotTrajectory(data : Dict[str, List[float]]) -> None:
+    """
+    Show the velocity, acceleration and 3D trajectory of a run
+
+    matplotlib is only imported here, so batch work never loads it.
+
+    Parameters
+    ----------
+    data : Dict[str, List[float]]
+        Values of every channel, as returned by loadChannels()
+    """
+    import matplotlib.pyplot as plt
+
+    # Plot x, y, and z velocity
+    plt.subplot(221)
+    plt.title("Velocity")
+    plt.xlabel("Time (s)")
+    plt.ylabel("Velocity (m/s)")
+    plt.plot(data["time"], data["vx"], label="x", color="red")
+    plt.plot(data["time"], data["vy"], label="y", color="green")
+    plt.plot(data["time"], data["vz"], label="z", color="blue")
+    plt.grid(True)
+    plt.legend()
+
+    # Plot x, y, and z acceleration
+    plt.subplot(223)
+    plt.title("Acceleration")
+    plt.xlabel("Time (s)")
+    plt.ylabel("Acceleration (m/s^2)")
+    plt.plot(data["time"], data["ax"], label="x", color="red")
+    plt.plot(data["time"], data["ay"], label="y", color="green")
+    plt.plot(data["time"], data["az"], label="z", color="blue")
+    plt.grid(True)
+    plt.legend()
+
+    plt.subplot(122, projection='3d')
+    plt.title("Position")
+    plt.plot(data["x"], data["y"], data["z"], label="3D Trajectory", color="black")
+    plt.grid(True)
+
+    plt.show()
@@ -0,0 +1,113 @@
+from .cli import *
+from sim.scenario import Scenario
+from core.vector import *
+import unittest
+import contextlib
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestCLI(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = self._directory.name
+        self.path = os.path.join(self.directory, "scenario.json")
+        with open(self.path, 'w') as scenario_file:
+            json.dump({"scenario": {"vel": [30, 20, 40], "dragCoeff": 0.2, "maxTime": 20},
+                       "sweep": {"parameter": "elevation", "range": [0.2, 1.0, 3]},
+                       "montecarlo": {"runs": 16, "seed": 3, "dispersions": {"mass": {"normal": [0, 0.5]}}}}, scenario_file)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def run_cli(self, *argv):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertEqual(main(list(argv)), 0)
+        return output.getvalue()
+
+    def test_scenario_files(self):
+        flat = os.path.join(self.directory, "flat.json")
+        with open(flat, 'w') as scenario_file:
+            json.dump(Scenario(mass = 4).toDict(), scenario_file)
+        sections = loadScenarioFile(flat)
+        self.assertEqual(buildScenario(sections["scenario"]), Scenario(mass = 4))
+        self.assertEqual(sections["sweep"], {})
+
+        scenario = buildScenario(loadScenarioFile(self.path)["scenario"], ["dof=3dof", "mass=2", "elevation=0.5"])
+        self.assertEqual((scenario.dof, scenario.mass), ("3dof", 2))
+        self.assertAlmostEqual(scenario.launch()[1], 0.5)
+        self.assertRaises(ValueError, buildScenario, {}, ["colour=red"])
+        self.assertRaises(ValueError, buildScenario, {}, ["mass"])
+
+        self.assertEqual(sweepValues({"range": [0, 1, 5]}), [0, 0.25, 0.5, 0.75, 1])
+        self.assertEqual(sweepValues({"values": [3, 1]}, values = [2]), [2])
+        self.assertRaises(ValueError, sweepValues, {})
+        self.assertRaises(ValueError, parseDistribution, {"gamma": [1, 2]})
+
+        toml = os.path.join(self.directory, "scenario.toml")
+        with open(toml, 'w') as scenario_file:
+            scenario_file.write('[scenario]\nmass = 4\nvel = [1, 2, 3]\n\n[sweep]\nparameter = "mass"\nvalues = [1, 2]\n')
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli
+            except ImportError:
+                self.assertRaises(ValueError, loadScenarioFile, toml)
+                return
+        sections = loadScenarioFile(toml)
+        self.assertEqual(buildScenario(sections["scenario"]), Scenario(mass = 4, vel = Vector3(1, 2, 3)))
+        self.assertEqual(sections["sweep"]["values"], [1, 2])
+
+    def test_commands(self):
+        outcome = json.loads(self.run_cli("run", self.path))
+        result = buildScenario(loadScenarioFile(self.path)["scenario"]).run()
+        self.assertEqual(outcome["impact"], [result.impact.x, result.impact.y, result.impact.z])
+
+        trajectory = os.path.join(self.directory, "run.csv")
+        self.run_cli("run", self.path, "-o", trajectory, "--channels", "time", "z")
+        with open(trajectory) as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        self.assertEqual(len(rows), result.steps)
+        self.assertEqual(list(rows[0]), ["time", "z"])
+
+        rows = list(csv.reader(io.StringIO(self.run_cli("sweep", self.path))))
+        self.assertEqual(rows[0][0], "elevation")
+        self.assertEqual([round(float(row[0]), 9) for row in rows[1:]], [0.2, 0.6, 1.0])
+        parallel = list(csv.reader(io.StringIO(self.run_cli("sweep", self.path, "--values", "0.2", "1.0", "-w", "2"))))
+        self.assertEqual(parallel[1:], [rows[1], rows[3]])
+
+        summary = os.path.join(self.directory, "summary.json")
+        self.run_cli("montecarlo", self.path, "-o", summary)
+        with open(summary) as summary_file:
+            self.assertEqual(json.load(summary_file)["runs"], 16)
+        merged = json.loads(self.run_cli("montecarlo", self.path, "-w", "2"))
+        self.assertEqual(merged["runs"], 16)
+
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                main(["run", os.path.join(self.directory, "missing.json")])
+            with self.assertRaises(SystemExit):
+                main(["plot", trajectory, "1"])
+
+    def test_startup_budget(self):
+        # A short job only imports what it needs, within the startup budget
+        process = subprocess.run([sys.executable, "-X", "importtime", "-m", "platysim", "run", self.path],
+                                 cwd = ROOT, capture_output = True, text = True, check = True)
+        imported = {}
+        for line in process.stderr.splitlines():
+            if line.startswith("import time:") and "|" in line and not line.endswith("imported package"):
+                own, _, name = line[len("import time:"):].split("|")
+                imported[name.strip()] = int(own)
+        for heavy in ("matplotlib", "platysim.plotting", "sim.telemetry", "sim.service", "sim.cluster", "http.server", "multiprocessing"):
+            self.assertNotIn(heavy, imported)
+        self.assertLess(sum(imported.values()) / 1e6, STARTUP_BUDGET)
+
+unittest.main(argv=[''],verbosity=2, exit=False)
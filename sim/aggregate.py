@@ -0,0 +1,625 @@
+import math
+from typing import Dict, List, Optional, Sequence, Tuple, Any
+
+from core.vector import *
+from sim.physics import Rigidbody
+from sim.scenario import ScenarioResult
+
+class RunningStats:
+    """
+    A class to accumulate count, mean, variance, min and max of a stream of values
+
+    Uses Welford's update, and Chan's parallel formula to merge partial results.
+
+    ...
+
+    Attributes
+    ----------
+    count : int
+        Number of values seen
+    mean : float
+        Running mean of the values
+    min : float
+        Smallest value seen
+    max : float
+        Largest value seen
+
+    Methods
+    -------
+    add():
+        Adds a value to the statistics
+    merge():
+        Merges another set of statistics into this one
+    variance():
+        Returns the sample variance of the values
+    std():
+        Returns the sample standard deviation of the values
+    """
+
+    def __init__(self) -> None:
+        """
+        Construct all necessary attributes for a RunningStats object
+        """
+
+        self.count = 0
+        self.mean = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._m2 = 0.0
+
+    def add(self, value : float) -> None:
+        """
+        Add a value to the statistics
+
+        Parameters
+        ----------
+        value : float
+            Value to add
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other : 'RunningStats') -> None:
+        """
+        Merge another set of statistics into this one
+
+        Parameters
+        ----------
+        other : RunningStats
+            Statistics to merge
+        """
+        if other.count == 0:
+            return
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def variance(self) -> float:
+        """
+        Return the sample variance of the values
+
+        Returns
+        -------
+        float
+            Sample variance (0 for fewer than two values)
+        """
+        if self.count < 2:
+            return 0.0
+        return self._m2 / (self.count - 1)
+
+    def std(self) -> float:
+        """
+        Return the sample standard deviation of the values
+
+        Returns
+        -------
+        float
+            Sample standard deviation (0 for fewer than two values)
+        """
+        return math.sqrt(self.variance())
+
+class QuantileSketch:
+    """
+    A class to estimate quantiles of a stream of values in bounded memory
+
+    Values are counted in logarithmically sized buckets, so every quantile estimate is within
+    a relative error of the true value. Sketches with the same accuracy merge exactly. When
+    more than maxBuckets buckets are in use, the buckets closest to zero are collapsed.
+
+    ...
+
+    Attributes
+    ----------
+    relativeAccuracy : float
+        Relative error bound of the quantile estimates
+    maxBuckets : int
+        Maximum number of buckets kept for each sign
+    count : int
+        Number of values seen
+
+    Methods
+    -------
+    add():
+        Adds a value to the sketch
+    merge():
+        Merges another sketch into this one
+    quantile():
+        Returns an estimate of a quantile of the values
+    """
+
+    def __init__(self, relativeAccuracy : float = 0.01, maxBuckets : int = 2048) -> None:
+        """
+        Construct all necessary attributes for a QuantileSketch object
+
+        Parameters
+        ----------
+        relativeAccuracy : float
+            Relative error bound of the quantile estimates
+        maxBuckets : int
+            Maximum number of buckets kept for each sign
+        """
+
+        self.relativeAccuracy = relativeAccuracy
+        self.maxBuckets = maxBuckets
+        self.count = 0
+
+        self._gamma = (1 + relativeAccuracy) / (1 - relativeAccuracy)
+        self._logGamma = math.log(self._gamma)
+        self._positive : Dict[int, int] = {}
+        self._negative : Dict[int, int] = {}
+        self._zero = 0
+
+    def _key(self, magnitude : float) -> int:
+        return math.ceil(math.log(magnitude) / self._logGamma)
+
+    def _value(self, key : int) -> float:
+        return 2 * math.pow(self._gamma, key) / (self._gamma + 1)
+
+    def _collapse(self, buckets : Dict[int, int]) -> None:
+        if len(buckets) <= self.maxBuckets:
+            return
+        keys = sorted(buckets)
+        excess = keys[:len(keys) - self.maxBuckets + 1]
+        target = keys[len(excess)]
+        for key in excess:
+            buckets[target] += buckets.pop(key)
+
+    def add(self, value : float) -> None:
+        """
+        Add a value to the sketch
+
+        Parameters
+        ----------
+        value : float
+            Value to add
+        """
+        self.count += 1
+        if value > 0:
+            key = self._key(value)
+            self._positive[key] = self._positive.get(key, 0) + 1
+            self._collapse(self._positive)
+        elif value < 0:
+            key = self._key(-value)
+            self._negative[key] = self._negative.get(key, 0) + 1
+            self._collapse(self._negative)
+        else:
+            self._zero += 1
+
+    def merge(self, other : 'QuantileSketch') -> None:
+        """
+        Merge another sketch into this one
+
+        Parameters
+        ----------
+        other : QuantileSketch
+            Sketch to merge, with the same relative accuracy
+        """
+        if other.relativeAccuracy != self.relativeAccuracy:
+            raise ValueError("Cannot merge QuantileSketch objects with different accuracies")
+
+        for key, count in other._positive.items():
+            self._positive[key] = self._positive.get(key, 0) + count
+        for key, count in other._negative.items():
+            self._negative[key] = self._negative.get(key, 0) + count
+        self._zero += other._zero
+        self.count += other.count
+
+        self._collapse(self._positive)
+        self._collapse(self._negative)
+
+    def quantile(self, q : float) -> float:
+        """
+        Return an estimate of a quantile of the values
+
+        Parameters
+        ----------
+        q : float
+            Quantile to estimate (0-1)
+
+        Returns
+        -------
+        float
+            Estimated quantile (nan if the sketch is empty)
+        """
+        if self.count == 0:
+            return math.nan
+
+        rank = q * (self.count - 1)
+        seen = 0
+
+        for key in sorted(self._negative, reverse = True):
+            seen += self._negative[key]
+            if seen > rank:
+                return -self._value(key)
+
+        seen += self._zero
+        if seen > rank:
+            return 0.0
+
+        for key in sorted(self._positive):
+            seen += self._positive[key]
+            if seen > rank:
+                return self._value(key)
+
+        return self._value(max(self._positive))
+
+class ImpactDispersion:
+    """
+    A class to accumulate the mean and covariance of two-dimensional impact points
+
+    ...
+
+    Attributes
+    ----------
+    count : int
+        Number of impact points seen
+    mean : Vector2
+        Mean impact point
+
+    Methods
+    -------
+    add():
+        Adds an impact point
+    merge():
+        Merges another set of impact statistics into this one
+    covariance():
+        Returns the sample covariance matrix of the impact points
+    ellipse():
+        Returns the dispersion ellipse containing a given probability
+    """
+
+    def __init__(self) -> None:
+        """
+        Construct all necessary attributes for an ImpactDispersion object
+        """
+
+        self.count = 0
+        self.mean = Vector2.Zero()
+        self._cxx = 0.0
+        self._cyy = 0.0
+        self._cxy = 0.0
+
+    def add(self, point : Vector2) -> None:
+        """
+        Add an impact point
+
+        Parameters
+        ----------
+        point : Vector2
+            Horizontal impact point
+        """
+        self.count += 1
+        dx = point.x - self.mean.x
+        dy = point.y - self.mean.y
+        self.mean = Vector2(self.mean.x + dx / self.count, self.mean.y + dy / self.count)
+        self._cxx += dx * (point.x - self.mean.x)
+        self._cyy += dy * (point.y - self.mean.y)
+        self._cxy += dx * (point.y - self.mean.y)
+
+    def merge(self, other : 'ImpactDispersion') -> None:
+        """
+        Merge another set of impact statistics into this one
+
+        Parameters
+        ----------
+        other : ImpactDispersion
+            Impact statistics to merge
+        """
+        if other.count == 0:
+            return
+
+        count = self.count + other.count
+        dx = other.mean.x - self.mean.x
+        dy = other.mean.y - self.mean.y
+        weight = self.count * other.count / count
+
+        self._cxx += other._cxx + dx * dx * weight
+        self._cyy += other._cyy + dy * dy * weight
+        self._cxy += other._cxy + dx * dy * weight
+        self.mean = Vector2(self.mean.x + dx * other.count / count, self.mean.y + dy * other.count / count)
+        self.count = count
+
+    def covariance(self) -> Tuple[float, float, float]:
+        """
+        Return the sample covariance matrix of the impact points
+
+        Returns
+        -------
+        Tuple[float, float, float]
+            Covariance matrix entries in xx, yy, xy order
+        """
+        if self.count < 2:
+            return 0.0, 0.0, 0.0
+        n = self.count - 1
+        return self._cxx / n, self._cyy / n, self._cxy / n
+
+    def ellipse(self, probability : float = 0.95) -> Tuple[Vector2, float, float, float]:
+        """
+        Return the dispersion ellipse containing a given probability, assuming normally distributed impacts
+
+        Parameters
+        ----------
+        probability : float
+            Probability mass (0-1) inside the ellipse
+
+        Returns
+        -------
+        Tuple[Vector2, float, float, float]
+            Center, semi-major axis, semi-minor axis and angle of the major axis from x (in radians)
+        """
+        sxx, syy, sxy = self.covariance()
+
+        # Eigenvalues of the 2x2 covariance matrix
+        mid = (sxx + syy) / 2
+        radius = math.sqrt(((sxx - syy) / 2) ** 2 + sxy * sxy)
+        major = mid + radius
+        minor = max(mid - radius, 0.0)
+        angle = 0.5 * math.atan2(2 * sxy, sxx - syy)
+
+        # Chi-squared quantile with two degrees of freedom
+        scale = math.sqrt(-2 * math.log(1 - probability))
+
+        return self.mean, scale * math.sqrt(major), scale * math.sqrt(minor), angle
+
+class TimeEnvelope:
+    """
+    A class to accumulate per-time-bin statistics of a set of channels across many runs
+
+    Memory grows with the number of time bins, not with the number of runs.
+
+    ...
+
+    Attributes
+    ----------
+    channels : Sequence[str]
+        Names of the accumulated channels
+    binWidth : float
+        Width of each time bin (in seconds)
+    bins : List[Dict[str, RunningStats]]
+        Statistics of every channel for each time bin
+
+    Methods
+    -------
+    add():
+        Adds a sample of every channel at a given time
+    merge():
+        Merges another envelope into this one
+    envelope():
+        Returns the per-bin mean, standard deviation, min and max of a channel
+    """
+
+    def __init__(self, channels : Sequence[str], binWidth : float = 1.0) -> None:
+        """
+        Construct all necessary attributes for a TimeEnvelope object
+
+        Parameters
+        ----------
+        channels : Sequence[str]
+            Names of the accumulated channels
+        binWidth : float
+            Width of each time bin (in seconds)
+        """
+
+        self.channels = tuple(channels)
+        self.binWidth = float(binWidth)
+        self.bins : List[Dict[str, RunningStats]] = []
+
+    def _bin(self, index : int) -> Dict[str, RunningStats]:
+        while len(self.bins) <= index:
+            self.bins.append({channel: RunningStats() for channel in self.channels})
+        return self.bins[index]
+
+    def add(self, time : float, values : Sequence[float]) -> None:
+        """
+        Add a sample of every channel at a given time
+
+        Parameters
+        ----------
+        time : float
+            Sim time of the sample
+        values : Sequence[float]
+            Value of each channel, in channel order
+        """
+        stats = self._bin(int(time / self.binWidth))
+        for channel, value in zip(self.channels, values):
+            stats[channel].add(value)
+
+    def merge(self, other : 'TimeEnvelope') -> None:
+        """
+        Merge another envelope into this one
+
+        Parameters
+        ----------
+        other : TimeEnvelope
+            Envelope with the same channels and bin width
+        """
+        if other.channels != self.channels or other.binWidth != self.binWidth:
+            raise ValueError("Cannot merge TimeEnvelope objects with different channels or bin widths")
+
+        for index, stats in enumerate(other.bins):
+            mine = self._bin(index)
+            for channel in self.channels:
+                mine[channel].merge(stats[channel])
+
+    def envelope(self, channel : str) -> List[Tuple[float, float, float, float, float]]:
+        """
+        Return the per-bin mean, standard deviation, min and max of a channel
+
+        Parameters
+        ----------
+        channel : str
+            Name of the channel
+
+        Returns
+        -------
+        List[Tuple[float, float, float, float, float]]
+            Bin start time, mean, standard deviation, min and max for every non-empty bin
+        """
+        rows = []
+        for index, stats in enumerate(self.bins):
+            s = stats[channel]
+            if s.count:
+                rows.append((index * self.binWidth, s.mean, s.std(), s.min, s.max))
+        return rows
+
+class EnsembleStatistics:
+    """
+    A class to aggregate landing dispersion, apogee and trajectory envelopes over many runs
+
+    Nothing is kept per run, so memory stays constant in the number of runs. Partial results
+    from parallel workers are combined with merge().
+
+    Example
+    -------
+    stats = EnsembleStatistics()
+    for scenario in sampler.scenarios(256):
+        stats.addResult(scenario.run(observer = stats.observe))
+
+    ...
+
+    Attributes
+    ----------
+    runs : int
+        Number of runs added
+    landed : int
+        Number of runs that reached the ground
+    impact : ImpactDispersion
+        Horizontal impact point statistics of landed runs
+    impactX, impactY : QuantileSketch
+        Quantile sketches of the impact point components of landed runs
+    apogee : RunningStats
+        Apogee statistics
+    apogeeQuantiles : QuantileSketch
+        Quantile sketch of the apogee
+    flightTime : RunningStats
+        Flight time statistics
+    envelope : TimeEnvelope
+        Per-time-bin position and velocity statistics
+
+    Methods
+    -------
+    observe():
+        Adds a trajectory sample of a body (usable as a Scenario.run observer)
+    addResult():
+        Adds the outcome of a finished run
+    merge():
+        Merges another set of ensemble statistics into this one
+    summary():
+        Returns a JSON-compatible summary of the statistics
+    """
+
+    ENVELOPE_CHANNELS = ("x", "y", "z", "vx", "vy", "vz")
+
+    def __init__(self, binWidth : float = 1.0, relativeAccuracy : float = 0.01) -> None:
+        """
+        Construct all necessary attributes for an EnsembleStatistics object
+
+        Parameters
+        ----------
+        binWidth : float
+            Width of each trajectory envelope time bin (in seconds)
+        relativeAccuracy : float
+            Relative error bound of the quantile sketches
+        """
+
+        self.runs = 0
+        self.landed = 0
+        self.impact = ImpactDispersion()
+        self.impactX = QuantileSketch(relativeAccuracy)
+        self.impactY = QuantileSketch(relativeAccuracy)
+        self.apogee = RunningStats()
+        self.apogeeQuantiles = QuantileSketch(relativeAccuracy)
+        self.flightTime = RunningStats()
+        self.envelope = TimeEnvelope(self.ENVELOPE_CHANNELS, binWidth)
+
+    def observe(self, time : float, body : Rigidbody) -> None:
+        """
+        Add a trajectory sample of a body
+
+        Parameters
+        ----------
+        time : float
+            Sim time of the sample
+        body : Rigidbody
+            Body whose position and velocity are sampled
+        """
+        pos = body.pos
+        vel = body.vel
+        self.envelope.add(time, (pos.x, pos.y, pos.z, vel.x, vel.y, vel.z))
+
+    def addResult(self, result : ScenarioResult) -> None:
+        """
+        Add the outcome of a finished run
+
+        Parameters
+        ----------
+        result : ScenarioResult
+            Outcome of the run
+        """
+        self.runs += 1
+        self.apogee.add(result.apogee)
+        self.apogeeQuantiles.add(result.apogee)
+
+        if result.landed:
+            self.landed += 1
+            self.impact.add(Vector2(result.impact.x, result.impact.y))
+            self.impactX.add(result.impact.x)
+            self.impactY.add(result.impact.y)
+            self.flightTime.add(result.flightTime)
+
+    def merge(self, other : 'EnsembleStatistics') -> None:
+        """
+        Merge another set of ensemble statistics into this one
+
+        Parameters
+        ----------
+        other : EnsembleStatistics
+            Statistics to merge, with the same bin width and accuracy
+        """
+        self.runs += other.runs
+        self.landed += other.landed
+        self.impact.merge(other.impact)
+        self.impactX.merge(other.impactX)
+        self.impactY.merge(other.impactY)
+        self.apogee.merge(other.apogee)
+        self.apogeeQuantiles.merge(other.apogeeQuantiles)
+        self.flightTime.merge(other.flightTime)
+        self.envelope.merge(other.envelope)
+
+    def summary(self, probability : float = 0.95) -> Dict[str, Any]:
+        """
+        Return a JSON-compatible summary of the statistics
+
+        Parameters
+        ----------
+        probability : float
+            Probability mass (0-1) of the impact ellipse
+
+        Returns
+        -------
+        Dict[str, Any]
+            Run counts, impact ellipse, apogee and flight time statistics
+        """
+        center, major, minor, angle = self.impact.ellipse(probability)
+        return {"runs": self.runs, "landed": self.landed,
+                "impact": {"mean": [center.x, center.y], "covariance": list(self.impact.covariance()),
+                           "ellipse": {"probability": probability, "semiMajor": major, "semiMinor": minor, "angle": angle},
+                           "x": {"p05": self.impactX.quantile(0.05), "p50": self.impactX.quantile(0.5), "p95": self.impactX.quantile(0.95)},
+                           "y": {"p05": self.impactY.quantile(0.05), "p50": self.impactY.quantile(0.5), "p95": self.impactY.quantile(0.95)}},
+                "apogee": {"mean": self.apogee.mean, "std": self.apogee.std(), "min": self.apogee.min, "max": self.apogee.max,
+                           "p50": self.apogeeQuantiles.quantile(0.5), "p99": self.apogeeQuantiles.quantile(0.99)},
+                "flightTime": {"mean": self.flightTime.mean, "std": self.flightTime.std(),
+                               "min": self.flightTime.min, "max": self.flightTime.max}}
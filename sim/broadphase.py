@@ -0,0 +1,241 @@
+import math
+from itertools import product
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from core.vector import *
+
+Cell = Tuple[int, int, int]
+
+class UniformGrid:
+    """
+    A uniform-grid broadphase over body positions
+
+    Every entry is a sphere filed under the grid cell holding its centre. Moving an entry only
+    touches the grid when it changes cell, so updating every body each step costs O(N), and
+    proximity queries only look at the cells within reach instead of at every other body.
+
+    ...
+
+    Attributes
+    ----------
+    cellSize : float
+        Edge length of a grid cell (ideally about the typical query distance)
+
+    Methods
+    -------
+    insert():
+        Adds an entry
+    move():
+        Updates the position of an entry
+    update():
+        Updates the positions of several entries
+    remove():
+        Removes an entry
+    neighbours():
+        Returns the entries within a distance of a point
+    overlaps():
+        Returns every pair of overlapping entries
+    groundContacts():
+        Returns the entries touching the ground
+    """
+
+    def __init__(self, cellSize : float = 10.0) -> None:
+        """
+        Construct all necessary attributes for a UniformGrid object
+
+        Parameters
+        ----------
+        cellSize : float
+            Edge length of a grid cell (ideally about the typical query distance)
+        """
+
+        if cellSize <= 0:
+            raise ValueError("The cell size must be positive")
+
+        self.cellSize = float(cellSize)
+        self._cells : Dict[Cell, Set[Hashable]] = {}
+        self._entries : Dict[Hashable, list] = {}
+        self._order : Dict[Hashable, int] = {}
+        self._count = 0
+        self._maxRadius = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key : Hashable) -> bool:
+        return key in self._entries
+
+    def _cell(self, pos : Vector3) -> Cell:
+        size = self.cellSize
+        return (math.floor(pos.x / size), math.floor(pos.y / size), math.floor(pos.z / size))
+
+    def _cellsWithin(self, pos : Vector3, reach : float) -> Iterable[Cell]:
+        size = self.cellSize
+        ranges = [range(math.floor((c - reach) / size), math.floor((c + reach) / size) + 1) for c in (pos.x, pos.y, pos.z)]
+        if len(ranges[0]) * len(ranges[1]) * len(ranges[2]) > len(self._cells):
+            # Cheaper to scan the occupied cells than the whole box
+            return [cell for cell in self._cells if all(cell[i] in ranges[i] for i in range(3))]
+        return product(*ranges)
+
+    def insert(self, key : Hashable, pos : Vector3, radius : float = 0.0) -> None:
+        """
+        Add an entry
+
+        Parameters
+        ----------
+        key : Hashable
+            Key of the entry (e.g. a Simulation slot)
+        pos : Vector3
+            Centre of the entry
+        radius : float
+            Radius of the entry
+        """
+        if key in self._entries:
+            raise KeyError(f"{key} is already in the grid")
+
+        cell = self._cell(pos)
+        self._entries[key] = [pos, float(radius), cell]
+        self._cells.setdefault(cell, set()).add(key)
+        self._order[key] = self._count
+        self._count += 1
+        self._maxRadius = max(self._maxRadius, float(radius))
+
+    def move(self, key : Hashable, pos : Vector3) -> None:
+        """
+        Update the position of an entry
+
+        Parameters
+        ----------
+        key : Hashable
+            Key of the entry
+        pos : Vector3
+            New centre of the entry
+        """
+        entry = self._entries[key]
+        entry[0] = pos
+        cell = self._cell(pos)
+        if cell != entry[2]:
+            members = self._cells[entry[2]]
+            members.discard(key)
+            if not members:
+                del self._cells[entry[2]]
+            self._cells.setdefault(cell, set()).add(key)
+            entry[2] = cell
+
+    def update(self, positions : Iterable[Tuple[Hashable, Vector3]]) -> None:
+        """
+        Update the positions of several entries
+
+        Parameters
+        ----------
+        positions : Iterable[Tuple[Hashable, Vector3]]
+            Key and new centre of every moved entry
+        """
+        for key, pos in positions:
+            self.move(key, pos)
+
+    def remove(self, key : Hashable) -> None:
+        """
+        Remove an entry
+
+        Parameters
+        ----------
+        key : Hashable
+            Key of the entry
+        """
+        _, _, cell = self._entries.pop(key)
+        del self._order[key]
+        members = self._cells[cell]
+        members.discard(key)
+        if not members:
+            del self._cells[cell]
+
+    def neighbours(self, pos : Vector3, distance : float) -> List[Hashable]:
+        """
+        Return the entries whose sphere comes within a distance of a point
+
+        Parameters
+        ----------
+        pos : Vector3
+            Point to search around
+        distance : float
+            Search distance
+
+        Returns
+        -------
+        List[Hashable]
+            Keys of the entries found
+        """
+        found = []
+        cells = self._cells
+        entries = self._entries
+        for cell in self._cellsWithin(pos, distance + self._maxRadius):
+            for key in cells.get(cell, ()):
+                other, radius, _ = entries[key]
+                reach = distance + radius
+                offset = other - pos
+                if offset.dot(offset) <= reach * reach:
+                    found.append(key)
+        return found
+
+    def overlaps(self, margin : float = 0.0) -> List[Tuple[Hashable, Hashable]]:
+        """
+        Return every pair of entries whose spheres overlap
+
+        Parameters
+        ----------
+        margin : float
+            Extra separation below which two spheres count as overlapping
+
+        Returns
+        -------
+        List[Tuple[Hashable, Hashable]]
+            Key pairs, the earlier inserted entry first
+        """
+        pairs = []
+        cells = self._cells
+        entries = self._entries
+        order = self._order
+        for key, (pos, radius, _) in entries.items():
+            rank = order[key]
+            for cell in self._cellsWithin(pos, radius + self._maxRadius + margin):
+                for otherKey in cells.get(cell, ()):
+                    if order[otherKey] <= rank:
+                        continue
+                    other, otherRadius, _ = entries[otherKey]
+                    reach = radius + otherRadius + margin
+                    offset = other - pos
+                    if offset.dot(offset) <= reach * reach:
+                        pairs.append((key, otherKey))
+        return pairs
+
+    def groundContacts(self, ground : Optional[Callable[[float, float], float]] = None, ceiling : float = 0.0) -> List[Hashable]:
+        """
+        Return the entries touching or below the ground
+
+        Only the entries in cells low enough to reach the ground are tested against it.
+
+        Parameters
+        ----------
+        ground : Callable[[float, float], float]
+            Ground height at a horizontal position (defaults to the z = 0 plane)
+        ceiling : float
+            Highest ground height anywhere (e.g. the terrain maximum)
+
+        Returns
+        -------
+        List[Hashable]
+            Keys of the entries in contact with the ground
+        """
+        top = math.floor((ceiling + self._maxRadius) / self.cellSize)
+        contacts = []
+        entries = self._entries
+        for cell, members in self._cells.items():
+            if cell[2] > top:
+                continue
+            for key in members:
+                pos, radius, _ = entries[key]
+                height = 0.0 if ground is None else ground(pos.x, pos.y)
+                if pos.z - radius <= height:
+                    contacts.append(key)
+        return contacts
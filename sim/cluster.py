@@ -0,0 +1,1000 @@
+import argparse
+import json
+import math
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+from core.vector import *
+from sim.metrics import RunMetrics
+from sim.scenario import Scenario, ScenarioResult
+
+# Wire protocol: every message is a 5-byte header (kind, payload length) followed by the payload.
+# Control payloads are JSON; RESULT payloads use the binary result format below.
+#   worker -> coordinator: HELLO {"worker"}, REQUEST, HEARTBEAT, RESULT, ERROR {"chunk", "error"}
+#   coordinator -> worker: CHUNK {"chunk", "scenarios"}, WAIT {"retry"}, DONE
+HELLO, REQUEST, CHUNK, WAIT, DONE, RESULT, HEARTBEAT, ERROR = range(1, 9)
+MESSAGE_HEADER = struct.Struct("!BI")
+
+# Binary result format: header, worker id (utf-8), then one record per run
+RESULT_HEADER = struct.Struct("<IIdH")
+RESULT_RECORD = struct.Struct("<5dI?")
+
+def sendMessage(sock : socket.socket, kind : int, payload : Any = b"") -> None:
+    """
+    Send a framed message
+
+    Parameters
+    ----------
+    sock : socket
+        Connected socket
+    kind : int
+        Message kind
+    payload : bytes OR JSON-compatible object
+        Message payload (non-bytes payloads are sent as JSON)
+    """
+    if not isinstance(payload, bytes):
+        payload = json.dumps(payload).encode()
+    sock.sendall(MESSAGE_HEADER.pack(kind, len(payload)) + payload)
+
+def _receiveExactly(sock : socket.socket, size : int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        block = sock.recv(size - len(data))
+        if not block:
+            raise ConnectionError("Connection closed")
+        data += block
+    return bytes(data)
+
+def receiveMessage(sock : socket.socket) -> Tuple[int, bytes]:
+    """
+    Receive a framed message
+
+    Parameters
+    ----------
+    sock : socket
+        Connected socket
+
+    Returns
+    -------
+    Tuple[int, bytes]
+        Message kind and raw payload
+    """
+    kind, size = MESSAGE_HEADER.unpack(_receiveExactly(sock, MESSAGE_HEADER.size))
+    return kind, _receiveExactly(sock, size)
+
+def encodeResults(chunk : int, worker : str, elapsed : float, results : Sequence[ScenarioResult]) -> bytes:
+    """
+    Pack the outcomes of a chunk into the binary result format
+
+    Parameters
+    ----------
+    chunk : int
+        Chunk number
+    worker : str
+        Id of the worker that ran the chunk
+    elapsed : float
+        Wall time spent running the chunk (in seconds)
+    results : Sequence[ScenarioResult]
+        Outcome of every run in the chunk
+
+    Returns
+    -------
+    bytes
+        Packed results
+    """
+    name = worker.encode()
+    parts = [RESULT_HEADER.pack(chunk, len(results), elapsed, len(name)), name]
+    for r in results:
+        parts.append(RESULT_RECORD.pack(r.impact.x, r.impact.y, r.impact.z, r.apogee, r.flightTime, r.steps, r.landed))
+    return b"".join(parts)
+
+def decodeResults(data : bytes) -> Tuple[int, str, float, List[ScenarioResult]]:
+    """
+    Unpack the binary result format
+
+    Parameters
+    ----------
+    data : bytes
+        Packed results
+
+    Returns
+    -------
+    Tuple[int, str, float, List[ScenarioResult]]
+        Chunk number, worker id, elapsed time and the outcome of every run
+    """
+    chunk, count, elapsed, size = RESULT_HEADER.unpack_from(data, 0)
+    offset = RESULT_HEADER.size
+    worker = data[offset:offset + size].decode()
+    offset += size
+
+    results = []
+    for x, y, z, apogee, flightTime, steps, landed in RESULT_RECORD.iter_unpack(data[offset:offset + count * RESULT_RECORD.size]):
+        results.append(ScenarioResult(Vector3(x, y, z), landed, apogee, flightTime, steps))
+    return chunk, worker, elapsed, results
+
+def runChunk(scenarios : Sequence[Scenario]) -> List[ScenarioResult]:
+    """
+    Run every scenario of a chunk
+
+    Parameters
+    ----------
+    scenarios : Sequence[Scenario]
+        Scenarios to run
+
+    Returns
+    -------
+    List[ScenarioResult]
+        Outcome of every run
+    """
+    return [scenario.run() for scenario in scenarios]
+
+class JobQueue:
+    """
+    A class to track the chunks of a campaign through leasing, completion and re-dispatch
+
+    A leased chunk whose worker stops sending heartbeats for longer than the lease timeout, or
+    whose worker disconnects, goes back to the pending queue. The first result for a chunk
+    wins; late duplicates are ignored. A chunk that raises on a worker, or is lost more than
+    maxDispatches times, is marked failed instead, so the campaign still ends. Thread-safe.
+
+    ...
+
+    Attributes
+    ----------
+    scenarios : List[Scenario]
+        Scenarios of the campaign
+    chunks : List[Tuple[int, int]]
+        Start and end index of every chunk
+    leaseTimeout : float
+        Seconds without a heartbeat before a leased chunk is re-dispatched
+    maxDispatches : int
+        Number of times a chunk is leased before it is marked failed when lost
+    redispatched : int
+        Number of chunks put back in the queue after being lost
+    failures : Dict[int, str]
+        Error of every failed chunk, by chunk number
+    metrics : RunMetrics
+        Optional progress and throughput metrics
+
+    Methods
+    -------
+    lease():
+        Leases the next pending chunk to a worker
+    heartbeat():
+        Extends every lease held by a worker
+    claim():
+        Records a lease taken outside lease(), e.g. from a file queue
+    release():
+        Re-queues a lost chunk, or marks it failed once it was lost too often
+    complete():
+        Stores the results of a chunk
+    fail():
+        Marks a chunk failed with an error
+    expire():
+        Re-queues chunks whose lease timed out
+    drop():
+        Re-queues every chunk leased by a worker
+    done():
+        Returns whether every chunk has results or failed
+    wait():
+        Blocks until every chunk has results or failed
+    results():
+        Returns the outcome of every scenario, in order
+    throughput():
+        Returns per-worker progress and throughput
+    """
+
+    def __init__(self, scenarios : Sequence[Scenario], chunkSize : int = 16, leaseTimeout : float = 30, metrics : Optional[RunMetrics] = None,
+                 maxDispatches : int = 3) -> None:
+        """
+        Construct all necessary attributes for a JobQueue object
+
+        Parameters
+        ----------
+        scenarios : Sequence[Scenario]
+            Scenarios of the campaign
+        chunkSize : int
+            Number of scenarios per chunk
+        leaseTimeout : float
+            Seconds without a heartbeat before a leased chunk is re-dispatched
+        metrics : RunMetrics
+            Optional progress and throughput metrics, counting every completed run
+        maxDispatches : int
+            Number of times a chunk is leased before it is marked failed when lost
+        """
+
+        self.scenarios = list(scenarios)
+        self.chunks = [(start, min(start + chunkSize, len(self.scenarios))) for start in range(0, len(self.scenarios), chunkSize)]
+        self.leaseTimeout = leaseTimeout
+        self.maxDispatches = maxDispatches
+        self.redispatched = 0
+        self.failures : Dict[int, str] = {}
+        self.metrics = metrics
+        if metrics is not None and metrics.totalRuns is None:
+            metrics.totalRuns = len(self.scenarios)
+
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)
+        self._pending : Deque[int] = deque(range(len(self.chunks)))
+        self._leases : Dict[int, Tuple[str, float]] = {}
+        self._results : Dict[int, List[ScenarioResult]] = {}
+        self._dispatches = [0] * len(self.chunks)
+        self._stats : Dict[str, Dict[str, float]] = {}
+
+    def _settled(self) -> bool:
+        return len(self._results) + len(self.failures) == len(self.chunks)
+
+    def _worker(self, worker : str) -> Dict[str, float]:
+        if worker not in self._stats:
+            self._stats[worker] = {"chunks": 0, "runs": 0, "busy": 0.0, "first": time.monotonic(), "last": time.monotonic()}
+        return self._stats[worker]
+
+    def lease(self, worker : str) -> Optional[Tuple[int, List[Scenario]]]:
+        """
+        Lease the next pending chunk to a worker
+
+        Parameters
+        ----------
+        worker : str
+            Id of the worker
+
+        Returns
+        -------
+        Tuple[int, List[Scenario]]
+            Chunk number and its scenarios, or None if nothing is pending
+        """
+        self.expire()
+        with self._lock:
+            self._worker(worker)
+            while self._pending:
+                chunk = self._pending.popleft()
+                if chunk not in self._results and chunk not in self.failures:
+                    self._leases[chunk] = (worker, time.monotonic() + self.leaseTimeout)
+                    self._dispatches[chunk] += 1
+                    start, end = self.chunks[chunk]
+                    return chunk, self.scenarios[start:end]
+            return None
+
+    def claim(self, chunk : int, worker : str) -> None:
+        """
+        Record a lease taken outside lease(), e.g. a chunk claimed from a file queue
+
+        The lease counts as a dispatch of the chunk but never expires, as its holder is
+        tracked by whoever serves the chunks.
+
+        Parameters
+        ----------
+        chunk : int
+            Chunk number
+        worker : str
+            Id of the worker
+        """
+        with self._lock:
+            if chunk in self._leases or chunk in self._results or chunk in self.failures:
+                return
+            self._worker(worker)
+            self._leases[chunk] = (worker, math.inf)
+            self._dispatches[chunk] += 1
+
+    def release(self, chunk : int) -> bool:
+        """
+        Re-queue a lost chunk, or mark it failed once it was leased maxDispatches times
+
+        Parameters
+        ----------
+        chunk : int
+            Chunk number
+
+        Returns
+        -------
+        bool
+            True if the chunk should be dispatched again
+        """
+        with self._lock:
+            if chunk in self._leases:
+                self._requeue([chunk])
+            return chunk not in self._results and chunk not in self.failures
+
+    def heartbeat(self, worker : str) -> None:
+        """
+        Extend every lease held by a worker
+
+        Parameters
+        ----------
+        worker : str
+            Id of the worker
+        """
+        with self._lock:
+            deadline = time.monotonic() + self.leaseTimeout
+            for chunk, (holder, _) in self._leases.items():
+                if holder == worker:
+                    self._leases[chunk] = (holder, deadline)
+
+    def complete(self, chunk : int, worker : str, elapsed : float, results : List[ScenarioResult]) -> bool:
+        """
+        Store the results of a chunk
+
+        Parameters
+        ----------
+        chunk : int
+            Chunk number
+        worker : str
+            Id of the worker that ran the chunk
+        elapsed : float
+            Wall time the worker spent on the chunk
+        results : List[ScenarioResult]
+            Outcome of every run in the chunk
+
+        Returns
+        -------
+        bool
+            False if the chunk already had results
+        """
+        with self._lock:
+            stats = self._worker(worker)
+            stats["last"] = time.monotonic()
+            if chunk in self._results or chunk in self.failures:
+                return False
+            start, end = self.chunks[chunk]
+            if len(results) != end - start:
+                raise ValueError(f"Chunk {chunk} needs {end - start} results, got {len(results)}")
+
+            self._results[chunk] = results
+            self._leases.pop(chunk, None)
+            stats["chunks"] += 1
+            stats["runs"] += len(results)
+            stats["busy"] += elapsed
+            if self._settled():
+                self._finished.notify_all()
+        if self.metrics is not None:
+            self.metrics.complete(len(results), sum(result.steps for result in results), sum(result.flightTime for result in results))
+        return True
+
+    def fail(self, chunk : int, worker : str, error : str) -> bool:
+        """
+        Mark a chunk failed, so it is not dispatched again
+
+        Parameters
+        ----------
+        chunk : int
+            Chunk number
+        worker : str
+            Id of the worker that reported the error
+        error : str
+            Description of the error
+
+        Returns
+        -------
+        bool
+            False if the chunk already had results or had failed
+        """
+        with self._lock:
+            self._worker(worker)["last"] = time.monotonic()
+            if chunk in self._results or chunk in self.failures:
+                return False
+            self._leases.pop(chunk, None)
+            self.failures[chunk] = f"{worker}: {error}"
+            if self._settled():
+                self._finished.notify_all()
+        return True
+
+    def _requeue(self, chunks : List[int]) -> None:
+        for chunk in chunks:
+            worker, _ = self._leases.pop(chunk)
+            if self._dispatches[chunk] >= self.maxDispatches:
+                self.failures[chunk] = f"{worker}: lost {self._dispatches[chunk]} times"
+                continue
+            self._pending.appendleft(chunk)
+            self.redispatched += 1
+        if chunks and self._settled():
+            self._finished.notify_all()
+
+    def expire(self) -> None:
+        """
+        Re-queue every chunk whose lease timed out
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._requeue([chunk for chunk, (_, deadline) in self._leases.items() if deadline < now])
+
+    def drop(self, worker : str) -> None:
+        """
+        Re-queue every chunk leased by a worker
+
+        Parameters
+        ----------
+        worker : str
+            Id of the worker
+        """
+        with self._lock:
+            self._requeue([chunk for chunk, (holder, _) in self._leases.items() if holder == worker])
+
+    def done(self) -> bool:
+        """
+        Return whether every chunk has results or failed
+
+        Returns
+        -------
+        bool
+            True once the campaign is complete
+        """
+        with self._lock:
+            return self._settled()
+
+    def wait(self, timeout : Optional[float] = None, poll : float = 0.5) -> bool:
+        """
+        Block until every chunk has results or failed, re-queueing expired leases meanwhile
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum time to wait (in seconds)
+        poll : float
+            Interval between lease checks (in seconds)
+
+        Returns
+        -------
+        bool
+            True if the campaign completed
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        while not self.done():
+            remaining = poll if end is None else min(poll, end - time.monotonic())
+            if remaining <= 0:
+                return False
+            with self._lock:
+                self._finished.wait_for(self._settled, remaining)
+            self.expire()
+        return True
+
+    def results(self) -> List[ScenarioResult]:
+        """
+        Return the outcome of every scenario, in scenario order
+
+        Returns
+        -------
+        List[ScenarioResult]
+            Outcome of every run (without bodies); RuntimeError is raised if any chunk failed
+        """
+        with self._lock:
+            if self.failures:
+                raise RuntimeError("Chunks failed: " + "; ".join(f"{chunk} ({error})" for chunk, error in sorted(self.failures.items())))
+            if len(self._results) != len(self.chunks):
+                raise RuntimeError("The campaign is not complete")
+            return [result for chunk in range(len(self.chunks)) for result in self._results[chunk]]
+
+    def throughput(self) -> Dict[str, Dict[str, float]]:
+        """
+        Return per-worker progress and throughput
+
+        Returns
+        -------
+        Dict[str, Dict[str, float]]
+            Completed chunks and runs, busy time, and runs per busy and per wall-clock second of every worker
+        """
+        with self._lock:
+            report = {}
+            for worker, stats in self._stats.items():
+                wall = stats["last"] - stats["first"]
+                report[worker] = {"chunks": stats["chunks"], "runs": stats["runs"], "busy": stats["busy"],
+                                  "runsPerSecond": stats["runs"] / stats["busy"] if stats["busy"] > 0 else 0.0,
+                                  "runsPerWallSecond": stats["runs"] / wall if wall > 0 else 0.0}
+            return report
+
+class _CoordinatorHandler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        queue : JobQueue = self.server.queue
+        retry : float = self.server.retry
+        worker = f"{self.client_address[0]}:{self.client_address[1]}"
+        try:
+            while True:
+                kind, payload = receiveMessage(self.request)
+                if kind == HELLO:
+                    worker = json.loads(payload)["worker"]
+                elif kind == HEARTBEAT:
+                    queue.heartbeat(worker)
+                elif kind == RESULT:
+                    chunk, _, elapsed, results = decodeResults(payload)
+                    queue.complete(chunk, worker, elapsed, results)
+                elif kind == ERROR:
+                    failure = json.loads(payload)
+                    queue.fail(failure["chunk"], worker, failure["error"])
+                elif kind == REQUEST:
+                    job = queue.lease(worker)
+                    if job is not None:
+                        chunk, scenarios = job
+                        sendMessage(self.request, CHUNK, {"chunk": chunk, "scenarios": [s.toDict() for s in scenarios]})
+                    elif queue.done():
+                        sendMessage(self.request, DONE)
+                        return
+                    else:
+                        sendMessage(self.request, WAIT, {"retry": retry})
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            queue.drop(worker)
+
+class Coordinator:
+    """
+    A class to serve the chunks of a JobQueue to workers over TCP
+
+    ...
+
+    Attributes
+    ----------
+    queue : JobQueue
+        Chunks of the campaign
+    address : Tuple[str, int]
+        Host and port the coordinator listens on
+
+    Methods
+    -------
+    start():
+        Starts serving in a background thread
+    wait():
+        Blocks until the campaign is complete
+    close():
+        Stops serving
+    """
+
+    def __init__(self, queue : JobQueue, host : str = "127.0.0.1", port : int = 0, retry : float = 0.5) -> None:
+        """
+        Construct all necessary attributes for a Coordinator object
+
+        Parameters
+        ----------
+        queue : JobQueue
+            Chunks of the campaign
+        host : str
+            Interface to listen on
+        port : int
+            Port to listen on (0 picks a free port)
+        retry : float
+            Seconds an idle worker waits before asking again while chunks are leased out
+        """
+
+        self.queue = queue
+        self.server = socketserver.ThreadingTCPServer((host, port), _CoordinatorHandler, bind_and_activate = False)
+        self.server.daemon_threads = True
+        self.server.allow_reuse_address = True
+        self.server.server_bind()
+        self.server.server_activate()
+        self.server.queue = queue
+        self.server.retry = retry
+        self.address = self.server.server_address
+        self._thread : Optional[threading.Thread] = None
+
+    def __enter__(self) -> 'Coordinator':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def start(self) -> 'Coordinator':
+        """
+        Start serving in a background thread
+
+        Returns
+        -------
+        Coordinator
+            This coordinator
+        """
+        self._thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+        self._thread.start()
+        return self
+
+    def wait(self, timeout : Optional[float] = None) -> bool:
+        """
+        Block until the campaign is complete
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum time to wait (in seconds)
+
+        Returns
+        -------
+        bool
+            True if the campaign completed
+        """
+        return self.queue.wait(timeout)
+
+    def close(self) -> None:
+        """
+        Stop serving
+        """
+        if self._thread is not None:
+            self.server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server.server_close()
+
+class _Heartbeat:
+    def __init__(self, interval : float, beat) -> None:
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target = self._run, args = (interval, beat), daemon = True)
+
+    def _run(self, interval : float, beat) -> None:
+        while not self._stop.wait(interval):
+            try:
+                beat()
+            except OSError:
+                return
+
+    def __enter__(self) -> '_Heartbeat':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+def defaultWorkerId() -> str:
+    """
+    Return a worker id made of the hostname and process id
+
+    Returns
+    -------
+    str
+        Worker id
+    """
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class Worker:
+    """
+    A class to pull chunks from a Coordinator, run them and push back their results
+
+    ...
+
+    Attributes
+    ----------
+    address : Tuple[str, int]
+        Host and port of the coordinator
+    workerId : str
+        Id reported to the coordinator
+    heartbeatInterval : float
+        Seconds between heartbeats while running a chunk
+
+    Methods
+    -------
+    run():
+        Works until the coordinator reports the campaign complete
+    """
+
+    def __init__(self, host : str, port : int, workerId : Optional[str] = None, heartbeatInterval : float = 5) -> None:
+        """
+        Construct all necessary attributes for a Worker object
+
+        Parameters
+        ----------
+        host : str
+            Host of the coordinator
+        port : int
+            Port of the coordinator
+        workerId : str
+            Id reported to the coordinator (defaults to hostname and pid)
+        heartbeatInterval : float
+            Seconds between heartbeats while running a chunk
+        """
+
+        self.address = (host, port)
+        self.workerId = workerId if workerId is not None else defaultWorkerId()
+        self.heartbeatInterval = heartbeatInterval
+
+    def run(self) -> int:
+        """
+        Work until the coordinator reports the campaign complete
+
+        Returns
+        -------
+        int
+            Number of chunks run
+        """
+        count = 0
+        lock = threading.Lock()
+        with socket.create_connection(self.address) as sock:
+            def send(kind : int, payload : Any = b"") -> None:
+                with lock:
+                    sendMessage(sock, kind, payload)
+
+            send(HELLO, {"worker": self.workerId})
+            while True:
+                send(REQUEST)
+                kind, payload = receiveMessage(sock)
+                if kind == DONE:
+                    return count
+                if kind == WAIT:
+                    time.sleep(json.loads(payload)["retry"])
+                    continue
+
+                job = json.loads(payload)
+                start = time.perf_counter()
+                try:
+                    with _Heartbeat(self.heartbeatInterval, lambda : send(HEARTBEAT)):
+                        results = runChunk([Scenario.FromDict(s) for s in job["scenarios"]])
+                except Exception as error:
+                    # A chunk that cannot run is reported rather than dropping the connection
+                    send(ERROR, {"chunk": job["chunk"], "error": repr(error)})
+                    continue
+                send(RESULT, encodeResults(job["chunk"], self.workerId, time.perf_counter() - start, results))
+                count += 1
+
+class FileCoordinator:
+    """
+    A class to serve the chunks of a JobQueue through a shared directory instead of TCP
+
+    Chunks are written to pending/, a FileWorker claims one by renaming it into leased/ and
+    keeps its modification time fresh as a heartbeat, then writes the binary results to
+    results/, or the error of a chunk that cannot run to an .err file there. Stale leases are
+    moved back to pending/ through JobQueue.release(), so a chunk lost maxDispatches times is
+    marked failed instead.
+
+    ...
+
+    Attributes
+    ----------
+    queue : JobQueue
+        Chunks of the campaign
+    directory : str
+        Shared queue directory
+
+    Methods
+    -------
+    publish():
+        Writes every chunk without results to the queue directory
+    poll():
+        Collects finished chunks and re-queues stale leases
+    wait():
+        Polls until the campaign is complete
+    """
+
+    def __init__(self, queue : JobQueue, directory : str) -> None:
+        """
+        Construct all necessary attributes for a FileCoordinator object
+
+        Parameters
+        ----------
+        queue : JobQueue
+            Chunks of the campaign
+        directory : str
+            Shared queue directory
+        """
+
+        self.queue = queue
+        self.directory = directory
+        for sub in ("pending", "leased", "results"):
+            os.makedirs(os.path.join(directory, sub), exist_ok = True)
+
+    def _write(self, chunk : int) -> None:
+        start, end = self.queue.chunks[chunk]
+        path = os.path.join(self.directory, "pending", f"{chunk:06d}.json")
+        with open(path + ".tmp", 'w') as json_file:
+            json.dump([s.toDict() for s in self.queue.scenarios[start:end]], json_file)
+        os.replace(path + ".tmp", path)
+
+    def publish(self) -> None:
+        """
+        Write every chunk to the pending queue and clear the done marker
+        """
+        marker = os.path.join(self.directory, "done")
+        if os.path.exists(marker):
+            os.remove(marker)
+        for chunk in range(len(self.queue.chunks)):
+            self._write(chunk)
+
+    def poll(self) -> None:
+        """
+        Collect finished chunks and move stale leases back to the pending queue
+        """
+        results = os.path.join(self.directory, "results")
+        for name in os.listdir(results):
+            if name.endswith(".bin"):
+                path = os.path.join(results, name)
+                with open(path, 'rb') as result_file:
+                    chunk, worker, elapsed, runs = decodeResults(result_file.read())
+                self.queue.complete(chunk, worker, elapsed, runs)
+                os.remove(path)
+            elif name.endswith(".err"):
+                path = os.path.join(results, name)
+                with open(path) as error_file:
+                    failure = json.load(error_file)
+                self.queue.fail(failure["chunk"], failure["worker"], failure["error"])
+                os.remove(path)
+
+        leased = os.path.join(self.directory, "leased")
+        now = time.time()
+        for name in os.listdir(leased):
+            path = os.path.join(leased, name)
+            chunk, _, worker = name.partition("@")
+            self.queue.claim(int(chunk), worker)
+            try:
+                stale = now - os.path.getmtime(path) > self.queue.leaseTimeout
+                if stale:
+                    if self.queue.release(int(chunk)):
+                        os.rename(path, os.path.join(self.directory, "pending", chunk + ".json"))
+                    else:
+                        os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        if self.queue.done():
+            open(os.path.join(self.directory, "done"), 'w').close()
+
+    def wait(self, timeout : Optional[float] = None, poll : float = 0.5) -> bool:
+        """
+        Poll the queue directory until the campaign is complete
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum time to wait (in seconds)
+        poll : float
+            Interval between polls (in seconds)
+
+        Returns
+        -------
+        bool
+            True if the campaign completed
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.poll()
+            if self.queue.done():
+                return True
+            if end is not None and time.monotonic() > end:
+                return False
+            time.sleep(poll)
+
+class FileWorker:
+    """
+    A class to claim chunks from a FileCoordinator's queue directory, run them and write back their results
+
+    ...
+
+    Attributes
+    ----------
+    directory : str
+        Shared queue directory
+    workerId : str
+        Id written into the results
+    heartbeatInterval : float
+        Seconds between lease refreshes while running a chunk
+    poll : float
+        Seconds between checks of an empty queue
+
+    Methods
+    -------
+    run():
+        Works until the coordinator marks the campaign complete
+    """
+
+    def __init__(self, directory : str, workerId : Optional[str] = None, heartbeatInterval : float = 5, poll : float = 0.5) -> None:
+        """
+        Construct all necessary attributes for a FileWorker object
+
+        Parameters
+        ----------
+        directory : str
+            Shared queue directory
+        workerId : str
+            Id written into the results (defaults to hostname and pid)
+        heartbeatInterval : float
+            Seconds between lease refreshes while running a chunk
+        poll : float
+            Seconds between checks of an empty queue
+        """
+
+        self.directory = directory
+        self.workerId = workerId if workerId is not None else defaultWorkerId()
+        self.heartbeatInterval = heartbeatInterval
+        self.poll = poll
+
+    def _claim(self) -> Optional[Tuple[int, str]]:
+        pending = os.path.join(self.directory, "pending")
+        for name in sorted(os.listdir(pending)):
+            if not name.endswith(".json"):
+                continue
+            leased = os.path.join(self.directory, "leased", f"{name[:-5]}@{self.workerId}")
+            try:
+                os.rename(os.path.join(pending, name), leased)
+            except FileNotFoundError:
+                # Another worker claimed it first
+                continue
+            os.utime(leased)
+            return int(name[:-5]), leased
+        return None
+
+    def run(self) -> int:
+        """
+        Work until the coordinator marks the campaign complete
+
+        Returns
+        -------
+        int
+            Number of chunks run
+        """
+        count = 0
+        while True:
+            claim = self._claim()
+            if claim is None:
+                if os.path.exists(os.path.join(self.directory, "done")):
+                    return count
+                time.sleep(self.poll)
+                continue
+
+            chunk, leased = claim
+            start = time.perf_counter()
+            try:
+                with open(leased) as json_file:
+                    scenarios = [Scenario.FromDict(s) for s in json.load(json_file)]
+                with _Heartbeat(self.heartbeatInterval, lambda : os.utime(leased)):
+                    results = runChunk(scenarios)
+            except Exception as error:
+                path = os.path.join(self.directory, "results", f"{chunk:06d}.err")
+                data = json.dumps({"chunk": chunk, "worker": self.workerId, "error": repr(error)}).encode()
+            else:
+                path = os.path.join(self.directory, "results", f"{chunk:06d}.bin")
+                data = encodeResults(chunk, self.workerId, time.perf_counter() - start, results)
+
+            with open(path + f".{self.workerId}.tmp", 'wb') as result_file:
+                result_file.write(data)
+            os.replace(path + f".{self.workerId}.tmp", path)
+            try:
+                os.remove(leased)
+            except FileNotFoundError:
+                pass
+            count += 1
+
+def workerMain(host : str, port : int, workerId : Optional[str] = None, heartbeatInterval : float = 5) -> int:
+    """
+    Run a TCP worker; usable as a multiprocessing target
+
+    Parameters
+    ----------
+    host, port, workerId, heartbeatInterval
+        As for Worker
+
+    Returns
+    -------
+    int
+        Number of chunks run
+    """
+    return Worker(host, port, workerId, heartbeatInterval).run()
+
+def fileWorkerMain(directory : str, workerId : Optional[str] = None, heartbeatInterval : float = 5, poll : float = 0.5) -> int:
+    """
+    Run a file queue worker; usable as a multiprocessing target
+
+    Parameters
+    ----------
+    directory, workerId, heartbeatInterval, poll
+        As for FileWorker
+
+    Returns
+    -------
+    int
+        Number of chunks run
+    """
+    return FileWorker(directory, workerId, heartbeatInterval, poll).run()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Run a sim campaign worker")
+    parser.add_argument("--host", help = "coordinator host (TCP mode)")
+    parser.add_argument("--port", type = int, help = "coordinator port (TCP mode)")
+    parser.add_argument("--queue", help = "shared queue directory (file mode)")
+    parser.add_argument("--id", help = "worker id")
+    parser.add_argument("--heartbeat", type = float, default = 5, help = "seconds between heartbeats")
+    args = parser.parse_args()
+
+    if args.queue:
+        fileWorkerMain(args.queue, args.id, args.heartbeat)
+    elif args.host and args.port:
+        workerMain(args.host, args.port, args.id, args.heartbeat)
+    else:
+        parser.error("either --queue or --host and --port are required")
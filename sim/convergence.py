@@ -0,0 +1,192 @@
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+from core.vector import *
+from sim.integrators import INTEGRATORS
+from sim.scenario import Scenario
+
+# Quantities compared against the reference, as accepted by ConvergenceStudy.recommend()
+CONVERGENCE_OUTPUTS = ("impact", "apogee", "flightTime")
+
+@dataclass
+class ConvergenceRun:
+    """
+    A class to represent one step size and integrator of a convergence study
+
+    ...
+
+    Attributes
+    ----------
+    integrator : str
+        Integration scheme (see INTEGRATORS)
+    dt : float
+        Step size
+    wallTime : float
+        Fastest wall time of the run (in seconds)
+    forceEvaluations : int
+        Number of force evaluations of the run
+    impact : Vector3
+        Impact point
+    apogee : float
+        Highest altitude reached
+    flightTime : float
+        Time of flight
+    errors : Dict[str, float]
+        Distance of each of CONVERGENCE_OUTPUTS from the reference
+    """
+
+    integrator : str
+    dt : float
+    wallTime : float
+    forceEvaluations : int
+    impact : Vector3
+    apogee : float
+    flightTime : float
+    errors : Dict[str, float]
+
+@dataclass
+class ConvergenceStudy:
+    """
+    A class to represent the outcome of a convergence study
+
+    ...
+
+    Attributes
+    ----------
+    runs : List[ConvergenceRun]
+        Every step size and integrator tried
+    reference : Dict[str, Any]
+        Reference impact point, apogee and flight time
+    method : str
+        How the reference was obtained ("richardson" or "tight")
+
+    Methods
+    -------
+    recommend():
+        Returns the cheapest run meeting some error tolerances
+    table():
+        Returns the runs as a text table
+    """
+
+    runs : List[ConvergenceRun]
+    reference : Dict[str, Any]
+    method : str
+
+    def recommend(self, impactTolerance : Optional[float] = None, apogeeTolerance : Optional[float] = None,
+                  flightTimeTolerance : Optional[float] = None, cost : str = "wallTime") -> Optional[ConvergenceRun]:
+        """
+        Return the cheapest run meeting some error tolerances
+
+        Parameters
+        ----------
+        impactTolerance : float
+            Largest acceptable impact point error (in meters)
+        apogeeTolerance : float
+            Largest acceptable apogee error (in meters)
+        flightTimeTolerance : float
+            Largest acceptable flight time error (in seconds)
+        cost : str
+            Cost to minimise ("wallTime" or "forceEvaluations")
+
+        Returns
+        -------
+        ConvergenceRun
+            Cheapest acceptable run, or None if no run meets the tolerances
+        """
+        tolerances = {"impact": impactTolerance, "apogee": apogeeTolerance, "flightTime": flightTimeTolerance}
+        accepted = [run for run in self.runs
+                    if all(tolerance is None or run.errors[name] <= tolerance for name, tolerance in tolerances.items())]
+        if not accepted:
+            return None
+        return min(accepted, key = lambda run: (getattr(run, cost), -run.dt))
+
+    def table(self) -> str:
+        """
+        Return the runs as a text table
+
+        Returns
+        -------
+        str
+            One line per run with its cost and errors
+        """
+        lines = [f"{'integrator':<10} {'dt':>9} {'wall [s]':>9} {'evals':>8} {'impact err':>11} {'apogee err':>11} {'time err':>10}"]
+        for run in self.runs:
+            lines.append(f"{run.integrator:<10} {run.dt:>9.5f} {run.wallTime:>9.4f} {run.forceEvaluations:>8d} "
+                         f"{run.errors['impact']:>11.3e} {run.errors['apogee']:>11.3e} {run.errors['flightTime']:>10.3e}")
+        return "\n".join(lines)
+
+def _extrapolate(coarse : float, medium : float, fine : float, ratio : float, order : int) -> float:
+    # Richardson extrapolation with the order observed over three levels, bounded by the nominal order
+    observed = order
+    if coarse != medium and medium != fine and (coarse - medium) * (medium - fine) > 0:
+        observed = min(order, max(0.5, math.log(abs(coarse - medium) / abs(medium - fine)) / math.log(ratio)))
+    return fine + (fine - medium) / (ratio ** observed - 1)
+
+def convergenceStudy(scenario : Scenario, dts : Optional[Sequence[float]] = None, integrators : Sequence[str] = ("euler", "heun", "rk4"),
+                     reference : str = "richardson", repeats : int = 1) -> ConvergenceStudy:
+    """
+    Run a scenario across a ladder of step sizes and integrators and measure their errors
+
+    The reference is either Richardson-extrapolated from the three finest runs of the highest
+    order integrator (the ladder should then shrink by a constant ratio), or a "tight" run of
+    that integrator at an eighth of the finest step size.
+
+    Parameters
+    ----------
+    scenario : Scenario
+        Scenario to study
+    dts : Sequence[float]
+        Step sizes to try (defaults to 4, 2, 1, 1/2 and 1/4 times the scenario's)
+    integrators : Sequence[str]
+        Integration schemes to try (see INTEGRATORS)
+    reference : str
+        How to obtain the reference ("richardson" or "tight")
+    repeats : int
+        Number of timed repetitions of every run (the fastest one counts)
+
+    Returns
+    -------
+    ConvergenceStudy
+        Cost and error of every run, with the reference used
+    """
+    dts = sorted((float(dt) for dt in (dts if dts is not None else [scenario.dt * 2 ** k for k in (2, 1, 0, -1, -2)])), reverse = True)
+    unknown = [name for name in integrators if name not in INTEGRATORS]
+    if unknown:
+        raise ValueError(f"Unknown integrators: {', '.join(unknown)}")
+    if reference not in ("richardson", "tight"):
+        raise ValueError(f"Unknown reference method: {reference}")
+    if reference == "richardson" and len(dts) < 3:
+        raise ValueError("Richardson extrapolation needs at least three step sizes")
+
+    runs : List[ConvergenceRun] = []
+    for name in integrators:
+        for dt in dts:
+            variant = scenario.replace(dt = dt, integrator = name)
+            wallTime = math.inf
+            for _ in range(max(1, repeats)):
+                start = time.perf_counter()
+                result = variant.run()
+                wallTime = min(wallTime, time.perf_counter() - start)
+            runs.append(ConvergenceRun(name, dt, wallTime, result.steps * INTEGRATORS[name].stages,
+                                       result.impact, result.apogee, result.flightTime, {}))
+
+    best = max(integrators, key = lambda name: INTEGRATORS[name].order)
+    if reference == "tight":
+        result = scenario.replace(dt = dts[-1] / 8, integrator = best).run()
+        truth = {"impact": result.impact, "apogee": result.apogee, "flightTime": result.flightTime}
+    else:
+        coarse, medium, fine = [run for run in runs if run.integrator == best][-3:]
+        ratio = medium.dt / fine.dt
+        order = INTEGRATORS[best].order
+        def extrapolate(values):
+            return _extrapolate(*values, ratio, order)
+        truth = {"impact": Vector3(*[extrapolate([getattr(run.impact, c) for run in (coarse, medium, fine)]) for c in "xyz"]),
+                 "apogee": extrapolate([run.apogee for run in (coarse, medium, fine)]),
+                 "flightTime": extrapolate([run.flightTime for run in (coarse, medium, fine)])}
+
+    for run in runs:
+        run.errors = {"impact": (run.impact - truth["impact"]).norm(), "apogee": abs(run.apogee - truth["apogee"]),
+                      "flightTime": abs(run.flightTime - truth["flightTime"])}
+    return ConvergenceStudy(runs, truth, reference)
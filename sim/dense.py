@@ -0,0 +1,266 @@
+import bisect
+from dataclasses import dataclass
+from typing import List, Optional
+
+from core.vector import *
+from core.quaternion import *
+
+def hermite(p0 : Vector3, d0 : Vector3, p1 : Vector3, d1 : Vector3, h : float, s : float) -> Vector3:
+    """
+    Evaluate a cubic Hermite spline between two points with known derivatives
+
+    Parameters
+    ----------
+    p0 : Vector3
+        Value at the start of the interval
+    d0 : Vector3
+        Derivative at the start of the interval
+    p1 : Vector3
+        Value at the end of the interval
+    d1 : Vector3
+        Derivative at the end of the interval
+    h : float
+        Length of the interval (in seconds)
+    s : float
+        Fraction (0-1) of the interval at which to evaluate
+
+    Returns
+    -------
+    Vector3
+        Interpolated value
+    """
+    s2 = s * s
+    s3 = s2 * s
+    h00 = 2 * s3 - 3 * s2 + 1
+    h10 = s3 - 2 * s2 + s
+    h01 = -2 * s3 + 3 * s2
+    h11 = s3 - s2
+    return p0 * h00 + d0 * (h10 * h) + p1 * h01 + d1 * (h11 * h)
+
+@dataclass
+class StateSample:
+    """
+    A class to represent the state of a body at a point in time
+
+    ...
+
+    Attributes
+    ----------
+    time : float
+        Sim time of the sample
+    pos : Vector3
+        Position of the body's CoG
+    vel : Vector3
+        Velocity of the body's CoG
+    acc : Vector3
+        Translational acceleration of the body's CoG
+    ori : Quaternion
+        Orientation of the body
+    angularVel : Vector3
+        Rotation of the body per second
+    """
+
+    time : float
+    pos : Vector3
+    vel : Vector3
+    acc : Vector3
+    ori : Quaternion
+    angularVel : Vector3
+
+    @classmethod
+    def FromBody(cls, time : float, body) -> 'StateSample':
+        """
+        Construct a StateSample object from the current state of a Rigidbody
+
+        Parameters
+        ----------
+        time : float
+            Sim time of the sample
+        body : Rigidbody
+            Body to sample
+
+        Returns
+        -------
+        StateSample
+            Sampled state of the body
+        """
+        return cls(time, body.pos, body.vel, body.lastAcc, body.ori, body.angularVel)
+
+def interpolateState(a : StateSample, b : StateSample, time : float) -> StateSample:
+    """
+    Interpolate the state of a body between two samples
+
+    Position and velocity use cubic Hermite splines (on velocity and acceleration respectively),
+    orientation uses slerp and angular velocity is linear.
+
+    Parameters
+    ----------
+    a : StateSample
+        Sample at the start of the interval
+    b : StateSample
+        Sample at the end of the interval
+    time : float
+        Sim time at which to interpolate
+
+    Returns
+    -------
+    StateSample
+        Interpolated state
+    """
+    h = b.time - a.time
+    if h == 0:
+        return b
+    s = (time - a.time) / h
+
+    pos = hermite(a.pos, a.vel, b.pos, b.vel, h, s)
+    vel = hermite(a.vel, a.acc, b.vel, b.acc, h, s)
+    acc = a.acc + (b.acc - a.acc) * s
+    ori = a.ori.slerp(b.ori, s)
+    angularVel = a.angularVel + (b.angularVel - a.angularVel) * s
+
+    return StateSample(time, pos, vel, acc, ori, angularVel)
+
+class DenseTrajectory:
+    """
+    A class to record a trajectory sparsely and query its state at arbitrary times
+
+    Samples are stored at step boundaries (optionally only every few steps) and the state
+    between them is reconstructed with interpolateState().
+
+    ...
+
+    Attributes
+    ----------
+    every : int
+        Number of observed steps per stored sample
+    samples : List[StateSample]
+        Stored samples in time order
+
+    Methods
+    -------
+    add():
+        Stores the current state of a body
+    observe():
+        Stores the current state of a body every few calls (usable as a Scenario.run observer)
+    at():
+        Returns the state at an arbitrary time
+    resample():
+        Returns the states at a fixed output rate
+    """
+
+    def __init__(self, every : int = 1) -> None:
+        """
+        Construct all necessary attributes for a DenseTrajectory object
+
+        Parameters
+        ----------
+        every : int
+            Number of observed steps per stored sample
+        """
+
+        self.every = int(every)
+        self.samples : List[StateSample] = []
+
+        self._times : List[float] = []
+        self._observed = 0
+        self._pending : Optional[StateSample] = None
+
+    def add(self, time : float, body) -> None:
+        """
+        Store the current state of a body
+
+        Parameters
+        ----------
+        time : float
+            Sim time of the state
+        body : Rigidbody
+            Body to sample
+        """
+        if self._times and time <= self._times[-1]:
+            raise ValueError("DenseTrajectory samples must be added in increasing time order")
+
+        self.samples.append(StateSample.FromBody(time, body))
+        self._times.append(time)
+        self._pending = None
+
+    def observe(self, time : float, body) -> None:
+        """
+        Store the current state of a body every few calls
+
+        The most recent unstored state is kept, so the end of the trajectory can be queried too.
+
+        Parameters
+        ----------
+        time : float
+            Sim time of the state
+        body : Rigidbody
+            Body to sample
+        """
+        if self._observed % self.every == 0:
+            self.add(time, body)
+        else:
+            self._pending = StateSample.FromBody(time, body)
+        self._observed += 1
+
+    def _allSamples(self) -> List[StateSample]:
+        if self._pending is not None:
+            return self.samples + [self._pending]
+        return self.samples
+
+    def at(self, time : float) -> StateSample:
+        """
+        Return the state at an arbitrary time
+
+        Parameters
+        ----------
+        time : float
+            Sim time within the recorded span
+
+        Returns
+        -------
+        StateSample
+            Interpolated state
+        """
+        samples = self._allSamples()
+        if not samples or time < samples[0].time or time > samples[-1].time:
+            raise ValueError(f"Time {time} is outside the recorded trajectory")
+
+        index = bisect.bisect_left(self._times, time)
+        if index < len(self._times) and self._times[index] == time:
+            return samples[index]
+        if index >= len(self._times):
+            return interpolateState(samples[-2], samples[-1], time)
+        return interpolateState(samples[index - 1], samples[index], time)
+
+    def resample(self, dt : float, start : Optional[float] = None, end : Optional[float] = None) -> List[StateSample]:
+        """
+        Return the states at a fixed output rate
+
+        Parameters
+        ----------
+        dt : float
+            Output interval (in seconds)
+        start : float
+            First output time (defaults to the first sample)
+        end : float
+            Last output time (defaults to the last sample)
+
+        Returns
+        -------
+        List[StateSample]
+            Interpolated states at start, start + dt, ... up to end
+        """
+        samples = self._allSamples()
+        if not samples:
+            return []
+        start = samples[0].time if start is None else start
+        end = samples[-1].time if end is None else end
+
+        states = []
+        n = 0
+        time = start
+        while time <= end + 1e-12:
+            states.append(self.at(min(time, end)))
+            n += 1
+            time = start + n * dt
+        return states
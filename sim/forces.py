@@ -0,0 +1,217 @@
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from core.vector import *
+
+# How a multi-rate force is filled in between evaluations
+HOLD_MODES = ("hold", "extrapolate")
+
+class MultiRate:
+    """
+    A class to evaluate a force model every few steps and hold or extrapolate it in between
+
+    The model returns a tuple of vectors (e.g. a force and a torque). Between evaluations the
+    last value is either held, or linearly extrapolated in steps from the last two values.
+
+    ...
+
+    Attributes
+    ----------
+    every : int
+        Number of steps per evaluation
+    mode : str
+        How the value is filled in between evaluations (see HOLD_MODES)
+    calls : int
+        Number of steps served
+    evaluations : int
+        Number of times the model was evaluated
+
+    Methods
+    -------
+    __call__():
+        Returns the value of a model for this step, evaluating it when due
+    reset():
+        Forgets the held values so the next call evaluates the model
+    """
+
+    def __init__(self, every : int = 1, mode : str = "hold") -> None:
+        """
+        Construct all necessary attributes for a MultiRate object
+
+        Parameters
+        ----------
+        every : int
+            Number of steps per evaluation
+        mode : str
+            How the value is filled in between evaluations (see HOLD_MODES)
+        """
+
+        if every < 1:
+            raise ValueError("A force must be evaluated at least every step")
+        if mode not in HOLD_MODES:
+            raise ValueError(f"Unknown hold mode: {mode}")
+
+        self.every = int(every)
+        self.mode = mode
+        self.calls = 0
+        self.evaluations = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forget the held values so the next call evaluates the model
+        """
+        self._last : Optional[Tuple[Vector3, ...]] = None
+        self._previous : Optional[Tuple[Vector3, ...]] = None
+        self._phase = 0
+
+    def __call__(self, model : Callable[[], Tuple[Vector3, ...]]) -> Tuple[Vector3, ...]:
+        """
+        Return the value of a model for this step, evaluating it when due
+
+        Parameters
+        ----------
+        model : Callable[[], Tuple[Vector3, ...]]
+            Force model at the current state
+
+        Returns
+        -------
+        Tuple[Vector3, ...]
+            Evaluated, held or extrapolated value
+        """
+        self.calls += 1
+        phase = self._phase
+        self._phase = (phase + 1) % self.every
+        if phase == 0 or self._last is None:
+            self._previous, self._last = self._last, tuple(model())
+            self.evaluations += 1
+            return self._last
+        if self.mode == "extrapolate" and self._previous is not None:
+            fraction = phase / self.every
+            return tuple(last + (last - previous) * fraction for last, previous in zip(self._last, self._previous))
+        return self._last
+
+class RatedForce:
+    """
+    A controller applying a force model at its own evaluation rate
+
+    The model returns an inertial-frame force through the CoM and an inertial-frame torque.
+    Instances can be passed as the controller of Scenario.run() or ReplayLog.Record().
+
+    ...
+
+    Attributes
+    ----------
+    model : Callable[[float, Rigidbody], Tuple[Vector3, Vector3]]
+        Force and torque as a function of the sim time and the body
+    rate : MultiRate
+        Evaluation schedule of the model
+
+    Methods
+    -------
+    __call__():
+        Applies the force of the current step to a body
+    """
+
+    def __init__(self, model : Callable[[float, Any], Tuple[Vector3, Vector3]], every : int = 1, mode : str = "hold") -> None:
+        """
+        Construct all necessary attributes for a RatedForce object
+
+        Parameters
+        ----------
+        model : Callable[[float, Rigidbody], Tuple[Vector3, Vector3]]
+            Force and torque as a function of the sim time and the body
+        every : int
+            Number of steps per evaluation
+        mode : str
+            How the force is filled in between evaluations (see HOLD_MODES)
+        """
+
+        self.model = model
+        self.rate = MultiRate(every, mode)
+
+    def __call__(self, time : float, body) -> None:
+        """
+        Apply the force of the current step to a body
+
+        Parameters
+        ----------
+        time : float
+            Sim time at the start of the step
+        body : Rigidbody
+            Body to push
+        """
+        force, torque = self.rate(lambda: self.model(time, body))
+        body.applyForceCoM(force)
+        body.applyTorque(torque)
+
+@dataclass
+class RateRun:
+    """
+    A class to represent one evaluation rate of a rate study
+
+    ...
+
+    Attributes
+    ----------
+    every : int
+        Number of steps per aerodynamic evaluation
+    mode : str
+        How the forces were filled in between evaluations
+    wallTime : float
+        Fastest wall time of the run (in seconds)
+    evaluations : int
+        Number of aerodynamic evaluations
+    errors : Dict[str, float]
+        Impact point, apogee and flight time distance from the every-step run
+    """
+
+    every : int
+    mode : str
+    wallTime : float
+    evaluations : int
+    errors : Dict[str, float]
+
+def rateStudy(scenario : Any, rates : Sequence[int] = (1, 2, 5, 10), modes : Sequence[str] = HOLD_MODES, repeats : int = 1) -> List[RateRun]:
+    """
+    Report the cost and error of evaluating a scenario's aerodynamics at lower rates
+
+    Parameters
+    ----------
+    scenario : Scenario
+        Scenario to study (with the built-in "euler" integrator, the only one taking an aerodynamic rate)
+    rates : Sequence[int]
+        Numbers of steps per aerodynamic evaluation to try
+    modes : Sequence[str]
+        Hold modes to try (see HOLD_MODES)
+    repeats : int
+        Number of timed repetitions of every run (the fastest one counts)
+
+    Returns
+    -------
+    List[RateRun]
+        Cost and error of every rate and mode, against evaluating every step
+    """
+    def timed(variant) -> Tuple[float, Any]:
+        best = math.inf
+        for _ in range(max(1, repeats)):
+            start = time.perf_counter()
+            result = variant.run()
+            best = min(best, time.perf_counter() - start)
+        return best, result
+
+    if scenario.integrator != "euler":
+        raise ValueError("Multi-rate aerodynamics only support the built-in integrator")
+
+    _, reference = timed(scenario.replace(aeroEvery = 1))
+    runs = []
+    for mode in modes:
+        for every in rates:
+            wallTime, result = timed(scenario.replace(aeroEvery = every, aeroMode = mode))
+            rate = result.body.aeroRate
+            errors = {"impact": (result.impact - reference.impact).norm(), "apogee": abs(result.apogee - reference.apogee),
+                      "flightTime": abs(result.flightTime - reference.flightTime)}
+            runs.append(RateRun(every, mode, wallTime, rate.evaluations if rate is not None else result.steps, errors))
+    return runs
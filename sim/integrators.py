@@ -0,0 +1,310 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+
+from core.vector import *
+from core.quaternion import *
+
+class Integrator(ABC):
+    """
+    Base class for the integration schemes a Rigidbody can use in update()
+
+    An integrator advances pos, vel, ori and angularVel of a body over one step, evaluating
+    body.derivatives() at the trial states it needs, and leaves the effective accelerations
+    of the step in acc and angularAcc.
+
+    After every step the distance of the orientation from a unit quaternion is tracked as its
+    drift, and the orientation is renormalized once the drift exceeds a tolerance.
+
+    ...
+
+    Attributes
+    ----------
+    name : str
+        Name of the scheme
+    order : int
+        Order of accuracy of the translational state
+    stages : int
+        Force evaluations per step
+    renormalizeAbove : float
+        Drift beyond which the orientation is renormalized (None to never renormalize)
+    drift : float
+        Drift of the orientation after the last step
+    maxDrift : float
+        Largest drift seen before renormalizing
+    renormalizations : int
+        Number of times the orientation was renormalized
+
+    Methods
+    -------
+    step():
+        Advances a body by one step
+    settle():
+        Tracks the drift of a body's orientation and renormalizes it when due
+    reset():
+        Clears the drift and renormalization counts, for a body put in a new state
+    """
+
+    name = ""
+    order = 1
+    stages = 1
+
+    def __init__(self, renormalizeAbove : Optional[float] = 1e-12) -> None:
+        """
+        Construct all necessary attributes for an Integrator object
+
+        Parameters
+        ----------
+        renormalizeAbove : float
+            Drift beyond which the orientation is renormalized (None to never renormalize)
+        """
+
+        self.renormalizeAbove = renormalizeAbove
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clear the drift and renormalization counts, for a body put in a new state
+        """
+        self.drift = 0.0
+        self.maxDrift = 0.0
+        self.renormalizations = 0
+
+    def settle(self, body) -> None:
+        """
+        Track the drift of a body's orientation and renormalize it when due
+
+        Parameters
+        ----------
+        body : Rigidbody
+            Body just advanced
+        """
+        self.drift = abs(body.ori.norm() - 1)
+        self.maxDrift = max(self.maxDrift, self.drift)
+        if self.renormalizeAbove is not None and self.drift > self.renormalizeAbove:
+            body.ori = body.ori.normalized()
+            self.drift = 0.0
+            self.renormalizations += 1
+
+    @abstractmethod
+    def step(self, body, dt : float) -> None:
+        """
+        Advance a body by one step
+
+        Parameters
+        ----------
+        body : Rigidbody
+            Body to advance
+        dt : float
+            Step size
+        """
+
+class SemiImplicitEuler(Integrator):
+    """
+    The semi-implicit Euler scheme of Rigidbody.update(), as an Integrator
+    """
+
+    name = "euler"
+
+    def step(self, body, dt : float) -> None:
+        acc, angularAcc = body.derivatives(body.pos, body.vel, body.ori, body.angularVel)
+
+        body.vel += acc * dt
+        body.pos += body.vel * dt
+        body.angularVel += angularAcc * dt
+        body.ori *= Quaternion.FromRotationVector(body.angularVel * dt)
+        self.settle(body)
+
+        body.acc = acc
+        body.angularAcc = angularAcc
+
+def _combine(base : Vector3, rates : Sequence[Vector3], weights : Sequence[float], dt : float) -> Vector3:
+    result = base
+    for weight, rate in zip(weights, rates):
+        if weight:
+            result = result + rate * (weight * dt)
+    return result
+
+class ExplicitRungeKutta(Integrator):
+    """
+    An explicit Runge-Kutta scheme given by its Butcher tableau
+
+    The orientation follows the stage angular velocities as a rotation-vector increment on the
+    step's starting orientation, so it is exact for a constant angular velocity, but only
+    second-order accurate in attitude when the angular velocity changes over the step.
+
+    ...
+
+    Attributes
+    ----------
+    a : Tuple[Tuple[float, ...], ...]
+        Stage coefficients (row i weights the rates of the earlier stages)
+    b : Tuple[float, ...]
+        Weights of the stage rates in the step
+    """
+
+    a : Tuple[Tuple[float, ...], ...] = ((),)
+    b : Tuple[float, ...] = (1.0,)
+
+    def step(self, body, dt : float) -> None:
+        pos, vel, ori, angularVel = body.pos, body.vel, body.ori, body.angularVel
+        vels : List[Vector3] = []
+        accs : List[Vector3] = []
+        angularVels : List[Vector3] = []
+        angularAccs : List[Vector3] = []
+
+        for row in self.a:
+            stageVel = _combine(vel, accs, row, dt)
+            stageAngularVel = _combine(angularVel, angularAccs, row, dt)
+            stagePos = _combine(pos, vels, row, dt)
+            increment = _combine(Vector3.Zero(), angularVels, row, dt)
+            stageOri = self.rotate(ori, angularVels, row, dt) if any(row) else ori
+
+            acc, angularAcc = body.derivatives(stagePos, stageVel, stageOri, stageAngularVel)
+            vels.append(stageVel)
+            accs.append(acc)
+            angularVels.append(self.rotationRate(increment, stageAngularVel))
+            angularAccs.append(angularAcc)
+
+        body.pos = _combine(pos, vels, self.b, dt)
+        body.vel = _combine(vel, accs, self.b, dt)
+        body.angularVel = _combine(angularVel, angularAccs, self.b, dt)
+        body.ori = self.rotate(ori, angularVels, self.b, dt)
+        self.settle(body)
+
+        body.acc = _combine(Vector3.Zero(), accs, self.b, 1.0)
+        body.angularAcc = _combine(Vector3.Zero(), angularAccs, self.b, 1.0)
+
+    def rotate(self, ori : Quaternion, rates : Sequence[Vector3], weights : Sequence[float], dt : float) -> Quaternion:
+        """
+        Return an orientation advanced by a weighted sum of stage rotation rates
+
+        Parameters
+        ----------
+        ori : Quaternion
+            Orientation at the start of the step
+        rates : Sequence[Vector3]
+            Rotation rates of the earlier stages
+        weights : Sequence[float]
+            Weights of the rates
+        dt : float
+            Step size
+
+        Returns
+        -------
+        Quaternion
+            Advanced orientation
+        """
+        return ori * Quaternion.FromRotationVector(_combine(Vector3.Zero(), rates, weights, dt))
+
+    def rotationRate(self, increment : Vector3, angularVel : Vector3) -> Vector3:
+        """
+        Return the rotation rate of a stage, as weighted by rotate()
+
+        Parameters
+        ----------
+        increment : Vector3
+            Rotation vector from the step's starting orientation to the stage's
+        angularVel : Vector3
+            Angular velocity of the stage
+
+        Returns
+        -------
+        Vector3
+            Rotation rate of the stage
+        """
+        return angularVel
+
+class Heun(ExplicitRungeKutta):
+    """
+    Heun's second-order explicit trapezoid scheme
+    """
+
+    name = "heun"
+    order = 2
+    stages = 2
+    a = ((), (1.0,))
+    b = (0.5, 0.5)
+
+class RK4(ExplicitRungeKutta):
+    """
+    The classic fourth-order Runge-Kutta scheme
+    """
+
+    name = "rk4"
+    order = 4
+    stages = 4
+    a = ((), (0.5,), (0.0, 0.5), (0.0, 0.0, 1.0))
+    b = (1 / 6, 1 / 3, 1 / 3, 1 / 6)
+
+class MuntheKaas(ExplicitRungeKutta):
+    """
+    A Runge-Kutta-Munthe-Kaas scheme, which keeps the tableau's order in attitude too
+
+    The stage orientations are exponentials of a rotation vector integrated in the Lie algebra,
+    whose rate is the stage angular velocity corrected by the inverse derivative of the
+    exponential map. The orientation stays a unit quaternion by construction.
+    """
+
+    def rotationRate(self, increment : Vector3, angularVel : Vector3) -> Vector3:
+        # Inverse derivative of the exponential map, truncated after the terms an order-4 scheme needs
+        bracket = increment.cross(angularVel)
+        return angularVel + bracket * 0.5 + increment.cross(bracket) * (1 / 12)
+
+class RKMK4(MuntheKaas):
+    """
+    The classic fourth-order Runge-Kutta scheme in its Runge-Kutta-Munthe-Kaas form
+    """
+
+    name = "rkmk4"
+    order = 4
+    stages = 4
+    a = RK4.a
+    b = RK4.b
+
+class CrouchGrossman(ExplicitRungeKutta):
+    """
+    A Crouch-Grossman scheme, which rotates by a product of exponentials of the stage rates
+
+    No correction of the rates is needed, and the orientation stays a unit quaternion by
+    construction. The tableau must satisfy the Crouch-Grossman order conditions.
+    """
+
+    def rotate(self, ori : Quaternion, rates : Sequence[Vector3], weights : Sequence[float], dt : float) -> Quaternion:
+        for weight, rate in zip(weights, rates):
+            if weight:
+                ori = ori * Quaternion.FromRotationVector(rate * (weight * dt))
+        return ori
+
+class CG3(CrouchGrossman):
+    """
+    Crouch and Grossman's third-order three-stage scheme
+    """
+
+    name = "cg3"
+    order = 3
+    stages = 3
+    a = ((), (3 / 4,), (119 / 216, 17 / 108))
+    b = (13 / 51, -2 / 3, 24 / 17)
+
+# Integration schemes by name, as accepted by Scenario.integrator
+INTEGRATORS : Dict[str, Type[Integrator]] = {"euler": SemiImplicitEuler, "heun": Heun, "rk4": RK4, "cg3": CG3, "rkmk4": RKMK4}
+
+def makeIntegrator(name : str) -> Optional[Integrator]:
+    """
+    Return the integrator a body should use for a named scheme
+
+    Parameters
+    ----------
+    name : str
+        Name of the scheme (see INTEGRATORS)
+
+    Returns
+    -------
+    Integrator
+        Integrator to assign to Rigidbody.integrator, None for the built-in semi-implicit Euler
+    """
+    if name not in INTEGRATORS:
+        raise ValueError(f"Unknown integrator: {name}")
+    if name == "euler":
+        return None
+    return INTEGRATORS[name]()
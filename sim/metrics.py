@@ -0,0 +1,306 @@
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+Snapshot = Dict[str, Any]
+
+def recorderBytes(recorders : Iterable[Any]) -> int:
+    """
+    Return the memory held by the stored columns of several recorders
+
+    Parameters
+    ----------
+    recorders : Iterable[Recorder]
+        Recorders to measure
+
+    Returns
+    -------
+    int
+        Bytes held by their columns
+    """
+    return sum(len(column) * column.itemsize for recorder in recorders for column in recorder.columns.values())
+
+class MetricsSink(ABC):
+    """
+    Base class for destinations of published metrics snapshots
+
+    ...
+
+    Methods
+    -------
+    publish():
+        Delivers a snapshot
+    close():
+        Releases any resources held by the sink
+    """
+
+    @abstractmethod
+    def publish(self, snapshot : Snapshot) -> None:
+        """
+        Deliver a snapshot
+
+        Parameters
+        ----------
+        snapshot : Snapshot
+            Metric name to value (None when not known yet)
+        """
+
+    def close(self) -> None:
+        """
+        Release any resources held by the sink
+        """
+        pass
+
+class CallbackSink(MetricsSink):
+    """
+    A sink handing every snapshot to a function
+    """
+
+    def __init__(self, callback : Callable[[Snapshot], None]) -> None:
+        self.callback = callback
+
+    def publish(self, snapshot : Snapshot) -> None:
+        self.callback(snapshot)
+
+class JSONLinesSink(MetricsSink):
+    """
+    A sink appending every snapshot to a JSON lines file
+    """
+
+    def __init__(self, path : str) -> None:
+        self.path = path
+        self._file = open(path, 'a')
+
+    def publish(self, snapshot : Snapshot) -> None:
+        self._file.write(json.dumps(snapshot) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+class PrometheusFileSink(MetricsSink):
+    """
+    A sink keeping the latest snapshot in a Prometheus text-format file
+
+    The file is replaced atomically, so it can be served by a node exporter textfile collector.
+    """
+
+    def __init__(self, path : str, prefix : str = "platysim", labels : Optional[Dict[str, str]] = None) -> None:
+        self.path = path
+        self.prefix = prefix
+        self.labels = "{" + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items())) + "}" if labels else ""
+
+    def publish(self, snapshot : Snapshot) -> None:
+        lines = []
+        for name, value in snapshot.items():
+            if value is None or isinstance(value, str):
+                continue
+            metric = self.prefix + "_" + "".join("_" + c.lower() if c.isupper() else c for c in name)
+            lines.append(f"# TYPE {metric} {'counter' if name in RunMetrics.COUNTERS else 'gauge'}")
+            lines.append(f"{metric}{self.labels} {float(value)!r}")
+        temporary = self.path + ".tmp"
+        with open(temporary, 'w') as metrics_file:
+            metrics_file.write("\n".join(lines) + "\n")
+        os.replace(temporary, self.path)
+
+class RunMetrics:
+    """
+    A class to track the progress and throughput of a run and publish it at a low fixed rate
+
+    The hot-path calls only bump counters and look at the clock every few calls, so leaving
+    the metrics on costs next to nothing; gauges are only evaluated when publishing.
+
+    Published metrics: wallTime, simTime, realTimeFactor (sim seconds per wall second), steps,
+    stepsPerSecond, forceEvaluations, forceEvaluationsPerSecond, bodiesActive, runs,
+    runsPerSecond, eta (seconds left, when a total is known) and any registered gauge, e.g.
+    recorderBytes. Rates are over the last publishing interval.
+
+    ...
+
+    Attributes
+    ----------
+    sinks : List[MetricsSink]
+        Destinations of the snapshots
+    interval : float
+        Seconds between snapshots
+    totalRuns : int
+        Number of runs expected, for the ETA
+    totalSimTime : float
+        Sim time expected, for the ETA when the number of runs is not known
+
+    Methods
+    -------
+    gauge():
+        Registers a value read at every snapshot
+    advance():
+        Counts steps of the sim clock
+    complete():
+        Counts finished runs
+    snapshot():
+        Returns the current metrics
+    publish():
+        Sends a snapshot to every sink
+    close():
+        Publishes a final snapshot and closes the sinks
+    """
+
+    COUNTERS = ("steps", "forceEvaluations", "runs", "simTime")
+
+    def __init__(self, sinks : Sequence[MetricsSink] = (), interval : float = 5.0, totalRuns : Optional[int] = None,
+                 totalSimTime : Optional[float] = None, checkEvery : int = 32) -> None:
+        """
+        Construct all necessary attributes for a RunMetrics object
+
+        Parameters
+        ----------
+        sinks : Sequence[MetricsSink]
+            Destinations of the snapshots
+        interval : float
+            Seconds between snapshots
+        totalRuns : int
+            Number of runs expected, for the ETA
+        totalSimTime : float
+            Sim time expected, for the ETA when the number of runs is not known
+        checkEvery : int
+            Number of advance() calls between looks at the wall clock
+        """
+
+        self.sinks = list(sinks)
+        self.interval = interval
+        self.totalRuns = totalRuns
+        self.totalSimTime = totalSimTime
+        self.checkEvery = max(1, checkEvery)
+
+        self.steps = 0
+        self.forceEvaluations = 0
+        self.runs = 0
+        self.simTime = 0.0
+        self.bodiesActive = 0
+
+        self._gauges : Dict[str, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._next = self._started + interval
+        self._calls = 0
+        self._last = (self._started, 0, 0, 0, 0.0)
+
+    def __enter__(self) -> 'RunMetrics':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def gauge(self, name : str, value : Callable[[], float]) -> None:
+        """
+        Register a value read at every snapshot
+
+        Parameters
+        ----------
+        name : str
+            Metric name
+        value : Callable[[], float]
+            Function returning the current value
+        """
+        self._gauges[name] = value
+
+    def advance(self, dt : float, bodies : int = 1, forceEvaluations : Optional[int] = None) -> None:
+        """
+        Count one step of a sim clock
+
+        Parameters
+        ----------
+        dt : float
+            Sim time stepped
+        bodies : int
+            Number of bodies stepped
+        forceEvaluations : int
+            Number of force evaluations made (defaults to one per body)
+        """
+        self.steps += bodies
+        self.forceEvaluations += bodies if forceEvaluations is None else forceEvaluations
+        self.simTime += dt
+        self.bodiesActive = bodies
+        self._calls += 1
+        if self._calls >= self.checkEvery:
+            self._calls = 0
+            if time.monotonic() >= self._next:
+                self.publish()
+
+    def complete(self, runs : int = 1, steps : int = 0, simTime : float = 0.0, forceEvaluations : Optional[int] = None) -> None:
+        """
+        Count finished runs, and the work they did when it was not counted by advance()
+
+        Thread-safe.
+
+        Parameters
+        ----------
+        runs : int
+            Number of runs finished
+        steps : int
+            Number of body steps they made
+        simTime : float
+            Sim time they covered
+        forceEvaluations : int
+            Number of force evaluations they made (defaults to one per step)
+        """
+        with self._lock:
+            self.runs += runs
+            self.steps += steps
+            self.forceEvaluations += steps if forceEvaluations is None else forceEvaluations
+            self.simTime += simTime
+        if time.monotonic() >= self._next:
+            self.publish()
+
+    def snapshot(self) -> Snapshot:
+        """
+        Return the current metrics
+
+        Returns
+        -------
+        Snapshot
+            Metric name to value (None when not known yet)
+        """
+        with self._lock:
+            now = time.monotonic()
+            wall = now - self._started
+            since, steps, evaluations, runs, simTime = self._last
+            span = now - since
+            snapshot : Snapshot = {"wallTime": wall, "simTime": self.simTime,
+                                   "realTimeFactor": self.simTime / wall if wall > 0 else None,
+                                   "steps": self.steps, "stepsPerSecond": (self.steps - steps) / span if span > 0 else None,
+                                   "forceEvaluations": self.forceEvaluations,
+                                   "forceEvaluationsPerSecond": (self.forceEvaluations - evaluations) / span if span > 0 else None,
+                                   "bodiesActive": self.bodiesActive, "runs": self.runs,
+                                   "runsPerSecond": (self.runs - runs) / span if span > 0 else None}
+
+            eta = None
+            if self.totalRuns is not None and self.runs > 0:
+                eta = max(0, self.totalRuns - self.runs) * wall / self.runs
+            elif self.totalSimTime is not None and self.simTime > 0:
+                eta = max(0.0, self.totalSimTime - self.simTime) * wall / self.simTime
+            snapshot["eta"] = eta
+            self._last = (now, self.steps, self.forceEvaluations, self.runs, self.simTime)
+
+        for name, value in self._gauges.items():
+            snapshot[name] = value()
+        return snapshot
+
+    def publish(self) -> None:
+        """
+        Send a snapshot to every sink
+        """
+        self._next = time.monotonic() + self.interval
+        snapshot = self.snapshot()
+        for sink in self.sinks:
+            sink.publish(snapshot)
+
+    def close(self) -> None:
+        """
+        Publish a final snapshot and close the sinks
+        """
+        self.publish()
+        for sink in self.sinks:
+            sink.close()
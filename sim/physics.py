@@ -9,8 +9,10 @@ import math
 
 from core.vector import *
 from core.quaternion import *
+from core.matrix import Matrix3
+from sim.dense import hermite
 
-from typing import Callable
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
 
 @dataclass
 class Rigidbody:
@@ -36,14 +38,34 @@ class Rigidbody:
     oriQuat : Quaternion
         Quaternion representation of ori
     angularVel : Vector3
-        Rotation of the rigidbody per second
+        Rotation of the rigidbody per second, in the body frame
     angularAcc : Vector3
-        Rotational acceleration of the rigidbody per second
+        Rotational acceleration of the rigidbody per second, in the body frame
+    moi : Vector3
+        Principal moments of inertia of the rigidbody (in kg m^2)
+    inertia : Matrix3
+        Optional full body-frame inertia tensor about the CoG, used instead of moi
+    integrator : Integrator
+        Optional integration scheme for update() (None for the built-in semi-implicit Euler)
     
     Methods
     -------
     update():
         Updates a Rigidbody given a time difference
+    derivatives():
+        Returns the accelerations at a trial state within the current step
+    inverseInertia():
+        Returns the inverse of the body-frame inertia tensor
+    torqueResponse():
+        Returns the map from an inertial-frame torque to the angular acceleration
+    torqueAcc():
+        Returns the angular acceleration caused by an inertial-frame torque
+    gyroscopicAcc():
+        Returns the angular acceleration of the gyroscopic term of Euler's equations
+    reset():
+        Puts a Rigidbody in a new kinematic state with no pending forces
+    interpolate():
+        Returns the interpolated state within the last update step
     applyForceCoM():
         Apply an inertial-frame force through the CoM of a Rgidbody
     applyForceCoMLocal():
@@ -68,14 +90,28 @@ class Rigidbody:
     lastAcc : Vector3 = Vector3.Zero()
 
     moi : Vector3 = Vector3(1, 1, 1)
+    inertia : Optional[Matrix3] = None
 
     ori : Quaternion = Quaternion.Zero()
     spin : Quaternion = Quaternion.Zero()
     angularVel : Vector3 = Vector3.Zero()
     angularAcc : Vector3 = Vector3.Zero()
 
+    lastPos : Vector3 = Vector3.Zero()
+    lastVel : Vector3 = Vector3.Zero()
+    lastOri : Quaternion = Quaternion.Zero()
+    lastDt : float = 0
 
-    def __init__(self, mass : float = 1, moi : Union[float, Vector3] = 1, gravity : bool = True, pos : Vector3 = Vector3(0, 0, 0), vel : Vector3 = Vector3(0, 0, 0), ori : Quaternion = Quaternion.Zero()) -> None:
+    integrator : Optional[Any] = None
+
+    # Inverse inertia and torque response, cached until the values of the mass properties or the
+    # orientation change (keyed on components, as the vectors and matrices can be mutated in place)
+    _inverseFor = None
+    _inverse = None
+    _responseFor = None
+    _response = None
+
+    def __init__(self, mass : float = 1, moi : Union[float, Vector3, Matrix3] = 1, gravity : bool = True, pos : Vector3 = Vector3(0, 0, 0), vel : Vector3 = Vector3(0, 0, 0), ori : Quaternion = Quaternion.Zero()) -> None:
         """
         Construct all necessary attributes for a Rigidbody object
 
@@ -83,6 +119,8 @@ class Rigidbody:
         ----------
         mass : float
             Mass of the rigidbody (in kg)
+        moi : float OR Vector3 OR Matrix3
+            Moment of inertia, principal moments of inertia or full body-frame inertia tensor
         pos : Vector3
             Position of the rigidbody's CoG in space
         vel : Vector3
@@ -91,12 +129,15 @@ class Rigidbody:
             Rotation of the rigidbody about its CoG
         """
 
-        self.mass = float(mass)
+        self.mass = mass if type(mass) is Dual else float(mass)
 
         self.pos = pos
         self.vel = vel
 
-        if isinstance(moi, Vector3):
+        if isinstance(moi, Matrix3):
+            self.inertia = moi
+            self.moi = moi.diagonal()
+        elif isinstance(moi, Vector3):
             self.moi = moi
         else:
             self.moi = Vector3(moi, moi, moi)
@@ -105,6 +146,10 @@ class Rigidbody:
 
         self.gravity = gravity
 
+        self.lastPos = pos
+        self.lastVel = vel
+        self.lastOri = ori
+
     def update(self, dt : float) -> None:
         """
         Updates a Rigidbody given a time difference
@@ -114,24 +159,217 @@ class Rigidbody:
         dt : float
             Time difference for the update step
         """
-        dt = float(dt)
+        dt = dt if type(dt) is Dual else float(dt)
 
-        # TODO: Place all global constants (gravity, etc.) in a sim-wide settings class
-        if self.gravity:
-            self.acc += Vector3(0, 0, -9.807)
+        # Keep the start of the step for dense output
+        self.lastPos = self.pos
+        self.lastVel = self.vel
+        self.lastOri = self.ori
+        self.lastDt = dt
 
-        self.vel += self.acc * dt
-        self.pos += self.vel * dt
+        if self.integrator is not None:
+            # The integrator leaves the effective accelerations of the step in acc and angularAcc
+            self.integrator.step(self, dt)
+        else:
+            # TODO: Place all global constants (gravity, etc.) in a sim-wide settings class
+            if self.gravity:
+                self.acc += Vector3(0, 0, -9.807)
 
-        self.angularVel += self.angularAcc * dt
-        
-        self.ori *= Quaternion.FromRotationVector(self.angularVel * dt)
+            self.vel += self.acc * dt
+            self.pos += self.vel * dt
+
+            self.angularAcc += self.gyroscopicAcc(self.angularVel)
+            self.angularVel += self.angularAcc * dt
+
+            self.ori *= Quaternion.FromRotationVector(self.angularVel * dt)
 
         # Reset acceleration every timestep so next forces/gravity work properly
         self.lastAcc = self.acc
         self.acc = Vector3.Zero()
         self.angularAcc = Vector3.Zero()
 
+    def derivatives(self, pos : Vector3, vel : Vector3, ori : Quaternion, angularVel : Vector3) -> Tuple[Vector3, Vector3]:
+        """
+        Returns the accelerations at a trial state within the current step
+
+        Forces applied before the step are held constant over it; subclasses add the forces
+        that depend on the state.
+
+        Parameters
+        ----------
+        pos : Vector3
+            Trial position of the CoG
+        vel : Vector3
+            Trial velocity of the CoG
+        ori : Quaternion
+            Trial orientation
+        angularVel : Vector3
+            Trial angular velocity
+
+        Returns
+        -------
+        Tuple[Vector3, Vector3]
+            Translational and rotational acceleration
+        """
+        acc = self.acc
+        if self.gravity:
+            acc = acc + Vector3(0, 0, -9.807)
+        return acc, self.angularAcc + self.gyroscopicAcc(angularVel)
+
+    def inverseInertia(self) -> Matrix3:
+        """
+        Returns the inverse of the body-frame inertia tensor
+
+        It is recomputed only when the values of moi or inertia change.
+
+        Returns
+        -------
+        Matrix3
+            Inverse inertia tensor
+        """
+        key = self._inertiaKey()
+        if self._inverseFor != key:
+            self._inverse = (Matrix3.Diagonal(self.moi) if self.inertia is None else self.inertia).inverse()
+            self._inverseFor = key
+            self._responseFor = None
+        return self._inverse
+
+    def torqueResponse(self) -> Matrix3:
+        """
+        Returns the map from an inertial-frame torque to the body-frame angular acceleration
+
+        This is the inverse inertia tensor composed with the rotation into the body frame. It is
+        recomputed only when ori or the mass properties change, so every torque applied within a
+        step costs a single matrix-vector product.
+
+        Returns
+        -------
+        Matrix3
+            Torque response at the current orientation
+        """
+        inverse = self.inverseInertia()
+        ori = self.ori
+        key = (ori.w, ori.x, ori.y, ori.z)
+        if self._responseFor != key:
+            self._response = inverse * Matrix3.FromQuaternion(ori.conj())
+            self._responseFor = key
+        return self._response
+
+    def _inertiaKey(self) -> Tuple[Any, ...]:
+        """
+        Returns the components of the mass properties in effect
+
+        Returns
+        -------
+        Tuple[Any, ...]
+            Components of inertia if it is set, otherwise of moi
+        """
+        inertia = self.inertia
+        if inertia is None:
+            moi = self.moi
+            return (moi.x, moi.y, moi.z)
+        return (inertia.xx, inertia.xy, inertia.xz,
+                inertia.yx, inertia.yy, inertia.yz,
+                inertia.zx, inertia.zy, inertia.zz)
+
+    def torqueAcc(self, torque : Vector3, ori : Optional[Quaternion] = None) -> Vector3:
+        """
+        Returns the body-frame angular acceleration caused by an inertial-frame torque
+
+        Parameters
+        ----------
+        torque : Vector3
+            The torque (in Newton-meters)
+        ori : Quaternion
+            Orientation at which the torque acts (defaults to the current one)
+
+        Returns
+        -------
+        Vector3
+            Angular acceleration
+        """
+        if ori is None or ori is self.ori:
+            return self.torqueResponse() * torque
+        return self.inverseInertia() * (torque * ori.conj())
+
+    def gyroscopicAcc(self, angularVel : Vector3) -> Vector3:
+        """
+        Returns the angular acceleration of the gyroscopic term of Euler's equations, -I^-1 (w x I w)
+
+        Parameters
+        ----------
+        angularVel : Vector3
+            Body-frame angular velocity
+
+        Returns
+        -------
+        Vector3
+            Angular acceleration
+        """
+        if angularVel.x == 0 and angularVel.y == 0 and angularVel.z == 0:
+            return Vector3.Zero()
+        if self.inertia is None:
+            moi = self.moi
+            momentum = Vector3(moi.x * angularVel.x, moi.y * angularVel.y, moi.z * angularVel.z)
+        else:
+            momentum = self.inertia * angularVel
+        return -(self.inverseInertia() * angularVel.cross(momentum))
+
+    def reset(self, pos : Vector3, vel : Vector3, ori : Quaternion, angularVel : Vector3 = Vector3.Zero()) -> None:
+        """
+        Puts a Rigidbody in a new kinematic state with no pending forces or integrator drift, so it can be reused
+
+        Parameters
+        ----------
+        pos : Vector3
+            Position of the rigidbody's CoG in space
+        vel : Vector3
+            Velocity of the rigidbody's CoG
+        ori : Quaternion
+            Rotation of the rigidbody about its CoG
+        angularVel : Vector3
+            Rotation of the rigidbody per second
+        """
+        self.pos = pos
+        self.vel = vel
+        self.ori = ori
+        self.angularVel = angularVel
+
+        self.acc = Vector3.Zero()
+        self.angularAcc = Vector3.Zero()
+        self.lastAcc = Vector3.Zero()
+
+        self.lastPos = pos
+        self.lastVel = vel
+        self.lastOri = ori
+        self.lastDt = 0
+
+        if self.integrator is not None:
+            self.integrator.reset()
+
+    def interpolate(self, fraction : float) -> Tuple[Vector3, Vector3, Quaternion]:
+        """
+        Returns the interpolated state within the last update step
+
+        Position uses a cubic Hermite spline, velocity is interpolated along the applied
+        acceleration and orientation uses slerp.
+
+        Parameters
+        ----------
+        fraction : float
+            Fraction (0-1) of the last step, 0 being its start and 1 the current state
+
+        Returns
+        -------
+        Tuple[Vector3, Vector3, Quaternion]
+            Interpolated position, velocity and orientation
+        """
+        pos = hermite(self.lastPos, self.lastVel, self.pos, self.vel, self.lastDt, fraction)
+        vel = hermite(self.lastVel, self.lastAcc, self.vel, self.lastAcc, self.lastDt, fraction)
+        ori = self.lastOri.slerp(self.ori, fraction)
+
+        return pos, vel, ori
+
     def applyForceCoM(self, force : Vector3) -> None:
         """
         Apply an inertial-frame force through the CoM of a Rgidbody
@@ -141,7 +379,7 @@ class Rigidbody:
         force : Vector3
             The force (in Newtons) to apply to this Rigidbody
         """
-        self.acc += force / float(self.mass)
+        self.acc += force / self.mass
 
     def applyForceCoMLocal(self, force : Vector3) -> None:
         """
@@ -164,8 +402,7 @@ class Rigidbody:
         torque : Vector3
             The torque (in Newton-meters) to apply to this Rigidbody
         """
-        torqueAcc = Vector3(torque.x / self.moi.x, torque.y / self.moi.y, torque.z / self.moi.z)
-        self.angularAcc += torqueAcc
+        self.angularAcc += self.torqueResponse() * torque
 
     def applyTorqueLocal(self, torque : Vector3) -> None:
         """
@@ -176,8 +413,7 @@ class Rigidbody:
         torque : Vector3
             The torque (in Newton-meters) to apply to this Rigidbody
         """
-        globalTorque = torque * self.ori
-        self.applyTorque(globalTorque)
+        self.angularAcc += self.inverseInertia() * torque
 
     def applyForce(self, force : Vector3, dis : Vector3) -> None:
         """
@@ -240,6 +476,8 @@ class AerodynamicRigidbody(Rigidbody):
         The reference area on which Cl is applied
     centerOfPressure : Vector3
         The local frame offset of the CoP from the CoM
+    aeroRate : MultiRate
+        Optional schedule evaluating the aerodynamic forces every few steps (built-in update only)
     """
 
     dragCoeff : Callable[[float], float] = lambda aoa : 0
@@ -250,6 +488,7 @@ class AerodynamicRigidbody(Rigidbody):
 
     globalWind : Vector3 = Vector3.Zero()
     airDensity : float = 1.225
+    aeroRate : Optional[Any] = None
 
     def __init__(self, mass : float = 1, moi : Union[float, Vector3] = 1, gravity : bool = True, pos : Vector3 = Vector3(0, 0, 0), vel : Vector3 = Vector3(0, 0, 0), ori : Quaternion = Quaternion.Zero(),
                 dragCoeff : Callable[[float], float] = lambda aoa : 0, liftCoeff : Callable[[float], float] = lambda aoa : 0, dragArea : float = 1, liftArea : float = 1, centerOfPressure : Vector3 = Vector3.Zero()) -> None:
@@ -279,6 +518,25 @@ class AerodynamicRigidbody(Rigidbody):
         self.liftArea = liftArea
         self.centerOfPressure = centerOfPressure
 
+    def reset(self, pos : Vector3, vel : Vector3, ori : Quaternion, angularVel : Vector3 = Vector3.Zero()) -> None:
+        """
+        Puts an AerodynamicRigidbody in a new kinematic state with no pending or held forces, so it can be reused
+
+        Parameters
+        ----------
+        pos : Vector3
+            Position of the rigidbody's CoG in space
+        vel : Vector3
+            Velocity of the rigidbody's CoG
+        ori : Quaternion
+            Rotation of the rigidbody about its CoG
+        angularVel : Vector3
+            Rotation of the rigidbody per second
+        """
+        super().reset(pos, vel, ori, angularVel)
+        if self.aeroRate is not None:
+            self.aeroRate.reset()
+
     def setWind(self, wind : Vector3) -> None:
         """
         Set the global wind vector
@@ -290,19 +548,27 @@ class AerodynamicRigidbody(Rigidbody):
         """
         self.globalWind = wind
 
-    def update(self, dt : float) -> None:
+    def aeroForces(self, vel : Vector3) -> Tuple[Vector3, Vector3]:
         """
-        Updates a Rigidbody given a time difference
+        Calculate the aerodynamic forces at a given velocity
 
         Parameters
         ----------
-        dt : float
-            Time difference for the update step
-        """
-        dt = float(dt)
+        vel : Vector3
+            Velocity of the CoG
 
+        Returns
+        -------
+        Tuple[Vector3, Vector3]
+            Global-frame drag and lift forces, acting at the center of pressure
+        """
         # Calculate the velocity relative to the wind
-        velRelWind = self.vel - self.globalWind
+        velRelWind = vel - self.globalWind
+        speed = velRelWind.norm()
+
+        # Still air exerts no aerodynamic force (and has no angle of attack)
+        if speed == 0:
+            return Vector3.Zero(), Vector3.Zero()
 
         # Calculate the angle of attack
         aoa = velRelWind.angle(Vector3.UnitZ())
@@ -312,11 +578,94 @@ class AerodynamicRigidbody(Rigidbody):
         liftCoeff = self.liftCoeff(aoa)
 
         # Calculate the drag and lift forces
-        dragForce = -velRelWind.normalized() * dragCoeff * self.dragArea * self.airDensity * velRelWind.norm() * velRelWind.norm() * 0.5
+        dragForce = -velRelWind.normalized() * dragCoeff * self.dragArea * self.airDensity * speed * speed * 0.5
         liftForce = Vector3.Zero()
 
+        return dragForce, liftForce
+
+    def derivatives(self, pos : Vector3, vel : Vector3, ori : Quaternion, angularVel : Vector3) -> Tuple[Vector3, Vector3]:
+        """
+        Returns the accelerations at a trial state within the current step, aerodynamics included
+
+        Parameters
+        ----------
+        pos : Vector3
+            Trial position of the CoG
+        vel : Vector3
+            Trial velocity of the CoG
+        ori : Quaternion
+            Trial orientation
+        angularVel : Vector3
+            Trial angular velocity
+
+        Returns
+        -------
+        Tuple[Vector3, Vector3]
+            Translational and rotational acceleration
+        """
+        dragForce, liftForce = self.aeroForces(vel)
+        force = dragForce + liftForce
+        torque = (self.centerOfPressure * ori).cross(force)
+
+        acc, angularAcc = super().derivatives(pos, vel, ori, angularVel)
+        return acc + force / self.mass, angularAcc + self.torqueAcc(torque, ori)
+
+    def update(self, dt : float) -> None:
+        """
+        Updates a Rigidbody given a time difference
+
+        Parameters
+        ----------
+        dt : float
+            Time difference for the update step
+        """
+        dt = dt if type(dt) is Dual else float(dt)
+
+        if self.integrator is not None:
+            # The integrator evaluates the aerodynamics at its own trial states
+            super().update(dt)
+            return
+
+        if self.aeroRate is None:
+            dragForce, liftForce = self.aeroForces(self.vel)
+        else:
+            dragForce, liftForce = self.aeroRate(lambda: self.aeroForces(self.vel))
+
         # Apply the forces globally with local offset
         self.applyGlobalForceLocal(dragForce, self.centerOfPressure)
         self.applyGlobalForceLocal(liftForce, self.centerOfPressure)
 
         super().update(dt)
+
+def refreshInertia(bodies : Sequence[Rigidbody]) -> None:
+    """
+    Refresh the cached torque responses of many bodies in one pass
+
+    Bodies with equal mass properties (e.g. children spawned from one parent, or scenarios
+    copied with replace()) share a single inverse inertia tensor. Bodies that do not rotate,
+    such as reduced-order point masses, are skipped.
+
+    Parameters
+    ----------
+    bodies : Sequence[Rigidbody]
+        Bodies about to be stepped
+    """
+    inverses : Dict[Tuple[Any, ...], Matrix3] = {}
+    fromQuaternion = Matrix3.FromQuaternion
+    for body in bodies:
+        if not isinstance(body, Rigidbody):
+            continue
+        key = body._inertiaKey()
+        if body._inverseFor != key:
+            shared = inverses.get(key)
+            if shared is None:
+                body.inverseInertia()
+            else:
+                body._inverseFor, body._inverse = key, shared
+                body._responseFor = None
+        inverses[key] = body._inverse
+        ori = body.ori
+        oriKey = (ori.w, ori.x, ori.y, ori.z)
+        if body._responseFor != oriKey:
+            body._response = body._inverse * fromQuaternion(ori.conj())
+            body._responseFor = oriKey
@@ -0,0 +1,554 @@
+import csv
+import math
+from array import array
+from collections import deque
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+Row = Tuple[float, ...]
+
+# Body attribute behind each channel that Recorder.recordBody() can sample
+CHANNEL_SOURCES = {"x": "pos.x", "y": "pos.y", "z": "pos.z",
+                   "vx": "vel.x", "vy": "vel.y", "vz": "vel.z",
+                   "ax": "lastAcc.x", "ay": "lastAcc.y", "az": "lastAcc.z",
+                   "qw": "ori.w", "qx": "ori.x", "qy": "ori.y", "qz": "ori.z",
+                   "wx": "globalWind.x", "wy": "globalWind.y", "wz": "globalWind.z"}
+
+DEFAULT_CHANNELS = ("time", "x", "y", "z", "vx", "vy", "vz", "ax", "ay", "az")
+
+# Sea-level defaults used by the derived aerodynamic channels
+AIR_DENSITY = 1.225
+SPEED_OF_SOUND = 340.29
+
+def _euler(recorder : 'Recorder', component : int) -> array:
+    # Same conversion as Quaternion.ToEuler(), over whole columns
+    atan2, asin, copysign = math.atan2, math.asin, math.copysign
+    out = array('d')
+    for w, x, y, z in zip(*(recorder.column(channel) for channel in ("qw", "qx", "qy", "qz"))):
+        if component == 0:
+            out.append(atan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z)))
+        elif component == 1:
+            sinp = 2 * (w * y - z * x)
+            out.append(copysign(math.pi / 2, sinp) if abs(sinp) >= 1 else asin(sinp))
+        else:
+            out.append(atan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y)))
+    return out
+
+def _airVelocity(recorder : 'Recorder') -> Iterator[Tuple[float, float, float]]:
+    # Velocity relative to the wind, which is taken as still air when its channels are not recorded
+    vx, vy, vz = (recorder.column(channel) for channel in ("vx", "vy", "vz"))
+    if all(channel in recorder.channels for channel in ("wx", "wy", "wz")):
+        wx, wy, wz = (recorder.column(channel) for channel in ("wx", "wy", "wz"))
+        return ((a - b, c - d, e - f) for a, b, c, d, e, f in zip(vx, wx, vy, wy, vz, wz))
+    return zip(vx, vy, vz)
+
+def _airspeed(recorder : 'Recorder') -> array:
+    sqrt = math.sqrt
+    return array('d', (sqrt(x * x + y * y + z * z) for x, y, z in _airVelocity(recorder)))
+
+def _angleOfAttack(recorder : 'Recorder') -> array:
+    # Angle between the air-relative velocity and the z axis, as in AerodynamicRigidbody
+    acos = math.acos
+    return array('d', (acos(max(-1.0, min(1.0, v[2] / speed))) if speed > 0 else 0.0
+                       for v, speed in zip(_airVelocity(recorder), recorder.column("airspeed"))))
+
+# Channels computed on demand from the recorded columns: name to (required channels, function of the recorder)
+DERIVED_CHANNELS : Dict[str, Tuple[Tuple[str, ...], Callable[['Recorder'], array]]] = {
+    "yaw": (("qw", "qx", "qy", "qz"), lambda recorder: _euler(recorder, 0)),
+    "pitch": (("qw", "qx", "qy", "qz"), lambda recorder: _euler(recorder, 1)),
+    "roll": (("qw", "qx", "qy", "qz"), lambda recorder: _euler(recorder, 2)),
+    "airspeed": (("vx", "vy", "vz"), _airspeed),
+    "aoa": (("vx", "vy", "vz"), _angleOfAttack),
+    "mach": (("vx", "vy", "vz"), lambda recorder: array('d', (v / recorder.speedOfSound for v in recorder.column("airspeed")))),
+    "dynamicPressure": (("vx", "vy", "vz"), lambda recorder: array('d', (0.5 * recorder.airDensity * v * v for v in recorder.column("airspeed")))),
+}
+
+class RecordingPolicy:
+    """
+    Base class for policies deciding which offered rows a Recorder stores
+
+    Rows are offered in time order and the policy returns the rows to store, which may
+    include earlier rows it held back. The first channel of every row is time.
+
+    Methods
+    -------
+    bind():
+        Tells the policy the channel layout of the rows
+    offer():
+        Offers a row and returns the rows to store
+    flush():
+        Returns any held-back rows that still need to be stored
+    reset():
+        Forgets all state so the next offered row starts afresh
+    """
+
+    def bind(self, channels : Sequence[str]) -> None:
+        """
+        Tell the policy the channel layout of the rows
+
+        Parameters
+        ----------
+        channels : Sequence[str]
+            Channel names, time first
+        """
+        self.channels = tuple(channels)
+        self.reset()
+
+    def offer(self, row : Row) -> List[Row]:
+        """
+        Offer a row and return the rows to store
+
+        Parameters
+        ----------
+        row : Row
+            Value of every channel
+
+        Returns
+        -------
+        List[Row]
+            Rows to store, in time order
+        """
+        return [row]
+
+    def flush(self) -> List[Row]:
+        """
+        Return any held-back rows that still need to be stored
+
+        Returns
+        -------
+        List[Row]
+            Rows to store, in time order
+        """
+        return []
+
+    def reset(self) -> None:
+        """
+        Forget all state so the next offered row starts afresh
+        """
+        pass
+
+class EveryStep(RecordingPolicy):
+    """
+    A policy that stores every offered row
+    """
+    pass
+
+class Decimate(RecordingPolicy):
+    """
+    A policy that stores every n-th offered row, plus the last one when flushed
+    """
+
+    def __init__(self, n : int) -> None:
+        """
+        Construct all necessary attributes for a Decimate object
+
+        Parameters
+        ----------
+        n : int
+            Number of offered rows per stored row
+        """
+
+        self.n = int(n)
+
+    def reset(self) -> None:
+        self._count = 0
+        self._last : Optional[Row] = None
+
+    def offer(self, row : Row) -> List[Row]:
+        stored = self._count % self.n == 0
+        self._count += 1
+        self._last = None if stored else row
+        return [row] if stored else []
+
+    def flush(self) -> List[Row]:
+        last, self._last = self._last, None
+        return [last] if last is not None else []
+
+class Deadband(RecordingPolicy):
+    """
+    A policy that stores a row when any channel moved further than its tolerance from the last stored row
+
+    Channels without a tolerance never trigger a store on their own.
+    """
+
+    def __init__(self, tolerances : Dict[str, float]) -> None:
+        """
+        Construct all necessary attributes for a Deadband object
+
+        Parameters
+        ----------
+        tolerances : Dict[str, float]
+            Allowed change of each channel before a row is stored
+        """
+
+        self.tolerances = dict(tolerances)
+
+    def bind(self, channels : Sequence[str]) -> None:
+        unknown = set(self.tolerances) - set(channels)
+        if unknown:
+            raise ValueError(f"Unknown channels: {', '.join(sorted(unknown))}")
+        self._checks = [(channels.index(name), tol) for name, tol in self.tolerances.items()]
+        super().bind(channels)
+
+    def reset(self) -> None:
+        self._stored : Optional[Row] = None
+        self._last : Optional[Row] = None
+
+    def offer(self, row : Row) -> List[Row]:
+        stored = self._stored
+        if stored is None or any(abs(row[i] - stored[i]) > tol for i, tol in self._checks):
+            self._stored = row
+            self._last = None
+            return [row]
+        self._last = row
+        return []
+
+    def flush(self) -> List[Row]:
+        last, self._last = self._last, None
+        return [last] if last is not None else []
+
+class PiecewiseLinear(RecordingPolicy):
+    """
+    A policy that only stores the rows needed to rebuild every channel within its tolerance by linear interpolation
+
+    Implements swing-door compression: the slopes from the last stored row that keep every
+    skipped row within tolerance are tracked per channel, and the previous row is stored once
+    the newest row falls outside them. Channels without a tolerance are interpolated freely.
+    """
+
+    def __init__(self, tolerances : Dict[str, float]) -> None:
+        """
+        Construct all necessary attributes for a PiecewiseLinear object
+
+        Parameters
+        ----------
+        tolerances : Dict[str, float]
+            Maximum reconstruction error of each channel
+        """
+
+        self.tolerances = dict(tolerances)
+
+    def bind(self, channels : Sequence[str]) -> None:
+        unknown = set(self.tolerances) - set(channels)
+        if unknown:
+            raise ValueError(f"Unknown channels: {', '.join(sorted(unknown))}")
+        self._checks = [(channels.index(name), tol) for name, tol in self.tolerances.items()]
+        super().bind(channels)
+
+    def reset(self) -> None:
+        self._anchor : Optional[Row] = None
+        self._last : Optional[Row] = None
+        self._low = [-math.inf] * len(self._checks)
+        self._high = [math.inf] * len(self._checks)
+
+    def _narrow(self, row : Row) -> None:
+        anchor = self._anchor
+        dt = row[0] - anchor[0]
+        for k, (i, tol) in enumerate(self._checks):
+            self._low[k] = max(self._low[k], (row[i] - tol - anchor[i]) / dt)
+            self._high[k] = min(self._high[k], (row[i] + tol - anchor[i]) / dt)
+
+    def offer(self, row : Row) -> List[Row]:
+        anchor = self._anchor
+        if anchor is None:
+            self._anchor = row
+            return [row]
+
+        dt = row[0] - anchor[0]
+        for k, (i, tol) in enumerate(self._checks):
+            slope = (row[i] - anchor[i]) / dt
+            if slope < self._low[k] or slope > self._high[k]:
+                # The line to this row would miss a skipped row, so keep the previous one
+                stored = self._last
+                self._anchor = stored
+                self._low = [-math.inf] * len(self._checks)
+                self._high = [math.inf] * len(self._checks)
+                self._narrow(row)
+                self._last = row
+                return [stored]
+
+        self._narrow(row)
+        self._last = row
+        return []
+
+    def flush(self) -> List[Row]:
+        last, self._last = self._last, None
+        if last is None:
+            return []
+        self._anchor = last
+        self._low = [-math.inf] * len(self._checks)
+        self._high = [math.inf] * len(self._checks)
+        return [last]
+
+class EventBurst(RecordingPolicy):
+    """
+    A policy that stores every row around events, and defers to another policy otherwise
+
+    When the trigger fires, the last `before` rows and the next `after` rows are stored in full.
+    """
+
+    def __init__(self, trigger : Callable[[Dict[str, float]], bool], before : int = 10, after : int = 100, base : Optional[RecordingPolicy] = None) -> None:
+        """
+        Construct all necessary attributes for an EventBurst object
+
+        Parameters
+        ----------
+        trigger : Callable[[Dict[str, float]], bool]
+            Function of a row (as a channel name to value mapping) that returns True on an event
+        before : int
+            Number of rows before the event to store
+        after : int
+            Number of rows after the event to store
+        base : RecordingPolicy
+            Policy used outside of bursts (defaults to storing nothing)
+        """
+
+        self.trigger = trigger
+        self.before = int(before)
+        self.after = int(after)
+        self.base = base
+
+    def bind(self, channels : Sequence[str]) -> None:
+        if self.base is not None:
+            self.base.bind(channels)
+        super().bind(channels)
+
+    def reset(self) -> None:
+        self._history : deque = deque(maxlen = self.before)
+        self._remaining = 0
+        self._lastTime = -math.inf
+        if self.base is not None:
+            self.base.reset()
+
+    def _emit(self, rows : List[Row]) -> List[Row]:
+        emitted = []
+        for row in sorted(rows, key = lambda r : r[0]):
+            if row[0] > self._lastTime:
+                emitted.append(row)
+                self._lastTime = row[0]
+        return emitted
+
+    def offer(self, row : Row) -> List[Row]:
+        if self.trigger(dict(zip(self.channels, row))):
+            rows = list(self._history) + [row]
+            if self._remaining == 0 and self.base is not None:
+                rows += self.base.flush()
+            self._history.clear()
+            self._remaining = self.after
+            return self._emit(rows)
+
+        if self._remaining > 0:
+            self._remaining -= 1
+            if self._remaining == 0 and self.base is not None:
+                self.base.reset()
+            return self._emit([row])
+
+        self._history.append(row)
+        if self.base is None:
+            return []
+        return self._emit(self.base.offer(row))
+
+    def flush(self) -> List[Row]:
+        if self.base is None or self._remaining > 0:
+            return []
+        return self._emit(self.base.flush())
+
+class Recorder:
+    """
+    A class to record telemetry channels into typed columns
+
+    A recording policy decides which offered rows are stored, so slowly changing parts of a
+    trajectory can be recorded sparsely.
+
+    ...
+
+    Attributes
+    ----------
+    channels : Tuple[str, ...]
+        Names of the recorded channels, time first
+    policy : RecordingPolicy
+        Policy deciding which offered rows are stored
+    columns : Dict[str, array]
+        Stored values of every channel
+    derived : Tuple[str, ...]
+        Names of the derived channels (see DERIVED_CHANNELS), computed only when read
+    airDensity : float
+        Air density used by the dynamic pressure channel
+    speedOfSound : float
+        Speed of sound used by the Mach channel
+    writer : TelemetryWriter
+        Optional background writer the filled columns are handed to
+
+    Methods
+    -------
+    column():
+        Returns the values of a recorded or derived channel
+    record():
+        Offers a row of channel values
+    recordBody():
+        Offers the current state of a body
+    flush():
+        Stores any rows held back by the policy and hands unwritten rows to the writer
+    rows():
+        Returns the stored rows as channel name to value mappings
+    writeCSV():
+        Writes the stored rows to a CSV file
+    """
+
+    def __init__(self, channels : Sequence[str] = DEFAULT_CHANNELS, policy : Optional[RecordingPolicy] = None, derived : Sequence[str] = (),
+                 airDensity : float = AIR_DENSITY, speedOfSound : float = SPEED_OF_SOUND, writer : Optional[Any] = None) -> None:
+        """
+        Construct all necessary attributes for a Recorder object
+
+        Parameters
+        ----------
+        channels : Sequence[str]
+            Names of the recorded channels, time first
+        policy : RecordingPolicy
+            Policy deciding which offered rows are stored (defaults to every row)
+        derived : Sequence[str]
+            Names of the derived channels (see DERIVED_CHANNELS)
+        airDensity : float
+            Air density used by the dynamic pressure channel
+        speedOfSound : float
+            Speed of sound used by the Mach channel
+        writer : TelemetryWriter
+            Optional background writer; every writer.chunkRows stored rows the filled columns
+            are handed to it and recording goes on in fresh ones, so columns only hold the rows
+            not written yet
+        """
+
+        if not channels or channels[0] != "time":
+            raise ValueError("The first recorded channel must be time")
+        for name in derived:
+            if name not in DERIVED_CHANNELS:
+                raise ValueError(f"Unknown derived channel: {name}")
+            missing = [channel for channel in DERIVED_CHANNELS[name][0] if channel not in channels]
+            if missing:
+                raise ValueError(f"Derived channel {name} needs the channels {', '.join(missing)}")
+
+        self.derived = tuple(derived)
+        self.airDensity = airDensity
+        self.speedOfSound = speedOfSound
+        self._cache : Dict[str, Tuple[int, array]] = {}
+        self.writer = writer
+        if writer is not None and writer.channels != tuple(channels):
+            raise ValueError("The writer must have the recorded channels")
+
+        self.channels = tuple(channels)
+        self.policy = policy if policy is not None else EveryStep()
+        self.policy.bind(self.channels)
+        self.columns : Dict[str, array] = {channel: array('d') for channel in self.channels}
+
+        self._columns = [self.columns[channel] for channel in self.channels]
+        self._getters = [attrgetter(CHANNEL_SOURCES[channel]) for channel in self.channels[1:] if channel in CHANNEL_SOURCES]
+        self._bodyChannels = len(self._getters) == len(self.channels) - 1
+
+    def __len__(self) -> int:
+        return len(self._columns[0])
+
+    def _store(self, rows : List[Row]) -> None:
+        for row in rows:
+            for column, value in zip(self._columns, row):
+                column.append(value)
+        if self.writer is not None and len(self._columns[0]) >= self.writer.chunkRows:
+            self._handOff()
+
+    def _handOff(self) -> None:
+        # Swap the filled buffers out to the writer and keep recording into fresh ones
+        self.writer.write(self.columns)
+        self.columns = {channel: array('d') for channel in self.channels}
+        self._columns = [self.columns[channel] for channel in self.channels]
+        self._cache = {}
+
+    def column(self, channel : str) -> array:
+        """
+        Return the values of a recorded or derived channel
+
+        A derived channel is computed from the stored columns the first time it is read and
+        kept until more rows are stored.
+
+        Parameters
+        ----------
+        channel : str
+            Name of the channel
+
+        Returns
+        -------
+        array
+            Value of the channel at every stored row
+        """
+        if channel in self.columns:
+            return self.columns[channel]
+        if channel not in DERIVED_CHANNELS or not all(c in self.columns for c in DERIVED_CHANNELS[channel][0]):
+            raise KeyError(f"{channel} is neither recorded nor derivable from the recorded channels")
+
+        cached = self._cache.get(channel)
+        if cached is not None and cached[0] == len(self):
+            return cached[1]
+        values = DERIVED_CHANNELS[channel][1](self)
+        self._cache[channel] = (len(self), values)
+        return values
+
+    def record(self, row : Sequence[float]) -> None:
+        """
+        Offer a row of channel values
+
+        Parameters
+        ----------
+        row : Sequence[float]
+            Value of every channel, in channel order
+        """
+        self._store(self.policy.offer(tuple(row)))
+
+    def recordBody(self, time : float, body) -> None:
+        """
+        Offer the current state of a body
+
+        Parameters
+        ----------
+        time : float
+            Sim time of the state
+        body : Rigidbody
+            Body to sample
+        """
+        if not self._bodyChannels:
+            raise ValueError("recordBody() needs every channel after time to be in CHANNEL_SOURCES")
+        self._store(self.policy.offer((time,) + tuple(getter(body) for getter in self._getters)))
+
+    def flush(self) -> None:
+        """
+        Store any rows held back by the policy, and hand any unwritten rows to the writer
+        """
+        self._store(self.policy.flush())
+        if self.writer is not None and len(self):
+            self._handOff()
+
+    def rows(self) -> Iterator[Dict[str, float]]:
+        """
+        Return the stored rows as channel name to value mappings, derived channels included
+
+        Returns
+        -------
+        Iterator[Dict[str, float]]
+            Stored rows in time order
+        """
+        names = self.channels + self.derived
+        for values in zip(*self._columns, *(self.column(name) for name in self.derived)):
+            yield dict(zip(names, values))
+
+    def writeCSV(self, path : str) -> None:
+        """
+        Flush the policy and write the stored rows to a CSV file
+
+        Parameters
+        ----------
+        path : str
+            Path of the CSV file
+        """
+        self.flush()
+        with open(path, 'w', newline='') as csv_file:
+            writer : csv.DictWriter = csv.DictWriter(csv_file, fieldnames=list(self.channels + self.derived))
+            writer.writeheader()
+            for row in self.rows():
+                writer.writerow(row)
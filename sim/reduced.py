@@ -0,0 +1,380 @@
+from typing import Any, Callable, Optional, Tuple
+
+from core.vector import *
+from core.quaternion import *
+from sim.dense import hermite
+from sim.physics import AerodynamicRigidbody
+
+# Body models a Scenario can be built as, as accepted by Scenario.dof
+DEGREES_OF_FREEDOM = ("6dof", "3dof", "planar")
+
+class PointMass:
+    """
+    A class to represent a 3-DOF point mass with aerodynamic drag
+
+    It offers the parts of the AerodynamicRigidbody interface used by Scenario.run(),
+    Simulation, Recorder and controllers, so it can stand in for one where rotation does not
+    matter. Its orientation stays fixed and torques are ignored.
+
+    ...
+
+    Attributes
+    ----------
+    mass : float
+        Mass of the body (in kg)
+    gravity : bool
+        Whether or not to apply gravity to this body
+    pos : Vector3
+        Position of the body
+    vel : Vector3
+        Velocity of the body
+    acc : Vector3
+        Acceleration from the forces applied in the current step
+    ori : Quaternion
+        Fixed orientation of the body, kept for the orientation channels and promote()
+    dragCoeff : Callable[[float], float] -> float
+        The function that relates angle of attack to drag coefficient
+    dragArea : float
+        The reference area on which Cd is applied
+    globalWind : Vector3
+        Global wind vector
+    integrator : Integrator
+        Optional integration scheme for update() (None for the built-in semi-implicit Euler)
+    aeroRate : MultiRate
+        Optional schedule evaluating the aerodynamic forces every few steps (built-in update only)
+
+    Methods
+    -------
+    update():
+        Updates a PointMass given a time difference
+    derivatives():
+        Returns the accelerations at a trial state within the current step
+    reset():
+        Puts a PointMass in a new kinematic state with no pending or held forces, so it can be reused
+    interpolate():
+        Returns the interpolated state within the last update step
+    setWind():
+        Set the global wind vector
+    applyForceCoM():
+        Apply an inertial-frame force to a PointMass
+    applyTorque():
+        Ignores a torque
+    promote():
+        Returns a 6-DOF body in the current state of this one
+    """
+
+    # A point mass does not rotate
+    liftCoeff = staticmethod(lambda aoa : 0)
+    angularVel = Vector3.Zero()
+    angularAcc = Vector3.Zero()
+    airDensity = 1.225
+
+    # Same aerodynamic model as a non-rotating AerodynamicRigidbody
+    aeroForces = AerodynamicRigidbody.aeroForces
+
+    def __init__(self, mass : float = 1, gravity : bool = True, pos : Vector3 = Vector3(0, 0, 0), vel : Vector3 = Vector3(0, 0, 0), ori : Quaternion = Quaternion.Zero(),
+                 dragCoeff : Callable[[float], float] = lambda aoa : 0, dragArea : float = 1) -> None:
+        """
+        Construct all necessary attributes for a PointMass object
+
+        Parameters
+        ----------
+        mass : float
+            Mass of the body (in kg)
+        gravity : bool
+            Whether or not to apply gravity to this body
+        pos : Vector3
+            Initial position of the body
+        vel : Vector3
+            Initial velocity of the body
+        ori : Quaternion
+            Fixed orientation of the body
+        dragCoeff : Callable[[float], float] -> float
+            The function that relates angle of attack to drag coefficient
+        dragArea : float
+            The reference area on which Cd is applied
+        """
+
+        self.mass = mass if type(mass) is Dual else float(mass)
+        self.gravity = gravity
+        self.dragCoeff = dragCoeff
+        self.dragArea = dragArea
+        self.globalWind = Vector3.Zero()
+        self.integrator : Optional[Any] = None
+        self.aeroRate : Optional[Any] = None
+        self.reset(pos, vel, ori)
+
+    def update(self, dt : float) -> None:
+        """
+        Updates a PointMass given a time difference
+
+        Parameters
+        ----------
+        dt : float
+            Time difference for the update step
+        """
+        dt = dt if type(dt) is Dual else float(dt)
+
+        self.lastPos = self.pos
+        self.lastVel = self.vel
+        self.lastDt = dt
+
+        if self.integrator is not None:
+            self.integrator.step(self, dt)
+        else:
+            if self.aeroRate is None:
+                dragForce, liftForce = self.aeroForces(self.vel)
+            else:
+                dragForce, liftForce = self.aeroRate(lambda: self.aeroForces(self.vel))
+            self.acc += dragForce / self.mass
+            self.acc += liftForce / self.mass
+
+            if self.gravity:
+                self.acc += Vector3(0, 0, -9.807)
+
+            self.vel += self.acc * dt
+            self.pos += self.vel * dt
+
+        self.lastAcc = self.acc
+        self.acc = Vector3.Zero()
+
+    def derivatives(self, pos : Vector3, vel : Vector3, ori : Quaternion, angularVel : Vector3) -> Tuple[Vector3, Vector3]:
+        """
+        Returns the accelerations at a trial state within the current step
+
+        Parameters
+        ----------
+        pos : Vector3
+            Trial position
+        vel : Vector3
+            Trial velocity
+        ori : Quaternion
+            Trial orientation (unused)
+        angularVel : Vector3
+            Trial angular velocity (unused)
+
+        Returns
+        -------
+        Tuple[Vector3, Vector3]
+            Translational acceleration, and a zero rotational acceleration
+        """
+        dragForce, liftForce = self.aeroForces(vel)
+        acc = self.acc + (dragForce + liftForce) / self.mass
+        if self.gravity:
+            acc = acc + Vector3(0, 0, -9.807)
+        return acc, Vector3.Zero()
+
+    def reset(self, pos : Vector3, vel : Vector3, ori : Optional[Quaternion] = None, angularVel : Optional[Vector3] = None) -> None:
+        """
+        Puts a PointMass in a new kinematic state with no pending or held forces, so it can be reused
+
+        Parameters
+        ----------
+        pos : Vector3
+            Position of the body
+        vel : Vector3
+            Velocity of the body
+        ori : Quaternion
+            Fixed orientation of the body (unchanged if None)
+        angularVel : Vector3
+            Ignored, a point mass does not rotate
+        """
+        self.pos = pos
+        self.vel = vel
+        if ori is not None:
+            self.ori = ori
+
+        self.acc = Vector3.Zero()
+        self.lastAcc = Vector3.Zero()
+        self.lastPos = pos
+        self.lastVel = vel
+        self.lastDt = 0
+
+        if self.integrator is not None:
+            self.integrator.reset()
+        if self.aeroRate is not None:
+            self.aeroRate.reset()
+
+    def interpolate(self, fraction : float) -> Tuple[Vector3, Vector3, Quaternion]:
+        """
+        Returns the interpolated state within the last update step
+
+        Parameters
+        ----------
+        fraction : float
+            Fraction (0-1) of the last step, 0 being its start and 1 the current state
+
+        Returns
+        -------
+        Tuple[Vector3, Vector3, Quaternion]
+            Interpolated position, velocity and orientation
+        """
+        pos = hermite(self.lastPos, self.lastVel, self.pos, self.vel, self.lastDt, fraction)
+        vel = hermite(self.lastVel, self.lastAcc, self.vel, self.lastAcc, self.lastDt, fraction)
+        return pos, vel, self.ori
+
+    def setWind(self, wind : Vector3) -> None:
+        """
+        Set the global wind vector
+
+        Parameters
+        ----------
+        wind : Vector3
+            The global wind vector
+        """
+        self.globalWind = wind
+
+    def applyForceCoM(self, force : Vector3) -> None:
+        """
+        Apply an inertial-frame force to a PointMass
+
+        Parameters
+        ----------
+        force : Vector3
+            The force (in Newtons) to apply to this body
+        """
+        self.acc += force / self.mass
+
+    def applyTorque(self, torque : Vector3) -> None:
+        """
+        Ignore a torque, a point mass does not rotate
+
+        Parameters
+        ----------
+        torque : Vector3
+            The torque (in Newton-meters) that would be applied
+        """
+        pass
+
+    def promote(self, moi : Any = 1, angularVel : Vector3 = Vector3.Zero()) -> AerodynamicRigidbody:
+        """
+        Return a 6-DOF body in the current state of this one, to continue a run in full
+
+        Parameters
+        ----------
+        moi : float OR Vector3 OR Matrix3
+            Moment of inertia of the new body (see Rigidbody)
+        angularVel : Vector3
+            Initial angular velocity of the new body
+
+        Returns
+        -------
+        AerodynamicRigidbody
+            Body with the same mass, aerodynamics, wind and kinematic state
+        """
+        body = AerodynamicRigidbody(mass = self.mass, moi = moi, gravity = self.gravity, pos = self.pos, vel = self.vel, ori = self.ori,
+                                    dragCoeff = self.dragCoeff, dragArea = self.dragArea)
+        body.angularVel = angularVel
+        body.airDensity = self.airDensity
+        body.setWind(self.globalWind)
+        return body
+
+class PlanarBody(PointMass):
+    """
+    A class to represent a point mass flying in a vertical plane, integrated on Vector2
+
+    The plane contains the initial horizontal velocity. The planar state (downrange, altitude)
+    is mirrored into pos, vel and lastAcc after every step for the shared machinery. Forces
+    and wind are projected onto the plane, so crosswind is ignored.
+
+    ...
+
+    Attributes
+    ----------
+    origin : Vector3
+        Point of the plane at zero downrange and altitude
+    heading : Vector3
+        Horizontal unit vector of the downrange direction
+    planarPos : Vector2
+        Downrange distance and altitude of the body
+    planarVel : Vector2
+        Downrange and vertical velocity of the body
+    """
+
+    def update(self, dt : float) -> None:
+        dt = dt if type(dt) is Dual else float(dt)
+
+        if self.integrator is not None:
+            raise ValueError("Planar bodies only support the built-in integrator")
+
+        self.lastPos = self.pos
+        self.lastVel = self.vel
+        self.lastDt = dt
+
+        if self.aeroRate is None:
+            dragForce = self.planarDrag(self.planarVel)
+        else:
+            dragForce, = self.aeroRate(lambda: (self.planarDrag(self.planarVel),))
+        acc = self.planarAcc + dragForce / self.mass
+
+        if self.gravity:
+            acc += Vector2(0, -9.807)
+
+        self.planarVel += acc * dt
+        self.planarPos += self.planarVel * dt
+        self.planarAcc = Vector2.Zero()
+
+        heading, origin = self.heading, self.origin
+        self.pos = Vector3(origin.x + heading.x * self.planarPos.x, origin.y + heading.y * self.planarPos.x, self.planarPos.y)
+        self.vel = Vector3(heading.x * self.planarVel.x, heading.y * self.planarVel.x, self.planarVel.y)
+        self.lastAcc = Vector3(heading.x * acc.x, heading.y * acc.x, acc.y)
+
+    def planarDrag(self, vel : Vector2) -> Vector2:
+        """
+        Calculate the in-plane drag force at a given planar velocity
+
+        Parameters
+        ----------
+        vel : Vector2
+            Downrange and vertical velocity
+
+        Returns
+        -------
+        Vector2
+            Drag force in the plane
+        """
+        wind = self.globalWind
+        velRelWind = vel - Vector2(wind.x * self.heading.x + wind.y * self.heading.y, wind.z)
+        speed = velRelWind.norm()
+        if speed == 0:
+            return Vector2.Zero()
+        aoa = velRelWind.angle(Vector2.UnitY())
+        return -velRelWind.normalized() * self.dragCoeff(aoa) * self.dragArea * self.airDensity * speed * speed * 0.5
+
+    def reset(self, pos : Vector3, vel : Vector3, ori : Optional[Quaternion] = None, angularVel : Optional[Vector3] = None) -> None:
+        """
+        Puts a PlanarBody in a new kinematic state with no pending or held forces, laying its plane along the horizontal velocity
+
+        Parameters
+        ----------
+        pos : Vector3
+            Position of the body
+        vel : Vector3
+            Velocity of the body (its component across the plane is dropped)
+        ori : Quaternion
+            Fixed orientation of the body (unchanged if None)
+        angularVel : Vector3
+            Ignored, a planar point mass does not rotate
+        """
+        horizontal = Vector2(vel.x, vel.y).norm()
+        if horizontal > 0:
+            self.heading = Vector3(vel.x / horizontal, vel.y / horizontal, 0)
+        elif not hasattr(self, "heading"):
+            self.heading = Vector3.UnitX()
+        self.origin = Vector3(pos.x, pos.y, 0)
+        self.planarPos = Vector2(0, pos.z)
+        self.planarVel = Vector2(vel.x * self.heading.x + vel.y * self.heading.y, vel.z)
+        self.planarAcc = Vector2.Zero()
+
+        super().reset(pos, Vector3(self.heading.x * self.planarVel.x, self.heading.y * self.planarVel.x, vel.z), ori)
+
+    def applyForceCoM(self, force : Vector3) -> None:
+        """
+        Apply the in-plane part of an inertial-frame force to a PlanarBody
+
+        Parameters
+        ----------
+        force : Vector3
+            The force (in Newtons) to apply to this body
+        """
+        self.planarAcc += Vector2(force.x * self.heading.x + force.y * self.heading.y, force.z) / self.mass
@@ -0,0 +1,319 @@
+import json
+import random
+import struct
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from core.vector import *
+from sim.dense import DenseTrajectory
+from sim.recorder import DEFAULT_CHANNELS, Recorder, RecordingPolicy
+from sim.scenario import Scenario, ScenarioResult
+
+# File layout: magic, header size, JSON header, then the zlib-compressed input events
+REPLAY_MAGIC = b"PREPLAY1"
+REPLAY_EVENT = struct.Struct("<IB3d")
+
+# Held inputs a controller can command; each stays applied until commanded again
+INPUT_KINDS = ("wind", "force", "torque")
+
+class InputCommands:
+    """
+    A class to collect the inputs a controller commands during a recorded run
+
+    ...
+
+    Attributes
+    ----------
+    wind : Vector3
+        Commanded global wind
+    force : Vector3
+        Commanded inertial-frame force through the CoM
+    torque : Vector3
+        Commanded inertial-frame torque
+
+    Methods
+    -------
+    setWind():
+        Commands the global wind
+    setForce():
+        Commands a force through the CoM
+    setTorque():
+        Commands a torque
+    """
+
+    def __init__(self, wind : Vector3) -> None:
+        """
+        Construct all necessary attributes for an InputCommands object
+
+        Parameters
+        ----------
+        wind : Vector3
+            Initial global wind
+        """
+
+        self.wind = wind
+        self.force = Vector3.Zero()
+        self.torque = Vector3.Zero()
+
+    def setWind(self, wind : Vector3) -> None:
+        """Command the global wind from this step on"""
+        self.wind = wind
+
+    def setForce(self, force : Vector3) -> None:
+        """Command an inertial-frame force through the CoM from this step on"""
+        self.force = force
+
+    def setTorque(self, torque : Vector3) -> None:
+        """Command an inertial-frame torque from this step on"""
+        self.torque = torque
+
+class _HeldInputs:
+    # Applies held inputs to the body before every step; shared by recording and replay so both take the same path
+    def __init__(self, wind : Vector3) -> None:
+        self.wind = wind
+        self.force = Vector3.Zero()
+        self.torque = Vector3.Zero()
+
+    def apply(self, body) -> None:
+        body.setWind(self.wind)
+        if self.force != Vector3.Zero():
+            body.applyForceCoM(self.force)
+        if self.torque != Vector3.Zero():
+            body.applyTorque(self.torque)
+
+class ReplayLog:
+    """
+    A class to represent a run by its inputs alone, for deterministic re-simulation
+
+    The log keeps the scenario, the seed handed to the controller and every change of a held
+    input (wind, force, torque) with the step it took effect on. Replaying applies the same
+    inputs through the same code path, so every channel is regenerated bit for bit.
+
+    ...
+
+    Attributes
+    ----------
+    scenario : Scenario
+        Initial state and configuration of the run
+    seed : int
+        Seed of the random generator handed to the controller
+    events : List[Tuple[int, str, Vector3]]
+        Step, input kind and value of every input change, in step order
+    summary : Dict[str, Any]
+        Outcome of the recorded run, used by verify()
+
+    Factories
+    ---------
+    Record():
+        Runs a scenario under a controller and logs its inputs
+    Load():
+        Reads a log written by save()
+
+    Methods
+    -------
+    replay():
+        Re-simulates the run
+    telemetry():
+        Re-simulates the run into a Recorder
+    dense():
+        Re-simulates the run into a DenseTrajectory, for output at any rate
+    verify():
+        Returns whether a replay reproduces the recorded outcome exactly
+    save():
+        Writes the log to a file
+    """
+
+    def __init__(self, scenario : Scenario, seed : Optional[int] = None, events : Sequence[Tuple[int, str, Vector3]] = (),
+                 summary : Optional[Dict[str, Any]] = None) -> None:
+        """
+        Construct all necessary attributes for a ReplayLog object
+
+        Parameters
+        ----------
+        scenario : Scenario
+            Initial state and configuration of the run
+        seed : int
+            Seed of the random generator handed to the controller
+        events : Sequence[Tuple[int, str, Vector3]]
+            Step, input kind and value of every input change, in step order
+        summary : Dict[str, Any]
+            Outcome of the recorded run
+        """
+
+        self.scenario = scenario
+        self.seed = seed
+        self.events = list(events)
+        self.summary = summary if summary is not None else {}
+
+    @classmethod
+    def Record(cls, scenario : Scenario, controller : Optional[Callable[[float, Any, InputCommands, random.Random], None]] = None,
+               seed : Optional[int] = None, observer : Optional[Callable[[float, Any], None]] = None) -> Tuple['ReplayLog', ScenarioResult]:
+        """
+        Run a scenario under a controller and log the inputs it commands
+
+        Parameters
+        ----------
+        scenario : Scenario
+            Scenario to run
+        controller : Callable[[float, Rigidbody, InputCommands, Random], None]
+            Function called before every step with the sim time, the body, the input commands
+            and a random generator seeded with seed
+        seed : int
+            Seed of the controller's random generator
+        observer : Callable[[float, Rigidbody], None]
+            Optional function called after every step with the sim time and the body
+
+        Returns
+        -------
+        Tuple[ReplayLog, ScenarioResult]
+            Log of the run and its outcome
+        """
+        log = cls(scenario, seed)
+        rng = random.Random(seed)
+        commands = InputCommands(scenario.wind)
+        held = _HeldInputs(scenario.wind)
+        step = [0]
+
+        def control(time : float, body) -> None:
+            if controller is not None:
+                controller(time, body, commands, rng)
+                for kind in INPUT_KINDS:
+                    value = getattr(commands, kind)
+                    if value != getattr(held, kind):
+                        setattr(held, kind, value)
+                        log.events.append((step[0], kind, value))
+            held.apply(body)
+            step[0] += 1
+
+        result = scenario.run(observer, controller = control)
+        log.summary = cls._summarize(result)
+        return log, result
+
+    @staticmethod
+    def _summarize(result : ScenarioResult) -> Dict[str, Any]:
+        return {"impact": [result.impact.x, result.impact.y, result.impact.z], "landed": result.landed,
+                "flightTime": result.flightTime, "steps": result.steps}
+
+    def replay(self, observer : Optional[Callable[[float, Any], None]] = None) -> ScenarioResult:
+        """
+        Re-simulate the run from its logged inputs
+
+        Parameters
+        ----------
+        observer : Callable[[float, Rigidbody], None]
+            Optional function called after every step with the sim time and the body
+
+        Returns
+        -------
+        ScenarioResult
+            Outcome of the run
+        """
+        held = _HeldInputs(self.scenario.wind)
+        events = self.events
+        state = [0, 0]
+
+        def control(time : float, body) -> None:
+            step, index = state
+            while index < len(events) and events[index][0] == step:
+                setattr(held, events[index][1], events[index][2])
+                index += 1
+            held.apply(body)
+            state[0] = step + 1
+            state[1] = index
+
+        return self.scenario.run(observer, controller = control)
+
+    def telemetry(self, channels : Sequence[str] = DEFAULT_CHANNELS, policy : Optional[RecordingPolicy] = None) -> Recorder:
+        """
+        Re-simulate the run into a Recorder
+
+        Parameters
+        ----------
+        channels : Sequence[str]
+            Recorded channels, time first (see CHANNEL_SOURCES)
+        policy : RecordingPolicy
+            Policy deciding which steps are stored (e.g. Decimate for a lower rate)
+
+        Returns
+        -------
+        Recorder
+            Regenerated telemetry
+        """
+        recorder = Recorder(channels, policy)
+        self.replay(recorder.recordBody)
+        recorder.flush()
+        return recorder
+
+    def dense(self, every : int = 1) -> DenseTrajectory:
+        """
+        Re-simulate the run into a DenseTrajectory, whose resample() gives the state at any rate
+
+        Parameters
+        ----------
+        every : int
+            Number of steps per stored sample
+
+        Returns
+        -------
+        DenseTrajectory
+            Regenerated trajectory
+        """
+        trajectory = DenseTrajectory(every)
+        self.replay(trajectory.observe)
+        return trajectory
+
+    def verify(self) -> bool:
+        """
+        Return whether a replay reproduces the recorded outcome exactly
+
+        Returns
+        -------
+        bool
+            True if the impact point, flight time and step count match bit for bit
+        """
+        return self._summarize(self.replay()) == self.summary
+
+    def save(self, path : str) -> None:
+        """
+        Write the log to a file
+
+        Parameters
+        ----------
+        path : str
+            Path of the file
+        """
+        header = json.dumps({"scenario": self.scenario.toDict(), "seed": self.seed, "events": len(self.events),
+                             "summary": self.summary}).encode()
+        events = b"".join(REPLAY_EVENT.pack(step, INPUT_KINDS.index(kind), value.x, value.y, value.z) for step, kind, value in self.events)
+        with open(path, 'wb') as replay_file:
+            replay_file.write(REPLAY_MAGIC + struct.pack("<I", len(header)) + header)
+            replay_file.write(zlib.compress(events))
+
+    @classmethod
+    def Load(cls, path : str) -> 'ReplayLog':
+        """
+        Construct a ReplayLog object from a file written by save()
+
+        Parameters
+        ----------
+        path : str
+            Path of the file
+
+        Returns
+        -------
+        ReplayLog
+            Loaded log
+        """
+        with open(path, 'rb') as replay_file:
+            data = replay_file.read()
+        if not data.startswith(REPLAY_MAGIC):
+            raise ValueError(f"{path} is not a replay log")
+
+        offset = len(REPLAY_MAGIC)
+        size, = struct.unpack_from("<I", data, offset)
+        offset += 4
+        header = json.loads(data[offset:offset + size])
+        events = [(step, INPUT_KINDS[kind], Vector3(x, y, z)) for step, kind, x, y, z in REPLAY_EVENT.iter_unpack(zlib.decompress(data[offset + size:]))]
+        if len(events) != header["events"]:
+            raise ValueError(f"{path} is truncated")
+        return cls(Scenario.FromDict(header["scenario"]), header["seed"], events, header["summary"])
@@ -0,0 +1,513 @@
+import random
+from statistics import NormalDist
+from typing import Dict, Iterator, List, Optional
+
+from core.vector import *
+from core.quaternion import *
+from sim.scenario import Scenario
+
+# Joe & Kuo (2008) primitive polynomials and initial direction numbers for dimensions 2-21,
+# stored as (degree, polynomial coefficients, initial direction numbers)
+SOBOL_DIRECTIONS = [
+    (1, 0, (1,)),
+    (2, 1, (1, 3)),
+    (3, 1, (1, 3, 1)),
+    (3, 2, (1, 1, 1)),
+    (4, 1, (1, 1, 3, 3)),
+    (4, 4, (1, 3, 5, 13)),
+    (5, 2, (1, 1, 5, 5, 17)),
+    (5, 4, (1, 1, 5, 5, 5)),
+    (5, 7, (1, 1, 7, 11, 19)),
+    (5, 11, (1, 1, 5, 1, 1)),
+    (5, 13, (1, 1, 1, 3, 11)),
+    (5, 14, (1, 3, 5, 5, 31)),
+    (6, 1, (1, 3, 3, 9, 7, 49)),
+    (6, 13, (1, 1, 1, 15, 21, 21)),
+    (6, 16, (1, 3, 1, 13, 27, 49)),
+    (6, 19, (1, 1, 1, 15, 7, 5)),
+    (6, 22, (1, 3, 1, 15, 13, 25)),
+    (6, 25, (1, 1, 5, 5, 19, 61)),
+    (7, 1, (1, 3, 7, 11, 23, 15, 103)),
+    (7, 4, (1, 3, 7, 13, 13, 15, 69)),
+]
+
+SOBOL_BITS = 32
+
+class SobolSequence:
+    """
+    A class to generate (optionally scrambled) Sobol low-discrepancy points in the unit hypercube
+
+    Scrambling uses a random linear matrix scramble followed by a random digital shift, so every
+    seed gives a different randomised sequence that keeps the stratification of the original.
+    Balance properties hold for sample counts that are powers of two.
+
+    ...
+
+    Attributes
+    ----------
+    dimensions : int
+        Number of dimensions of each point
+    scramble : bool
+        Whether or not the sequence is scrambled
+    seed : int
+        Seed for the scrambling
+
+    Methods
+    -------
+    point():
+        Returns the point at a given index of the sequence
+    random():
+        Returns the next n points of the sequence
+    fastForward():
+        Skips a number of points of the sequence
+    """
+
+    def __init__(self, dimensions : int, scramble : bool = True, seed : Optional[int] = None) -> None:
+        """
+        Construct all necessary attributes for a SobolSequence object
+
+        Parameters
+        ----------
+        dimensions : int
+            Number of dimensions of each point
+        scramble : bool
+            Whether or not to scramble the sequence
+        seed : int
+            Seed for the scrambling
+        """
+
+        if dimensions < 1 or dimensions > len(SOBOL_DIRECTIONS) + 1:
+            raise ValueError(f"SobolSequence supports 1 to {len(SOBOL_DIRECTIONS) + 1} dimensions")
+
+        self.dimensions = dimensions
+        self.scramble = scramble
+        self.seed = seed
+
+        self._directions = [[1 << (SOBOL_BITS - 1 - i) for i in range(SOBOL_BITS)]]
+        for degree, poly, initial in SOBOL_DIRECTIONS[:dimensions - 1]:
+            v = [m << (SOBOL_BITS - 1 - i) for i, m in enumerate(initial)]
+            for i in range(degree, SOBOL_BITS):
+                value = v[i - degree] ^ (v[i - degree] >> degree)
+                for k in range(1, degree):
+                    if (poly >> (degree - 1 - k)) & 1:
+                        value ^= v[i - k]
+                v.append(value)
+            self._directions.append(v)
+
+        self._shift = [0] * dimensions
+        if scramble:
+            rng = random.Random(seed)
+            for d in range(dimensions):
+                self._directions[d] = self._scrambleDirections(self._directions[d], rng)
+                self._shift[d] = rng.getrandbits(SOBOL_BITS)
+
+        self._index = 0
+        self._state = list(self._shift)
+
+    @staticmethod
+    def _scrambleDirections(directions : List[int], rng : random.Random) -> List[int]:
+        """
+        Apply a random lower-triangular binary matrix to a set of direction numbers
+
+        Parameters
+        ----------
+        directions : List[int]
+            Direction numbers of a single dimension, most significant bit first
+        rng : random.Random
+            Random generator for the scramble matrix
+
+        Returns
+        -------
+        List[int]
+            Scrambled direction numbers
+        """
+        # Row i of the matrix acts on bits 0..i (counted from the most significant bit)
+        rows = []
+        for i in range(SOBOL_BITS):
+            lower = rng.getrandbits(i) << (SOBOL_BITS - i) if i > 0 else 0
+            rows.append(lower | (1 << (SOBOL_BITS - 1 - i)))
+
+        scrambled = []
+        for v in directions:
+            value = 0
+            for i, row in enumerate(rows):
+                if bin(row & v).count("1") & 1:
+                    value |= 1 << (SOBOL_BITS - 1 - i)
+            scrambled.append(value)
+        return scrambled
+
+    def _integerPoint(self, index : int) -> List[int]:
+        """
+        Return the point at a given index of the sequence as integers scaled by 2^32
+
+        Parameters
+        ----------
+        index : int
+            Index of the point (0 is the first point)
+
+        Returns
+        -------
+        List[int]
+            Integer coordinates of the point
+        """
+        gray = index ^ (index >> 1)
+        values = list(self._shift)
+        bit = 0
+        while gray:
+            if gray & 1:
+                for d in range(self.dimensions):
+                    values[d] ^= self._directions[d][bit]
+            gray >>= 1
+            bit += 1
+        return values
+
+    def point(self, index : int) -> List[float]:
+        """
+        Return the point at a given index of the sequence
+
+        Parameters
+        ----------
+        index : int
+            Index of the point (0 is the first point)
+
+        Returns
+        -------
+        List[float]
+            Point in the unit hypercube
+        """
+        return [(value + 0.5) / (1 << SOBOL_BITS) for value in self._integerPoint(index)]
+
+    def random(self, n : int) -> List[List[float]]:
+        """
+        Return the next n points of the sequence
+
+        Parameters
+        ----------
+        n : int
+            Number of points to generate
+
+        Returns
+        -------
+        List[List[float]]
+            Points in the unit hypercube
+        """
+        scale = 1.0 / (1 << SOBOL_BITS)
+        points = []
+        for _ in range(n):
+            points.append([(value + 0.5) * scale for value in self._state])
+
+            # Gray code order: the next point differs in the direction number of the lowest zero bit
+            index = self._index
+            bit = 0
+            while index & 1:
+                index >>= 1
+                bit += 1
+            if bit >= SOBOL_BITS:
+                raise OverflowError("SobolSequence exhausted")
+            for d in range(self.dimensions):
+                self._state[d] ^= self._directions[d][bit]
+            self._index += 1
+        return points
+
+    def fastForward(self, n : int) -> None:
+        """
+        Skip a number of points of the sequence
+
+        Parameters
+        ----------
+        n : int
+            Number of points to skip
+        """
+        self._index += n
+        self._state = self._integerPoint(self._index)
+
+class LatinHypercube:
+    """
+    A class to generate Latin hypercube designs in the unit hypercube
+
+    Each dimension is split into n equal strata and every stratum holds exactly one point.
+
+    ...
+
+    Attributes
+    ----------
+    dimensions : int
+        Number of dimensions of each point
+    centered : bool
+        Whether points sit at stratum centres rather than random positions within them
+    seed : int
+        Seed for the design
+
+    Methods
+    -------
+    random():
+        Returns a design of n points
+    """
+
+    def __init__(self, dimensions : int, centered : bool = False, seed : Optional[int] = None) -> None:
+        """
+        Construct all necessary attributes for a LatinHypercube object
+
+        Parameters
+        ----------
+        dimensions : int
+            Number of dimensions of each point
+        centered : bool
+            Whether points sit at stratum centres rather than random positions within them
+        seed : int
+            Seed for the design
+        """
+
+        self.dimensions = dimensions
+        self.centered = centered
+        self.seed = seed
+
+        self._rng = random.Random(seed)
+
+    def random(self, n : int) -> List[List[float]]:
+        """
+        Return a design of n points
+
+        Parameters
+        ----------
+        n : int
+            Number of points to generate
+
+        Returns
+        -------
+        List[List[float]]
+            Points in the unit hypercube
+        """
+        columns = []
+        for _ in range(self.dimensions):
+            strata = list(range(n))
+            self._rng.shuffle(strata)
+            if self.centered:
+                columns.append([(s + 0.5) / n for s in strata])
+            else:
+                columns.append([(s + self._rng.random()) / n for s in strata])
+        return [list(point) for point in zip(*columns)]
+
+class Uniform:
+    """
+    A uniform distribution between two bounds
+
+    Methods
+    -------
+    ppf():
+        Maps a unit-interval value to a value of the distribution
+    """
+
+    def __init__(self, low : float, high : float) -> None:
+        """
+        Construct all necessary attributes for a Uniform object
+
+        Parameters
+        ----------
+        low : float
+            Lower bound of the distribution
+        high : float
+            Upper bound of the distribution
+        """
+
+        self.low = float(low)
+        self.high = float(high)
+
+    def ppf(self, u : float) -> float:
+        """
+        Map a unit-interval value to a value of the distribution (inverse CDF)
+
+        Parameters
+        ----------
+        u : float
+            Value in the unit interval
+
+        Returns
+        -------
+        float
+            Corresponding value of the distribution
+        """
+        return self.low + (self.high - self.low) * u
+
+class Normal:
+    """
+    A normal distribution with a given mean and standard deviation
+
+    Methods
+    -------
+    ppf():
+        Maps a unit-interval value to a value of the distribution
+    """
+
+    def __init__(self, mean : float = 0, std : float = 1) -> None:
+        """
+        Construct all necessary attributes for a Normal object
+
+        Parameters
+        ----------
+        mean : float
+            Mean of the distribution
+        std : float
+            Standard deviation of the distribution
+        """
+
+        self.mean = float(mean)
+        self.std = float(std)
+        self._dist = NormalDist(self.mean, self.std)
+
+    def ppf(self, u : float) -> float:
+        """
+        Map a unit-interval value to a value of the distribution (inverse CDF)
+
+        Parameters
+        ----------
+        u : float
+            Value in the open unit interval
+
+        Returns
+        -------
+        float
+            Corresponding value of the distribution
+        """
+        if self.std == 0:
+            return self.mean
+        return self._dist.inv_cdf(u)
+
+# Scenario quantities that can be dispersed; sampled values are added to the nominal value
+DISPERSION_PARAMETERS = ("mass", "moi.x", "moi.y", "moi.z", "dragScale",
+                         "vel.x", "vel.y", "vel.z", "yaw", "pitch", "roll",
+                         "wind.x", "wind.y", "wind.z")
+
+class DispersionSampler:
+    """
+    A class to generate dispersed scenarios for Monte Carlo campaigns
+
+    Every dispersed parameter takes one dimension of a scrambled Sobol sequence or Latin
+    hypercube design, mapped through the parameter's distribution. Sampled values are
+    perturbations added to the nominal scenario: mass, moments of inertia, drag scale,
+    velocity and wind components are offset directly, while yaw, pitch and roll (in radians)
+    rotate the nominal orientation.
+
+    ...
+
+    Attributes
+    ----------
+    nominal : Scenario
+        Scenario around which the parameters are dispersed
+    dispersions : Dict[str, Uniform | Normal]
+        Distribution of the perturbation for each dispersed parameter
+    method : str
+        Sampling method, "sobol" or "lhs"
+    seed : int
+        Seed for the sampling method
+
+    Methods
+    -------
+    samples():
+        Returns the perturbations for n runs
+    apply():
+        Applies a set of perturbations to the nominal scenario
+    scenarios():
+        Returns the dispersed scenarios for n runs
+    """
+
+    def __init__(self, nominal : Scenario, dispersions : Dict[str, object], method : str = "sobol", seed : Optional[int] = None) -> None:
+        """
+        Construct all necessary attributes for a DispersionSampler object
+
+        Parameters
+        ----------
+        nominal : Scenario
+            Scenario around which the parameters are dispersed
+        dispersions : Dict[str, Uniform | Normal]
+            Distribution of the perturbation for each dispersed parameter
+        method : str
+            Sampling method, "sobol" (scrambled Sobol) or "lhs" (Latin hypercube)
+        seed : int
+            Seed for the sampling method
+        """
+
+        unknown = [name for name in dispersions if name not in DISPERSION_PARAMETERS]
+        if unknown:
+            raise ValueError(f"Unknown dispersion parameters: {', '.join(unknown)}")
+        if method not in ("sobol", "lhs"):
+            raise ValueError(f"Unknown sampling method: {method}")
+
+        self.nominal = nominal
+        self.dispersions = dict(dispersions)
+        self.method = method
+        self.seed = seed
+
+        self._names = list(self.dispersions)
+        if method == "sobol":
+            self._generator = SobolSequence(len(self._names), seed = seed)
+        else:
+            self._generator = LatinHypercube(len(self._names), seed = seed)
+
+    def samples(self, n : int) -> List[Dict[str, float]]:
+        """
+        Return the perturbations for n runs
+
+        With the Sobol method, successive calls continue the sequence; with the Latin
+        hypercube method, every call returns a new independent design of n points.
+
+        Parameters
+        ----------
+        n : int
+            Number of runs
+
+        Returns
+        -------
+        List[Dict[str, float]]
+            Perturbation of each dispersed parameter for every run
+        """
+        samples = []
+        for point in self._generator.random(n):
+            samples.append({name: self.dispersions[name].ppf(u) for name, u in zip(self._names, point)})
+        return samples
+
+    def apply(self, sample : Dict[str, float]) -> Scenario:
+        """
+        Apply a set of perturbations to the nominal scenario
+
+        Parameters
+        ----------
+        sample : Dict[str, float]
+            Perturbation of each dispersed parameter
+
+        Returns
+        -------
+        Scenario
+            Dispersed copy of the nominal scenario
+        """
+        nominal = self.nominal
+        get = lambda name : sample.get(name, 0.0)
+
+        ori = nominal.ori
+        if "yaw" in sample or "pitch" in sample or "roll" in sample:
+            ori = ori * Quaternion.FromEuler(get("yaw"), get("pitch"), get("roll"))
+
+        return nominal.replace(
+            mass = nominal.mass + get("mass"),
+            moi = nominal.moi + Vector3(get("moi.x"), get("moi.y"), get("moi.z")),
+            dragScale = nominal.dragScale + get("dragScale"),
+            vel = nominal.vel + Vector3(get("vel.x"), get("vel.y"), get("vel.z")),
+            ori = ori,
+            wind = nominal.wind + Vector3(get("wind.x"), get("wind.y"), get("wind.z")))
+
+    def scenarios(self, n : int) -> Iterator[Scenario]:
+        """
+        Return the dispersed scenarios for n runs
+
+        Parameters
+        ----------
+        n : int
+            Number of runs
+
+        Returns
+        -------
+        Iterator[Scenario]
+            Dispersed scenarios
+        """
+        for sample in self.samples(n):
+            yield self.apply(sample)
@@ -0,0 +1,431 @@
+import math
+from dataclasses import dataclass, field, replace
+from typing import Callable, Optional, Dict, Any, Tuple
+
+from core.vector import *
+from core.quaternion import *
+from core.matrix import Matrix3
+from core import dual
+from sim.physics import AerodynamicRigidbody
+from sim.reduced import DEGREES_OF_FREEDOM, PointMass, PlanarBody
+from sim.integrators import makeIntegrator
+from sim.forces import MultiRate
+
+# Named scalar quantities of a scenario, usable with Scenario.parameter() and Scenario.withParameters()
+SCENARIO_PARAMETERS = ("mass", "dragCoeff", "dragScale", "dragArea",
+                       "pos.x", "pos.y", "pos.z", "vel.x", "vel.y", "vel.z",
+                       "wind.x", "wind.y", "wind.z", "speed", "elevation", "azimuth",
+                       "yaw", "pitch", "roll")
+
+LAUNCH_PARAMETERS = ("speed", "elevation", "azimuth")
+ORIENTATION_PARAMETERS = ("yaw", "pitch", "roll")
+
+def groundCrossing(lastPos : Vector3, pos : Vector3, time : float, dt : float) -> Tuple[Vector3, float]:
+    """
+    Interpolate the point and time at which a step crossed the ground plane
+
+    Parameters
+    ----------
+    lastPos : Vector3
+        Position at the start of the step (at or above the ground)
+    pos : Vector3
+        Position at the end of the step (below the ground)
+    time : float
+        Time at the end of the step
+    dt : float
+        Length of the step
+
+    Returns
+    -------
+    Tuple[Vector3, float]
+        Impact point and time
+    """
+    fraction = lastPos.z / (lastPos.z - pos.z)
+    return lastPos + (pos - lastPos) * fraction, time - dt + fraction * dt
+
+@dataclass
+class ScenarioResult:
+    """
+    A class to represent the outcome of a single scenario run
+
+    ...
+
+    Attributes
+    ----------
+    impact : Vector3
+        Position at which the body crossed the ground plane (final position if it never landed)
+    landed : bool
+        Whether or not the body reached the ground before the time limit
+    apogee : float
+        Highest altitude reached during the run
+    flightTime : float
+        Simulated time at impact (or at the time limit)
+    steps : int
+        Number of physics steps taken
+    body : AerodynamicRigidbody
+        The body in its final state
+    """
+
+    impact : Vector3
+    landed : bool
+    apogee : float
+    flightTime : float
+    steps : int
+    body : Optional[AerodynamicRigidbody] = None
+
+def resultToDict(result : ScenarioResult) -> Dict[str, Any]:
+    """
+    Return a JSON-compatible representation of a run outcome
+
+    Parameters
+    ----------
+    result : ScenarioResult
+        Outcome of a run
+
+    Returns
+    -------
+    Dict[str, Any]
+        Outcome fields with the impact point as a list
+    """
+    return {"impact": [result.impact.x, result.impact.y, result.impact.z], "landed": result.landed,
+            "apogee": result.apogee, "flightTime": result.flightTime, "steps": result.steps}
+
+@dataclass
+class Scenario:
+    """
+    A class to represent a single-body flight scenario
+
+    The defaults reproduce the scenario in main.py.
+
+    ...
+
+    Attributes
+    ----------
+    mass : float
+        Mass of the body (in kg)
+    moi : Vector3
+        Principal moments of inertia of the body
+    inertia : Matrix3
+        Optional full body-frame inertia tensor of the body, used instead of moi
+    pos : Vector3
+        Initial position of the body's CoG
+    vel : Vector3
+        Initial velocity of the body's CoG
+    ori : Quaternion
+        Initial orientation of the body
+    dragCoeff : float
+        Drag coefficient of the body
+    dragScale : float
+        Multiplier applied to the drag coefficient
+    dragArea : float
+        The reference area on which Cd is applied
+    wind : Vector3
+        Global wind vector
+    dt : float
+        Physics step size (in seconds)
+    maxTime : float
+        Simulated time after which the run is stopped
+    integrator : str
+        Integration scheme of the body (see INTEGRATORS)
+    aeroEvery : int
+        Number of steps per evaluation of the aerodynamic forces (other than 1 needs the "euler" integrator)
+    aeroMode : str
+        How the aerodynamic forces are filled in between evaluations (see HOLD_MODES)
+    dof : str
+        Body model (see DEGREES_OF_FREEDOM), "3dof" and "planar" skip the rotational dynamics
+
+    Methods
+    -------
+    build():
+        Constructs the body described by this scenario
+    run():
+        Simulates the scenario until impact or the time limit
+    launch():
+        Returns the initial speed, elevation and azimuth
+    withLaunch():
+        Returns a copy of this scenario with a given initial speed, elevation and azimuth
+    parameter():
+        Returns the value of a named scenario parameter
+    withParameters():
+        Returns a copy of this scenario with some named parameters changed
+    replace():
+        Returns a copy of this scenario with some fields changed
+    toDict():
+        Returns a JSON-compatible representation of this scenario
+    FromDict():
+        Creates a Scenario from a JSON-compatible representation
+    """
+
+    mass : float = 10
+    moi : Vector3 = field(default_factory=lambda: Vector3(1, 1, 1))
+    inertia : Optional[Matrix3] = None
+    pos : Vector3 = field(default_factory=lambda: Vector3(0, 0, 1000))
+    vel : Vector3 = field(default_factory=lambda: Vector3(30, 20, 0))
+    ori : Quaternion = field(default_factory=Quaternion.Zero)
+    dragCoeff : float = 0.1
+    dragScale : float = 1
+    dragArea : float = 1
+    wind : Vector3 = field(default_factory=Vector3.Zero)
+    dt : float = 0.01
+    maxTime : float = 60
+    integrator : str = "euler"
+    aeroEvery : int = 1
+    aeroMode : str = "hold"
+    dof : str = "6dof"
+
+    def build(self) -> AerodynamicRigidbody:
+        """
+        Construct the body described by this scenario
+
+        Returns
+        -------
+        AerodynamicRigidbody
+            Body in its initial state (a PointMass or PlanarBody for the reduced-order models)
+        """
+        cd = self.dragCoeff * self.dragScale
+
+        if self.aeroEvery != 1 and self.integrator != "euler":
+            raise ValueError("Multi-rate aerodynamics only support the built-in integrator")
+        if self.dof == "6dof":
+            body = AerodynamicRigidbody(mass = self.mass, moi = self.moi if self.inertia is None else self.inertia, pos = self.pos, vel = self.vel, ori = self.ori,
+                                        dragCoeff = lambda aoa : cd, dragArea = self.dragArea)
+        elif self.dof in DEGREES_OF_FREEDOM:
+            if self.dof == "planar" and self.integrator != "euler":
+                raise ValueError("Planar bodies only support the built-in integrator")
+            model = PointMass if self.dof == "3dof" else PlanarBody
+            body = model(mass = self.mass, pos = self.pos, vel = self.vel, ori = self.ori, dragCoeff = lambda aoa : cd, dragArea = self.dragArea)
+        else:
+            raise ValueError(f"Unknown body model: {self.dof}")
+        body.setWind(self.wind)
+        body.integrator = makeIntegrator(self.integrator)
+        if self.aeroEvery != 1:
+            body.aeroRate = MultiRate(self.aeroEvery, self.aeroMode)
+        return body
+
+    def run(self, observer : Optional[Callable[[float, AerodynamicRigidbody], None]] = None, ground : Optional[Any] = None,
+            controller : Optional[Callable[[float, AerodynamicRigidbody], None]] = None) -> ScenarioResult:
+        """
+        Simulate the scenario until the body hits the ground or the time limit is reached
+
+        Parameters
+        ----------
+        observer : Callable[[float, AerodynamicRigidbody], None]
+            Optional function called after every step with the sim time and the body
+        ground : FlatGround OR Heightmap
+            Ground to impact (defaults to the z = 0 plane); the terrain is only sampled below its maxHeight
+        controller : Callable[[float, AerodynamicRigidbody], None]
+            Optional function called before every step with the sim time and the body, to apply inputs
+
+        Returns
+        -------
+        ScenarioResult
+            Impact point, apogee and final state of the run
+        """
+        body = self.build()
+        dt = float(self.dt)
+
+        time = 0.0
+        steps = 0
+        apogee = body.pos.z
+        ceiling = 0.0 if ground is None else ground.maxHeight
+
+        while True:
+            if controller is not None:
+                controller(time, body)
+            lastPos = body.pos
+            body.update(dt)
+            time += dt
+            steps += 1
+
+            if observer is not None:
+                observer(time, body)
+
+            if body.pos.z > apogee:
+                apogee = body.pos.z
+
+            if body.pos.z < ceiling:
+                if ground is None:
+                    impact, flightTime = groundCrossing(lastPos, body.pos, time, dt)
+                    return ScenarioResult(impact, True, apogee, flightTime, steps, body)
+                if body.pos.z < ground.height(body.pos.x, body.pos.y):
+                    impact, flightTime = ground.crossing(lastPos, body.pos, time, dt)
+                    return ScenarioResult(impact, True, apogee, flightTime, steps, body)
+
+            if time >= self.maxTime:
+                return ScenarioResult(body.pos, False, apogee, time, steps, body)
+
+    def launch(self) -> Tuple[float, float, float]:
+        """
+        Return the initial speed, elevation and azimuth of the body
+
+        Returns
+        -------
+        Tuple[float, float, float]
+            Speed, elevation above the horizontal and azimuth from +x towards +y (in radians)
+        """
+        vel = self.vel
+        speed = vel.norm()
+        if speed == 0:
+            return 0.0, 0.0, 0.0
+        return speed, dual.asin(vel.z / speed), dual.atan2(vel.y, vel.x)
+
+    def withLaunch(self, speed : float, elevation : float, azimuth : float) -> 'Scenario':
+        """
+        Return a copy of this scenario with a given initial speed, elevation and azimuth
+
+        Parameters
+        ----------
+        speed : float
+            Initial speed of the body
+        elevation : float
+            Elevation of the initial velocity above the horizontal (in radians)
+        azimuth : float
+            Azimuth of the initial velocity from +x towards +y (in radians)
+
+        Returns
+        -------
+        Scenario
+            Modified copy of this scenario
+        """
+        horizontal = speed * dual.cos(elevation)
+        vel = Vector3(horizontal * dual.cos(azimuth), horizontal * dual.sin(azimuth), speed * dual.sin(elevation))
+        return self.replace(vel = vel)
+
+    def parameter(self, name : str) -> float:
+        """
+        Return the value of a named scenario parameter
+
+        Parameters
+        ----------
+        name : str
+            Name of the parameter (see SCENARIO_PARAMETERS)
+
+        Returns
+        -------
+        float
+            Value of the parameter
+        """
+        if name in LAUNCH_PARAMETERS:
+            return self.launch()[LAUNCH_PARAMETERS.index(name)]
+        if name in ORIENTATION_PARAMETERS:
+            return self.ori.ToEuler()[ORIENTATION_PARAMETERS.index(name)]
+        if name in SCENARIO_PARAMETERS:
+            if "." in name:
+                vector, component = name.split(".")
+                return getattr(getattr(self, vector), component)
+            return getattr(self, name)
+        raise ValueError(f"Unknown scenario parameter: {name}")
+
+    def withParameters(self, values : Dict[str, float]) -> 'Scenario':
+        """
+        Return a copy of this scenario with some named parameters changed
+
+        Launch parameters (speed, elevation, azimuth) and velocity components cannot be
+        changed together. Unchanged launch or orientation angles keep their current values.
+
+        Parameters
+        ----------
+        values : Dict[str, float]
+            New value of each changed parameter (see SCENARIO_PARAMETERS)
+
+        Returns
+        -------
+        Scenario
+            Modified copy of this scenario
+        """
+        unknown = [name for name in values if name not in SCENARIO_PARAMETERS]
+        if unknown:
+            raise ValueError(f"Unknown scenario parameters: {', '.join(unknown)}")
+        if any(name.startswith("vel.") for name in values) and any(name in LAUNCH_PARAMETERS for name in values):
+            raise ValueError("Velocity components and launch parameters cannot be changed together")
+
+        scenario = self
+        if any(name in LAUNCH_PARAMETERS for name in values):
+            launch = self.launch()
+            scenario = scenario.withLaunch(*[values.get(name, current) for name, current in zip(LAUNCH_PARAMETERS, launch)])
+
+        changes : Dict[str, Any] = {}
+        if any(name in ORIENTATION_PARAMETERS for name in values):
+            angles = self.ori.ToEuler()
+            changes["ori"] = Quaternion.FromEuler(*[values.get(name, current) for name, current in zip(ORIENTATION_PARAMETERS, angles)])
+        for vector in ("pos", "vel", "wind"):
+            if any(name.startswith(vector + ".") for name in values):
+                v = getattr(scenario, vector)
+                changes[vector] = Vector3(values.get(vector + ".x", v.x), values.get(vector + ".y", v.y), values.get(vector + ".z", v.z))
+        for name in ("mass", "dragCoeff", "dragScale", "dragArea"):
+            if name in values:
+                changes[name] = values[name]
+
+        return scenario.replace(**changes)
+
+    def replace(self, **changes : Any) -> 'Scenario':
+        """
+        Return a copy of this scenario with some fields changed
+
+        Parameters
+        ----------
+        **changes : Any
+            Field names and their new values
+
+        Returns
+        -------
+        Scenario
+            Modified copy of this scenario
+        """
+        return replace(self, **changes)
+
+    def toDict(self) -> Dict[str, Any]:
+        """
+        Return a JSON-compatible representation of this scenario
+
+        Returns
+        -------
+        Dict[str, Any]
+            Scenario fields with vectors as lists and matrices as lists of rows
+        """
+        inertia = self.inertia
+        return {"mass": self.mass, "moi": [self.moi.x, self.moi.y, self.moi.z],
+                "inertia": None if inertia is None else [[inertia.xx, inertia.xy, inertia.xz], [inertia.yx, inertia.yy, inertia.yz],
+                                                         [inertia.zx, inertia.zy, inertia.zz]],
+                "pos": [self.pos.x, self.pos.y, self.pos.z], "vel": [self.vel.x, self.vel.y, self.vel.z],
+                "ori": [self.ori.w, self.ori.x, self.ori.y, self.ori.z],
+                "dragCoeff": self.dragCoeff, "dragScale": self.dragScale, "dragArea": self.dragArea,
+                "wind": [self.wind.x, self.wind.y, self.wind.z], "dt": self.dt, "maxTime": self.maxTime,
+                "integrator": self.integrator, "aeroEvery": self.aeroEvery, "aeroMode": self.aeroMode, "dof": self.dof}
+
+    @classmethod
+    def FromDict(cls, data : Dict[str, Any]) -> 'Scenario':
+        """
+        Construct a Scenario object from a JSON-compatible representation
+
+        Missing fields take their default values.
+
+        Parameters
+        ----------
+        data : Dict[str, Any]
+            Scenario fields with vectors as lists and matrices as lists of rows
+
+        Returns
+        -------
+        Scenario
+            Constructed scenario
+        """
+        unknown = set(data) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Unknown scenario fields: {', '.join(sorted(unknown))}")
+
+        kwargs : Dict[str, Any] = {}
+        for key, value in data.items():
+            if key in ("moi", "pos", "vel", "wind"):
+                kwargs[key] = Vector3(*value)
+            elif key == "ori":
+                kwargs[key] = Quaternion(*value)
+            elif key == "inertia":
+                kwargs[key] = None if value is None else Matrix3(*(float(entry) for row in value for entry in row))
+            elif key in ("integrator", "aeroMode", "dof"):
+                kwargs[key] = str(value)
+            elif key == "aeroEvery":
+                kwargs[key] = int(value)
+            else:
+                kwargs[key] = float(value)
+        return cls(**kwargs)
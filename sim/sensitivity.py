@@ -0,0 +1,60 @@
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from core.vector import *
+from core.dual import Dual, valueOf, gradientOf
+from sim.physics import AerodynamicRigidbody
+from sim.scenario import Scenario, ScenarioResult, SCENARIO_PARAMETERS
+
+# Scenario quantities that runSensitivity() can differentiate with respect to
+SENSITIVITY_PARAMETERS = SCENARIO_PARAMETERS
+
+def seedScenario(scenario : Scenario, parameters : Sequence[str]) -> Scenario:
+    """
+    Return a copy of a scenario whose selected parameters are seeded Duals
+
+    Parameters
+    ----------
+    scenario : Scenario
+        Nominal scenario
+    parameters : Sequence[str]
+        Names of the parameters to differentiate with respect to (see SENSITIVITY_PARAMETERS)
+
+    Returns
+    -------
+    Scenario
+        Scenario carrying the derivatives through its run
+    """
+    values = [scenario.parameter(name) for name in parameters]
+    return scenario.withParameters(dict(zip(parameters, Dual.Seed(values))))
+
+def runSensitivity(scenario : Scenario, parameters : Sequence[str],
+                   observer : Optional[Callable[[float, AerodynamicRigidbody], None]] = None) -> Tuple[ScenarioResult, Dict[str, Dict[str, float]]]:
+    """
+    Run a scenario once and return its outcome with its partial derivatives
+
+    Parameters
+    ----------
+    scenario : Scenario
+        Nominal scenario
+    parameters : Sequence[str]
+        Names of the parameters to differentiate with respect to (see SENSITIVITY_PARAMETERS)
+    observer : Callable[[float, AerodynamicRigidbody], None]
+        Optional function called after every step with the sim time and the (Dual-valued) body
+
+    Returns
+    -------
+    Tuple[ScenarioResult, Dict[str, Dict[str, float]]]
+        Outcome of the run with plain float values, and the derivative of each of
+        impact.x, impact.y, apogee and flightTime with respect to each parameter
+    """
+    result = seedScenario(scenario, parameters).run(observer)
+    n = len(parameters)
+
+    outputs = {"impact.x": result.impact.x, "impact.y": result.impact.y,
+               "apogee": result.apogee, "flightTime": result.flightTime}
+    derivatives = {name: dict(zip(parameters, gradientOf(value, n))) for name, value in outputs.items()}
+
+    impact = Vector3(valueOf(result.impact.x), valueOf(result.impact.y), valueOf(result.impact.z))
+    plain = ScenarioResult(impact, result.landed, valueOf(result.apogee), valueOf(result.flightTime), result.steps, result.body)
+
+    return plain, derivatives
@@ -0,0 +1,422 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from sim.aggregate import QuantileSketch, RunningStats
+from sim.recorder import Decimate, Recorder
+from sim.scenario import Scenario, ScenarioResult, resultToDict
+from sim.simulation import Simulation
+
+class ResultCache:
+    """
+    A class to keep the most recently used responses up to a fixed number of entries
+
+    Thread-safe.
+
+    ...
+
+    Attributes
+    ----------
+    maxEntries : int
+        Maximum number of cached responses
+    hits : int
+        Number of lookups answered from the cache
+    misses : int
+        Number of lookups not found in the cache
+
+    Methods
+    -------
+    get():
+        Returns a cached response, or None
+    put():
+        Caches a response, evicting the least recently used one if full
+    """
+
+    def __init__(self, maxEntries : int = 256) -> None:
+        """
+        Construct all necessary attributes for a ResultCache object
+
+        Parameters
+        ----------
+        maxEntries : int
+            Maximum number of cached responses (0 disables caching)
+        """
+
+        self.maxEntries = maxEntries
+        self.hits = 0
+        self.misses = 0
+        self._entries : OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key : str) -> Optional[Dict[str, Any]]:
+        """
+        Return a cached response, or None
+
+        Parameters
+        ----------
+        key : str
+            Canonical request key
+
+        Returns
+        -------
+        Dict[str, Any]
+            Cached response
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key : str, response : Dict[str, Any]) -> None:
+        """
+        Cache a response, evicting the least recently used one if full
+
+        Parameters
+        ----------
+        key : str
+            Canonical request key
+        response : Dict[str, Any]
+            Response to cache
+        """
+        if self.maxEntries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last = False)
+
+class _Job:
+    __slots__ = ("key", "scenario", "body", "every", "future")
+
+    def __init__(self, key : str, scenario : Scenario, body : Any, every : int) -> None:
+        self.key = key
+        self.scenario = scenario
+        self.body = body
+        self.every = every
+        self.future : Future = Future()
+
+class SimulationService:
+    """
+    A long-lived local HTTP/JSON service running scenarios on demand
+
+    Requests arriving within a short window are coalesced and stepped together as one
+    Simulation per step size, identical in-flight requests share a single run, and responses
+    are kept in a bounded LRU cache. Scenarios are built on submission, so an invalid one is
+    rejected on its own instead of failing the batch it would have joined.
+
+    Endpoints
+    ---------
+    POST /run:
+        {"scenario": {...}, "trajectory": bool, "every": int} -> {"result": {...}, "trajectory": {...}, "cached": bool}
+    POST /batch:
+        {"scenarios": [...], "trajectory": bool, "every": int} -> {"results": [...]}
+    GET /metrics:
+        Request, cache and batch counters, latency quantiles and throughput
+    GET /health:
+        {"status": "ok"}
+
+    ...
+
+    Attributes
+    ----------
+    address : Tuple[str, int]
+        Host and port the service listens on
+    cache : ResultCache
+        Cache of recent responses
+    batchWindow : float
+        Seconds to wait for more requests after the first of a batch
+    maxBatch : int
+        Maximum number of runs per batch
+
+    Methods
+    -------
+    start():
+        Starts serving in background threads
+    submit():
+        Queues a scenario and returns a future of its response
+    metrics():
+        Returns the service metrics
+    close():
+        Stops serving
+    """
+
+    def __init__(self, host : str = "127.0.0.1", port : int = 0, batchWindow : float = 0.005, maxBatch : int = 64, cacheSize : int = 256) -> None:
+        """
+        Construct all necessary attributes for a SimulationService object
+
+        Parameters
+        ----------
+        host : str
+            Interface to listen on
+        port : int
+            Port to listen on (0 picks a free port)
+        batchWindow : float
+            Seconds to wait for more requests after the first of a batch
+        maxBatch : int
+            Maximum number of runs per batch
+        cacheSize : int
+            Maximum number of cached responses
+        """
+
+        self.batchWindow = batchWindow
+        self.maxBatch = maxBatch
+        self.cache = ResultCache(cacheSize)
+
+        self.server = ThreadingHTTPServer((host, port), _ServiceHandler)
+        self.server.daemon_threads = True
+        self.server.service = self
+        self.address = self.server.server_address
+
+        self._queue : queue.Queue = queue.Queue()
+        self._inflight : Dict[str, _Job] = {}
+        self._lock = threading.Lock()
+        self._threads : List[threading.Thread] = []
+
+        self._started = time.monotonic()
+        self._requests = 0
+        self._errors = 0
+        self._runs = 0
+        self._coalesced = 0
+        self._batchSizes = RunningStats()
+        self._latency = QuantileSketch()
+        self._latencyStats = RunningStats()
+
+    def __enter__(self) -> 'SimulationService':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def start(self) -> 'SimulationService':
+        """
+        Start serving and batching in background threads
+
+        Returns
+        -------
+        SimulationService
+            This service
+        """
+        self._threads = [threading.Thread(target = self.server.serve_forever, daemon = True),
+                         threading.Thread(target = self._batchLoop, daemon = True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def close(self) -> None:
+        """
+        Stop serving and batching
+        """
+        self.server.shutdown()
+        self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.server.server_close()
+
+    def submit(self, scenario : Scenario, every : int = 0) -> Future:
+        """
+        Queue a scenario and return a future of its response
+
+        Parameters
+        ----------
+        scenario : Scenario
+            Scenario to run
+        every : int
+            Record every n-th step of the trajectory (0 records none)
+
+        Returns
+        -------
+        Future
+            Future of the response ({"result": ..., "trajectory": ...}); ValueError is raised
+            right away if the scenario cannot be built
+        """
+        key = json.dumps([scenario.toDict(), every], sort_keys = True)
+        cached = self.cache.get(key)
+        if cached is not None:
+            future : Future = Future()
+            future.set_result(dict(cached, cached = True))
+            return future
+
+        body = scenario.build()
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is not None:
+                self._coalesced += 1
+                return job.future
+            job = _Job(key, scenario, body, every)
+            self._inflight[key] = job
+        self._queue.put(job)
+        return job.future
+
+    def _nextBatch(self) -> Optional[List[_Job]]:
+        job = self._queue.get()
+        if job is None:
+            return None
+        batch = [job]
+        deadline = time.monotonic() + self.batchWindow
+        while len(batch) < self.maxBatch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout = remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                self._queue.put(None)
+                break
+            batch.append(job)
+        return batch
+
+    def _runBatch(self, jobs : List[_Job]) -> None:
+        simulation = Simulation(jobs[0].scenario.dt)
+        for job in jobs:
+            simulation.add(job.body, job.scenario.maxTime)
+        recorders : Dict[int, Recorder] = {slot: Recorder(policy = Decimate(job.every)) for slot, job in enumerate(jobs) if job.every > 0}
+        if recorders:
+            def record(time : float, slot : int, body) -> None:
+                if slot in recorders:
+                    recorders[slot].recordBody(time, body)
+            simulation.observe(record)
+        results = simulation.run()
+
+        for slot, job in enumerate(jobs):
+            response : Dict[str, Any] = {"result": resultToDict(results[slot])}
+            if slot in recorders:
+                recorders[slot].flush()
+                response["trajectory"] = {channel: list(column) for channel, column in recorders[slot].columns.items()}
+            self.cache.put(job.key, response)
+            job.future.set_result(dict(response, cached = False))
+
+    def _batchLoop(self) -> None:
+        while True:
+            batch = self._nextBatch()
+            if batch is None:
+                return
+
+            groups : Dict[float, List[_Job]] = {}
+            for job in batch:
+                groups.setdefault(float(job.scenario.dt), []).append(job)
+            for jobs in groups.values():
+                try:
+                    self._runBatch(jobs)
+                except Exception as error:
+                    if len(jobs) == 1:
+                        jobs[0].future.set_exception(error)
+                        continue
+                    # Rerun the group one job at a time, so only the failing ones fail
+                    for job in jobs:
+                        if job.future.done():
+                            continue
+                        try:
+                            job.body = job.scenario.build()
+                            self._runBatch([job])
+                        except Exception as jobError:
+                            job.future.set_exception(jobError)
+
+            with self._lock:
+                for job in batch:
+                    self._inflight.pop(job.key, None)
+                self._runs += len(batch)
+                self._batchSizes.add(len(batch))
+
+    def _record(self, latency : float, error : bool) -> None:
+        with self._lock:
+            self._requests += 1
+            self._errors += error
+            self._latency.add(latency)
+            self._latencyStats.add(latency)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Return the service metrics
+
+        Returns
+        -------
+        Dict[str, Any]
+            Request, cache and batch counters, latency (in milliseconds) and runs per second
+        """
+        with self._lock:
+            uptime = time.monotonic() - self._started
+            latency = {"mean": self._latencyStats.mean if self._latencyStats.count else None}
+            for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+                latency[name] = self._latency.quantile(q) if self._latency.count else None
+            return {"uptime": uptime, "requests": self._requests, "errors": self._errors, "runs": self._runs,
+                    "coalesced": self._coalesced, "cacheHits": self.cache.hits, "cacheMisses": self.cache.misses,
+                    "cacheEntries": len(self.cache), "batches": self._batchSizes.count,
+                    "meanBatchSize": self._batchSizes.mean if self._batchSizes.count else None,
+                    "latencyMs": latency, "runsPerSecond": self._runs / uptime if uptime > 0 else 0.0}
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    server_version = "PlatySim"
+
+    def log_message(self, format : str, *args : Any) -> None:
+        pass
+
+    def _send(self, status : int, body : Dict[str, Any]) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        service : SimulationService = self.server.service
+        if self.path == "/metrics":
+            self._send(200, service.metrics())
+        elif self.path == "/health":
+            self._send(200, {"status": "ok"})
+        else:
+            self._send(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self) -> None:
+        service : SimulationService = self.server.service
+        start = time.perf_counter()
+        status = 200
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            every = int(request.get("every", 1)) if request.get("trajectory") else 0
+            if self.path == "/run":
+                body = service.submit(Scenario.FromDict(request.get("scenario", {})), every).result()
+            elif self.path == "/batch":
+                futures = [service.submit(Scenario.FromDict(s), every) for s in request.get("scenarios", [])]
+                body = {"results": [future.result() for future in futures]}
+            else:
+                status, body = 404, {"error": f"Unknown path: {self.path}"}
+        except (ValueError, TypeError, KeyError) as error:
+            status, body = 400, {"error": str(error)}
+        except Exception as error:
+            status, body = 500, {"error": str(error)}
+
+        service._record((time.perf_counter() - start) * 1000, status != 200)
+        self._send(status, body)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Run the local simulation service")
+    parser.add_argument("--host", default = "127.0.0.1", help = "interface to listen on")
+    parser.add_argument("--port", type = int, default = 8765, help = "port to listen on")
+    parser.add_argument("--batch-window", type = float, default = 0.005, help = "seconds to coalesce requests")
+    parser.add_argument("--cache", type = int, default = 256, help = "maximum number of cached responses")
+    args = parser.parse_args()
+
+    service = SimulationService(args.host, args.port, args.batch_window, cacheSize = args.cache).start()
+    print(f"Serving on http://{service.address[0]}:{service.address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        service.close()
@@ -0,0 +1,401 @@
+import json
+import math
+import secrets
+import struct
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from multiprocessing import shared_memory
+from operator import attrgetter
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sim.recorder import CHANNEL_SOURCES, DEFAULT_CHANNELS
+from sim.scenario import Scenario, ScenarioResult
+
+# Block header: magic, version, capacity, length, size of the channel list
+HEADER = struct.Struct("<4sIQQQ")
+MAGIC = b"PSHM"
+VERSION = 1
+
+class SharedTrajectory:
+    """
+    A class to hold a trajectory as typed columns in a shared memory block
+
+    A worker creates the block and appends rows; another process attaches to it by name and
+    reads the columns as memoryviews without copying. The block layout is a fixed header, the
+    channel names as JSON and then one float64 column of `capacity` values per channel.
+
+    Memoryviews returned by column() must be released before the block is closed.
+
+    ...
+
+    Attributes
+    ----------
+    name : str
+        Name of the shared memory block
+    channels : Tuple[str, ...]
+        Names of the channels, time first
+    capacity : int
+        Maximum number of rows
+
+    Factories
+    ---------
+    Create():
+        Creates a new, empty block
+    Attach():
+        Attaches to an existing block by name
+
+    Methods
+    -------
+    append():
+        Appends a row of channel values
+    recordBody():
+        Appends the current state of a body
+    column():
+        Returns the stored values of a channel without copying
+    rows():
+        Returns the stored rows as channel name to value mappings
+    close():
+        Detaches this process from the block
+    unlink():
+        Destroys the block once every process has closed it
+    """
+
+    def __init__(self, memory : shared_memory.SharedMemory, channels : Sequence[str], capacity : int, offset : int) -> None:
+        """
+        Construct all necessary attributes for a SharedTrajectory object (use Create() or Attach())
+
+        Parameters
+        ----------
+        memory : SharedMemory
+            The shared memory block
+        channels : Sequence[str]
+            Names of the channels, time first
+        capacity : int
+            Maximum number of rows
+        offset : int
+            Byte offset of the first column
+        """
+
+        self.memory = memory
+        self.name = memory.name
+        self.channels = tuple(channels)
+        self.capacity = capacity
+
+        self._data = memory.buf[offset:offset + 8 * capacity * len(self.channels)].cast('d')
+        self._getters : Optional[List[attrgetter]] = None
+
+    @classmethod
+    def Create(cls, channels : Sequence[str] = DEFAULT_CHANNELS, capacity : int = 1024, name : Optional[str] = None) -> 'SharedTrajectory':
+        """
+        Construct a SharedTrajectory object in a new, empty shared memory block
+
+        Parameters
+        ----------
+        channels : Sequence[str]
+            Names of the channels, time first
+        capacity : int
+            Maximum number of rows
+        name : str
+            Name of the block (a random name is chosen if omitted)
+
+        Returns
+        -------
+        SharedTrajectory
+            Empty trajectory
+        """
+        if not channels or channels[0] != "time":
+            raise ValueError("The first channel must be time")
+
+        names = json.dumps(list(channels)).encode()
+        offset = HEADER.size + 8 * math.ceil(len(names) / 8)
+        memory = shared_memory.SharedMemory(name = name, create = True, size = offset + 8 * capacity * len(channels))
+        HEADER.pack_into(memory.buf, 0, MAGIC, VERSION, capacity, 0, len(names))
+        memory.buf[HEADER.size:HEADER.size + len(names)] = names
+        return cls(memory, channels, capacity, offset)
+
+    @classmethod
+    def Attach(cls, name : str) -> 'SharedTrajectory':
+        """
+        Construct a SharedTrajectory object attached to an existing shared memory block
+
+        Parameters
+        ----------
+        name : str
+            Name of the block
+
+        Returns
+        -------
+        SharedTrajectory
+            Trajectory backed by the block
+        """
+        memory = shared_memory.SharedMemory(name = name)
+        magic, version, capacity, _, size = HEADER.unpack_from(memory.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            memory.close()
+            raise ValueError(f"{name} is not a shared trajectory block")
+
+        channels = json.loads(bytes(memory.buf[HEADER.size:HEADER.size + size]))
+        return cls(memory, channels, capacity, HEADER.size + 8 * math.ceil(size / 8))
+
+    def __len__(self) -> int:
+        return HEADER.unpack_from(self.memory.buf, 0)[3]
+
+    def __enter__(self) -> 'SharedTrajectory':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def append(self, row : Sequence[float]) -> None:
+        """
+        Append a row of channel values
+
+        Parameters
+        ----------
+        row : Sequence[float]
+            Value of every channel, in channel order
+        """
+        length = len(self)
+        if length >= self.capacity:
+            raise IndexError(f"Shared trajectory {self.name} is full ({self.capacity} rows)")
+
+        data = self._data
+        capacity = self.capacity
+        for i, value in enumerate(row):
+            data[i * capacity + length] = value
+        # Publish the row only once every column holds it
+        struct.pack_into("<Q", self.memory.buf, 16, length + 1)
+
+    def recordBody(self, time : float, body) -> None:
+        """
+        Append the current state of a body
+
+        Parameters
+        ----------
+        time : float
+            Sim time of the state
+        body : Rigidbody
+            Body to sample
+        """
+        if self._getters is None:
+            if not all(channel in CHANNEL_SOURCES for channel in self.channels[1:]):
+                raise ValueError("recordBody() needs every channel after time to be in CHANNEL_SOURCES")
+            self._getters = [attrgetter(CHANNEL_SOURCES[channel]) for channel in self.channels[1:]]
+        self.append([time] + [getter(body) for getter in self._getters])
+
+    def column(self, channel : str) -> memoryview:
+        """
+        Return the stored values of a channel without copying
+
+        Parameters
+        ----------
+        channel : str
+            Name of the channel
+
+        Returns
+        -------
+        memoryview
+            Float64 view of the stored values
+        """
+        start = self.channels.index(channel) * self.capacity
+        return self._data[start:start + len(self)]
+
+    def rows(self) -> Iterator[Dict[str, float]]:
+        """
+        Return the stored rows as channel name to value mappings
+
+        Returns
+        -------
+        Iterator[Dict[str, float]]
+            Stored rows in time order
+        """
+        columns = [self.column(channel) for channel in self.channels]
+        for values in zip(*columns):
+            yield dict(zip(self.channels, values))
+
+    def close(self) -> None:
+        """
+        Detach this process from the block
+        """
+        self._data.release()
+        self.memory.close()
+
+    def unlink(self) -> None:
+        """
+        Destroy the block once every process has closed it
+        """
+        self.memory.unlink()
+
+def _unlinkAll(names : List[str]) -> None:
+    for name in names:
+        try:
+            memory = shared_memory.SharedMemory(name = name)
+        except FileNotFoundError:
+            continue
+        memory.close()
+        memory.unlink()
+    names.clear()
+
+class SharedResultRegistry:
+    """
+    A class to hand out shared memory block names to workers and clean them up afterwards
+
+    Every block name is issued here before a worker creates it, so blocks left behind by a
+    crashed worker (or a parent that never read them) are still destroyed by cleanup(), when
+    leaving a with statement or at interpreter exit.
+
+    ...
+
+    Attributes
+    ----------
+    prefix : str
+        Prefix of every issued name
+
+    Methods
+    -------
+    issue():
+        Returns a new block name for a worker
+    attach():
+        Attaches to a block written by a worker
+    release():
+        Closes and destroys a block
+    cleanup():
+        Destroys every block issued by this registry
+    """
+
+    def __init__(self, prefix : Optional[str] = None) -> None:
+        """
+        Construct all necessary attributes for a SharedResultRegistry object
+
+        Parameters
+        ----------
+        prefix : str
+            Prefix of every issued name (a random prefix is chosen if omitted)
+        """
+
+        self.prefix = prefix if prefix is not None else "psim" + secrets.token_hex(4)
+        self._count = 0
+        self._names : List[str] = []
+        self._finalizer = weakref.finalize(self, _unlinkAll, self._names)
+
+    def __enter__(self) -> 'SharedResultRegistry':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cleanup()
+
+    def issue(self) -> str:
+        """
+        Return a new block name for a worker
+
+        Returns
+        -------
+        str
+            Unique block name
+        """
+        name = f"{self.prefix}_{self._count}"
+        self._count += 1
+        self._names.append(name)
+        return name
+
+    def attach(self, name : str) -> SharedTrajectory:
+        """
+        Attach to a block written by a worker
+
+        Parameters
+        ----------
+        name : str
+            Name issued by this registry
+
+        Returns
+        -------
+        SharedTrajectory
+            Trajectory backed by the block
+        """
+        if name not in self._names:
+            raise ValueError(f"{name} was not issued by this registry")
+        return SharedTrajectory.Attach(name)
+
+    def release(self, trajectory : SharedTrajectory) -> None:
+        """
+        Close and destroy a block
+
+        Parameters
+        ----------
+        trajectory : SharedTrajectory
+            Trajectory attached through this registry
+        """
+        trajectory.close()
+        try:
+            trajectory.unlink()
+        except FileNotFoundError:
+            pass
+        if trajectory.name in self._names:
+            self._names.remove(trajectory.name)
+
+    def cleanup(self) -> None:
+        """
+        Destroy every block issued by this registry that still exists
+        """
+        _unlinkAll(self._names)
+
+def runShared(job : Tuple[Scenario, str, Sequence[str]]) -> ScenarioResult:
+    """
+    Run a scenario, recording its trajectory into a new shared memory block
+
+    Meant to run in a worker process: the block is left for the parent to attach to by name,
+    and the returned result does not carry the body.
+
+    Parameters
+    ----------
+    job : Tuple[Scenario, str, Sequence[str]]
+        Scenario, block name and recorded channels
+
+    Returns
+    -------
+    ScenarioResult
+        Outcome of the run
+    """
+    scenario, name, channels = job
+    capacity = int(math.ceil(scenario.maxTime / scenario.dt)) + 2
+    trajectory = SharedTrajectory.Create(channels, capacity, name)
+    try:
+        result = scenario.run(trajectory.recordBody)
+    finally:
+        trajectory.close()
+    return replace(result, body = None)
+
+def runScenariosShared(scenarios : Sequence[Scenario], registry : SharedResultRegistry, channels : Sequence[str] = DEFAULT_CHANNELS,
+                       workers : int = 0) -> Iterator[Tuple[ScenarioResult, SharedTrajectory]]:
+    """
+    Run scenarios in worker processes and return their trajectories through shared memory
+
+    Trajectories are yielded in scenario order; release each one through the registry once read.
+
+    Parameters
+    ----------
+    scenarios : Sequence[Scenario]
+        Scenarios to run
+    registry : SharedResultRegistry
+        Registry issuing the block names
+    channels : Sequence[str]
+        Recorded channels, time first (see CHANNEL_SOURCES)
+    workers : int
+        Number of worker processes (0 or 1 runs in-process)
+
+    Returns
+    -------
+    Iterator[Tuple[ScenarioResult, SharedTrajectory]]
+        Outcome and trajectory of every run
+    """
+    jobs = [(scenario, registry.issue(), tuple(channels)) for scenario in scenarios]
+
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            for job, result in zip(jobs, executor.map(runShared, jobs)):
+                yield result, registry.attach(job[1])
+    else:
+        for job in jobs:
+            result = runShared(job)
+            yield result, registry.attach(job[1])
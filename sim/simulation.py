@@ -0,0 +1,584 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+from numbers import Number
+
+from core.vector import *
+from core.quaternion import *
+from core.matrix import Matrix3
+from sim.physics import Rigidbody, AerodynamicRigidbody, refreshInertia
+from sim.broadphase import UniformGrid
+from sim.scenario import Scenario, ScenarioResult, groundCrossing
+from sim.recorder import DEFAULT_CHANNELS, Recorder, RecordingPolicy
+from sim.metrics import RunMetrics, recorderBytes
+
+# Body properties a spawned child copies from its parent unless overridden
+INHERITED_PROPERTIES = ("mass", "moi", "gravity", "dragCoeff", "liftCoeff", "dragArea", "liftArea",
+                        "centerOfPressure", "globalWind", "airDensity", "integrator", "inertia")
+
+# Body properties a reused slot goes back to, as they were when its body was added or reserved
+POOLED_PROPERTIES = INHERITED_PROPERTIES + ("aeroRate",)
+
+class Simulation:
+    """
+    A class to step many bodies in lockstep on a shared clock
+
+    Every body is stepped until it hits the ground or reaches its time limit, after
+    which it leaves the active set and its outcome is kept as a ScenarioResult.
+
+    Bodies can be spawned and despawned mid-run. Slots of despawned bodies (and, with
+    recycle, of finished ones) go on a free list, and spawn() reuses their body objects in
+    place, so debris events do not keep allocating bodies. reserve() preallocates slots.
+
+    With a sleep speed set, bodies that stay slower than it (in both linear and angular
+    speed) for the sleep time are put to sleep: they keep their slot and broadphase entry but
+    are no longer stepped until woken, so per-step cost only tracks the bodies in motion.
+    Bodies accelerating faster than the sleep acceleration, such as a body at its apogee,
+    never count as at rest.
+
+    ...
+
+    Attributes
+    ----------
+    dt : float
+        Physics step size (in seconds)
+    time : float
+        Current sim time
+    bodies : List[Rigidbody]
+        Every body added, indexed by slot
+    active : List[int]
+        Slots of the bodies still in flight
+    results : List[Optional[ScenarioResult]]
+        Outcome of every finished body, indexed by slot
+    observers : List[Callable[[float, int, Rigidbody], None]]
+        Functions called after every body step
+    broadphase : UniformGrid
+        Optional spatial index of the bodies in flight, keyed by slot
+    ground : FlatGround OR Heightmap
+        Ground the bodies impact (None for the z = 0 plane)
+    recycle : bool
+        Whether the slots of finished bodies are freed for reuse
+    retireHandlers : List[Callable[[int, ScenarioResult], None]]
+        Functions called with the slot and outcome of every finished body
+    deactivateHandlers : List[Callable[[int, str], None]]
+        Functions called with the slot and reason whenever a body stops being stepped
+    sleepSpeed : float
+        Speed below which a body counts as at rest (None disables sleeping)
+    sleepTime : float
+        Time a body must stay at rest before it is put to sleep
+    sleepAcc : float
+        Acceleration below which a slow body counts as at rest
+    sleeping : Set[int]
+        Slots of the sleeping bodies
+    recorders : Dict[int, Recorder]
+        Telemetry of every body, by slot, once record() was called
+    metrics : RunMetrics
+        Optional progress and throughput metrics, advanced every step
+
+    Factories
+    ---------
+    FromScenarios():
+        Creates a Simulation holding the bodies of several scenarios
+
+    Methods
+    -------
+    add():
+        Adds a body and returns its slot
+    reserve():
+        Preallocates free slots and their bodies
+    spawn():
+        Puts a body in flight in a free slot, optionally separating from a parent
+    despawn():
+        Removes a body from flight and frees its slot
+    onRetire():
+        Registers a function called when a body finishes
+    onDeactivate():
+        Registers a function called when a body stops being stepped
+    wake():
+        Puts a sleeping body back in the active set
+    record():
+        Records the telemetry of every body
+    observe():
+        Registers a function called after every body step
+    step():
+        Steps every active body once
+    run():
+        Steps until every body has finished
+    """
+
+    def __init__(self, dt : float = 0.01, broadphase : Optional[UniformGrid] = None, ground : Optional[Any] = None, recycle : bool = False,
+                 sleepSpeed : Optional[float] = None, sleepTime : float = 1.0, metrics : Optional[RunMetrics] = None, sleepAcc : float = 0.1) -> None:
+        """
+        Construct all necessary attributes for a Simulation object
+
+        Parameters
+        ----------
+        dt : float
+            Physics step size (in seconds)
+        broadphase : UniformGrid
+            Optional spatial index kept up to date with the bodies in flight
+        ground : FlatGround OR Heightmap
+            Ground the bodies impact (defaults to the z = 0 plane)
+        recycle : bool
+            Whether the slots of finished bodies are freed for reuse (their results are kept
+            until then, so collect them with onRetire())
+        sleepSpeed : float
+            Speed below which a body counts as at rest (None disables sleeping)
+        sleepTime : float
+            Time a body must stay at rest before it is put to sleep
+        metrics : RunMetrics
+            Optional progress and throughput metrics, advanced every step
+        sleepAcc : float
+            Acceleration below which a slow body counts as at rest
+        """
+
+        self.dt = float(dt)
+        self.time = 0.0
+        self.bodies : List[Rigidbody] = []
+        self.active : List[int] = []
+        self.results : List[Optional[ScenarioResult]] = []
+        self.observers : List[Callable[[float, int, Rigidbody], None]] = []
+        self.broadphase = broadphase
+        self.ground = ground
+        self.recycle = recycle
+        self.retireHandlers : List[Callable[[int, ScenarioResult], None]] = []
+        self.deactivateHandlers : List[Callable[[int, str], None]] = []
+        self.sleepSpeed = sleepSpeed
+        self.sleepTime = sleepTime
+        self.sleepAcc = sleepAcc
+        self.sleeping : Set[int] = set()
+        self.recorders : Dict[int, Recorder] = {}
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.gauge("recorderBytes", lambda: recorderBytes(self.recorders.values()))
+
+        self._start : List[float] = []
+        self._maxTime : List[float] = []
+        self._apogee : List[float] = []
+        self._steps : List[int] = []
+        self._flying : List[bool] = []
+        self._free : List[int] = []
+        self._stepping = False
+        self._spawned : List[int] = []
+        self._despawned : Set[int] = set()
+        self._resting : List[int] = []
+        self._defaults : List[Dict[str, Any]] = []
+        self._recording : Optional[Callable[[], Recorder]] = None
+
+    @classmethod
+    def FromScenarios(cls, scenarios : Sequence[Scenario], **options : Any) -> 'Simulation':
+        """
+        Construct a Simulation object holding the bodies of several scenarios, in order
+
+        Parameters
+        ----------
+        scenarios : Sequence[Scenario]
+            Scenarios sharing the same step size
+        **options : Any
+            Other arguments of the Simulation (broadphase, ground)
+
+        Returns
+        -------
+        Simulation
+            Simulation with one slot per scenario
+        """
+        if len({float(scenario.dt) for scenario in scenarios}) > 1:
+            raise ValueError("All scenarios of a Simulation must share the same dt")
+
+        simulation = cls(scenarios[0].dt if scenarios else 0.01, **options)
+        for scenario in scenarios:
+            simulation.add(scenario.build(), scenario.maxTime)
+        return simulation
+
+    def add(self, body : Rigidbody, maxTime : float = 60, radius : float = 0.0) -> int:
+        """
+        Add a body in flight from the current sim time
+
+        Parameters
+        ----------
+        body : Rigidbody
+            Body to simulate
+        maxTime : float
+            Flight time after which the body is stopped
+        radius : float
+            Bounding radius of the body in the broadphase
+
+        Returns
+        -------
+        int
+            Slot of the body
+        """
+        slot = len(self.bodies)
+        self.bodies.append(body)
+        self.results.append(None)
+        self._start.append(0.0)
+        self._maxTime.append(0.0)
+        self._apogee.append(0.0)
+        self._steps.append(0)
+        self._flying.append(False)
+        self._resting.append(0)
+        self._defaults.append(self._pooled(body))
+        self._launch(slot, maxTime, radius)
+        return slot
+
+    def _pooled(self, body : Rigidbody) -> Dict[str, Any]:
+        return {name: getattr(body, name) for name in POOLED_PROPERTIES if hasattr(body, name)}
+
+    def _launch(self, slot : int, maxTime : float, radius : float) -> None:
+        body = self.bodies[slot]
+        self.results[slot] = None
+        self._start[slot] = self.time
+        self._maxTime[slot] = maxTime
+        self._apogee[slot] = body.pos.z
+        self._steps[slot] = 0
+        self._flying[slot] = True
+        self._resting[slot] = 0
+        if self._recording is not None:
+            self.recorders[slot] = self._recording()
+        (self._spawned if self._stepping else self.active).append(slot)
+        if self.broadphase is not None:
+            self.broadphase.insert(slot, body.pos, radius)
+
+    def reserve(self, count : int, factory : Callable[[], Rigidbody] = AerodynamicRigidbody) -> None:
+        """
+        Preallocate free slots and their bodies for later spawns
+
+        Parameters
+        ----------
+        count : int
+            Number of slots to add
+        factory : Callable[[], Rigidbody]
+            Function creating an idle body
+        """
+        for _ in range(count):
+            slot = len(self.bodies)
+            body = factory()
+            self.bodies.append(body)
+            self._defaults.append(self._pooled(body))
+            self.results.append(None)
+            self._start.append(0.0)
+            self._maxTime.append(0.0)
+            self._apogee.append(0.0)
+            self._steps.append(0)
+            self._flying.append(False)
+            self._resting.append(0)
+            self._free.append(slot)
+
+    def spawn(self, pos : Optional[Vector3] = None, vel : Optional[Vector3] = None, ori : Optional[Quaternion] = None,
+              angularVel : Optional[Vector3] = None, parent : Optional[int] = None, offset : Vector3 = Vector3.Zero(),
+              deltaV : Vector3 = Vector3.Zero(), maxTime : float = 60, radius : float = 0.0, **properties : Any) -> int:
+        """
+        Put a body in flight in a free slot, reusing its body object
+
+        The body first goes back to the POOLED_PROPERTIES it had when its slot was added or
+        reserved, so nothing carries over from an earlier occupant. A child of a parent body
+        starts from the parent's current state, displaced by offset and pushed by deltaV (both
+        in the parent's local frame), and copies the parent's INHERITED_PROPERTIES unless they
+        are given. Bodies spawned during a step are first stepped on the next one.
+
+        Parameters
+        ----------
+        pos : Vector3
+            Position of the body (defaults to the parent's, or the origin)
+        vel : Vector3
+            Velocity of the body (defaults to the parent's, or zero)
+        ori : Quaternion
+            Orientation of the body (defaults to the parent's, or identity)
+        angularVel : Vector3
+            Angular velocity of the body (defaults to the parent's, or zero)
+        parent : int
+            Slot of the body this one separates from
+        offset : Vector3
+            Separation offset from the parent in its local frame
+        deltaV : Vector3
+            Separation velocity relative to the parent in its local frame
+        maxTime : float
+            Flight time after which the body is stopped
+        radius : float
+            Bounding radius of the body in the broadphase
+        **properties : Any
+            Body attributes to set (mass, dragCoeff, dragArea, ...); moi may be a scalar,
+            Vector3 or Matrix3 as for Rigidbody
+
+        Returns
+        -------
+        int
+            Slot of the body
+        """
+        given = properties
+        if parent is not None:
+            source = self.bodies[parent]
+            inherited = {name: getattr(source, name) for name in INHERITED_PROPERTIES if hasattr(source, name)}
+            inherited.update(properties)
+            properties = inherited
+            pos = pos if pos is not None else source.pos + offset * source.ori
+            vel = vel if vel is not None else source.vel + deltaV * source.ori
+            ori = ori if ori is not None else source.ori
+            angularVel = angularVel if angularVel is not None else source.angularVel
+
+        if not self._free:
+            self.reserve(1)
+        slot = self._free.pop()
+        body = self.bodies[slot]
+        values = dict(self._defaults[slot])
+        values.update(properties)
+        if "moi" in given and "inertia" not in given:
+            # A given moi replaces any inherited or default inertia tensor
+            values["inertia"] = None
+        moi = values.get("moi")
+        if isinstance(moi, Matrix3):
+            values["inertia"], values["moi"] = moi, moi.diagonal()
+        elif isinstance(moi, Number):
+            values["moi"] = Vector3(moi, moi, moi)
+        if "mass" in properties:
+            values["mass"] = float(values["mass"])
+        for name, value in values.items():
+            setattr(body, name, value)
+        body.reset(pos if pos is not None else Vector3.Zero(), vel if vel is not None else Vector3.Zero(),
+                   ori if ori is not None else Quaternion.Zero(), angularVel if angularVel is not None else Vector3.Zero())
+
+        self._launch(slot, maxTime, radius)
+        return slot
+
+    def despawn(self, slot : int) -> None:
+        """
+        Remove a body from flight without a result and free its slot
+
+        During a step, the body leaves the active set at the end of the step.
+
+        Parameters
+        ----------
+        slot : int
+            Slot of the body
+        """
+        if not self._flying[slot]:
+            raise ValueError(f"Slot {slot} is not in flight")
+
+        self._flying[slot] = False
+        self.results[slot] = None
+        if self.broadphase is not None:
+            self.broadphase.remove(slot)
+        if slot in self.sleeping:
+            self.sleeping.remove(slot)
+            self._free.append(slot)
+        elif self._stepping:
+            self._despawned.add(slot)
+        else:
+            self.active.remove(slot)
+            self._free.append(slot)
+        self._deactivate(slot, "despawned")
+
+    def onRetire(self, handler : Callable[[int, ScenarioResult], None]) -> None:
+        """
+        Register a function called when a body lands or reaches its time limit
+
+        Parameters
+        ----------
+        handler : Callable[[int, ScenarioResult], None]
+            Function of the body's slot and outcome
+        """
+        self.retireHandlers.append(handler)
+
+    def onDeactivate(self, handler : Callable[[int, str], None]) -> None:
+        """
+        Register a function called whenever a body stops being stepped
+
+        Parameters
+        ----------
+        handler : Callable[[int, str], None]
+            Function of the body's slot and the reason: "landed", "timeout", "asleep" or "despawned"
+        """
+        self.deactivateHandlers.append(handler)
+
+    def wake(self, slot : int) -> None:
+        """
+        Put a sleeping body back in the active set
+
+        Parameters
+        ----------
+        slot : int
+            Slot of the body
+        """
+        self.sleeping.remove(slot)
+        self._resting[slot] = 0
+        (self._spawned if self._stepping else self.active).append(slot)
+
+    def record(self, channels : Sequence[str] = DEFAULT_CHANNELS, policy : Optional[Callable[[], RecordingPolicy]] = None) -> Dict[int, Recorder]:
+        """
+        Record the telemetry of every body from now on, one Recorder per slot
+
+        Recorders are flushed whenever their body is deactivated, so each one ends with the
+        body's final state even under a sparse recording policy. A reused slot starts a new
+        Recorder; collect the old one with onDeactivate() first.
+
+        Parameters
+        ----------
+        channels : Sequence[str]
+            Recorded channels, time first (see CHANNEL_SOURCES)
+        policy : Callable[[], RecordingPolicy]
+            Function creating the recording policy of each body (defaults to every step)
+
+        Returns
+        -------
+        Dict[int, Recorder]
+            Recorder of every body, by slot
+        """
+        self._recording = lambda : Recorder(channels, policy() if policy is not None else None)
+        for slot in self.active:
+            self.recorders[slot] = self._recording()
+
+        recorders = self.recorders
+        def sample(time : float, slot : int, body : Rigidbody) -> None:
+            recorders[slot].recordBody(time, body)
+        self.observe(sample)
+        self.onDeactivate(lambda slot, reason : recorders[slot].flush() if slot in recorders else None)
+        return recorders
+
+    def observe(self, observer : Callable[[float, int, Rigidbody], None]) -> None:
+        """
+        Register a function called after every step of every active body
+
+        Parameters
+        ----------
+        observer : Callable[[float, int, Rigidbody], None]
+            Function of the body's flight time, its slot and the body
+        """
+        self.observers.append(observer)
+
+    def _deactivate(self, slot : int, reason : str) -> None:
+        for handler in self.deactivateHandlers:
+            handler(slot, reason)
+
+    def _retire(self, slot : int, result : ScenarioResult) -> None:
+        self.results[slot] = result
+        self._flying[slot] = False
+        if self.broadphase is not None:
+            self.broadphase.remove(slot)
+        self._deactivate(slot, "landed" if result.landed else "timeout")
+        for handler in self.retireHandlers:
+            handler(slot, result)
+        if self.metrics is not None:
+            self.metrics.complete()
+        if self.recycle:
+            self._free.append(slot)
+
+    def _settles(self, slot : int, body : Rigidbody) -> bool:
+        # Count the steps spent at rest and put the body to sleep once it stayed long enough
+        # A slow body still under way, e.g. at the top of a climb, does not count as resting
+        limit = self.sleepSpeed * self.sleepSpeed
+        if (body.vel.dot(body.vel) < limit and body.angularVel.dot(body.angularVel) < limit
+                and body.lastAcc.dot(body.lastAcc) < self.sleepAcc * self.sleepAcc):
+            self._resting[slot] += 1
+            if self._resting[slot] * self.dt >= self.sleepTime:
+                self.sleeping.add(slot)
+                self._deactivate(slot, "asleep")
+                return True
+        else:
+            self._resting[slot] = 0
+        return False
+
+    def step(self) -> None:
+        """
+        Step every active body once, retiring bodies that landed or reached their time limit
+
+        With terrain, bodies below its maxHeight are checked against it in one batched query.
+        The torque responses of all bodies are refreshed in one pass before they are stepped.
+        """
+        dt = self.dt
+        self.time += dt
+        self._stepping = True
+        observers = self.observers
+        ground = self.ground
+        ceiling = 0.0 if ground is None else ground.maxHeight
+        flying = self._flying
+        sleeps = self.sleepSpeed is not None
+        stepped = len(self.active)
+        counting = self.metrics is not None
+        evaluations = 0
+        still = []
+        low = []
+
+        bodies = self.bodies
+        refreshInertia([bodies[slot] for slot in self.active if flying[slot]])
+
+        for slot in self.active:
+            if not flying[slot]:
+                # Despawned earlier in this step
+                continue
+            body = self.bodies[slot]
+            lastPos = body.pos
+            if counting:
+                # Integrators evaluate the forces once per stage; multi-rate aerodynamics only when due
+                rate = getattr(body, "aeroRate", None) if body.integrator is None else None
+                if rate is not None:
+                    evaluations -= rate.evaluations
+                else:
+                    evaluations += 1 if body.integrator is None else body.integrator.stages
+            body.update(dt)
+            if counting and rate is not None:
+                evaluations += rate.evaluations
+            time = self.time - self._start[slot]
+            self._steps[slot] += 1
+
+            for observer in observers:
+                observer(time, slot, body)
+
+            if body.pos.z > self._apogee[slot]:
+                self._apogee[slot] = body.pos.z
+
+            if body.pos.z < ceiling:
+                if ground is not None:
+                    low.append((slot, lastPos, time))
+                    continue
+                impact, flightTime = groundCrossing(lastPos, body.pos, time, dt)
+                self._retire(slot, ScenarioResult(impact, True, self._apogee[slot], flightTime, self._steps[slot], body))
+            elif time >= self._maxTime[slot]:
+                self._retire(slot, ScenarioResult(body.pos, False, self._apogee[slot], time, self._steps[slot], body))
+            elif not (sleeps and self._settles(slot, body)):
+                still.append(slot)
+
+        if low:
+            bodies = self.bodies
+            heights = ground.heights([(bodies[slot].pos.x, bodies[slot].pos.y) for slot, _, _ in low])
+            for (slot, lastPos, time), height in zip(low, heights):
+                if not flying[slot]:
+                    continue
+                body = bodies[slot]
+                if body.pos.z < height:
+                    impact, flightTime = ground.crossing(lastPos, body.pos, time, dt)
+                    self._retire(slot, ScenarioResult(impact, True, self._apogee[slot], flightTime, self._steps[slot], body))
+                elif time >= self._maxTime[slot]:
+                    self._retire(slot, ScenarioResult(body.pos, False, self._apogee[slot], time, self._steps[slot], body))
+                elif not (sleeps and self._settles(slot, body)):
+                    still.append(slot)
+            still.sort()
+
+        self._stepping = False
+        if self._despawned:
+            despawned = self._despawned
+            still = [slot for slot in still if slot not in despawned]
+            self._free.extend(despawned)
+            self._despawned = set()
+        if self._spawned:
+            still.extend(self._spawned)
+            self._spawned = []
+
+        self.active = still
+
+        if self.broadphase is not None:
+            bodies = self.bodies
+            self.broadphase.update((slot, bodies[slot].pos) for slot in still)
+
+        if self.metrics is not None:
+            self.metrics.advance(dt, stepped, evaluations)
+
+    def run(self) -> List[ScenarioResult]:
+        """
+        Step until every body has finished or fallen asleep
+
+        Returns
+        -------
+        List[ScenarioResult]
+            Outcome of every body, indexed by slot
+        """
+        while self.active:
+            self.step()
+        return self.results
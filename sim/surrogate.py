@@ -0,0 +1,455 @@
+import json
+import math
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from typing import Dict, List, Optional, Sequence, Tuple, Any
+
+from core.linalg import solveLinear, leastSquares
+from sim.scenario import Scenario, SCENARIO_PARAMETERS
+from sim.sampling import SobolSequence
+
+# Run outcomes a surrogate can predict
+SURROGATE_OUTPUTS = ("impact.x", "impact.y", "apogee", "flightTime")
+
+def runOutputs(scenario : Scenario) -> List[float]:
+    """
+    Run a scenario and return the outcomes a surrogate is fitted to
+
+    Parameters
+    ----------
+    scenario : Scenario
+        Scenario to run
+
+    Returns
+    -------
+    List[float]
+        Value of each of SURROGATE_OUTPUTS
+    """
+    result = scenario.run()
+    return [result.impact.x, result.impact.y, result.apogee, result.flightTime]
+
+def legendre(degree : int, x : float) -> float:
+    """
+    Evaluate a Legendre polynomial with Bonnet's recursion
+
+    Parameters
+    ----------
+    degree : int
+        Degree of the polynomial
+    x : float
+        Point in [-1, 1]
+
+    Returns
+    -------
+    float
+        Value of the polynomial
+    """
+    if degree == 0:
+        return 1.0
+    p0, p1 = 1.0, x
+    for n in range(1, degree):
+        p0, p1 = p1, ((2 * n + 1) * x * p1 - n * p0) / (n + 1)
+    return p1
+
+class Surrogate(ABC):
+    """
+    Base class for cheap models of run outcomes over a box of scenario parameters
+
+    Inputs are scaled from their bounds onto [-1, 1] before fitting.
+
+    ...
+
+    Attributes
+    ----------
+    inputs : Tuple[str, ...]
+        Names of the input parameters (see SCENARIO_PARAMETERS)
+    bounds : Dict[str, Tuple[float, float]]
+        Lower and upper bound of each input
+    outputs : Tuple[str, ...]
+        Names of the predicted outcomes
+    validation : Dict[str, Dict[str, float]]
+        Cross-validated RMS and maximum error of each output
+
+    Methods
+    -------
+    fit():
+        Fits the model to a set of runs
+    predict():
+        Returns the predicted outcomes for a set of input values
+    crossValidate():
+        Estimates the prediction error by k-fold cross-validation
+    save():
+        Writes the fitted model to a JSON file
+    Load():
+        Creates a fitted Surrogate from a JSON file
+    """
+
+    kind = ""
+
+    def __init__(self, inputs : Sequence[str], bounds : Dict[str, Tuple[float, float]], outputs : Sequence[str] = SURROGATE_OUTPUTS) -> None:
+        """
+        Construct all necessary attributes for a Surrogate object
+
+        Parameters
+        ----------
+        inputs : Sequence[str]
+            Names of the input parameters (see SCENARIO_PARAMETERS)
+        bounds : Dict[str, Tuple[float, float]]
+            Lower and upper bound of each input
+        outputs : Sequence[str]
+            Names of the predicted outcomes
+        """
+
+        self.inputs = tuple(inputs)
+        self.bounds = {name: (float(bounds[name][0]), float(bounds[name][1])) for name in self.inputs}
+        self.outputs = tuple(outputs)
+        self.validation : Dict[str, Dict[str, float]] = {}
+
+    def _scale(self, values : Sequence[float]) -> List[float]:
+        scaled = []
+        for name, v in zip(self.inputs, values):
+            low, high = self.bounds[name]
+            scaled.append(2 * (v - low) / (high - low) - 1)
+        return scaled
+
+    @abstractmethod
+    def _fitScaled(self, points : List[List[float]], targets : List[List[float]]) -> None:
+        pass
+
+    @abstractmethod
+    def _predictScaled(self, point : List[float]) -> List[float]:
+        pass
+
+    @abstractmethod
+    def _parameters(self) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    def _restore(self, data : Dict[str, Any]) -> None:
+        pass
+
+    def fit(self, samples : List[Sequence[float]], results : List[Sequence[float]]) -> 'Surrogate':
+        """
+        Fit the model to a set of runs
+
+        Parameters
+        ----------
+        samples : List[Sequence[float]]
+            Input values of every run, in input order
+        results : List[Sequence[float]]
+            Outcomes of every run, in output order
+
+        Returns
+        -------
+        Surrogate
+            This surrogate, fitted
+        """
+        self._fitScaled([self._scale(s) for s in samples], [list(r) for r in results])
+        return self
+
+    def predict(self, values : Dict[str, float]) -> Dict[str, float]:
+        """
+        Return the predicted outcomes for a set of input values
+
+        Parameters
+        ----------
+        values : Dict[str, float]
+            Value of every input
+
+        Returns
+        -------
+        Dict[str, float]
+            Predicted value of every output
+        """
+        return dict(zip(self.outputs, self._predictScaled(self._scale([values[name] for name in self.inputs]))))
+
+    def crossValidate(self, samples : List[Sequence[float]], results : List[Sequence[float]], folds : int = 5) -> Dict[str, Dict[str, float]]:
+        """
+        Estimate the prediction error by k-fold cross-validation, then fit to all runs
+
+        Parameters
+        ----------
+        samples : List[Sequence[float]]
+            Input values of every run, in input order
+        results : List[Sequence[float]]
+            Outcomes of every run, in output order
+        folds : int
+            Number of folds
+
+        Returns
+        -------
+        Dict[str, Dict[str, float]]
+            RMS and maximum absolute error of each output on held-out runs
+        """
+        points = [self._scale(s) for s in samples]
+        targets = [list(r) for r in results]
+        squared = [0.0] * len(self.outputs)
+        worst = [0.0] * len(self.outputs)
+
+        for fold in range(folds):
+            train = [i for i in range(len(points)) if i % folds != fold]
+            test = [i for i in range(len(points)) if i % folds == fold]
+            self._fitScaled([points[i] for i in train], [targets[i] for i in train])
+            for i in test:
+                for k, (p, t) in enumerate(zip(self._predictScaled(points[i]), targets[i])):
+                    squared[k] += (p - t) ** 2
+                    worst[k] = max(worst[k], abs(p - t))
+
+        self._fitScaled(points, targets)
+        self.validation = {name: {"rms": math.sqrt(squared[k] / len(points)), "max": worst[k]} for k, name in enumerate(self.outputs)}
+        return self.validation
+
+    def save(self, path : str) -> None:
+        """
+        Write the fitted model to a JSON file
+
+        Parameters
+        ----------
+        path : str
+            Path of the JSON file
+        """
+        data = {"type": self.kind, "inputs": list(self.inputs), "bounds": {k: list(v) for k, v in self.bounds.items()},
+                "outputs": list(self.outputs), "validation": self.validation}
+        data.update(self._parameters())
+        with open(path, 'w') as json_file:
+            json.dump(data, json_file)
+
+    @classmethod
+    def Load(cls, path : str) -> 'Surrogate':
+        """
+        Construct a fitted Surrogate object from a JSON file written by save()
+
+        Parameters
+        ----------
+        path : str
+            Path of the JSON file
+
+        Returns
+        -------
+        Surrogate
+            Fitted surrogate of the saved type
+        """
+        with open(path) as json_file:
+            data = json.load(json_file)
+        kinds = {subclass.kind: subclass for subclass in (PolynomialSurrogate, RBFSurrogate)}
+        if data["type"] not in kinds:
+            raise ValueError(f"Unknown surrogate type: {data['type']}")
+        surrogate = kinds[data["type"]].__new__(kinds[data["type"]])
+        Surrogate.__init__(surrogate, data["inputs"], data["bounds"], data["outputs"])
+        surrogate.validation = data["validation"]
+        surrogate._restore(data)
+        return surrogate
+
+class PolynomialSurrogate(Surrogate):
+    """
+    A polynomial chaos surrogate: a least-squares fit of total-degree Legendre polynomials
+
+    The Legendre basis is orthogonal for uniformly distributed inputs on their bounds.
+    """
+
+    kind = "polynomial"
+
+    def __init__(self, inputs : Sequence[str], bounds : Dict[str, Tuple[float, float]], outputs : Sequence[str] = SURROGATE_OUTPUTS,
+                 degree : int = 3, ridge : float = 1e-10) -> None:
+        """
+        Construct all necessary attributes for a PolynomialSurrogate object
+
+        Parameters
+        ----------
+        inputs, bounds, outputs
+            As for Surrogate
+        degree : int
+            Maximum total degree of the polynomial terms
+        ridge : float
+            Tikhonov regularisation of the least-squares fit
+        """
+
+        super().__init__(inputs, bounds, outputs)
+        self.degree = degree
+        self.ridge = ridge
+        self.terms = [t for t in product(range(degree + 1), repeat = len(self.inputs)) if sum(t) <= degree]
+        self.coefficients : List[List[float]] = []
+
+    def _basis(self, point : List[float]) -> List[float]:
+        tables = [[legendre(d, x) for d in range(self.degree + 1)] for x in point]
+        values = []
+        for term in self.terms:
+            v = 1.0
+            for table, d in zip(tables, term):
+                v *= table[d]
+            values.append(v)
+        return values
+
+    def _fitScaled(self, points : List[List[float]], targets : List[List[float]]) -> None:
+        if len(points) < len(self.terms):
+            raise ValueError(f"A degree {self.degree} surrogate needs at least {len(self.terms)} runs")
+        rows = [self._basis(p) for p in points]
+        self.coefficients = [leastSquares(rows, [t[k] for t in targets], self.ridge) for k in range(len(self.outputs))]
+
+    def _predictScaled(self, point : List[float]) -> List[float]:
+        basis = self._basis(point)
+        return [sum(c * b for c, b in zip(coefficients, basis)) for coefficients in self.coefficients]
+
+    def _parameters(self) -> Dict[str, Any]:
+        return {"degree": self.degree, "ridge": self.ridge, "terms": self.terms, "coefficients": self.coefficients}
+
+    def _restore(self, data : Dict[str, Any]) -> None:
+        self.degree = data["degree"]
+        self.ridge = data["ridge"]
+        self.terms = [tuple(t) for t in data["terms"]]
+        self.coefficients = data["coefficients"]
+
+class RBFSurrogate(Surrogate):
+    """
+    A radial basis function interpolant with a linear polynomial tail
+
+    Kernels are "cubic" (r^3, no shape parameter), "gaussian" and "multiquadric".
+    """
+
+    kind = "rbf"
+
+    def __init__(self, inputs : Sequence[str], bounds : Dict[str, Tuple[float, float]], outputs : Sequence[str] = SURROGATE_OUTPUTS,
+                 kernel : str = "cubic", epsilon : float = 1.0, smoothing : float = 0.0) -> None:
+        """
+        Construct all necessary attributes for an RBFSurrogate object
+
+        Parameters
+        ----------
+        inputs, bounds, outputs
+            As for Surrogate
+        kernel : str
+            "cubic", "gaussian" or "multiquadric"
+        epsilon : float
+            Shape parameter of the gaussian and multiquadric kernels
+        smoothing : float
+            Value added to the kernel diagonal (0 interpolates the runs exactly)
+        """
+
+        if kernel not in ("cubic", "gaussian", "multiquadric"):
+            raise ValueError(f"Unknown RBF kernel: {kernel}")
+
+        super().__init__(inputs, bounds, outputs)
+        self.kernel = kernel
+        self.epsilon = epsilon
+        self.smoothing = smoothing
+        self.centers : List[List[float]] = []
+        self.weights : List[List[float]] = []
+
+    def _phi(self, r : float) -> float:
+        if self.kernel == "cubic":
+            return r * r * r
+        if self.kernel == "gaussian":
+            return math.exp(-(self.epsilon * r) ** 2)
+        return math.sqrt(1 + (self.epsilon * r) ** 2)
+
+    def _fitScaled(self, points : List[List[float]], targets : List[List[float]]) -> None:
+        n = len(points)
+        d = len(self.inputs)
+        size = n + d + 1
+        a = [[0.0] * size for _ in range(size)]
+        for i, p in enumerate(points):
+            for j, q in enumerate(points):
+                a[i][j] = self._phi(math.dist(p, q))
+            a[i][i] += self.smoothing
+            tail = [1.0] + p
+            for k, v in enumerate(tail):
+                a[i][n + k] = v
+                a[n + k][i] = v
+
+        self.centers = [list(p) for p in points]
+        self.weights = [solveLinear(a, [t[k] for t in targets] + [0.0] * (d + 1)) for k in range(len(self.outputs))]
+
+    def _predictScaled(self, point : List[float]) -> List[float]:
+        features = [self._phi(math.dist(point, c)) for c in self.centers] + [1.0] + list(point)
+        return [sum(w * f for w, f in zip(weights, features)) for weights in self.weights]
+
+    def _parameters(self) -> Dict[str, Any]:
+        return {"kernel": self.kernel, "epsilon": self.epsilon, "smoothing": self.smoothing,
+                "centers": self.centers, "weights": self.weights}
+
+    def _restore(self, data : Dict[str, Any]) -> None:
+        self.kernel = data["kernel"]
+        self.epsilon = data["epsilon"]
+        self.smoothing = data["smoothing"]
+        self.centers = data["centers"]
+        self.weights = data["weights"]
+
+def sampleRuns(nominal : Scenario, bounds : Dict[str, Tuple[float, float]], n : int, seed : Optional[int] = None,
+               workers : int = 0) -> Tuple[List[List[float]], List[List[float]]]:
+    """
+    Run a scrambled Sobol design of scenarios over a box of parameters
+
+    Parameters
+    ----------
+    nominal : Scenario
+        Scenario whose parameters are varied
+    bounds : Dict[str, Tuple[float, float]]
+        Lower and upper bound of each varied parameter (see SCENARIO_PARAMETERS)
+    n : int
+        Number of runs (preferably a power of two)
+    seed : int
+        Seed for the design
+    workers : int
+        Number of worker processes (0 or 1 runs in-process)
+
+    Returns
+    -------
+    Tuple[List[List[float]], List[List[float]]]
+        Input values and outcomes (SURROGATE_OUTPUTS) of every run
+    """
+    unknown = [name for name in bounds if name not in SCENARIO_PARAMETERS]
+    if unknown:
+        raise ValueError(f"Unknown surrogate inputs: {', '.join(unknown)}")
+
+    names = list(bounds)
+    samples = [[bounds[name][0] + (bounds[name][1] - bounds[name][0]) * u for name, u in zip(names, point)]
+               for point in SobolSequence(len(names), seed = seed).random(n)]
+    scenarios = [nominal.withParameters(dict(zip(names, s))) for s in samples]
+
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(runOutputs, scenarios, chunksize = max(1, n // (4 * workers))))
+    else:
+        results = [runOutputs(scenario) for scenario in scenarios]
+    return samples, results
+
+def buildSurrogate(nominal : Scenario, bounds : Dict[str, Tuple[float, float]], n : int = 128, model : str = "polynomial",
+                   folds : int = 5, seed : Optional[int] = None, workers : int = 0, **options : Any) -> Surrogate:
+    """
+    Run a design of scenarios, then fit and cross-validate a surrogate of their outcomes
+
+    Parameters
+    ----------
+    nominal : Scenario
+        Scenario whose parameters are varied
+    bounds : Dict[str, Tuple[float, float]]
+        Lower and upper bound of each varied parameter (see SCENARIO_PARAMETERS)
+    n : int
+        Number of runs (preferably a power of two)
+    model : str
+        "polynomial" or "rbf"
+    folds : int
+        Number of cross-validation folds
+    seed : int
+        Seed for the design
+    workers : int
+        Number of worker processes (0 or 1 runs in-process)
+    **options : Any
+        Options of the surrogate class (degree, kernel, ...)
+
+    Returns
+    -------
+    Surrogate
+        Fitted surrogate with its validation errors
+    """
+    if model == "polynomial":
+        surrogate : Surrogate = PolynomialSurrogate(list(bounds), bounds, **options)
+    elif model == "rbf":
+        surrogate = RBFSurrogate(list(bounds), bounds, **options)
+    else:
+        raise ValueError(f"Unknown surrogate model: {model}")
+
+    samples, results = sampleRuns(nominal, bounds, n, seed, workers)
+    surrogate.crossValidate(samples, results, folds)
+    return surrogate
@@ -0,0 +1,472 @@
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from core.vector import *
+from core.linalg import Matrix, solveLinear
+from sim.scenario import Scenario, SCENARIO_PARAMETERS
+from sim.sensitivity import runSensitivity
+
+# Default bounds of the launch parameters; every other parameter is unbounded unless given
+DEFAULT_BOUNDS = {"speed": (0.0, math.inf), "elevation": (-math.pi / 2, math.pi / 2), "mass": (1e-6, math.inf)}
+
+def runImpact(scenario : Scenario) -> Tuple[float, float, bool]:
+    """
+    Run a scenario and return its horizontal impact point
+
+    Parameters
+    ----------
+    scenario : Scenario
+        Scenario to run
+
+    Returns
+    -------
+    Tuple[float, float, bool]
+        Impact x, impact y and whether or not the body landed
+    """
+    result = scenario.run()
+    return result.impact.x, result.impact.y, result.landed
+
+def leastSquaresStep(jac : Matrix, residual : List[float], damping : float) -> List[float]:
+    """
+    Return the damped Gauss-Newton (Levenberg-Marquardt) step for a residual
+
+    Parameters
+    ----------
+    jac : Matrix
+        Jacobian of the residual (rows) with respect to the parameters (columns)
+    residual : List[float]
+        Current residual
+    damping : float
+        Levenberg-Marquardt damping factor
+
+    Returns
+    -------
+    List[float]
+        Parameter step minimising |residual + jac step|^2 + damping * |D step|^2
+    """
+    n = len(jac[0])
+    jtj = [[sum(row[i] * row[j] for row in jac) for j in range(n)] for i in range(n)]
+    jtr = [sum(row[i] * r for row, r in zip(jac, residual)) for i in range(n)]
+    for i in range(n):
+        jtj[i][i] += damping * max(jtj[i][i], 1e-12)
+    return solveLinear(jtj, [-g for g in jtr])
+
+@dataclass
+class TargetingResult:
+    """
+    A class to represent the outcome of a targeting solve
+
+    ...
+
+    Attributes
+    ----------
+    parameters : Dict[str, float]
+        Solved value of each parameter
+    impact : Vector2
+        Horizontal impact point reached with the solved parameters
+    miss : float
+        Distance between the impact point and the target
+    converged : bool
+        Whether or not the body landed and the miss distance is within tolerance
+    iterations : int
+        Number of solver iterations
+    evaluations : int
+        Number of simulation runs
+    scenario : Scenario
+        Nominal scenario with the solved parameters applied
+    landed : bool
+        Whether or not the body landed with the solved parameters (impact is its last position otherwise)
+    """
+
+    parameters : Dict[str, float]
+    impact : Vector2
+    miss : float
+    converged : bool
+    iterations : int
+    evaluations : int
+    scenario : Optional[Scenario] = None
+    landed : bool = True
+
+@dataclass
+class CachedSolution:
+    """
+    A class to represent a previously solved target
+
+    ...
+
+    Attributes
+    ----------
+    target : Vector2
+        Solved target point
+    values : List[float]
+        Solved parameter values
+    jacobian : Matrix
+        Jacobian of the impact point at the solution
+    """
+
+    target : Vector2
+    values : List[float]
+    jacobian : Matrix = field(default_factory=list)
+
+class SolutionCache:
+    """
+    A class to keep recent targeting solutions for warm starts
+
+    ...
+
+    Attributes
+    ----------
+    maxEntries : int
+        Maximum number of kept solutions, the oldest being dropped first
+    entries : List[CachedSolution]
+        Kept solutions, oldest first
+
+    Methods
+    -------
+    add():
+        Keeps a solution
+    nearest():
+        Returns the kept solution closest to a target
+    save():
+        Writes the kept solutions to a JSON file
+    Load():
+        Creates a SolutionCache from a JSON file
+    """
+
+    def __init__(self, maxEntries : int = 256) -> None:
+        """
+        Construct all necessary attributes for a SolutionCache object
+
+        Parameters
+        ----------
+        maxEntries : int
+            Maximum number of kept solutions
+        """
+
+        self.maxEntries = maxEntries
+        self.entries : List[CachedSolution] = []
+
+    def add(self, solution : CachedSolution) -> None:
+        """
+        Keep a solution
+
+        Parameters
+        ----------
+        solution : CachedSolution
+            Solution to keep
+        """
+        self.entries.append(solution)
+        if len(self.entries) > self.maxEntries:
+            del self.entries[0]
+
+    def nearest(self, target : Vector2) -> Optional[CachedSolution]:
+        """
+        Return the kept solution closest to a target
+
+        Parameters
+        ----------
+        target : Vector2
+            Target point
+
+        Returns
+        -------
+        CachedSolution
+            Closest solution, or None if the cache is empty
+        """
+        if not self.entries:
+            return None
+        return min(self.entries, key = lambda entry : (entry.target - target).norm())
+
+    def save(self, path : str) -> None:
+        """
+        Write the kept solutions to a JSON file
+
+        Parameters
+        ----------
+        path : str
+            Path of the JSON file
+        """
+        data = [{"target": [e.target.x, e.target.y], "values": e.values, "jacobian": e.jacobian} for e in self.entries]
+        with open(path, 'w') as json_file:
+            json.dump({"maxEntries": self.maxEntries, "entries": data}, json_file)
+
+    @classmethod
+    def Load(cls, path : str) -> 'SolutionCache':
+        """
+        Construct a SolutionCache object from a JSON file written by save()
+
+        Parameters
+        ----------
+        path : str
+            Path of the JSON file
+
+        Returns
+        -------
+        SolutionCache
+            Loaded cache
+        """
+        with open(path) as json_file:
+            data = json.load(json_file)
+        cache = cls(data["maxEntries"])
+        for e in data["entries"]:
+            cache.add(CachedSolution(Vector2(*e["target"]), e["values"], e["jacobian"]))
+        return cache
+
+class Targeter:
+    """
+    A class to solve for scenario parameters that put the impact point on a target
+
+    The simulation is treated as a function from the selected parameters to the horizontal
+    impact point and solved with a bounded, damped Gauss-Newton (Levenberg-Marquardt) method.
+    The Jacobian is either rebuilt from forward differences every iteration ("lm"), or built
+    once and refined with Broyden rank-one updates ("broyden"). Forward-difference columns run
+    in parallel worker processes; jacobian="dual" instead gets the residual and the Jacobian
+    from a single forward-mode differentiated run. Solved targets are cached, and new targets
+    start from the nearest cached solution corrected by its Jacobian.
+
+    ...
+
+    Attributes
+    ----------
+    nominal : Scenario
+        Scenario whose parameters are solved for
+    parameters : Tuple[str, ...]
+        Names of the solved parameters (see SCENARIO_PARAMETERS)
+    bounds : Dict[str, Tuple[float, float]]
+        Lower and upper bound of each parameter
+    method : str
+        "lm" or "broyden"
+    jacobian : str
+        "parallel" (forward differences) or "dual" (forward-mode differentiation)
+    workers : int
+        Number of worker processes for forward differences (0 or 1 runs them in-process)
+    tolerance : float
+        Miss distance (in meters) at which the solve has converged
+    maxIterations : int
+        Maximum number of solver iterations
+    cache : SolutionCache
+        Solutions used for warm starts
+
+    Methods
+    -------
+    solve():
+        Solves for the parameters that hit a target
+    close():
+        Shuts down the worker processes
+    """
+
+    def __init__(self, nominal : Scenario, parameters : Sequence[str], bounds : Optional[Dict[str, Tuple[float, float]]] = None,
+                 method : str = "broyden", jacobian : str = "parallel", workers : int = 0,
+                 tolerance : float = 0.1, maxIterations : int = 30, cache : Optional[SolutionCache] = None) -> None:
+        """
+        Construct all necessary attributes for a Targeter object
+
+        Parameters
+        ----------
+        nominal : Scenario
+            Scenario whose parameters are solved for
+        parameters : Sequence[str]
+            Names of the solved parameters (see SCENARIO_PARAMETERS)
+        bounds : Dict[str, Tuple[float, float]]
+            Lower and upper bound of each parameter (DEFAULT_BOUNDS otherwise)
+        method : str
+            "lm" or "broyden"
+        jacobian : str
+            "parallel" (forward differences) or "dual" (forward-mode differentiation)
+        workers : int
+            Number of worker processes for forward differences (0 or 1 runs them in-process)
+        tolerance : float
+            Miss distance (in meters) at which the solve has converged
+        maxIterations : int
+            Maximum number of solver iterations
+        cache : SolutionCache
+            Solutions used for warm starts (a new cache otherwise)
+        """
+
+        unknown = [name for name in parameters if name not in SCENARIO_PARAMETERS]
+        if unknown:
+            raise ValueError(f"Unknown targeting parameters: {', '.join(unknown)}")
+        if method not in ("lm", "broyden"):
+            raise ValueError(f"Unknown targeting method: {method}")
+        if jacobian not in ("parallel", "dual"):
+            raise ValueError(f"Unknown Jacobian evaluation: {jacobian}")
+
+        self.nominal = nominal
+        self.parameters = tuple(parameters)
+        self.bounds = {name: (bounds or {}).get(name, DEFAULT_BOUNDS.get(name, (-math.inf, math.inf))) for name in self.parameters}
+        self.method = method
+        self.jacobian = jacobian
+        self.workers = workers
+        self.tolerance = tolerance
+        self.maxIterations = maxIterations
+        self.cache = cache if cache is not None else SolutionCache()
+
+        self._executor : Optional[ProcessPoolExecutor] = None
+        self._evaluations = 0
+
+    def __enter__(self) -> 'Targeter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Shut down the worker processes
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _clamp(self, values : List[float]) -> List[float]:
+        return [min(max(v, self.bounds[name][0]), self.bounds[name][1]) for name, v in zip(self.parameters, values)]
+
+    def _scenario(self, values : Sequence[float]) -> Scenario:
+        return self.nominal.withParameters(dict(zip(self.parameters, values)))
+
+    def _run(self, scenarios : List[Scenario]) -> List[Tuple[float, float, bool]]:
+        self._evaluations += len(scenarios)
+        if self.workers > 1 and len(scenarios) > 1:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers)
+            return list(self._executor.map(runImpact, scenarios))
+        return [runImpact(scenario) for scenario in scenarios]
+
+    def _steps(self, values : List[float]) -> List[float]:
+        steps = []
+        for name, v in zip(self.parameters, values):
+            h = 1e-6 * max(1.0, abs(v))
+            # Step inwards at an upper bound
+            steps.append(-h if v + h > self.bounds[name][1] else h)
+        return steps
+
+    def _evaluate(self, values : List[float], target : Vector2, withJacobian : bool) -> Tuple[List[float], Optional[Matrix], bool]:
+        """
+        Return the residual at a set of parameter values, optionally its Jacobian, and whether the body landed
+
+        A run that stops mid-air has no impact point, so the Jacobian is None when any of its
+        runs did not land.
+        """
+        if self.jacobian == "dual" and withJacobian:
+            self._evaluations += 1
+            result, derivatives = runSensitivity(self._scenario(values), self.parameters)
+            residual = [result.impact.x - target.x, result.impact.y - target.y]
+            jac = [[derivatives["impact.x"][name] for name in self.parameters],
+                   [derivatives["impact.y"][name] for name in self.parameters]]
+            return residual, jac if result.landed else None, result.landed
+
+        if not withJacobian:
+            x, y, landed = self._run([self._scenario(values)])[0]
+            return [x - target.x, y - target.y], None, landed
+
+        # The base point and every forward-difference column run as one parallel batch
+        steps = self._steps(values)
+        points = [values] + [[v + (h if i == j else 0.0) for j, v in enumerate(values)] for i, h in enumerate(steps)]
+        impacts = self._run([self._scenario(p) for p in points])
+        x0, y0, landed = impacts[0]
+        if not all(impact[2] for impact in impacts):
+            return [x0 - target.x, y0 - target.y], None, landed
+        jac = [[(impacts[i + 1][0] - x0) / steps[i] for i in range(len(steps))],
+               [(impacts[i + 1][1] - y0) / steps[i] for i in range(len(steps))]]
+        return [x0 - target.x, y0 - target.y], jac, landed
+
+    def _warmStart(self, target : Vector2) -> Tuple[List[float], Optional[Matrix]]:
+        """
+        Return initial parameter values (and Jacobian) from the nearest cached solution
+        """
+        entry = self.cache.nearest(target)
+        if entry is None:
+            return self._clamp([self.nominal.parameter(name) for name in self.parameters]), None
+
+        values = list(entry.values)
+        if entry.jacobian:
+            # First-order prediction from the cached solution to the new target
+            shift = [-(target.x - entry.target.x), -(target.y - entry.target.y)]
+            try:
+                step = leastSquaresStep(entry.jacobian, shift, 1e-9)
+                values = [v + s for v, s in zip(values, step)]
+            except ZeroDivisionError:
+                pass
+        return self._clamp(values), entry.jacobian or None
+
+    def solve(self, target : Vector2, initial : Optional[Dict[str, float]] = None) -> TargetingResult:
+        """
+        Solve for the parameters that put the impact point on a target
+
+        Parameters
+        ----------
+        target : Vector2
+            Horizontal target point
+        initial : Dict[str, float]
+            Initial parameter values (warm-started from the cache otherwise)
+
+        Returns
+        -------
+        TargetingResult
+            Solved parameters and the reached impact point (trials that do not land are
+            rejected like ones that miss by more, and a start that does not land is not solved)
+        """
+        self._evaluations = 0
+
+        if initial is not None:
+            values = self._clamp([initial.get(name, self.nominal.parameter(name)) for name in self.parameters])
+            jac = None
+        else:
+            values, jac = self._warmStart(target)
+
+        needJacobian = self.method == "lm" or self.jacobian == "dual"
+        if jac is None or needJacobian:
+            residual, jac, landed = self._evaluate(values, target, True)
+            fresh = True
+        else:
+            residual, _, landed = self._evaluate(values, target, False)
+            jac = [list(row) for row in jac]
+            fresh = False
+
+        damping = 1e-3
+        iterations = 0
+        while landed and jac is not None and math.hypot(*residual) > self.tolerance and iterations < self.maxIterations:
+            iterations += 1
+            try:
+                step = leastSquaresStep(jac, residual, damping)
+            except ZeroDivisionError:
+                break
+            trial = self._clamp([v + s for v, s in zip(values, step)])
+            actual = [t - v for t, v in zip(trial, values)]
+            if not any(actual):
+                break
+
+            trialResidual, trialJac, trialLanded = self._evaluate(trial, target, needJacobian)
+            usable = trialLanded and (trialJac is not None or not needJacobian)
+
+            if usable and math.hypot(*trialResidual) < math.hypot(*residual):
+                if trialJac is None:
+                    # Broyden rank-one update along the step actually taken
+                    dd = sum(a * a for a in actual)
+                    for r in range(len(jac)):
+                        predicted = sum(jac[r][c] * actual[c] for c in range(len(actual)))
+                        error = (trialResidual[r] - residual[r]) - predicted
+                        for c in range(len(actual)):
+                            jac[r][c] += error * actual[c] / dd
+                    fresh = False
+                else:
+                    jac = trialJac
+                values, residual = trial, trialResidual
+                damping = max(damping / 3, 1e-9)
+            else:
+                damping *= 4
+                if not fresh:
+                    # A stale Broyden Jacobian is refreshed before damping further
+                    residual, jac, landed = self._evaluate(values, target, True)
+                    fresh = True
+
+        miss = math.hypot(*residual)
+        converged = landed and miss <= self.tolerance
+        if converged:
+            self.cache.add(CachedSolution(target, list(values), [list(row) for row in jac] if jac else []))
+
+        return TargetingResult(dict(zip(self.parameters, values)), Vector2(residual[0] + target.x, residual[1] + target.y),
+                               miss, converged, iterations, self._evaluations, self._scenario(values), landed)
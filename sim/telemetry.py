@@ -0,0 +1,544 @@
+import json
+import lzma
+import queue
+import struct
+import sys
+import threading
+import zlib
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from itertools import accumulate, chain
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# File layout: header, channel names as JSON, chunks of every channel's values, then the chunk index and its trailer
+TELEMETRY_MAGIC = b"PTLM"
+TELEMETRY_VERSION = 1
+TELEMETRY_HEADER = struct.Struct("<4sI8sI")
+# Chunk layout: magic, row count, payload size, first and last time, then the compressed payload
+CHUNK_HEADER = struct.Struct("<4sIIdd")
+CHUNK_MAGIC = b"CHNK"
+# Index entry layout: chunk offset, rows, payload size, first and last time, then the minimum and maximum of every channel
+INDEX_ENTRY = struct.Struct("<QIIdd")
+INDEX_TRAILER = struct.Struct("<4sQI")
+INDEX_MAGIC = b"PIDX"
+
+CODECS = ("zlib", "lzma", "none")
+
+Columns = Dict[str, array]
+
+WORD_MASK = (1 << 64) - 1
+
+def _difference(words : Sequence[int]) -> List[int]:
+    return [(value - previous) & WORD_MASK for value, previous in zip(words, chain((0,), words))]
+
+def _integrate(deltas : Sequence[int]) -> List[int]:
+    return list(accumulate(deltas, lambda total, delta: (total + delta) & WORD_MASK))
+
+def encodeColumn(column : array) -> bytes:
+    """
+    Delta-encode a column of doubles for compression
+
+    The bit patterns of the values are taken as 64-bit integers and differenced twice
+    (modulo 2**64, so the encoding is lossless), which leaves mostly small numbers for smooth
+    trajectories, and the bytes are then grouped by significance so the zero runs line up.
+
+    Parameters
+    ----------
+    column : array
+        Values of type 'd'
+
+    Returns
+    -------
+    bytes
+        Encoded values, 8 bytes per value
+    """
+    words = array('Q')
+    words.frombytes(column.tobytes())
+    if sys.byteorder != "little":
+        words.byteswap()
+    raw = array('Q', _difference(_difference(words))).tobytes()
+    return b"".join(raw[i::8] for i in range(8))
+
+def decodeColumn(data : bytes) -> array:
+    """
+    Decode a column written by encodeColumn()
+
+    Parameters
+    ----------
+    data : bytes
+        Encoded values
+
+    Returns
+    -------
+    array
+        Values of type 'd'
+    """
+    n = len(data) // 8
+    raw = bytearray(len(data))
+    for i in range(8):
+        raw[i::8] = data[i * n:(i + 1) * n]
+    deltas = array('Q')
+    deltas.frombytes(raw)
+    words = array('Q', _integrate(_integrate(deltas)))
+    if sys.byteorder != "little":
+        words.byteswap()
+    column = array('d')
+    column.frombytes(words.tobytes())
+    return column
+
+def _compress(codec : str, data : bytes, level : int) -> bytes:
+    if codec == "zlib":
+        return zlib.compress(data, level)
+    if codec == "lzma":
+        return lzma.compress(data, preset = level)
+    return data
+
+def _decompress(codec : str, data : bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "lzma":
+        return lzma.decompress(data)
+    return data
+
+@dataclass
+class ChunkIndex:
+    """
+    A class to represent the index entry of a telemetry chunk
+
+    ...
+
+    Attributes
+    ----------
+    offset : int
+        File offset of the chunk header
+    rows : int
+        Number of rows in the chunk
+    size : int
+        Size of the compressed payload
+    first : float
+        Time of the first row
+    last : float
+        Time of the last row
+    minimum : Dict[str, float]
+        Smallest value of every channel (None if the file has no index)
+    maximum : Dict[str, float]
+        Largest value of every channel (None if the file has no index)
+    """
+
+    offset : int
+    rows : int
+    size : int
+    first : float
+    last : float
+    minimum : Optional[Dict[str, float]] = None
+    maximum : Optional[Dict[str, float]] = None
+
+class TelemetryWriter:
+    """
+    A class to compress and write telemetry chunks on a background thread
+
+    Filled column chunks are handed over with write() (a Recorder with a writer does so on
+    its own every chunkRows rows), encoded and compressed on the writer thread and written
+    out in large sequential blocks. A bounded queue of pending chunks applies back-pressure
+    when the disk or the compressor falls behind the simulation. Closing the writer appends
+    an index of every chunk's time span, offset and per-channel range.
+
+    ...
+
+    Attributes
+    ----------
+    path : str
+        Path of the telemetry file
+    channels : Tuple[str, ...]
+        Names of the channels, time first
+    chunkRows : int
+        Rows per chunk a Recorder hands over
+    codec : str
+        Compression of the chunks (see CODECS)
+    level : int
+        Compression level
+    blockSize : int
+        Bytes gathered before each write to disk
+    rows : int
+        Number of rows handed over so far
+
+    Methods
+    -------
+    write():
+        Queues a chunk of columns for writing
+    close():
+        Writes every queued chunk and closes the file
+    """
+
+    def __init__(self, path : str, channels : Sequence[str], chunkRows : int = 4096, codec : str = "zlib", level : int = 6,
+                 queueSize : int = 4, blockSize : int = 1 << 20) -> None:
+        """
+        Construct all necessary attributes for a TelemetryWriter object
+
+        Parameters
+        ----------
+        path : str
+            Path of the telemetry file
+        channels : Sequence[str]
+            Names of the channels, time first
+        chunkRows : int
+            Rows per chunk a Recorder hands over
+        codec : str
+            Compression of the chunks (see CODECS)
+        level : int
+            Compression level
+        queueSize : int
+            Number of chunks that can wait for the writer thread before write() blocks
+        blockSize : int
+            Bytes gathered before each write to disk
+        """
+
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}")
+        if not channels or channels[0] != "time":
+            raise ValueError("The first channel must be time")
+
+        self.path = path
+        self.channels = tuple(channels)
+        self.chunkRows = chunkRows
+        self.codec = codec
+        self.level = level
+        self.blockSize = blockSize
+        self.rows = 0
+
+        self._file : BinaryIO = open(path, 'wb')
+        names = json.dumps(list(self.channels)).encode()
+        self._file.write(TELEMETRY_HEADER.pack(TELEMETRY_MAGIC, TELEMETRY_VERSION, codec.encode(), len(names)) + names)
+        self._position = self._file.tell()
+        self._index : List[bytes] = []
+
+        self._queue : queue.Queue = queue.Queue(maxsize = max(1, queueSize))
+        self._error : Optional[BaseException] = None
+        self._closed = False
+        self._thread = threading.Thread(target = self._run, daemon = True)
+        self._thread.start()
+
+    def __enter__(self) -> 'TelemetryWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _raise(self) -> None:
+        if self._error is not None:
+            raise IOError(f"Writing {self.path} failed") from self._error
+
+    def write(self, columns : Columns) -> None:
+        """
+        Queue a chunk of columns for writing
+
+        The arrays are owned by the writer from then on, so hand over filled buffers and keep
+        recording into fresh ones. Blocks while the queue is full.
+
+        Parameters
+        ----------
+        columns : Columns
+            Values of every channel, all of the same length
+        """
+        self._raise()
+        if self._closed:
+            raise ValueError("The writer is closed")
+        chunk = [columns[channel] for channel in self.channels]
+        if any(len(column) != len(chunk[0]) for column in chunk):
+            raise ValueError("Every column of a chunk must have the same length")
+        if len(chunk[0]):
+            self.rows += len(chunk[0])
+            self._queue.put(chunk)
+
+    def _encode(self, chunk : List[array]) -> bytes:
+        payload = _compress(self.codec, b"".join(encodeColumn(column) for column in chunk), self.level)
+        time = chunk[0]
+        ranges = [bound for column in chunk for bound in (min(column), max(column))]
+        self._index.append(INDEX_ENTRY.pack(self._position, len(time), len(payload), time[0], time[-1]) +
+                           struct.pack(f"<{len(ranges)}d", *ranges))
+        data = CHUNK_HEADER.pack(CHUNK_MAGIC, len(time), len(payload), time[0], time[-1]) + payload
+        self._position += len(data)
+        return data
+
+    def _run(self) -> None:
+        block = bytearray()
+        while True:
+            chunk = self._queue.get()
+            try:
+                if self._error is None:
+                    if chunk is not None:
+                        block += self._encode(chunk)
+                    else:
+                        block += b"".join(self._index) + INDEX_TRAILER.pack(INDEX_MAGIC, self._position, len(self._index))
+                    if chunk is None or len(block) >= self.blockSize:
+                        self._file.write(block)
+                        block = bytearray()
+            except BaseException as error:
+                self._error = error
+            if chunk is None:
+                return
+
+    def close(self) -> None:
+        """
+        Write every queued chunk and close the file
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        self._raise()
+
+class TelemetryReader:
+    """
+    A class to read a telemetry file written by a TelemetryWriter
+
+    The chunk index at the end of the file lets time windows and threshold crossings be
+    found by decoding only the chunks that can hold them. Files whose writer was not closed
+    have no index; their chunk headers are scanned instead and crossings searched everywhere.
+
+    ...
+
+    Attributes
+    ----------
+    path : str
+        Path of the telemetry file
+    channels : Tuple[str, ...]
+        Names of the channels, time first
+    codec : str
+        Compression of the chunks
+    index : List[ChunkIndex]
+        Time span, location and channel ranges of every chunk, in time order
+
+    Methods
+    -------
+    chunks():
+        Iterates over the decoded chunks
+    read():
+        Returns every value of some channels
+    window():
+        Returns the values of some channels within a time window
+    crossings():
+        Returns the times at which a channel crosses a threshold
+    close():
+        Closes the file
+    """
+
+    def __init__(self, path : str) -> None:
+        """
+        Construct all necessary attributes for a TelemetryReader object
+
+        Parameters
+        ----------
+        path : str
+            Path of the telemetry file
+        """
+
+        self.path = path
+        self._file : BinaryIO = open(path, 'rb')
+        magic, version, codec, size = TELEMETRY_HEADER.unpack(self._file.read(TELEMETRY_HEADER.size))
+        if magic != TELEMETRY_MAGIC:
+            self._file.close()
+            raise ValueError(f"{path} is not a telemetry file")
+        if version != TELEMETRY_VERSION:
+            self._file.close()
+            raise ValueError(f"{path} has unsupported version {version}")
+
+        self.codec = codec.rstrip(b"\0").decode()
+        self.channels : Tuple[str, ...] = tuple(json.loads(self._file.read(size)))
+        self._dataStart = self._file.tell()
+        self.index = self._readIndex()
+        if self.index is None:
+            self.index = list(self._headers())
+        self._firsts = [chunk.first for chunk in self.index]
+
+    def __enter__(self) -> 'TelemetryReader':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _readIndex(self) -> Optional[List[ChunkIndex]]:
+        end = self._file.seek(0, 2)
+        if end - self._dataStart < INDEX_TRAILER.size:
+            return None
+        self._file.seek(end - INDEX_TRAILER.size)
+        magic, offset, count = INDEX_TRAILER.unpack(self._file.read(INDEX_TRAILER.size))
+        if magic != INDEX_MAGIC:
+            return None
+
+        ranges = struct.Struct(f"<{2 * len(self.channels)}d")
+        self._file.seek(offset)
+        data = self._file.read(count * (INDEX_ENTRY.size + ranges.size))
+        index = []
+        for entry in range(count):
+            start = entry * (INDEX_ENTRY.size + ranges.size)
+            chunkOffset, rows, size, first, last = INDEX_ENTRY.unpack_from(data, start)
+            bounds = ranges.unpack_from(data, start + INDEX_ENTRY.size)
+            index.append(ChunkIndex(chunkOffset, rows, size, first, last,
+                                    dict(zip(self.channels, bounds[0::2])), dict(zip(self.channels, bounds[1::2]))))
+        return index
+
+    def _headers(self) -> Iterator[ChunkIndex]:
+        offset = self._dataStart
+        while True:
+            self._file.seek(offset)
+            data = self._file.read(CHUNK_HEADER.size)
+            if len(data) < CHUNK_HEADER.size:
+                return
+            magic, rows, size, first, last = CHUNK_HEADER.unpack(data)
+            if magic != CHUNK_MAGIC:
+                return
+            yield ChunkIndex(offset, rows, size, first, last)
+            offset += CHUNK_HEADER.size + size
+
+    def _decode(self, chunk : ChunkIndex, channels : Sequence[str]) -> Columns:
+        self._file.seek(chunk.offset + CHUNK_HEADER.size)
+        payload = _decompress(self.codec, self._file.read(chunk.size))
+        width = chunk.rows * 8
+        columns = {}
+        for channel in channels:
+            start = self.channels.index(channel) * width
+            columns[channel] = decodeColumn(payload[start:start + width])
+        return columns
+
+    def chunks(self, channels : Optional[Sequence[str]] = None) -> Iterator[Columns]:
+        """
+        Iterate over the decoded chunks
+
+        Parameters
+        ----------
+        channels : Sequence[str]
+            Channels to decode (defaults to every channel)
+
+        Returns
+        -------
+        Iterator[Columns]
+            Values of the channels in every chunk, in time order
+        """
+        channels = self.channels if channels is None else tuple(channels)
+        for chunk in self.index:
+            yield self._decode(chunk, channels)
+
+    def read(self, channels : Optional[Sequence[str]] = None) -> Columns:
+        """
+        Return every value of some channels
+
+        Parameters
+        ----------
+        channels : Sequence[str]
+            Channels to read (defaults to every channel)
+
+        Returns
+        -------
+        Columns
+            Values of the channels
+        """
+        channels = self.channels if channels is None else tuple(channels)
+        columns : Columns = {channel: array('d') for channel in channels}
+        for chunk in self.chunks(channels):
+            for channel in channels:
+                columns[channel].extend(chunk[channel])
+        return columns
+
+    def window(self, start : float, end : float, channels : Optional[Sequence[str]] = None) -> Columns:
+        """
+        Return the values of some channels within a time window
+
+        Only the chunks overlapping the window are decoded.
+
+        Parameters
+        ----------
+        start : float
+            Start of the window
+        end : float
+            End of the window (inclusive)
+        channels : Sequence[str]
+            Channels to read (defaults to every channel); time is always read
+
+        Returns
+        -------
+        Columns
+            Values of the channels at the rows within the window
+        """
+        channels = self.channels if channels is None else tuple(channels)
+        wanted = ("time",) + tuple(channel for channel in channels if channel != "time")
+        columns : Columns = {channel: array('d') for channel in wanted}
+
+        for chunk in self.index[max(0, bisect_right(self._firsts, start) - 1):bisect_right(self._firsts, end)]:
+            if chunk.last < start:
+                continue
+            values = self._decode(chunk, wanted)
+            lo = bisect_left(values["time"], start)
+            hi = bisect_right(values["time"], end)
+            for channel in wanted:
+                columns[channel].extend(values[channel][lo:hi])
+        return columns
+
+    def crossings(self, channel : str, threshold : float, direction : str = "both", start : float = -math.inf,
+                  end : float = math.inf) -> List[float]:
+        """
+        Return the times at which a channel crosses a threshold
+
+        Only the chunks whose range, joined with that of the previous chunk, spans the
+        threshold are decoded. Crossing times are interpolated linearly between rows.
+
+        Parameters
+        ----------
+        channel : str
+            Channel to search
+        threshold : float
+            Value to cross
+        direction : str
+            Crossings to report ("up", "down" or "both")
+        start : float
+            Earliest time to search from
+        end : float
+            Latest time to search to
+
+        Returns
+        -------
+        List[float]
+            Crossing times, in order
+        """
+        if direction not in ("up", "down", "both"):
+            raise ValueError(f"Unknown crossing direction: {direction}")
+
+        times = []
+        carry : Optional[Tuple[float, float]] = None
+        for number, chunk in enumerate(self.index):
+            if chunk.last < start or chunk.first > end:
+                carry = None
+                continue
+            before = self.index[number - 1] if number > 0 else None
+            if chunk.minimum is not None:
+                # The last row of the previous chunk lies within its range
+                low, high = chunk.minimum[channel], chunk.maximum[channel]
+                if before is not None:
+                    low, high = min(low, before.minimum[channel]), max(high, before.maximum[channel])
+                if not low <= threshold <= high:
+                    carry = None
+                    continue
+
+            if carry is None and before is not None:
+                last = self._decode(before, ("time", channel))
+                carry = (last["time"][-1], last[channel][-1])
+            values = self._decode(chunk, ("time", channel))
+            for time, value in zip(values["time"], values[channel]):
+                if carry is not None and start <= carry[0] and time <= end:
+                    t0, v0 = carry
+                    up = v0 < threshold <= value
+                    down = v0 > threshold >= value
+                    if (up and direction != "down") or (down and direction != "up"):
+                        times.append(t0 + (time - t0) * (threshold - v0) / (value - v0))
+                carry = (time, value)
+        return times
+
+    def close(self) -> None:
+        """
+        Close the file
+        """
+        self._file.close()
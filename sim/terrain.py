@@ -0,0 +1,525 @@
+import math
+import mmap
+import struct
+import sys
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from core.vector import *
+
+# Tiled heightmap header: magic, version, sample type, rows, cols, tile size, spacing,
+# origin x, origin y, scale, offset, min height, max height
+TILED_HEADER = struct.Struct("<4sI4sIIIddddddd")
+TILED_MAGIC = b"PTER"
+TILED_VERSION = 1
+
+# Sample types a heightmap can be stored as
+SAMPLE_TYPES = ("h", "f", "d")
+
+class FlatGround:
+    """
+    A class to represent a flat ground plane
+
+    ...
+
+    Attributes
+    ----------
+    level : float
+        Height of the plane
+    maxHeight : float
+        Highest ground height (the plane height)
+
+    Methods
+    -------
+    height():
+        Returns the ground height at a horizontal position
+    heights():
+        Returns the ground heights at several horizontal positions
+    crossing():
+        Returns the point and time at which a step crossed the ground
+    """
+
+    def __init__(self, level : float = 0.0) -> None:
+        """
+        Construct all necessary attributes for a FlatGround object
+
+        Parameters
+        ----------
+        level : float
+            Height of the plane
+        """
+
+        self.level = float(level)
+        self.maxHeight = self.level
+
+    def height(self, x : float, y : float) -> float:
+        """
+        Return the ground height at a horizontal position
+
+        Parameters
+        ----------
+        x : float
+            x coordinate
+        y : float
+            y coordinate
+
+        Returns
+        -------
+        float
+            Ground height
+        """
+        return self.level
+
+    def heights(self, points : Sequence[Tuple[float, float]]) -> List[float]:
+        """
+        Return the ground heights at several horizontal positions
+
+        Parameters
+        ----------
+        points : Sequence[Tuple[float, float]]
+            x and y coordinates of every position
+
+        Returns
+        -------
+        List[float]
+            Ground height at every position
+        """
+        return [self.level] * len(points)
+
+    def crossing(self, lastPos : Vector3, pos : Vector3, time : float, dt : float) -> Tuple[Vector3, float]:
+        """
+        Return the point and time at which a step crossed the ground
+
+        Parameters
+        ----------
+        lastPos : Vector3
+            Position at the start of the step (above the ground)
+        pos : Vector3
+            Position at the end of the step (below the ground)
+        time : float
+            Time at the end of the step
+        dt : float
+            Length of the step
+
+        Returns
+        -------
+        Tuple[Vector3, float]
+            Impact point and time
+        """
+        before = lastPos.z - self.level
+        fraction = before / (before - (pos.z - self.level))
+        return lastPos + (pos - lastPos) * fraction, time - dt + fraction * dt
+
+class _LittleEndianSamples:
+    # Samples of a raw map on a big-endian host, byteswapped as they are read
+    def __init__(self, mapped : mmap.mmap, sampleType : str) -> None:
+        self._map = mapped
+        self._sample = struct.Struct("<" + sampleType)
+        self._count = len(mapped) // self._sample.size
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, k : int) -> float:
+        return self._sample.unpack_from(self._map, k * self._sample.size)[0]
+
+    def release(self) -> None:
+        self._map = None
+
+class Heightmap:
+    """
+    A class to query a memory-mapped DEM heightmap
+
+    Samples form a regular grid: row i lies at y = origin.y + i * spacing and column j at
+    x = origin.x + j * spacing. Heights between samples are interpolated bilinearly and
+    positions off the map take the height of the nearest edge.
+
+    Raw maps are headerless row-major arrays of one little-endian sample type and are read
+    straight from the mapping (byteswapped sample by sample on big-endian hosts). Tiled maps store square tiles that share their edge samples,
+    so every bilinear lookup falls within one tile. Tiles are decoded into a small LRU cache.
+
+    ...
+
+    Attributes
+    ----------
+    rows : int
+        Number of sample rows
+    cols : int
+        Number of sample columns
+    spacing : float
+        Distance between samples (in meters)
+    origin : Vector2
+        Horizontal position of the first sample
+    scale : float
+        Multiplier applied to stored samples
+    offset : float
+        Value added to stored samples after scaling
+    minHeight : float
+        Lowest height on the map (-inf if unknown)
+    maxHeight : float
+        Highest height on the map (inf if unknown, so the terrain is always sampled)
+
+    Factories
+    ---------
+    Raw():
+        Memory-maps a raw heightmap file
+    Open():
+        Memory-maps a tiled heightmap file
+
+    Methods
+    -------
+    height():
+        Returns the interpolated height at a horizontal position
+    heights():
+        Returns the interpolated heights at several horizontal positions
+    crossing():
+        Returns the point and time at which a step crossed the terrain
+    close():
+        Unmaps the file
+    """
+
+    def __init__(self, rows : int, cols : int, spacing : float, origin : Vector2, scale : float, offset : float) -> None:
+        """
+        Construct the attributes shared by every Heightmap (use Raw() or Open())
+
+        Parameters
+        ----------
+        rows, cols, spacing, origin, scale, offset
+            As for the attributes
+        """
+
+        self.rows = int(rows)
+        self.cols = int(cols)
+        self.spacing = float(spacing)
+        self.origin = origin
+        self.scale = float(scale)
+        self.offset = float(offset)
+        self.minHeight = -math.inf
+        self.maxHeight = math.inf
+
+        self._file = None
+        self._map : Optional[mmap.mmap] = None
+        self._data : Optional[Sequence[float]] = None
+        self._tileSize = 0
+        self._tilesAcross = 0
+        self._tileBytes = 0
+        self._tileOffset = 0
+        self._type = "f"
+        self._tiles : OrderedDict = OrderedDict()
+        self._cacheTiles = 0
+
+    @staticmethod
+    def _open(path : str) -> Tuple[object, mmap.mmap]:
+        handle = open(path, 'rb')
+        try:
+            return handle, mmap.mmap(handle.fileno(), 0, access = mmap.ACCESS_READ)
+        except Exception:
+            handle.close()
+            raise
+
+    @classmethod
+    def Raw(cls, path : str, rows : int, cols : int, spacing : float = 1.0, origin : Vector2 = Vector2(0, 0),
+            sampleType : str = "f", scale : float = 1.0, offset : float = 0.0, maxHeight : Optional[float] = None) -> 'Heightmap':
+        """
+        Construct a Heightmap object over a raw (headerless, row-major) heightmap file
+
+        Parameters
+        ----------
+        path : str
+            Path of the file
+        rows : int
+            Number of sample rows
+        cols : int
+            Number of sample columns
+        spacing : float
+            Distance between samples (in meters)
+        origin : Vector2
+            Horizontal position of the first sample
+        sampleType : str
+            "h" (int16), "f" (float32) or "d" (float64)
+        scale : float
+            Multiplier applied to stored samples
+        offset : float
+            Value added to stored samples after scaling
+        maxHeight : float
+            Highest height on the map; the file is not scanned for it, so it stays unbounded
+            if omitted (use writeTiled() for a map that carries its own bounds)
+
+        Returns
+        -------
+        Heightmap
+            Memory-mapped heightmap
+        """
+        if sampleType not in SAMPLE_TYPES:
+            raise ValueError(f"Unknown sample type: {sampleType}")
+        terrain = cls(rows, cols, spacing, origin, scale, offset)
+        terrain._file, terrain._map = cls._open(path)
+        if sys.byteorder == "little":
+            data = memoryview(terrain._map).cast(sampleType)
+        else:
+            data = _LittleEndianSamples(terrain._map, sampleType)
+        if len(data) < terrain.rows * terrain.cols:
+            data.release()
+            terrain.close()
+            raise ValueError(f"{path} holds {len(data)} samples, {terrain.rows * terrain.cols} expected")
+
+        terrain._data = data
+        terrain._type = sampleType
+        if maxHeight is not None:
+            terrain.maxHeight = float(maxHeight)
+        return terrain
+
+    @classmethod
+    def Open(cls, path : str, cacheTiles : int = 64) -> 'Heightmap':
+        """
+        Construct a Heightmap object over a tiled heightmap file written by writeTiled()
+
+        Parameters
+        ----------
+        path : str
+            Path of the file
+        cacheTiles : int
+            Number of decoded tiles kept in memory
+
+        Returns
+        -------
+        Heightmap
+            Memory-mapped heightmap
+        """
+        handle, mapped = cls._open(path)
+        magic, version, sampleType, rows, cols, tileSize, spacing, ox, oy, scale, offset, low, high = TILED_HEADER.unpack_from(mapped, 0)
+        if magic != TILED_MAGIC or version != TILED_VERSION:
+            mapped.close()
+            handle.close()
+            raise ValueError(f"{path} is not a tiled heightmap")
+
+        terrain = cls(rows, cols, spacing, Vector2(ox, oy), scale, offset)
+        terrain._file, terrain._map = handle, mapped
+        terrain._type = sampleType.rstrip(b"\0").decode()
+        terrain._tileSize = tileSize
+        terrain._tilesAcross = math.ceil((cols - 1) / tileSize)
+        terrain._tileBytes = (tileSize + 1) ** 2 * struct.calcsize(terrain._type)
+        terrain._tileOffset = 8 * math.ceil(TILED_HEADER.size / 8)
+        terrain._cacheTiles = cacheTiles
+        terrain.minHeight, terrain.maxHeight = low, high
+        return terrain
+
+    def __enter__(self) -> 'Heightmap':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Unmap the file
+        """
+        if self._data is not None:
+            self._data.release()
+            self._data = None
+        self._tiles.clear()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _tile(self, key : int) -> array:
+        tiles = self._tiles
+        tile = tiles.get(key)
+        if tile is not None:
+            tiles.move_to_end(key)
+            return tile
+
+        start = self._tileOffset + key * self._tileBytes
+        stored = array(self._type, self._map[start:start + self._tileBytes])
+        if sys.byteorder != "little":
+            stored.byteswap()
+        scale, offset = self.scale, self.offset
+        tile = array('d', [v * scale + offset for v in stored])
+        tiles[key] = tile
+        if len(tiles) > self._cacheTiles:
+            tiles.popitem(last = False)
+        return tile
+
+    def _locate(self, x : float, y : float) -> Tuple[int, int, float, float]:
+        # Grid cell holding (x, y) and the position within it, clamped to the map
+        u = min(max((x - self.origin.x) / self.spacing, 0.0), self.cols - 1.0)
+        v = min(max((y - self.origin.y) / self.spacing, 0.0), self.rows - 1.0)
+        j = min(int(u), self.cols - 2)
+        i = min(int(v), self.rows - 2)
+        return i, j, u - j, v - i
+
+    def _cellHeight(self, i : int, j : int, fu : float, fv : float) -> float:
+        if self._data is not None:
+            data = self._data
+            k = i * self.cols + j
+            h00, h01 = data[k], data[k + 1]
+            h10, h11 = data[k + self.cols], data[k + self.cols + 1]
+            top = h00 + (h01 - h00) * fu
+            bottom = h10 + (h11 - h10) * fu
+            return (top + (bottom - top) * fv) * self.scale + self.offset
+
+        size = self._tileSize
+        ti, tj = i // size, j // size
+        tile = self._tile(ti * self._tilesAcross + tj)
+        width = size + 1
+        k = (i - ti * size) * width + (j - tj * size)
+        h00, h01 = tile[k], tile[k + 1]
+        h10, h11 = tile[k + width], tile[k + width + 1]
+        top = h00 + (h01 - h00) * fu
+        bottom = h10 + (h11 - h10) * fu
+        return top + (bottom - top) * fv
+
+    def height(self, x : float, y : float) -> float:
+        """
+        Return the bilinearly interpolated height at a horizontal position
+
+        Parameters
+        ----------
+        x : float
+            x coordinate
+        y : float
+            y coordinate
+
+        Returns
+        -------
+        float
+            Terrain height
+        """
+        return self._cellHeight(*self._locate(x, y))
+
+    def heights(self, points : Sequence[Tuple[float, float]]) -> List[float]:
+        """
+        Return the bilinearly interpolated heights at several horizontal positions
+
+        Queries on tiled maps are answered tile by tile, so each tile is decoded at most once.
+
+        Parameters
+        ----------
+        points : Sequence[Tuple[float, float]]
+            x and y coordinates of every position
+
+        Returns
+        -------
+        List[float]
+            Terrain height at every position
+        """
+        cells = [self._locate(x, y) for x, y in points]
+        if self._data is not None:
+            return [self._cellHeight(*cell) for cell in cells]
+
+        size = self._tileSize
+        order = sorted(range(len(cells)), key = lambda n : (cells[n][0] // size, cells[n][1] // size))
+        result = [0.0] * len(cells)
+        for n in order:
+            result[n] = self._cellHeight(*cells[n])
+        return result
+
+    def crossing(self, lastPos : Vector3, pos : Vector3, time : float, dt : float, iterations : int = 4) -> Tuple[Vector3, float]:
+        """
+        Return the point and time at which a step crossed the terrain
+
+        The clearance above the terrain along the straight step is solved for zero with the
+        Illinois variant of regula falsi.
+
+        Parameters
+        ----------
+        lastPos : Vector3
+            Position at the start of the step (above the terrain)
+        pos : Vector3
+            Position at the end of the step (below the terrain)
+        time : float
+            Time at the end of the step
+        dt : float
+            Length of the step
+        iterations : int
+            Maximum number of refinement steps
+
+        Returns
+        -------
+        Tuple[Vector3, float]
+            Impact point and time
+        """
+        step = pos - lastPos
+        low, high = 0.0, 1.0
+        cLow = lastPos.z - self.height(lastPos.x, lastPos.y)
+        cHigh = pos.z - self.height(pos.x, pos.y)
+        fraction = cLow / (cLow - cHigh)
+        side = 0
+
+        for _ in range(iterations):
+            point = lastPos + step * fraction
+            clearance = point.z - self.height(point.x, point.y)
+            if abs(clearance) < 1e-9:
+                break
+            if clearance > 0:
+                low, cLow = fraction, clearance
+                if side == 1:
+                    cHigh *= 0.5
+                side = 1
+            else:
+                high, cHigh = fraction, clearance
+                if side == -1:
+                    cLow *= 0.5
+                side = -1
+            fraction = low + (high - low) * cLow / (cLow - cHigh)
+
+        return lastPos + step * fraction, time - dt + fraction * dt
+
+def writeTiled(path : str, heights : Sequence[Sequence[float]], spacing : float = 1.0, origin : Vector2 = Vector2(0, 0),
+               tileSize : int = 256, sampleType : str = "f", scale : float = 1.0, offset : float = 0.0) -> None:
+    """
+    Write a grid of heights as a tiled heightmap file for Heightmap.Open()
+
+    Parameters
+    ----------
+    path : str
+        Path of the file
+    heights : Sequence[Sequence[float]]
+        Heights by row (y) then column (x), at least 2 x 2
+    spacing : float
+        Distance between samples (in meters)
+    origin : Vector2
+        Horizontal position of the first sample
+    tileSize : int
+        Number of grid cells along a tile edge
+    sampleType : str
+        "h" (int16), "f" (float32) or "d" (float64)
+    scale : float
+        Stored samples are (height - offset) / scale
+    offset : float
+        Value added to stored samples after scaling
+    """
+    if sampleType not in SAMPLE_TYPES:
+        raise ValueError(f"Unknown sample type: {sampleType}")
+
+    rows, cols = len(heights), len(heights[0])
+    if rows < 2 or cols < 2:
+        raise ValueError("A heightmap needs at least 2 x 2 samples")
+
+    def stored(value : float):
+        value = (value - offset) / scale
+        return int(round(value)) if sampleType == "h" else value
+
+    low = min(min(row) for row in heights)
+    high = max(max(row) for row in heights)
+    if sampleType == "h":
+        low, high = stored(low) * scale + offset, stored(high) * scale + offset
+
+    with open(path, 'wb') as heightmap_file:
+        header = TILED_HEADER.pack(TILED_MAGIC, TILED_VERSION, sampleType.encode().ljust(4, b"\0"), rows, cols, tileSize,
+                                   spacing, origin.x, origin.y, scale, offset, low, high)
+        heightmap_file.write(header.ljust(8 * math.ceil(len(header) / 8), b"\0"))
+        for ti in range(math.ceil((rows - 1) / tileSize)):
+            for tj in range(math.ceil((cols - 1) / tileSize)):
+                tile = array(sampleType)
+                for i in range(ti * tileSize, ti * tileSize + tileSize + 1):
+                    row = heights[min(i, rows - 1)]
+                    for j in range(tj * tileSize, tj * tileSize + tileSize + 1):
+                        tile.append(stored(row[min(j, cols - 1)]))
+                if sys.byteorder != "little":
+                    tile.byteswap()
+                heightmap_file.write(tile.tobytes())
@@ -0,0 +1,1208 @@
+from core.vector import *
+from core.quaternion import *
+from .scenario import *
+from .sampling import *
+from .aggregate import *
+from .dense import *
+from .recorder import *
+from .sensitivity import *
+from .targeting import *
+from .surrogate import *
+from .sharedresults import *
+from .cluster import *
+from .simulation import *
+from .physics import Rigidbody, AerodynamicRigidbody, refreshInertia
+from core.matrix import Matrix3
+from .service import *
+from .broadphase import *
+from .terrain import *
+from .terrain import _LittleEndianSamples
+from .replay import *
+from .metrics import *
+from .integrators import *
+from .convergence import *
+from .telemetry import *
+from .forces import *
+from .reduced import *
+from array import array
+import unittest
+import bisect
+import struct
+import math
+import random
+import statistics
+import os
+import tempfile
+import multiprocessing
+import socket
+import time
+import threading
+import json
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+class TestScenario(unittest.TestCase):
+    def test_dict_roundtrip(self):
+        scenario = Scenario(mass = 12, vel = Vector3(1, 2, 3), wind = Vector3(4, 0, 0))
+        self.assertEqual(Scenario.FromDict(scenario.toDict()), scenario)
+        self.assertRaises(ValueError, Scenario.FromDict, {"massive": 1})
+
+    def test_run_matches_manual_loop(self):
+        scenario = Scenario()
+        result = scenario.run()
+        body = scenario.build()
+        steps = 0
+        while body.pos.z >= 0:
+            body.update(scenario.dt)
+            steps += 1
+        self.assertTrue(result.landed)
+        self.assertEqual(result.steps, steps)
+        self.assertEqual(result.body.pos, body.pos)
+        self.assertAlmostEqual(result.impact.z, 0)
+        self.assertEqual(result.apogee, 1000)
+
+class TestSampling(unittest.TestCase):
+    def test_sobol_unscrambled(self):
+        points = SobolSequence(2, scramble = False).random(8)
+        self.assertEqual([round(p[0], 6) for p in points], [0, 0.5, 0.75, 0.25, 0.375, 0.875, 0.625, 0.125])
+        self.assertEqual([round(p[1], 6) for p in points], [0, 0.5, 0.25, 0.75, 0.375, 0.875, 0.125, 0.625])
+
+    def test_sobol_stratification(self):
+        sequence = SobolSequence(21, seed = 3)
+        points = sequence.random(64)
+        for d in range(21):
+            self.assertEqual(sorted(int(p[d] * 64) for p in points), list(range(64)))
+        self.assertEqual(SobolSequence(21, seed = 3).point(37), points[37])
+
+    def test_sobol_fast_forward(self):
+        points = SobolSequence(4, seed = 1).random(20)
+        sequence = SobolSequence(4, seed = 1)
+        sequence.fastForward(12)
+        self.assertEqual(sequence.random(8), points[12:])
+
+    def test_latin_hypercube(self):
+        points = LatinHypercube(5, seed = 7).random(50)
+        for d in range(5):
+            self.assertEqual(sorted(int(p[d] * 50) for p in points), list(range(50)))
+        self.assertEqual(LatinHypercube(5, seed = 7).random(50), points)
+
+    def test_dispersion_sampler(self):
+        dispersions = {"mass": Normal(0, 0.5), "vel.x": Uniform(-1, 1), "yaw": Normal(0, 0.01), "wind.y": Uniform(0, 5)}
+        sampler = DispersionSampler(Scenario(), dispersions, seed = 11)
+        scenarios = list(sampler.scenarios(16))
+        self.assertEqual(scenarios, list(DispersionSampler(Scenario(), dispersions, seed = 11).scenarios(16)))
+        for scenario in scenarios:
+            self.assertTrue(29 <= scenario.vel.x <= 31)
+            self.assertTrue(0 <= scenario.wind.y <= 5)
+            self.assertEqual(scenario.vel.y, 20)
+        self.assertAlmostEqual(sum(s.mass for s in scenarios) / 16, 10, places = 1)
+        self.assertRaises(ValueError, DispersionSampler, Scenario(), {"colour": Uniform(0, 1)})
+
+class TestAggregate(unittest.TestCase):
+    def test_running_stats_merge(self):
+        rng = random.Random(5)
+        values = [rng.gauss(3, 2) for _ in range(1000)]
+        whole = RunningStats()
+        parts = [RunningStats() for _ in range(3)]
+        for i, value in enumerate(values):
+            whole.add(value)
+            parts[i % 3].add(value)
+        merged = RunningStats()
+        for part in parts:
+            merged.merge(part)
+        self.assertEqual(merged.count, 1000)
+        self.assertAlmostEqual(merged.mean, statistics.mean(values))
+        self.assertAlmostEqual(merged.variance(), statistics.variance(values))
+        self.assertAlmostEqual(whole.variance(), statistics.variance(values))
+        self.assertEqual((merged.min, merged.max), (min(values), max(values)))
+
+    def test_quantile_sketch(self):
+        rng = random.Random(9)
+        values = [rng.uniform(-50, 150) for _ in range(5000)]
+        sketch = QuantileSketch(0.01)
+        other = QuantileSketch(0.01)
+        for value in values[:2500]:
+            sketch.add(value)
+        for value in values[2500:]:
+            other.add(value)
+        sketch.merge(other)
+        ordered = sorted(values)
+        for q in (0.05, 0.5, 0.95):
+            exact = ordered[int(q * (len(values) - 1))]
+            self.assertLess(abs(sketch.quantile(q) - exact), 0.02 * abs(exact) + 0.5)
+
+    def test_impact_ellipse(self):
+        rng = random.Random(2)
+        dispersion = ImpactDispersion()
+        inside = 0
+        points = [Vector2(rng.gauss(100, 10), rng.gauss(-20, 3)) for _ in range(4000)]
+        for point in points:
+            dispersion.add(point)
+        center, major, minor, angle = dispersion.ellipse(0.9)
+        self.assertAlmostEqual(center.x, 100, delta = 1)
+        self.assertAlmostEqual(major / minor, 10 / 3, delta = 0.2)
+        for point in points:
+            dx, dy = point.x - center.x, point.y - center.y
+            u = dx * math.cos(angle) + dy * math.sin(angle)
+            v = -dx * math.sin(angle) + dy * math.cos(angle)
+            if (u / major) ** 2 + (v / minor) ** 2 <= 1:
+                inside += 1
+        self.assertAlmostEqual(inside / len(points), 0.9, delta = 0.02)
+
+    def test_ensemble_merge(self):
+        scenarios = list(DispersionSampler(Scenario(dt = 0.05), {"vel.x": Normal(0, 2), "mass": Uniform(-1, 1)}, seed = 4).scenarios(8))
+        whole = EnsembleStatistics()
+        parts = [EnsembleStatistics(), EnsembleStatistics()]
+        for i, scenario in enumerate(scenarios):
+            result = scenario.run(observer = whole.observe)
+            whole.addResult(result)
+            scenario.run(observer = parts[i % 2].observe)
+            parts[i % 2].addResult(result)
+        parts[0].merge(parts[1])
+        self.assertEqual(parts[0].landed, 8)
+        self.assertAlmostEqual(parts[0].impact.mean.x, whole.impact.mean.x)
+        self.assertAlmostEqual(parts[0].summary()["impact"]["ellipse"]["semiMajor"], whole.summary()["impact"]["ellipse"]["semiMajor"])
+        for a, b in zip(parts[0].envelope.envelope("z"), whole.envelope.envelope("z")):
+            self.assertAlmostEqual(a[1], b[1])
+            self.assertEqual(a[3:], b[3:])
+
+class TestDense(unittest.TestCase):
+    def test_body_interpolate(self):
+        body = Scenario().build()
+        body.angularVel = Vector3(0, 0, 1)
+        start = (body.pos, body.vel)
+        body.update(0.1)
+        self.assertEqual(body.interpolate(0)[:2], start)
+        pos, vel, ori = body.interpolate(1)
+        self.assertAlmostEqual((pos - body.pos).norm(), 0)
+        self.assertAlmostEqual((vel - body.vel).norm(), 0)
+        self.assertAlmostEqual(ori.z, body.ori.z)
+
+    def test_sparse_trajectory(self):
+        full = DenseTrajectory()
+        sparse = DenseTrajectory(every = 10)
+        def observe(time, body):
+            full.observe(time, body)
+            sparse.observe(time, body)
+        Scenario(maxTime = 10).run(observer = observe)
+        self.assertEqual(len(sparse.samples), (len(full.samples) + 9) // 10)
+        for sample in full.samples[5:-5:7]:
+            state = sparse.at(sample.time)
+            self.assertLess((state.pos - sample.pos).norm(), 1e-3)
+            self.assertLess((state.vel - sample.vel).norm(), 1e-2)
+        self.assertEqual(sparse.at(full.samples[-1].time).pos, full.samples[-1].pos)
+        self.assertEqual([round(s.time, 6) for s in sparse.resample(0.5, 1, 3)], [1, 1.5, 2, 2.5, 3])
+        self.assertRaises(ValueError, sparse.at, 11)
+
+class TestRecorder(unittest.TestCase):
+    def record(self, policy):
+        recorder = Recorder(policy = policy)
+        Scenario(dt = 0.01).run(observer = recorder.recordBody)
+        recorder.flush()
+        return recorder
+
+    def test_every_step_and_decimate(self):
+        full = self.record(None)
+        decimated = self.record(Decimate(10))
+        self.assertEqual(len(decimated), (len(full) - 1) // 10 + 2)
+        self.assertEqual(decimated.columns["time"][-1], full.columns["time"][-1])
+        self.assertEqual(list(decimated.columns["z"][:3]), list(full.columns["z"][0:21:10]))
+
+    def test_deadband(self):
+        full = self.record(None)
+        recorder = self.record(Deadband({"z": 5.0}))
+        self.assertLess(len(recorder), len(full) / 10)
+        z = list(recorder.columns["z"])
+        self.assertTrue(all(abs(a - b) > 5.0 for a, b in zip(z, z[1:-1])))
+
+    def test_piecewise_linear_error_bound(self):
+        full = self.record(None)
+        tolerances = {"x": 0.05, "z": 0.05, "vz": 0.01}
+        recorder = self.record(PiecewiseLinear(tolerances))
+        self.assertLess(len(recorder), len(full) / 10)
+        times = list(recorder.columns["time"])
+        for channel, tol in tolerances.items():
+            stored = list(recorder.columns[channel])
+            j = 0
+            for t, value in zip(full.columns["time"], full.columns[channel]):
+                while times[j + 1] < t:
+                    j += 1
+                s = (t - times[j]) / (times[j + 1] - times[j])
+                self.assertLessEqual(abs(stored[j] + (stored[j + 1] - stored[j]) * s - value), tol + 1e-9)
+
+    def test_event_burst(self):
+        recorder = self.record(EventBurst(lambda row : 500 < row["z"] <= 500.5, before = 5, after = 20))
+        z = list(recorder.columns["z"])
+        self.assertEqual(len(z), 26)
+        self.assertTrue(500 < z[5] <= 500.5)
+
+    def test_derived_channels(self):
+        channels = DEFAULT_CHANNELS + ("qw", "qx", "qy", "qz", "wx", "wy", "wz")
+        recorder = Recorder(channels, derived = ("yaw", "pitch", "roll", "aoa", "mach", "dynamicPressure"))
+        states = []
+        def observe(time, body):
+            recorder.recordBody(time, body)
+            states.append((body.ori, body.vel - body.globalWind))
+        Scenario(dt = 0.05, vel = Vector3(30, 5, 20), wind = Vector3(4, -2, 0), ori = Quaternion.FromEuler(0.3, 0.2, -0.1)).run(observe)
+        self.assertFalse(recorder._cache)
+
+        for i in (0, len(states) // 2, len(states) - 1):
+            ori, air = states[i]
+            for name, value in zip(("yaw", "pitch", "roll"), ori.ToEuler()):
+                self.assertAlmostEqual(recorder.column(name)[i], value)
+            self.assertAlmostEqual(recorder.column("aoa")[i], air.angle(Vector3.UnitZ()))
+            self.assertAlmostEqual(recorder.column("mach")[i], air.norm() / SPEED_OF_SOUND)
+            self.assertAlmostEqual(recorder.column("dynamicPressure")[i], 0.5 * AIR_DENSITY * air.norm() ** 2)
+
+        mach = recorder.column("mach")
+        self.assertIs(recorder.column("mach"), mach)
+        recorder.record([0.0] * len(channels))
+        self.assertEqual(len(recorder.column("mach")), len(mach) + 1)
+        self.assertIn("roll", next(recorder.rows()))
+        with self.assertRaises(ValueError):
+            Recorder(derived = ("yaw",))
+
+class TestSensitivity(unittest.TestCase):
+    def test_launch_roundtrip(self):
+        scenario = Scenario()
+        speed, elevation, azimuth = scenario.launch()
+        vel = scenario.withLaunch(speed, elevation, azimuth).vel
+        self.assertAlmostEqual((vel - scenario.vel).norm(), 0)
+
+    def test_matches_finite_differences(self):
+        scenario = Scenario(dt = 0.05, vel = Vector3(30, 20, 15), wind = Vector3(3, 0, 0))
+        parameters = ("mass", "dragCoeff", "elevation", "wind.x")
+        result, derivatives = runSensitivity(scenario, parameters)
+        self.assertAlmostEqual((result.impact - scenario.run().impact).norm(), 0)
+
+        speed, elevation, azimuth = scenario.launch()
+        perturbed = {"mass": lambda h : scenario.replace(mass = scenario.mass + h),
+                     "dragCoeff": lambda h : scenario.replace(dragCoeff = scenario.dragCoeff + h),
+                     "elevation": lambda h : scenario.withLaunch(speed, elevation + h, azimuth),
+                     "wind.x": lambda h : scenario.replace(wind = scenario.wind + Vector3(h, 0, 0))}
+        for name in parameters:
+            h = 1e-6
+            up = perturbed[name](h).run()
+            down = perturbed[name](-h).run()
+            fd = (up.impact.x - down.impact.x) / (2 * h)
+            self.assertAlmostEqual(derivatives["impact.x"][name], fd, delta = 1e-3 * abs(fd) + 1e-4)
+            fd = (up.flightTime - down.flightTime) / (2 * h)
+            self.assertAlmostEqual(derivatives["flightTime"][name], fd, delta = 1e-3 * abs(fd) + 1e-4)
+
+    def test_planar_bodies(self):
+        scenario = Scenario(dt = 0.05, vel = Vector3(30, 20, 15), wind = Vector3(3, 0, 0), dof = "planar")
+        result, derivatives = runSensitivity(scenario, ("elevation", "azimuth"))
+        self.assertAlmostEqual((result.impact - scenario.run().impact).norm(), 0)
+
+        speed, elevation, azimuth = scenario.launch()
+        h = 1e-6
+        fd = (scenario.withLaunch(speed, elevation, azimuth + h).run().impact.x - scenario.withLaunch(speed, elevation, azimuth - h).run().impact.x) / (2 * h)
+        self.assertAlmostEqual(derivatives["impact.x"]["azimuth"], fd, delta = 1e-3 * abs(fd))
+
+class TestTargeting(unittest.TestCase):
+    def setUp(self):
+        self.nominal = Scenario(dt = 0.05, pos = Vector3(0, 0, 0.01), vel = Vector3(40, 10, 40))
+
+    def test_solve_with_warm_start(self):
+        with Targeter(self.nominal, ("elevation", "azimuth"), workers = 2) as targeter:
+            first = targeter.solve(Vector2(125, 50))
+            self.assertTrue(first.converged)
+            impact = first.scenario.run().impact
+            self.assertLess(math.hypot(impact.x - 125, impact.y - 50), 0.1)
+            second = targeter.solve(Vector2(127, 48))
+            self.assertTrue(second.converged)
+            self.assertLess(second.evaluations, first.evaluations)
+            self.assertLessEqual(second.iterations, 2)
+
+    def test_dual_jacobian_and_bounds(self):
+        targeter = Targeter(self.nominal, ("speed", "azimuth"), method = "lm", jacobian = "dual")
+        result = targeter.solve(Vector2(120, 40))
+        self.assertTrue(result.converged)
+        self.assertEqual(result.evaluations, result.iterations + 1)
+        bounded = Targeter(self.nominal, ("speed", "azimuth"), bounds = {"speed": (0, 45)})
+        result = bounded.solve(Vector2(400, 0))
+        self.assertFalse(result.converged)
+        self.assertLessEqual(result.parameters["speed"], 45)
+
+    def test_trials_must_land(self):
+        # The target is only reachable with flights longer than maxTime
+        nominal = self.nominal.replace(maxTime = 6.5)
+        for method in ("broyden", "lm"):
+            result = Targeter(nominal, ("speed", "azimuth"), method = method).solve(Vector2(170, 45))
+            self.assertFalse(result.converged)
+            self.assertTrue(result.landed and result.scenario.run().landed)
+        result = Targeter(nominal.replace(maxTime = 2), ("speed", "azimuth")).solve(Vector2(170, 45))
+        self.assertEqual((result.converged, result.landed, result.iterations), (False, False, 0))
+
+    def test_cache_roundtrip(self):
+        cache = SolutionCache()
+        cache.add(CachedSolution(Vector2(1, 2), [0.5, 0.1], [[1, 0], [0, 1]]))
+        cache.add(CachedSolution(Vector2(10, 2), [0.7, 0.1], [[1, 0], [0, 1]]))
+        path = os.path.join(tempfile.mkdtemp(), "cache.json")
+        cache.save(path)
+        loaded = SolutionCache.Load(path)
+        self.assertEqual(loaded.nearest(Vector2(8, 0)).values, [0.7, 0.1])
+
+class TestSurrogate(unittest.TestCase):
+    def setUp(self):
+        self.nominal = Scenario(dt = 0.05, pos = Vector3(0, 0, 0.01), vel = Vector3(40, 10, 40))
+        self.bounds = {"elevation": (0.6, 0.9), "dragCoeff": (0.05, 0.15)}
+
+    def test_polynomial_fits_quadratic(self):
+        bounds = {"x": (0, 2), "y": (-1, 3)}
+        samples = [[random.uniform(0, 2), random.uniform(-1, 3)] for _ in range(30)]
+        results = [[1 + 2 * x - y * y + x * y] for x, y in samples]
+        self.assertRaises(TypeError, Surrogate, ("x", "y"), bounds, ("f",))
+        surrogate = PolynomialSurrogate(("x", "y"), bounds, ("f",), degree = 2)
+        validation = surrogate.crossValidate(samples, results)
+        self.assertLess(validation["f"]["max"], 1e-6)
+        self.assertAlmostEqual(surrogate.predict({"x": 1.5, "y": 0.5})["f"], 1 + 3 - 0.25 + 0.75)
+
+    def test_build_and_roundtrip(self):
+        for model in ("polynomial", "rbf"):
+            surrogate = buildSurrogate(self.nominal, self.bounds, n = 32, model = model, seed = 3)
+            values = {"elevation": 0.75, "dragCoeff": 0.08}
+            actual = self.nominal.withParameters(values).run()
+            predicted = surrogate.predict(values)
+            self.assertAlmostEqual(predicted["impact.x"], actual.impact.x, delta = 2)
+            self.assertLess(surrogate.validation["impact.x"]["rms"], 2)
+
+            path = os.path.join(tempfile.mkdtemp(), "surrogate.json")
+            surrogate.save(path)
+            loaded = Surrogate.Load(path)
+            self.assertIsInstance(loaded, type(surrogate))
+            self.assertEqual(loaded.predict(values), predicted)
+            self.assertEqual(loaded.validation, surrogate.validation)
+
+class TestSharedResults(unittest.TestCase):
+    def test_attach_reads_appended_rows(self):
+        with SharedResultRegistry() as registry:
+            trajectory = SharedTrajectory.Create(("time", "z"), 4, registry.issue())
+            trajectory.append((0.0, 10.0))
+            trajectory.append((0.1, 9.5))
+            attached = registry.attach(trajectory.name)
+            self.assertEqual(attached.channels, ("time", "z"))
+            self.assertEqual(list(attached.rows()), [{"time": 0.0, "z": 10.0}, {"time": 0.1, "z": 9.5}])
+            trajectory.append((0.2, 9.0))
+            z = attached.column("z")
+            self.assertEqual(list(z), [10.0, 9.5, 9.0])
+            z.release()
+            trajectory.close()
+            registry.release(attached)
+
+    def test_workers_match_in_process_runs(self):
+        scenarios = [Scenario(dt = 0.05, pos = Vector3(0, 0, 50), mass = m) for m in (5, 10, 20)]
+        with SharedResultRegistry() as registry:
+            for scenario, (result, trajectory) in zip(scenarios, runScenariosShared(scenarios, registry, workers = 2)):
+                expected = Recorder()
+                scenario.run(expected.recordBody)
+                self.assertEqual(len(trajectory), len(expected))
+                x = trajectory.column("x")
+                self.assertEqual(list(x), list(expected.columns["x"]))
+                x.release()
+                self.assertEqual(result.impact, scenario.run().impact)
+                registry.release(trajectory)
+
+    def test_cleanup_after_crash(self):
+        registry = SharedResultRegistry()
+        name = registry.issue()
+        SharedTrajectory.Create(capacity = 8, name = name).close()
+        registry.cleanup()
+        with self.assertRaises(FileNotFoundError):
+            SharedTrajectory.Attach(name)
+
+class TestCluster(unittest.TestCase):
+    def setUp(self):
+        self.scenarios = [Scenario(dt = 0.05, pos = Vector3(0, 0, 50), mass = 5 + i) for i in range(12)]
+        self.expected = [scenario.run() for scenario in self.scenarios]
+
+    def assertResults(self, results):
+        self.assertEqual(len(results), len(self.expected))
+        for result, expected in zip(results, self.expected):
+            self.assertEqual(result.impact, expected.impact)
+            self.assertEqual((result.steps, result.landed, result.flightTime), (expected.steps, expected.landed, expected.flightTime))
+
+    def test_result_encoding(self):
+        chunk, worker, elapsed, results = decodeResults(encodeResults(3, "node-a", 1.5, self.expected[:2]))
+        self.assertEqual((chunk, worker, elapsed), (3, "node-a", 1.5))
+        self.assertResults(results + self.expected[2:])
+
+    def test_tcp_workers(self):
+        queue = JobQueue(self.scenarios, chunkSize = 3)
+        with Coordinator(queue) as coordinator:
+            host, port = coordinator.address
+            workers = [multiprocessing.Process(target = workerMain, args = (host, port, f"node-{i}", 0.2)) for i in range(2)]
+            for worker in workers:
+                worker.start()
+            self.assertTrue(coordinator.wait(60))
+            for worker in workers:
+                worker.join(10)
+        self.assertResults(queue.results())
+        report = queue.throughput()
+        self.assertEqual(sum(stats["runs"] for stats in report.values()), len(self.scenarios))
+        self.assertTrue(all(stats["runsPerSecond"] > 0 for stats in report.values() if stats["runs"]))
+
+    def test_lost_chunks_are_redispatched(self):
+        queue = JobQueue(self.scenarios, chunkSize = 6, leaseTimeout = 0.2)
+        with Coordinator(queue) as coordinator:
+            # A worker that disconnects mid-chunk
+            with socket.create_connection(coordinator.address) as sock:
+                sendMessage(sock, HELLO, {"worker": "crashed"})
+                sendMessage(sock, REQUEST)
+                self.assertEqual(receiveMessage(sock)[0], CHUNK)
+            # A worker that hangs without heartbeats
+            hung = socket.create_connection(coordinator.address)
+            sendMessage(hung, HELLO, {"worker": "hung"})
+            sendMessage(hung, REQUEST)
+            self.assertEqual(receiveMessage(hung)[0], CHUNK)
+            time.sleep(0.3)
+
+            Worker(*coordinator.address, workerId = "healthy").run()
+            hung.close()
+        self.assertEqual(queue.redispatched, 2)
+        self.assertEqual(queue.throughput()["healthy"]["runs"], len(self.scenarios))
+        self.assertResults(queue.results())
+
+    def test_file_queue(self):
+        queue = JobQueue(self.scenarios, chunkSize = 4, leaseTimeout = 0.2)
+        coordinator = FileCoordinator(queue, tempfile.mkdtemp())
+        coordinator.publish()
+        # A stale lease left by a crashed worker
+        os.rename(os.path.join(coordinator.directory, "pending", "000001.json"), os.path.join(coordinator.directory, "leased", "000001@crashed"))
+        os.utime(os.path.join(coordinator.directory, "leased", "000001@crashed"), (0, 0))
+        workers = [multiprocessing.Process(target = fileWorkerMain, args = (coordinator.directory, f"node-{i}", 0.1, 0.05)) for i in range(2)]
+        for worker in workers:
+            worker.start()
+        self.assertTrue(coordinator.wait(60, poll = 0.05))
+        for worker in workers:
+            worker.join(10)
+            self.assertEqual(worker.exitcode, 0)
+        self.assertEqual(queue.redispatched, 1)
+        self.assertResults(queue.results())
+
+    def test_failed_chunks(self):
+        scenarios = list(self.scenarios)
+        scenarios[4] = scenarios[4].replace(integrator = "bogus")
+        queue = JobQueue(scenarios, chunkSize = 3)
+        with Coordinator(queue) as coordinator:
+            Worker(*coordinator.address, workerId = "healthy").run()
+            self.assertTrue(coordinator.wait(10))
+        self.assertEqual(list(queue.failures), [1])
+        self.assertIn("bogus", queue.failures[1])
+        self.assertEqual(queue.throughput()["healthy"]["runs"], len(scenarios) - 3)
+        self.assertRaises(RuntimeError, queue.results)
+
+        queue = JobQueue(scenarios, chunkSize = 3)
+        coordinator = FileCoordinator(queue, tempfile.mkdtemp())
+        coordinator.publish()
+        worker = threading.Thread(target = fileWorkerMain, args = (coordinator.directory, "node", 0.1, 0.05))
+        worker.start()
+        self.assertTrue(coordinator.wait(60, poll = 0.05))
+        worker.join(10)
+        self.assertEqual(list(queue.failures), [1])
+
+        # A chunk whose file-queue workers keep dying fails once it was leased maxDispatches times
+        queue = JobQueue(self.scenarios, chunkSize = 3, leaseTimeout = 0.2, maxDispatches = 2)
+        coordinator = FileCoordinator(queue, tempfile.mkdtemp())
+        coordinator.publish()
+        for attempt in range(2):
+            lease = os.path.join(coordinator.directory, "leased", f"000001@killed-{attempt}")
+            os.rename(os.path.join(coordinator.directory, "pending", "000001.json"), lease)
+            os.utime(lease, (0, 0))
+            coordinator.poll()
+        self.assertEqual((list(queue.failures), queue.redispatched), ([1], 1))
+        self.assertEqual(os.listdir(os.path.join(coordinator.directory, "leased")), [])
+        worker = threading.Thread(target = fileWorkerMain, args = (coordinator.directory, "node", 0.1, 0.05))
+        worker.start()
+        self.assertTrue(coordinator.wait(60, poll = 0.05))
+        worker.join(10)
+        self.assertEqual(queue.throughput()["node"]["runs"], len(self.scenarios) - 3)
+
+        # A chunk lost more often than allowed fails instead of going round forever
+        queue = JobQueue(self.scenarios, chunkSize = 6, maxDispatches = 1)
+        self.assertEqual(queue.lease("crashed")[0], 0)
+        queue.drop("crashed")
+        self.assertEqual((list(queue.failures), queue.redispatched), ([0], 0))
+        self.assertEqual(queue.lease("healthy")[0], 1)
+
+class TestSimulation(unittest.TestCase):
+    def test_lockstep_matches_single_runs(self):
+        scenarios = [Scenario(dt = 0.05, pos = Vector3(0, 0, 20 * i), maxTime = 3) for i in range(1, 5)]
+        simulation = Simulation.FromScenarios(scenarios)
+        seen = set()
+        simulation.observe(lambda time, slot, body : seen.add(slot))
+        results = simulation.run()
+        self.assertEqual(seen, {0, 1, 2, 3})
+        for scenario, result in zip(scenarios, results):
+            expected = scenario.run()
+            self.assertEqual(result.impact, expected.impact)
+            self.assertEqual((result.landed, result.steps, result.flightTime), (expected.landed, expected.steps, expected.flightTime))
+        with self.assertRaises(ValueError):
+            Simulation.FromScenarios([Scenario(dt = 0.05), Scenario(dt = 0.01)])
+
+    def test_spawn_children_inherit_parent_state(self):
+        simulation = Simulation(0.05)
+        parent = simulation.add(Scenario(pos = Vector3(0, 0, 500), vel = Vector3(30, 0, 20)).build())
+        children = []
+
+        def separate(time, slot, body):
+            if slot == parent and not children and time >= 1:
+                children.append(simulation.spawn(parent = parent, deltaV = Vector3(0, 5, 0), mass = 1))
+                self.assertNotIn(children[0], simulation.active)
+
+        simulation.observe(separate)
+        for _ in range(20):
+            simulation.step()
+        child = simulation.bodies[children[0]]
+        body = simulation.bodies[parent]
+        self.assertEqual(child.mass, 1)
+        self.assertEqual(child.dragArea, body.dragArea)
+        self.assertEqual(simulation.results[children[0]], None)
+        self.assertIn(children[0], simulation.active)
+        self.assertGreater(child.vel.y, 4)
+        results = simulation.run()
+        self.assertTrue(results[children[0]].landed and results[parent].landed)
+        self.assertGreater(results[children[0]].impact.y, results[parent].impact.y + 5)
+
+    def test_recycled_slots_bound_memory(self):
+        simulation = Simulation(0.05, recycle = True)
+        simulation.reserve(50)
+        landed = []
+        simulation.onRetire(lambda slot, result : landed.append(result.impact.z))
+        for wave in range(20):
+            for i in range(50):
+                simulation.spawn(pos = Vector3(i, wave, 5 + i % 7), vel = Vector3(1, 0, 0), mass = 2, dragCoeff = lambda aoa : 0.2)
+            doomed = simulation.active[0]
+            simulation.despawn(doomed)
+            self.assertNotIn(doomed, simulation.active)
+            simulation.run()
+        self.assertEqual(len(simulation.bodies), 50)
+        self.assertEqual(len(landed), 20 * 49)
+        self.assertTrue(all(abs(z) < 1e-9 for z in landed))
+        with self.assertRaises(ValueError):
+            simulation.despawn(0)
+
+    def test_recycled_slots_start_from_defaults(self):
+        simulation = Simulation(0.05)
+        simulation.reserve(1)
+        fresh = AerodynamicRigidbody()
+        tensor = Matrix3.Symmetric(Vector3(2, 3, 4), Vector3(0.1, 0, 0))
+        slot = simulation.spawn(pos = Vector3(0, 0, 10), mass = 10, dragCoeff = lambda aoa : 0.5, moi = tensor, integrator = makeIntegrator("rk4"))
+        body = simulation.bodies[slot]
+        self.assertEqual((body.inertia, body.moi, body.mass), (tensor, Vector3(2, 3, 4), 10))
+        simulation.despawn(slot)
+
+        self.assertEqual(simulation.spawn(pos = Vector3(0, 0, 10)), slot)
+        self.assertEqual((body.mass, body.moi, body.inertia, body.integrator), (fresh.mass, fresh.moi, None, None))
+        self.assertEqual(body.dragCoeff(0), fresh.dragCoeff(0))
+        simulation.despawn(slot)
+
+        simulation.spawn(moi = 2)
+        self.assertEqual((body.moi, body.inertia), (Vector3(2, 2, 2), None))
+
+    def test_recycled_slots_drop_held_forces(self):
+        for dof in ("6dof", "3dof"):
+            simulation = Simulation(0.05)
+            slot = simulation.add(Scenario(pos = Vector3(0, 0, 500), vel = Vector3(60, 0, 40), dragCoeff = 0.5, aeroEvery = 5, aeroMode = "extrapolate", dof = dof).build())
+            for _ in range(7):
+                simulation.step()
+            simulation.despawn(slot)
+
+            self.assertEqual(simulation.spawn(pos = Vector3(0, 0, 100)), slot)
+            simulation.step()
+            self.assertEqual(simulation.bodies[slot].lastAcc, Vector3(0, 0, -9.807))
+
+        body = Scenario(integrator = "rkmk4").build()
+        body.angularVel = Vector3(3, 1, 2)
+        body.integrator.renormalizeAbove = None
+        for _ in range(50):
+            body.update(0.05)
+        self.assertGreater(body.integrator.maxDrift, 0)
+        body.reset(Vector3.Zero(), Vector3.Zero(), Quaternion.Zero())
+        self.assertEqual((body.integrator.drift, body.integrator.maxDrift, body.integrator.renormalizations), (0, 0, 0))
+
+    def test_resting_bodies_sleep_and_recorders_end_on_final_state(self):
+        simulation = Simulation(0.05, sleepSpeed = 0.1, sleepTime = 0.5)
+        hovering = [simulation.add(Rigidbody(gravity = False, pos = Vector3(i, 0, 10), vel = Vector3(0.01, 0, 0))) for i in range(2)]
+        falling = simulation.add(Scenario(pos = Vector3(0, 0, 30)).build())
+        recorders = simulation.record(policy = lambda : Deadband({"z": 5.0}))
+        reasons = {}
+        simulation.onDeactivate(lambda slot, reason : reasons.setdefault(slot, reason))
+
+        for _ in range(10):
+            simulation.step()
+        self.assertEqual(simulation.sleeping, set(hovering))
+        self.assertEqual(simulation.active, [falling])
+        resting = simulation.bodies[hovering[0]].pos
+        simulation.run()
+        self.assertEqual(simulation.bodies[hovering[0]].pos, resting)
+        self.assertEqual(reasons, {hovering[0]: "asleep", hovering[1]: "asleep", falling: "landed"})
+
+        for slot in hovering + [falling]:
+            last = list(recorders[slot].rows())[-1]
+            self.assertEqual(last["z"], simulation.bodies[slot].pos.z)
+            self.assertEqual(last["x"], simulation.bodies[slot].pos.x)
+
+        simulation.bodies[hovering[1]].vel = Vector3(0, 0, -20)
+        simulation.wake(hovering[1])
+        simulation.run()
+        self.assertTrue(simulation.results[hovering[1]].landed)
+        self.assertEqual(simulation.sleeping, {hovering[0]})
+
+    def test_bodies_do_not_sleep_at_apogee(self):
+        # The body stays below the sleep speed for 0.2 s around its apogee, but is still falling
+        simulation = Simulation(0.01, sleepSpeed = 1.0, sleepTime = 0.1)
+        scenario = Scenario(dt = 0.01, pos = Vector3(0, 0, 100), vel = Vector3(0, 0, 10), dragCoeff = 0)
+        slot = simulation.add(scenario.build(), scenario.maxTime)
+        results = simulation.run()
+        self.assertEqual(simulation.sleeping, set())
+        self.assertTrue(results[slot].landed)
+        self.assertEqual(results[slot].impact, scenario.run().impact)
+
+class TestMetrics(unittest.TestCase):
+    def test_simulation_metrics(self):
+        self.assertRaises(TypeError, MetricsSink)
+        snapshots = []
+        metrics = RunMetrics([CallbackSink(snapshots.append)], interval = 0, totalRuns = 4, checkEvery = 10)
+        scenarios = [Scenario(dt = 0.05, pos = Vector3(0, 0, 20 + 10 * i)) for i in range(4)]
+        simulation = Simulation.FromScenarios(scenarios, metrics = metrics)
+        simulation.record()
+        results = simulation.run()
+        metrics.close()
+
+        self.assertEqual(metrics.steps, sum(result.steps for result in results))
+        self.assertEqual(metrics.forceEvaluations, metrics.steps)
+        self.assertEqual(metrics.runs, 4)
+        self.assertAlmostEqual(metrics.simTime, simulation.time)
+        self.assertGreater(len(snapshots), 2)
+        self.assertEqual(snapshots[0]["bodiesActive"], 4)
+        last = snapshots[-1]
+        self.assertEqual(last["eta"], 0)
+        self.assertEqual(last["recorderBytes"], sum(len(r) for r in simulation.recorders.values()) * 8 * len(DEFAULT_CHANNELS))
+        self.assertGreater(last["realTimeFactor"], 0)
+
+    def test_force_evaluations(self):
+        scenario = Scenario(dt = 0.05, pos = Vector3(0, 0, 40), vel = Vector3(20, 0, 10), dragCoeff = 0.3)
+        for variant, evaluations in ((scenario.replace(integrator = "rk4"), lambda steps : 4 * steps),
+                                     (scenario.replace(integrator = "cg3"), lambda steps : 3 * steps),
+                                     (scenario.replace(aeroEvery = 5), lambda steps : (steps + 4) // 5)):
+            metrics = RunMetrics(interval = 3600)
+            simulation = Simulation.FromScenarios([variant, variant], metrics = metrics)
+            results = simulation.run()
+            self.assertEqual(metrics.forceEvaluations, sum(evaluations(result.steps) for result in results))
+
+    def test_file_sinks_and_job_queue(self):
+        directory = tempfile.mkdtemp()
+        prometheus = os.path.join(directory, "platysim.prom")
+        lines = os.path.join(directory, "metrics.jsonl")
+        scenarios = [Scenario(dt = 0.05, pos = Vector3(0, 0, 30)) for _ in range(6)]
+        with RunMetrics([PrometheusFileSink(prometheus, labels = {"campaign": "test"}), JSONLinesSink(lines)], interval = 3600) as metrics:
+            queue = JobQueue(scenarios, chunkSize = 3, metrics = metrics)
+            self.assertEqual(metrics.totalRuns, 6)
+            chunk, batch = queue.lease("node")
+            queue.complete(chunk, "node", 0.1, runChunk(batch))
+            self.assertGreater(metrics.snapshot()["eta"], 0)
+
+        with open(prometheus) as prometheus_file:
+            text = prometheus_file.read()
+        self.assertIn('platysim_runs{campaign="test"} 3.0', text)
+        self.assertIn("# TYPE platysim_steps_per_second gauge", text)
+        with open(lines) as lines_file:
+            snapshot = json.loads(lines_file.readlines()[-1])
+        self.assertEqual(snapshot["steps"], 3 * scenarios[0].run().steps)
+
+class TestConvergence(unittest.TestCase):
+    def setUp(self):
+        self.scenario = Scenario(pos = Vector3(0, 0, 100), vel = Vector3(40, 10, 30), wind = Vector3(5, 0, 0), dragCoeff = 0.5)
+
+    def test_integrators(self):
+        reference = self.scenario.run()
+        self.assertRaises(TypeError, Integrator)
+        body = self.scenario.build()
+        body.integrator = SemiImplicitEuler()
+        for _ in range(100):
+            body.update(0.01)
+        self.assertAlmostEqual((body.pos - self.scenario.replace(maxTime = 1.0 - 1e-9).run().body.pos).norm(), 0, places = 9)
+
+        # Higher orders converge faster on the state at a fixed time
+        errors = {}
+        for name in INTEGRATORS:
+            final = [self.scenario.replace(dt = dt, integrator = name, maxTime = 2.0 - 1e-9).run().body.pos for dt in (0.1, 0.05, 0.025)]
+            errors[name] = ((final[0] - final[1]).norm(), (final[1] - final[2]).norm())
+        for name, order in (("euler", 1), ("heun", 2), ("rk4", 4)):
+            self.assertAlmostEqual(math.log2(errors[name][0] / errors[name][1]), order, delta = 0.5)
+        self.assertEqual(Scenario.FromDict(self.scenario.replace(integrator = "rk4").toDict()).integrator, "rk4")
+        with self.assertRaises(ValueError):
+            self.scenario.replace(integrator = "leapfrog").run()
+        self.assertLess((reference.impact - self.scenario.replace(integrator = "rk4").run().impact).norm(), 1.0)
+
+    def test_lie_group_attitude(self):
+        def spin(name, dt, renormalizeAbove = 1e-12):
+            body = Rigidbody(gravity = False)
+            body.angularVel = Vector3(0, 0, 40)
+            body.integrator = INTEGRATORS[name](renormalizeAbove)
+            for _ in range(round(1 / dt)):
+                body.applyTorqueLocal(Vector3(30, -10, 0))
+                body.update(dt)
+            return body
+
+        def angle(q, r):
+            d = q.conj() * r
+            return 2 * math.asin(min(1.0, Vector3(d.x, d.y, d.z).norm()))
+
+        reference = spin("rkmk4", 1 / 4096).ori
+        for name, order in (("rk4", 2), ("cg3", 3), ("rkmk4", 4)):
+            coarse, fine = [angle(spin(name, dt).ori, reference) for dt in (1 / 64, 1 / 128)]
+            self.assertAlmostEqual(math.log2(coarse / fine), order, delta = 0.5)
+        # A spinning body keeps its attitude accuracy at several times the step
+        self.assertLess(angle(spin("rkmk4", 1 / 64).ori, reference), angle(spin("rk4", 1 / 256).ori, reference))
+
+        body = spin("rkmk4", 1 / 64, renormalizeAbove = None)
+        self.assertLess(body.integrator.maxDrift, 1e-12)
+        self.assertEqual(body.integrator.renormalizations, 0)
+        body = spin("cg3", 1 / 64, renormalizeAbove = 0)
+        self.assertGreater(body.integrator.renormalizations, 0)
+        self.assertAlmostEqual(body.ori.norm(), 1, places = 15)
+
+    def test_study_recommends_cheapest(self):
+        study = convergenceStudy(self.scenario, dts = (0.08, 0.04, 0.02, 0.01))
+        self.assertEqual(len(study.runs), 12)
+        byKey = {(run.integrator, run.dt): run for run in study.runs}
+        self.assertEqual(byKey[("heun", 0.02)].forceEvaluations, 2 * self.scenario.replace(dt = 0.02, integrator = "heun").run().steps)
+        self.assertLess(byKey[("euler", 0.01)].errors["impact"], byKey[("euler", 0.08)].errors["impact"])
+
+        choice = study.recommend(impactTolerance = 0.5, cost = "forceEvaluations")
+        self.assertLessEqual(choice.errors["impact"], 0.5)
+        self.assertTrue(all(run.forceEvaluations >= choice.forceEvaluations for run in study.runs if run.errors["impact"] <= 0.5))
+        self.assertIsNone(study.recommend(apogeeTolerance = 0))
+        self.assertIn("rk4", study.table())
+
+        tight = convergenceStudy(self.scenario, dts = (0.04, 0.02), integrators = ("heun",), reference = "tight")
+        self.assertEqual(tight.method, "tight")
+        self.assertLess(tight.runs[1].errors["impact"], tight.runs[0].errors["impact"])
+
+class TestInertia(unittest.TestCase):
+    def test_torque_frames_and_caching(self):
+        inertia = Matrix3.Symmetric(Vector3(2, 3, 4), Vector3(0.1, 0, -0.2))
+        ori = Quaternion.FromAxisAngle(math.pi / 2, Vector3.UnitX())
+        body = Rigidbody(moi = inertia, gravity = False, ori = ori)
+        self.assertEqual(body.moi, Vector3(2, 3, 4))
+
+        # An inertial-frame torque acts about the matching body axis
+        body.applyTorque(Vector3(0, 0, 1))
+        expected = inertia.inverse() * (Vector3(0, 0, 1) * ori.conj())
+        self.assertAlmostEqual((body.angularAcc - expected).norm(), 0)
+        response = body.torqueResponse()
+        body.applyTorqueLocal(Vector3(1, 0, 0))
+        self.assertIs(body.torqueResponse(), response)
+
+        body.inertia = Matrix3.Diagonal(Vector3(1, 1, 1))
+        self.assertIsNot(body.torqueResponse(), response)
+        body.update(0.01)
+        self.assertIsNot(body.torqueResponse(), response)
+
+    def test_in_place_mass_property_changes(self):
+        body = Rigidbody(moi = Vector3(1, 1, 1), gravity = False, ori = Quaternion(1, 0, 0, 0))
+        body.applyTorque(Vector3(1, 0, 0))
+        body.update(0.01)
+
+        # Mutating the vectors and matrices in place refreshes the cached responses too
+        body.moi.x = 10
+        body.applyTorque(Vector3(1, 0, 0))
+        self.assertAlmostEqual(body.angularAcc.x, 0.1)
+        body.ori.w, body.ori.z = math.cos(math.pi / 4), math.sin(math.pi / 4)
+        fresh = Rigidbody(moi = Vector3(10, 1, 1), gravity = False, ori = Quaternion(body.ori.w, body.ori.x, body.ori.y, body.ori.z))
+        self.assertAlmostEqual((body.torqueAcc(Vector3(1, 0, 0)) - fresh.torqueAcc(Vector3(1, 0, 0))).norm(), 0)
+
+        body.inertia = Matrix3.Diagonal(Vector3(1, 1, 1))
+        other = Rigidbody(moi = body.inertia, gravity = False)
+        refreshInertia([body, other])
+        body.inertia.yy = 4
+        refreshInertia([body, other])
+        self.assertAlmostEqual(body.inverseInertia().yy, 0.25)
+        self.assertAlmostEqual(other.inverseInertia().yy, 0.25)
+
+    def test_torque_free_precession(self):
+        inertia = Matrix3.Symmetric(Vector3(1, 2, 3), Vector3(0.05, -0.1, 0.02))
+        body = Rigidbody(moi = inertia, gravity = False)
+        body.angularVel = Vector3(0.05, 4, 0.1)
+        body.integrator = RKMK4()
+
+        def momentum():
+            return (inertia * body.angularVel) * body.ori
+
+        start = momentum()
+        energy = body.angularVel.dot(inertia * body.angularVel)
+        for _ in range(1000):
+            body.update(0.005)
+        # The gyroscopic term moves the body-frame rate about the unstable intermediate axis...
+        self.assertGreater((body.angularVel - Vector3(0.05, 4, 0.1)).norm(), 1)
+        # ...while the inertial-frame angular momentum and the energy are conserved
+        self.assertAlmostEqual((momentum() - start).norm(), 0, places = 5)
+        self.assertAlmostEqual(body.angularVel.dot(inertia * body.angularVel), energy, places = 5)
+
+    def test_scenario_and_ensemble(self):
+        inertia = Matrix3.Symmetric(Vector3(1, 2, 3), Vector3(0.1, 0, 0))
+        scenario = Scenario(inertia = inertia, ori = Quaternion.FromEuler(0.3, 0.2, 0.1), maxTime = 2)
+        self.assertEqual(Scenario.FromDict(scenario.toDict()), scenario)
+        self.assertIsNone(Scenario.FromDict(Scenario().toDict()).inertia)
+
+        bodies = [scenario.build() for _ in range(3)]
+        refreshInertia(bodies)
+        self.assertIs(bodies[0].inverseInertia(), bodies[2].inverseInertia())
+
+        # A torque about the inertial x axis couples into the other body axes through the products of inertia
+        single = scenario.run(controller = lambda time, body: body.applyTorque(Vector3(0.5, 0, 0)))
+        self.assertNotEqual(single.body.angularVel.y, 0)
+
+        sim = Simulation(dt = scenario.dt)
+        for _ in range(2):
+            slot = sim.add(scenario.build(), maxTime = scenario.maxTime)
+            sim.bodies[slot].angularVel = Vector3(0.2, 1.5, -0.3)
+        results = sim.run()
+        reference = scenario.build()
+        reference.angularVel = Vector3(0.2, 1.5, -0.3)
+        for _ in range(results[0].steps):
+            reference.update(scenario.dt)
+        for result in results:
+            self.assertEqual(result.body.ori, reference.ori)
+            self.assertEqual(result.body.angularVel, reference.angularVel)
+
+class TestReduced(unittest.TestCase):
+    def test_point_mass_matches_six_dof(self):
+        scenario = Scenario(wind = Vector3(3, 1, 0))
+        full = scenario.run()
+        reduced = scenario.replace(dof = "3dof").run()
+        self.assertIsInstance(reduced.body, PointMass)
+        self.assertEqual((reduced.impact, reduced.flightTime, reduced.steps), (full.impact, full.flightTime, full.steps))
+        self.assertEqual(scenario.replace(dof = "3dof", integrator = "rk4").run().impact, scenario.replace(integrator = "rk4").run().impact)
+
+        # Promote to 6-DOF halfway through and carry on
+        body = scenario.replace(dof = "3dof").build()
+        reference = scenario.build()
+        for _ in range(500):
+            body.update(scenario.dt)
+            reference.update(scenario.dt)
+        body = body.promote(moi = scenario.moi)
+        for _ in range(500):
+            body.applyTorqueLocal(Vector3(0.1, 0, 0))
+            body.update(scenario.dt)
+            reference.applyTorqueLocal(Vector3(0.1, 0, 0))
+            reference.update(scenario.dt)
+        self.assertEqual(body.pos, reference.pos)
+        self.assertEqual(body.ori, reference.ori)
+
+    def test_planar_body(self):
+        scenario = Scenario(vel = Vector3(30, 20, 10), wind = Vector3(-3, -2, 0), dragCoeff = 0.5)
+        full = scenario.run()
+        planar = scenario.replace(dof = "planar").run()
+        self.assertAlmostEqual((planar.impact - full.impact).norm(), 0, places = 6)
+        self.assertAlmostEqual(planar.apogee, full.apogee, places = 6)
+        # Crosswind is dropped
+        crosswind = scenario.replace(wind = Vector3(-2, 3, 0))
+        self.assertGreater((crosswind.run().impact - crosswind.replace(dof = "planar").run().impact).norm(), 1)
+
+        self.assertEqual(Scenario.FromDict(scenario.replace(dof = "planar").toDict()).dof, "planar")
+        self.assertRaises(ValueError, scenario.replace(dof = "2dof").build)
+        self.assertRaises(ValueError, scenario.replace(dof = "planar", integrator = "rk4").build)
+
+    def test_shared_machinery(self):
+        scenarios = [Scenario(dof = dof, maxTime = 3) for dof in DEGREES_OF_FREEDOM]
+        sim = Simulation.FromScenarios(scenarios)
+        recorders = sim.record(("time", "x", "z", "vz", "qw"))
+        results = sim.run()
+        for recorder, result in zip(recorders.values(), results):
+            self.assertEqual(len(recorder), len(recorders[0]))
+            self.assertEqual(result.steps, results[0].steps)
+            self.assertEqual(recorder.column("qw")[-1], 1)
+        self.assertAlmostEqual((results[0].body.pos - results[2].body.pos).norm(), 0, places = 9)
+
+        log, result = ReplayLog.Record(scenarios[1], lambda time, body, commands, rng: commands.setForce(Vector3(0, 0, 500)) if time < 1 else None)
+        self.assertTrue(log.verify())
+        self.assertGreater(result.apogee, scenarios[1].run().apogee)
+
+class TestTelemetry(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.scenario = Scenario(dt = 0.01)
+
+    def test_column_encoding(self):
+        column = array('d', [0.0, -0.0, 1.5, float("inf"), -1e-300, 12345.678, float("nan")])
+        decoded = decodeColumn(encodeColumn(column))
+        self.assertEqual(decoded.tobytes(), column.tobytes())
+
+    def test_background_writer(self):
+        full = Recorder()
+        self.scenario.run(full.recordBody)
+        for codec in CODECS:
+            path = os.path.join(self.directory, f"run.{codec}")
+            with TelemetryWriter(path, DEFAULT_CHANNELS, chunkRows = 256, codec = codec, queueSize = 1, blockSize = 4096) as writer:
+                recorder = Recorder(writer = writer)
+                self.scenario.run(recorder.recordBody)
+                self.assertLess(len(recorder), 256)
+                recorder.flush()
+                self.assertEqual(len(recorder), 0)
+            self.assertEqual(writer.rows, len(full))
+
+            with TelemetryReader(path) as reader:
+                self.assertEqual((reader.channels, reader.codec), (DEFAULT_CHANNELS, codec))
+                self.assertEqual(reader.read(), full.columns)
+                self.assertEqual(len(list(reader.chunks(["z"]))), (len(full) + 255) // 256)
+            if codec != "none":
+                self.assertLess(os.path.getsize(path) * 2, len(full) * len(DEFAULT_CHANNELS) * 8)
+
+        with self.assertRaises(ValueError):
+            Recorder(writer = TelemetryWriter(os.path.join(self.directory, "bad"), ("time", "x")))
+
+    def test_time_index(self):
+        scenario = Scenario(dt = 0.01, pos = Vector3(0, 0, 50), vel = Vector3(10, 0, 40))
+        full = Recorder()
+        scenario.run(full.recordBody)
+        path = os.path.join(self.directory, "indexed.ptlm")
+        with TelemetryWriter(path, DEFAULT_CHANNELS, chunkRows = 50) as writer:
+            recorder = Recorder(writer = writer)
+            scenario.run(recorder.recordBody)
+            recorder.flush()
+
+        times = list(full.columns["time"])
+        z = list(full.columns["z"])
+        expected = []
+        for (t0, v0), (t1, v1) in zip(zip(times, z), zip(times[1:], z[1:])):
+            if (v0 < 100 <= v1) or (v0 > 100 >= v1):
+                expected.append(t0 + (t1 - t0) * (100 - v0) / (v1 - v0))
+        self.assertEqual(len(expected), 2)
+
+        with TelemetryReader(path) as reader:
+            self.assertEqual(len(reader.index), (len(full) + 49) // 50)
+            self.assertEqual(reader.index[3].first, times[150])
+            self.assertEqual(reader.index[3].maximum["x"], max(full.columns["x"][150:200]))
+            decoded = []
+            decode = reader._decode
+            reader._decode = lambda chunk, channels: decoded.append(chunk) or decode(chunk, channels)
+
+            window = reader.window(2.0, 2.5, ["z"])
+            lo = bisect.bisect_left(times, 2.0)
+            hi = bisect.bisect_right(times, 2.5)
+            self.assertEqual(list(window["time"]), times[lo:hi])
+            self.assertEqual(list(window["z"]), z[lo:hi])
+            self.assertLessEqual(len(decoded), 2)
+
+            decoded.clear()
+            self.assertEqual(reader.crossings("z", 100), expected)
+            self.assertLessEqual(len(decoded), 8)
+            self.assertEqual(reader.crossings("z", 100, "down"), expected[1:])
+            self.assertEqual(reader.crossings("z", 100, start = expected[0] + 0.1), expected[1:])
+            self.assertEqual(reader.crossings("z", 1e6), [])
+
+        # Without the index (a writer that was never closed) the headers are scanned
+        with open(path, 'rb') as indexed:
+            data = indexed.read()
+        unindexed = os.path.join(self.directory, "unindexed.ptlm")
+        with open(unindexed, 'wb') as raw:
+            raw.write(data[:struct.unpack("<Q", data[-12:-4])[0]])
+        with TelemetryReader(unindexed) as reader:
+            self.assertIsNone(reader.index[0].minimum)
+            self.assertEqual(reader.crossings("z", 100), expected)
+            self.assertEqual(reader.read(), full.columns)
+
+class TestForces(unittest.TestCase):
+    def test_multi_rate_schedule(self):
+        values = iter(range(100))
+        rate = MultiRate(every = 3, mode = "extrapolate")
+        served = [rate(lambda: (Vector3(next(values), 0, 0),))[0].x for _ in range(7)]
+        self.assertEqual(served, [0, 0, 0, 1, 1 + 1 / 3, 1 + 2 / 3, 2])
+        self.assertEqual((rate.calls, rate.evaluations), (7, 3))
+        with self.assertRaises(ValueError):
+            MultiRate(every = 0)
+
+    def test_rated_force_and_aero_rates(self):
+        scenario = Scenario(dt = 0.01, pos = Vector3(0, 0, 200), vel = Vector3(60, 0, 20), dragCoeff = 0.4)
+        thrust = lambda time, body: (body.vel.normalized() * (50 * max(0.0, 2 - time)), Vector3.Zero())
+        direct = scenario.run(controller = lambda time, body: body.applyForceCoM(thrust(time, body)[0]))
+        self.assertEqual(scenario.run(controller = RatedForce(thrust)).impact, direct.impact)
+        held = RatedForce(thrust, every = 4)
+        self.assertNotEqual(scenario.run(controller = held).impact, direct.impact)
+        self.assertEqual(held.rate.evaluations, (held.rate.calls + 3) // 4)
+
+        self.assertEqual(Scenario.FromDict(scenario.replace(aeroEvery = 5, aeroMode = "extrapolate").toDict()).aeroEvery, 5)
+        runs = {(run.every, run.mode): run for run in rateStudy(scenario, rates = (1, 5))}
+        self.assertEqual(runs[(1, "hold")].errors["impact"], 0)
+        self.assertAlmostEqual(runs[(5, "hold")].evaluations, runs[(1, "hold")].evaluations / 5, delta = 2)
+        self.assertGreater(runs[(5, "hold")].errors["impact"], 0)
+        self.assertLess(runs[(5, "extrapolate")].errors["impact"], runs[(5, "hold")].errors["impact"] / 10)
+
+        # Integrators evaluate the forces at their own trial states, so they take no aerodynamic rate
+        self.assertRaises(ValueError, scenario.replace(integrator = "rk4", aeroEvery = 5).build)
+        self.assertRaises(ValueError, rateStudy, scenario.replace(integrator = "rk4"))
+        self.assertIsNone(scenario.replace(integrator = "rk4").build().aeroRate)
+
+class TestService(unittest.TestCase):
+    def post(self, service, path, body):
+        request = urllib.request.Request(f"http://{service.address[0]}:{service.address[1]}{path}", json.dumps(body).encode(),
+                                         {"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    def get(self, service, path):
+        with urllib.request.urlopen(f"http://{service.address[0]}:{service.address[1]}{path}") as response:
+            return json.loads(response.read())
+
+    def test_batching_cache_and_metrics(self):
+        scenarios = [Scenario(dt = 0.05, pos = Vector3(0, 0, 30), mass = 5 + i).toDict() for i in range(6)]
+        with SimulationService(batchWindow = 0.05, cacheSize = 4) as service:
+            with ThreadPoolExecutor(8) as pool:
+                responses = list(pool.map(lambda s : self.post(service, "/run", {"scenario": s}), scenarios + scenarios[:2]))
+            for scenario, response in zip(scenarios + scenarios[:2], responses):
+                self.assertEqual(response["result"]["impact"][0], Scenario.FromDict(scenario).run().impact.x)
+
+            again = self.post(service, "/run", {"scenario": scenarios[-1]})
+            self.assertTrue(again["cached"])
+            traced = self.post(service, "/run", {"scenario": scenarios[0], "trajectory": True, "every": 2})
+            self.assertFalse(traced["cached"])
+            self.assertEqual(traced["trajectory"]["z"][-1], Scenario.FromDict(scenarios[0]).run().body.pos.z)
+
+            batch = self.post(service, "/batch", {"scenarios": scenarios[:3]})
+            self.assertEqual(len(batch["results"]), 3)
+
+            metrics = self.get(service, "/metrics")
+            self.assertEqual(metrics["requests"], 11)
+            self.assertLess(metrics["batches"], metrics["runs"])
+            self.assertGreaterEqual(metrics["cacheHits"], 1)
+            self.assertLessEqual(metrics["cacheEntries"], 4)
+            self.assertGreater(metrics["latencyMs"]["p90"], 0)
+
+    def test_bad_request(self):
+        with SimulationService() as service:
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                self.post(service, "/run", {"scenario": {"bogus": 1}})
+            self.assertEqual(context.exception.code, 400)
+
+    def test_bad_request_in_batch(self):
+        good = Scenario(dt = 0.05, pos = Vector3(0, 0, 30)).toDict()
+        bad = dict(good, integrator = "bogus")
+        def post(scenario):
+            try:
+                return self.post(service, "/run", {"scenario": scenario})
+            except urllib.error.HTTPError as error:
+                return error.code
+        with SimulationService(batchWindow = 0.2) as service:
+            with ThreadPoolExecutor(2) as pool:
+                responses = list(pool.map(post, [bad, good]))
+            self.assertEqual(responses[0], 400)
+            self.assertEqual(responses[1]["result"]["impact"][0], Scenario.FromDict(good).run().impact.x)
+            self.assertEqual(service.metrics()["errors"], 1)
+
+class TestBroadphase(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        grid = UniformGrid(5)
+        points = {}
+        for key in range(200):
+            points[key] = (Vector3(rng.uniform(-50, 50), rng.uniform(-50, 50), rng.uniform(-5, 50)), rng.uniform(0, 2))
+            grid.insert(key, *points[key])
+        for key in range(0, 200, 3):
+            points[key] = (points[key][0] + Vector3(rng.uniform(-10, 10), 0, rng.uniform(-10, 10)), points[key][1])
+            grid.move(key, points[key][0])
+        for key in range(0, 200, 7):
+            grid.remove(key)
+            del points[key]
+
+        expected = {(a, b) for a in points for b in points if a < b and (points[a][0] - points[b][0]).norm() <= points[a][1] + points[b][1] + 0.5}
+        self.assertEqual(set(grid.overlaps(0.5)), expected)
+        centre = Vector3(10, -5, 20)
+        self.assertEqual(set(grid.neighbours(centre, 12)), {k for k, (p, r) in points.items() if (p - centre).norm() <= 12 + r})
+        ground = lambda x, y : 0.02 * x
+        self.assertEqual(set(grid.groundContacts(ground, ceiling = 1)), {k for k, (p, r) in points.items() if p.z - r <= ground(p.x, p.y)})
+
+    def test_simulation_keeps_index_current(self):
+        simulation = Simulation(0.05, broadphase = UniformGrid(20))
+        for i in range(5):
+            simulation.add(Scenario(pos = Vector3(0, 0, 10 + 40 * i), vel = Vector3(5 * i + 1, 0, 0)).build(), radius = 1)
+        for _ in range(20):
+            simulation.step()
+            self.assertEqual(len(simulation.broadphase), len(simulation.active))
+            for slot in simulation.active:
+                self.assertIn(slot, simulation.broadphase.neighbours(simulation.bodies[slot].pos, 0))
+
+class TestTerrain(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        # A tilted plane with a ridge, 21 x 31 samples 10 m apart
+        self.grid = [[5 + 0.1 * x + (20 if x == 150 else 0) for x in range(0, 310, 10)] for y in range(0, 210, 10)]
+        self.raw = os.path.join(self.directory, "dem.raw")
+        with open(self.raw, 'wb') as raw_file:
+            array('f', [h for row in self.grid for h in row]).tofile(raw_file)
+        self.tiled = os.path.join(self.directory, "dem.tiles")
+        writeTiled(self.tiled, self.grid, spacing = 10, tileSize = 4, sampleType = "h", scale = 0.01)
+
+    def test_raw_and_tiled_agree(self):
+        with Heightmap.Raw(self.raw, 21, 31, spacing = 10) as raw, Heightmap.Open(self.tiled, cacheTiles = 3) as tiled:
+            self.assertEqual(raw.maxHeight, math.inf)
+            self.assertAlmostEqual(tiled.maxHeight, 40, places = 4)
+            self.assertAlmostEqual(raw.height(55, 33), 5 + 5.5, places = 4)
+            self.assertAlmostEqual(raw.height(145, 0), 5 + 14.5 + 10, places = 4)
+            self.assertAlmostEqual(raw.height(-100, 500), 5, places = 4)
+            rng = random.Random(3)
+            points = [(rng.uniform(-10, 310), rng.uniform(-10, 210)) for _ in range(200)]
+            for (x, y), h in zip(points, tiled.heights(points)):
+                self.assertAlmostEqual(h, raw.height(x, y), delta = 0.01)
+                self.assertEqual(h, tiled.height(x, y))
+            self.assertLessEqual(len(tiled._tiles), 3)
+
+            # The reader big-endian hosts use decodes the same samples
+            swapped = _LittleEndianSamples(raw._map, "f")
+            self.assertEqual(len(swapped), len(raw._data))
+            self.assertEqual([swapped[k] for k in range(0, 651, 50)], [raw._data[k] for k in range(0, 651, 50)])
+
+    def test_impact_on_terrain(self):
+        scenario = Scenario(dt = 0.05, pos = Vector3(0, 100, 60), vel = Vector3(25, 0, 5))
+        self.assertEqual(scenario.run(ground = FlatGround()).impact, scenario.run().impact)
+        with Heightmap.Raw(self.raw, 21, 31, spacing = 10, maxHeight = 40) as terrain:
+            result = scenario.run(ground = terrain)
+            self.assertTrue(result.landed)
+            with Heightmap.Raw(self.raw, 21, 31, spacing = 10) as unbounded:
+                self.assertEqual(scenario.run(ground = unbounded).impact, result.impact)
+            self.assertAlmostEqual(result.impact.z, terrain.height(result.impact.x, result.impact.y), places = 6)
+            self.assertLess(result.flightTime, scenario.run().flightTime)
+
+            simulation = Simulation.FromScenarios([scenario, scenario.replace(pos = Vector3(0, 50, 90))], ground = terrain)
+            batched = simulation.run()
+            self.assertEqual(batched[0].impact, result.impact)
+            self.assertEqual(batched[1].impact, scenario.replace(pos = Vector3(0, 50, 90)).run(ground = terrain).impact)
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.scenario = Scenario(dt = 0.01, pos = Vector3(0, 0, 50), vel = Vector3(30, 0, 20))
+
+    def control(self, time, body, commands, rng):
+        # Gusts every second and a short burn
+        if int(time * 100) % 100 == 0:
+            commands.setWind(Vector3(rng.gauss(0, 3), rng.gauss(0, 3), 0))
+        commands.setForce(Vector3(0, 0, 15) if time < 0.5 else Vector3.Zero())
+
+    def test_replay_is_bit_identical(self):
+        observed = Recorder()
+        log, result = ReplayLog.Record(self.scenario, self.control, seed = 11, observer = observed.recordBody)
+        observed.flush()
+        self.assertNotEqual(result.impact, self.scenario.run().impact)
+
+        path = os.path.join(self.directory, "run.replay")
+        log.save(path)
+        loaded = ReplayLog.Load(path)
+        self.assertEqual(len(loaded.events), len(log.events))
+        self.assertTrue(loaded.verify())
+        self.assertEqual(loaded.replay().impact, result.impact)
+        self.assertEqual(loaded.telemetry().columns, observed.columns)
+
+        csv = os.path.join(self.directory, "run.csv")
+        observed.writeCSV(csv)
+        self.assertLess(os.path.getsize(path) * 10, os.path.getsize(csv))
+
+    def test_dense_output_rate(self):
+        log, result = ReplayLog.Record(self.scenario, self.control, seed = 4)
+        samples = log.dense(every = 5).resample(0.25)
+        self.assertGreater(len(samples), 4)
+        self.assertFalse(ReplayLog(self.scenario, 4, [], log.summary).verify())
+
+unittest.main(argv=[''],verbosity=2, exit=False)